@@ -0,0 +1,97 @@
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette._utils import get_route_path
+from starlette.types import Receive, Scope, Send
+
+# RFC 7230 hop-by-hop headers: never forwarded by a proxy
+HOP_BY_HOP = {
+    b"connection", b"keep-alive", b"proxy-authenticate", b"proxy-authorization",
+    b"te", b"trailer", b"transfer-encoding", b"upgrade",
+}
+
+
+def _forwardable(headers: List[Tuple[bytes, bytes]], drop=()) -> List[Tuple[bytes, bytes]]:
+    # ASGI wants lower-case names
+    return [(k.lower(), v) for k, v in headers if k.lower() not in HOP_BY_HOP and k.lower() not in drop]
+
+
+async def _replay(content: bytes) -> AsyncIterator[bytes]:
+    yield content
+
+
+class AdminProxy:
+    """
+    Reverse proxy for /admin when the dashboard runs in its own process
+    (`gunicorn dashboard.wsgi:server`, see dashboard/wsgi.py).
+
+    The API process only relays bytes: no Dash/pandas in this process, no
+    WSGI bridge threads, and at most `max_connections` admin requests in
+    flight upstream (the rest queue in the pool), so dashboard load can't
+    starve /api/collect of the event loop or the threadpool.
+    """
+
+    def __init__(self, upstream: str, timeout: float = 60.0, max_connections: int = 8,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.upstream = upstream.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                transport=self.transport,
+                follow_redirects=False,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return
+
+        request = Request(scope, receive)
+        # path below the mount point: Dash serves its routes at / and only
+        # builds browser URLs with the /admin/ prefix
+        url = self.upstream + get_route_path(scope)
+        if scope.get("query_string"):
+            url += "?" + scope["query_string"].decode("latin-1")
+
+        headers = _forwardable(request.headers.raw, drop=(b"host", b"content-length"))
+        client_host = request.client.host if request.client else ""
+        headers += [
+            (b"x-forwarded-for", client_host.encode("latin-1")),
+            (b"x-forwarded-proto", scope.get("scheme", "http").encode("latin-1")),
+            (b"x-forwarded-host", request.headers.get("host", "").encode("latin-1")),
+        ]
+
+        try:
+            upstream_req = self.client.build_request(request.method, url, headers=headers,
+                                                     content=await request.body())
+            upstream_resp = await self.client.send(upstream_req, stream=True)
+        except httpx.HTTPError as e:
+            await PlainTextResponse(f"admin dashboard unavailable: {e.__class__.__name__}",
+                                    status_code=502)(scope, receive, send)
+            return
+
+        # transports that hand back an already-read body can't be streamed again
+        body = (_replay(upstream_resp.content) if upstream_resp.is_stream_consumed
+                else upstream_resp.aiter_raw())
+        response = StreamingResponse(body, status_code=upstream_resp.status_code,
+                                     background=BackgroundTask(upstream_resp.aclose))
+        # raw list keeps repeated headers (Set-Cookie) intact
+        response.raw_headers = _forwardable(upstream_resp.headers.raw)
+        await response(scope, receive, send)
@@ -0,0 +1,207 @@
+"""
+In-memory cache for the small files that get requested over and over
+(page shells, hot sprites, maps, JS modules).
+
+HotFileCache is an LRU bounded by total bytes. Entries are validated
+against the stat result the caller already has (mtime_ns + size), so an
+edited file is re-read on its next request and a hit costs no disk I/O
+beyond that stat. Misses are served from disk as usual and the file is
+loaded into memory afterwards in a background task, so reads never block
+the event loop.
+
+serve_file() wraps a prepared FileResponse (headers only, nothing read
+yet) and answers If-None-Match / If-Modified-Since with 304, serves hits
+from memory, and handles single byte ranges (`Range`, `If-Range`) for
+memory-served bodies; disk-served bodies use FileResponse's own range
+support.
+"""
+import os
+import threading
+from collections import OrderedDict
+from email.utils import parsedate
+from typing import Any, Dict, Optional, Tuple
+
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+
+class HotFileCache:
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024, max_file_bytes: int = 1024 * 1024):
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_file_bytes = max(0, int(max_file_bytes))
+        self._lock = threading.Lock()
+        # path -> (mtime_ns, size, data), least recently used first
+        self._files: "OrderedDict[str, Tuple[int, int, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0      # too large to cache
+        self.evictions = 0
+        self.bytes_served = 0  # from memory
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.max_file_bytes > 0
+
+    def accepts(self, size: int) -> bool:
+        return self.enabled and size <= min(self.max_file_bytes, self.max_bytes)
+
+    def get(self, path: str, stat_result: os.stat_result) -> Optional[bytes]:
+        """Cached bytes if still current for this stat result, else None (counted as a miss)."""
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None and entry[0] == stat_result.st_mtime_ns and entry[1] == stat_result.st_size:
+                self._files.move_to_end(path)
+                self.hits += 1
+                self.bytes_served += entry[1]
+                return entry[2]
+            if self.accepts(stat_result.st_size):
+                self.misses += 1
+            else:
+                self.bypassed += 1
+            return None
+
+    def load(self, path: str, stat_result: os.stat_result) -> None:
+        """Read a file into the cache (runs off the event loop)."""
+        if not self.accepts(stat_result.st_size):
+            return
+        try:
+            with open(path, "rb") as f:
+                data = f.read(self.max_file_bytes + 1)
+        except OSError:
+            return
+        if len(data) != stat_result.st_size:  # changed while we were reading
+            return
+        with self._lock:
+            old = self._files.pop(path, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._files[path] = (stat_result.st_mtime_ns, len(data), data)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes:
+                _, (_, size, _) = self._files.popitem(last=False)
+                self._bytes -= size
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._files.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._files),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_file_bytes": self.max_file_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "bytes_served_from_memory": self.bytes_served,
+                "hottest": [os.path.basename(p) for p in reversed(list(self._files)[-10:])],
+            }
+
+
+# ---------- conditional requests + ranges ----------
+def is_not_modified(response_headers: Headers, request_headers: Headers) -> bool:
+    """Same rules as StaticFiles: If-None-Match wins over If-Modified-Since."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        etag = response_headers.get("etag")
+        return etag is not None and etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+
+    if_modified_since = request_headers.get("if-modified-since")
+    last_modified = response_headers.get("last-modified")
+    if if_modified_since and last_modified:
+        ims, lm = parsedate(if_modified_since), parsedate(last_modified)
+        return ims is not None and lm is not None and ims >= lm
+    return False
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single `bytes=` range -> inclusive (start, end).
+    None means "ignore the header and send everything" (malformed or
+    multi-range); RangeNotSatisfiable for ranges entirely past the end.
+    """
+    unit, _, spec = (header or "").partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first == "":  # suffix: last N bytes
+            n = int(last)
+            if n <= 0:
+                raise RangeNotSatisfiable()
+            return max(0, size - n), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _if_range_ok(response_headers: Headers, request_headers: Headers) -> bool:
+    if_range = request_headers.get("if-range")
+    if not if_range:
+        return True
+    return if_range.strip() in (response_headers.get("etag"), response_headers.get("last-modified"))
+
+
+def memory_response(data: bytes, headers: Headers, request_headers: Headers, status_code: int = 200) -> Response:
+    """Response for an in-memory body, honouring a single Range request."""
+    out = MutableHeaders(raw=list(headers.raw))
+    out["accept-ranges"] = "bytes"
+    size = len(data)
+
+    range_header = request_headers.get("range")
+    if range_header and status_code == 200 and _if_range_ok(headers, request_headers):
+        try:
+            rng = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            out["content-range"] = f"bytes */{size}"
+            out["content-length"] = "0"
+            return Response(status_code=416, headers=dict(out))
+        if rng is not None:
+            start, end = rng
+            out["content-range"] = f"bytes {start}-{end}/{size}"
+            out["content-length"] = str(end - start + 1)
+            return Response(data[start:end + 1], status_code=206, headers=dict(out))
+
+    out["content-length"] = str(size)
+    return Response(data, status_code=status_code, headers=dict(out))
+
+
+def serve_file(response: FileResponse, stat_result: os.stat_result, request_headers: Headers,
+               cache: Optional[HotFileCache]) -> Response:
+    """304, memory hit, or the disk FileResponse (warming the cache afterwards)."""
+    if is_not_modified(response.headers, request_headers):
+        return NotModifiedResponse(response.headers)
+    if cache is None or not cache.enabled:
+        return response
+
+    path = str(response.path)
+    data = cache.get(path, stat_result)
+    if data is not None:
+        return memory_response(data, response.headers, request_headers, response.status_code)
+    if cache.accepts(stat_result.st_size) and response.background is None:
+        response.background = BackgroundTask(cache.load, path, stat_result)
+    return response
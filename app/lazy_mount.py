@@ -0,0 +1,68 @@
+import threading
+import time
+from typing import Callable, Optional
+
+import anyio
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class LazyMount:
+    """
+    ASGI app that builds the real app on first use.
+
+    Used for the /admin Dash mount: importing dashboard.app pulls in Dash,
+    Plotly Express and pandas and builds the whole layout (~1s of CPU on
+    the shared VM), which the ingest API should not wait for on a cold
+    start. `loader` runs once, in a worker thread, on the first request
+    (or from `preload_in_background`); concurrent first requests wait for
+    the same load. If it raises, the request gets a 503 and the next one
+    retries.
+    """
+
+    def __init__(self, loader: Callable[[], ASGIApp], name: str = "app"):
+        self.loader = loader
+        self.name = name
+        self._app: Optional[ASGIApp] = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._app is not None
+
+    def load(self) -> ASGIApp:
+        if self._app is None:
+            with self._lock:
+                if self._app is None:
+                    t0 = time.perf_counter()
+                    app = self.loader()
+                    self.load_seconds = time.perf_counter() - t0
+                    self._app = app
+        return self._app
+
+    def preload_in_background(self, delay: float = 0.0) -> threading.Thread:
+        """Load after `delay` seconds in a daemon thread (errors are left for the first request)."""
+        def run():
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                self.load()
+            except Exception:
+                pass
+
+        thread = threading.Thread(target=run, name=f"preload-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        app = self._app
+        if app is None:
+            try:
+                app = await anyio.to_thread.run_sync(self.load)
+            except Exception as e:
+                if scope["type"] == "http":
+                    resp = PlainTextResponse(f"{self.name} failed to load: {e}", status_code=503)
+                    await resp(scope, receive, send)
+                return
+        await app(scope, receive, send)
@@ -0,0 +1,161 @@
+"""
+Live rollup stream for the admin dashboard.
+
+The ingest writer thread reports every committed event to `record()`
+as (stage, difficulty, event_type). Counts accumulate in a pending
+table, and every `interval` seconds the event loop flushes the pending
+table as ONE delta message to each subscriber:
+
+    {"seq": 42, "ts": "...", "rows": [
+        {"stage": 3, "difficulty": "hard", "starts": 2, "completes": 1,
+         "fails": 0, "quits": 0, "deaths": 1}, ...]}
+
+/admin/_live/rollups serves that as server-sent events, under /admin so
+whatever restricts the dashboard restricts it too. The dashboard adds
+the deltas to the figures it already has, so live counters cost the
+database nothing: the numbers come from the rows the writer just
+committed.
+
+Subscribers that fall `max_queue` messages behind are dropped. The
+browser's EventSource reconnects, and the next server render of a
+figure brings its numbers back in line with the database. At most
+`max_subscribers` streams are open at once (0: no limit); the endpoint
+answers 503 past that.
+
+The broker lives in one process: with `uvicorn --workers N`, a
+subscriber only sees the events committed by the worker that serves its
+stream.
+"""
+import asyncio
+import json
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, Iterable, Optional, Set, Tuple
+
+# telemetry event_type -> rollup column
+ROLLUP_COLUMNS = {
+    "stage_start": "starts",
+    "stage_complete": "completes",
+    "fail": "fails",
+    "quit": "quits",
+    "death": "deaths",
+}
+
+_CLOSED = object()
+
+
+def format_sse(data: str, event: Optional[str] = None) -> str:
+    lines = [f"event: {event}"] if event else []
+    lines += [f"data: {line}" for line in data.splitlines() or [""]]
+    return "\n".join(lines) + "\n\n"
+
+
+class RollupBroker:
+    def __init__(self, interval: float = 1.0, max_queue: int = 120, heartbeat: float = 15.0,
+                 max_subscribers: int = 0):
+        self.interval = interval
+        self.max_queue = max(1, int(max_queue))
+        self.max_subscribers = max(0, int(max_subscribers))
+        self.heartbeat = heartbeat
+        self._lock = threading.Lock()
+        self._pending: "Counter[Tuple[int, str, str]]" = Counter()
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+        self.seq = 0
+        self.dropped = 0
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    @property
+    def full(self) -> bool:
+        return bool(self.max_subscribers) and len(self._subscribers) >= self.max_subscribers
+
+    # ----- writer thread -----
+    def record(self, events: Iterable[Tuple[int, str, str]]) -> None:
+        """Count committed events (stage, difficulty, event_type); other event types are ignored."""
+        counted = [(int(stage), difficulty or "", ROLLUP_COLUMNS[ev])
+                   for stage, difficulty, ev in events if ev in ROLLUP_COLUMNS and stage is not None]
+        if counted:
+            with self._lock:
+                self._pending.update(counted)
+
+    # ----- event loop -----
+    def flush(self) -> Optional[dict]:
+        """Turn the pending counts into one message and queue it for every subscriber."""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+        if not pending or not self._subscribers:
+            return None
+
+        rows: Dict[Tuple[int, str], dict] = {}
+        for (stage, difficulty, column), n in pending.items():
+            row = rows.setdefault((stage, difficulty), {
+                "stage": stage, "difficulty": difficulty, **{c: 0 for c in ROLLUP_COLUMNS.values()},
+            })
+            row[column] += n
+        self.seq += 1
+        message = {
+            "seq": self.seq,
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "rows": [rows[k] for k in sorted(rows)],
+        }
+
+        for queue in list(self._subscribers):
+            if queue.qsize() >= self.max_queue:
+                self._drop(queue)
+            else:
+                queue.put_nowait(message)
+        return message
+
+    def _drop(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        self.dropped += 1
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_CLOSED)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.flush()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for queue in list(self._subscribers):
+            self._drop(queue)
+
+    async def stream(self) -> AsyncIterator[str]:
+        """SSE body for one subscriber: a hello, then one `rollup` event per flush."""
+        if self.full:
+            # let in by the endpoint, but other streams took the last slots first
+            yield f"retry: {int(self.heartbeat * 1000)}\n" + format_sse(
+                json.dumps({"max_subscribers": self.max_subscribers}), event="busy")
+            return
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            yield format_sse(json.dumps({"seq": self.seq, "interval": self.interval}), event="hello")
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+                    continue
+                if message is _CLOSED:
+                    return
+                yield format_sse(json.dumps(message), event="rollup")
+        finally:
+            self._subscribers.discard(queue)
@@ -1,18 +1,31 @@
-import os, csv, json, sqlite3, hashlib, threading, uuid
+import os, csv, json, sqlite3, hashlib, threading, asyncio
 from datetime import datetime, timezone
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List, Tuple
 
-from fastapi import FastAPI, Request, Form
+from fastapi import FastAPI, Request, Form, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
 from itsdangerous import URLSafeSerializer, BadSignature
 
 from pathlib import Path
 
 from starlette.middleware.wsgi import WSGIMiddleware
-import dashboard.app as dash_entry
+
+from app.cache import LRUCache
+from app.admin_proxy import AdminProxy
+from app.hot_files import HotFileCache
+from app.lazy_mount import LazyMount
+from app.live import RollupBroker
+from app.request_metrics import RequestMetrics
+from app.request_profiler import ProfileRequests
+from app.static_files import AssetStaticFiles
+from app.sessions import make_session_registry
+from app.writer import IngestWriter
+from dashboard import profiler
+from dashboard.admin_auth import is_admin
+from dashboard.instrumentation import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
 
 
 
@@ -27,19 +40,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency by route and status class, served with the other metrics at /metrics
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request duration, to the end of the response body",
+    ("route", "status"),
+)
+app.add_middleware(RequestMetrics, histogram=REQUEST_SECONDS)
+# X-Profile: 1 (with ADMIN_TOKEN) runs one /api/collect request under cProfile
+app.add_middleware(ProfileRequests, paths=("/api/collect",))
+
 BASE_DIR = Path(__file__).resolve().parent.parent  # /app
 STATIC_DIR = BASE_DIR / "static"
+# built by `python -m tools.build_assets`; optional in dev
+DIST_DIR = STATIC_DIR / "dist"
 
-app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
-
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(BASE_DIR, "data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 CSV_PATH = os.path.join(DATA_DIR, "user_events.csv")
 DASHBOARD_DB_PATH = os.path.join(DATA_DIR, "game.db")  # unified DB
 
-# Serve browser files
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+# Small hot files (page shells, sprites, maps, modules) are served from RAM.
+# STATIC_CACHE_MB=0 turns it off.
+hot_files = HotFileCache(
+    max_bytes=int(float(os.environ.get("STATIC_CACHE_MB", "32")) * 1024 * 1024),
+    max_file_bytes=int(os.environ.get("STATIC_CACHE_MAX_FILE_KB", "1024")) * 1024,
+)
+
+# Serve browser files. /static/dist (fingerprinted + precompressed) has to be
+# mounted first or /static would swallow it.
+dist_files = AssetStaticFiles(directory=str(DIST_DIR), check_dir=False, hot_cache=hot_files)
+static_files = AssetStaticFiles(directory=str(STATIC_DIR), hot_cache=hot_files)
+app.mount("/static/dist", dist_files, name="static_dist")
+app.mount("/static", static_files, name="static")
+
+
+def page_response(request: Request, name: str):
+    """An HTML page (from the build output when there is one), with the same
+    caching, 304 and compression handling as /static."""
+    handler = dist_files if dist_files.manifest.files and (DIST_DIR / name).is_file() else static_files
+    full_path, stat_result = handler.lookup_path(name)
+    return handler.file_response(full_path, stat_result, request.scope)
 
 # ===== SESSIONS (COOKIE) =====
 SECRET = os.getenv("APP_SECRET", "change-this-to-a-long-random-string")
@@ -81,10 +122,35 @@ _csv_lock = threading.Lock()
 
 # ===== ANONYMIZATION (NEW!) =====
 ANON_SALT = os.environ.get("ANON_SALT", "dev_salt_change_me")
+# Number of distinct anonymous ids. 1000 keeps the historic user_087 ids but
+# starts colliding after a few hundred players; raise it for real traffic.
+ANON_ID_SPACE = max(1, int(os.environ.get("ANON_ID_SPACE", "1000")))
+_ANON_ID_WIDTH = max(3, len(str(ANON_ID_SPACE - 1)))
+# username → (user_id, user_num), so hot players skip the SHA-256
+_user_id_cache = LRUCache(maxsize=int(os.environ.get("USER_ID_CACHE_MAX", "10000")))
 
 # Server-side session tracking
-_active_sessions_lock = threading.Lock()
-_active_session_by_user: Dict[str, str] = {}
+# SESSION_BACKEND=sqlite shares sessions between `uvicorn --workers N` processes
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", "1800"))
+SESSION_MAX_ACTIVE = int(os.environ.get("SESSION_MAX_ACTIVE", "50000"))
+SESSION_SWEEP_SECONDS = float(os.environ.get("SESSION_SWEEP_SECONDS", "60"))
+SESSIONS_DB_PATH = os.path.join(DATA_DIR, "sessions.db")
+session_registry = make_session_registry(
+    SESSION_BACKEND, SESSIONS_DB_PATH, idle_ttl=SESSION_IDLE_SECONDS, max_size=SESSION_MAX_ACTIVE
+)
+
+# ===== IDEMPOTENT INGEST =====
+# Recently seen client event ids. A retry of an event we already stored is
+# answered from memory; the UNIQUE index on telemetry_events.event_id is the
+# backstop once an id has fallen out of this window.
+RECENT_EVENT_IDS_MAX = int(os.environ.get("RECENT_EVENT_IDS_MAX", "50000"))
+_recent_event_ids = LRUCache(maxsize=RECENT_EVENT_IDS_MAX)
+# ids whose first delivery is still being written -> a future of that write's
+# result (True/False stored, None not stored). An id only moves to
+# _recent_event_ids once it is stored, so a retry arriving meanwhile waits
+# for the outcome instead of being acknowledged for a write that may fail.
+_inflight_event_ids: Dict[str, asyncio.Future] = {}
 
 
 def sha256_hex(s: str) -> str:
@@ -92,47 +158,84 @@ def sha256_hex(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
 
 
-def user_id_from_username(username: str) -> str:
+def user_ids_from_username(username: str) -> Tuple[str, int]:
     """
-    Convert username to anonymous user_id like user_087.
-    Same username always gives same user_id (stable).
+    Convert username to (anonymous user_id like user_087, its integer 87).
+    Same username always gives same user_id (stable). Cached, so only the
+    first event of a player pays for the salted hash.
     """
+    cached = _user_id_cache.get(username)
+    if cached is not None:
+        return cached
+
     h = sha256_hex(f"{ANON_SALT}::{username}")
-    num = int(h[:8], 16) % 1000
-    return f"user_{num:03d}"
+    # 32 bits cover the default space; wider spaces need more of the digest
+    digits = 8 if ANON_ID_SPACE <= 2 ** 32 else 16
+    num = int(h[:digits], 16) % ANON_ID_SPACE
+    ids = (f"user_{num:0{_ANON_ID_WIDTH}d}", num)
+    _user_id_cache.put(username, ids)
+    return ids
 
 
-def generate_session_id(user_id: str) -> str:
-    """Generate unique session ID"""
-    return f"session_{user_id}_{uuid.uuid4().hex[:12]}"
+def user_id_from_username(username: str) -> str:
+    """Convert username to anonymous user_id like user_087."""
+    return user_ids_from_username(username)[0]
 
 
 def get_or_create_session_id(user_id: str, provided_session_id: str) -> str:
     """
     Guarantees session_id exists.
     - If client sends session_id → use it
-    - Else reuse active session for this user
+    - Else reuse active (non-idle) session for this user
     - Else create new session
     """
-    sid = (provided_session_id or "").strip()
-    
-    with _active_sessions_lock:
-        if sid:
-            _active_session_by_user[user_id] = sid
-            return sid
-        
-        if user_id in _active_session_by_user:
-            return _active_session_by_user[user_id]
-        
-        new_sid = generate_session_id(user_id)
-        _active_session_by_user[user_id] = new_sid
-        return new_sid
+    return session_registry.get_or_create(user_id, provided_session_id)
 
 
 def clear_session_id(user_id: str):
     """Clear session on logout"""
-    with _active_sessions_lock:
-        _active_session_by_user.pop(user_id, None)
+    session_registry.clear(user_id)
+
+
+async def _registry_call(fn, *args):
+    # the sqlite backend touches disk, keep it off the event loop
+    if session_registry.blocking:
+        return await run_in_threadpool(fn, *args)
+    return fn(*args)
+
+
+async def _session_sweeper():
+    """Periodically evict idle sessions (players who closed the tab)."""
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_SECONDS)
+        try:
+            await _registry_call(session_registry.sweep)
+        except Exception as e:
+            print(f"Session sweep failed: {e}")
+
+
+_sweeper_task: Optional[asyncio.Task] = None
+
+
+# ===== INGEST METRICS =====
+# Children are resolved once here; the writer thread only observes
+INGEST_STEP_SECONDS = REGISTRY.histogram(
+    "ingest_step_seconds", "Time per ingest batch in each write step", ("step",),
+)
+_STEP_CSV_APPEND = INGEST_STEP_SECONDS.labels("csv_append")
+_STEP_CSV_FSYNC = INGEST_STEP_SECONDS.labels("csv_fsync")
+_STEP_SQLITE_INSERT = INGEST_STEP_SECONDS.labels("sqlite_insert")
+_STEP_SQLITE_COMMIT = INGEST_STEP_SECONDS.labels("sqlite_commit")
+_BATCH_ROWS = REGISTRY.histogram(
+    "ingest_batch_rows", "Events per group-committed ingest batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+INGEST_EVENTS = REGISTRY.counter("ingest_events_total", "Collected events by write result", ("result",))
+_EVENTS_RESULT = {
+    True: INGEST_EVENTS.labels("stored"),
+    False: INGEST_EVENTS.labels("duplicate"),
+    None: INGEST_EVENTS.labels("failed"),
+}
 
 
 # ===== CSV HELPERS =====
@@ -144,10 +247,27 @@ def ensure_csv_exists():
             writer.writeheader()
 
 
+def append_csv_rows(rows: List[dict]):
+    """Append a batch of rows to the CSV with a single flush + fsync."""
+    ensure_csv_exists()
+    with _csv_lock:
+        with open(CSV_PATH, "a", newline="", encoding="utf-8") as f:
+            with _STEP_CSV_APPEND.time():
+                writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
+                for row in rows:
+                    writer.writerow({k: row.get(k, "") for k in CSV_HEADERS})
+                f.flush()           # ← Ensure data written to disk
+            with _STEP_CSV_FSYNC.time():
+                os.fsync(f.fileno())  # ← Force OS to write
+
+
 def ensure_dashboard_tables():
     conn = sqlite3.connect(DASHBOARD_DB_PATH)
     cur = conn.cursor()
 
+    # WAL lets the dashboard read while the ingest writer commits
+    cur.execute("PRAGMA journal_mode=WAL")
+
     cur.execute("""
     CREATE TABLE IF NOT EXISTS telemetry_events (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -156,10 +276,22 @@ def ensure_dashboard_tables():
         event_type TEXT,
         event_data TEXT,
         stage_number INTEGER,
-        timestamp TEXT
+        timestamp TEXT,
+        event_id TEXT
     );
     """)
 
+    # older DBs predate client event ids
+    cols = {row[1] for row in cur.execute("PRAGMA table_info(telemetry_events)")}
+    if "event_id" not in cols:
+        cur.execute("ALTER TABLE telemetry_events ADD COLUMN event_id TEXT")
+
+    # NULLs don't collide, so legacy rows without an id are unaffected
+    cur.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_telemetry_events_event_id
+    ON telemetry_events(event_id);
+    """)
+
     cur.execute("""
     CREATE TABLE IF NOT EXISTS death_heatmap (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -194,90 +326,167 @@ def hash_password(password: str) -> str:
 
 
 # ===== TELEMETRY → DASHBOARD DB (UPDATED) =====
-def update_dashboard_db(row_data):
-    try:
-        conn = sqlite3.connect(DASHBOARD_DB_PATH)
-        cur = conn.cursor()
+def _event_stage(row_data) -> Tuple[str, int]:
+    """(difficulty, stage_number) as stored in the dashboard DB."""
+    difficulty = row_data["mode_level_choice"].lower() if row_data.get("mode_level_choice") else "medium"
+    stage_number = row_data.get("stage_number")
+    if not stage_number:
+        stage_map = {"easy": 2, "medium": 5, "hard": 8, "": 5}
+        stage_number = stage_map.get(difficulty, 5)
+    return difficulty, stage_number
 
-        # Map user_id string to integer for DB
-        user_id_str = row_data["user_id"]  # ← Changed from "username"
+
+def _insert_event(cur, row_data) -> bool:
+    """
+    Insert one collected event (plus derived rows) using an open cursor.
+    Returns False when the event_id was already stored.
+    """
+    # Integer user id for DB; collect_event already computed it
+    user_id_str = row_data["user_id"]  # ← Changed from "username"
+    user_id = row_data.get("user_num")
+    if user_id is None:
         try:
             user_id = int(user_id_str.split("_")[-1])  # "user_087" → 87
         except Exception:
             user_id = 0
-        
-        session_id = row_data.get("session_id") or f"session_{user_id_str}_unknown"
+    
+    session_id = row_data.get("session_id") or f"session_{user_id_str}_unknown"
 
-        difficulty = row_data["mode_level_choice"].lower() if row_data.get("mode_level_choice") else "medium"
-        stage_number = row_data.get("stage_number")
-        if not stage_number:
-            stage_map = {"easy": 2, "medium": 5, "hard": 8, "": 5}
-            stage_number = stage_map.get(difficulty, 5)
+    difficulty, stage_number = _event_stage(row_data)
 
-        event_type = row_data["event_type"]
-        event_data_obj = {
-            "difficulty": difficulty,
-            "character": row_data.get("character_choice") or ""
-        }
+    event_type = row_data["event_type"]
+    event_data_obj = {
+        "difficulty": difficulty,
+        "character": row_data.get("character_choice") or ""
+    }
 
-        extra = row_data.get("extra")
-        if isinstance(extra, dict):
-            event_data_obj.update(extra)
+    extra = row_data.get("extra")
+    if isinstance(extra, dict):
+        event_data_obj.update(extra)
 
-        event_data = json.dumps(event_data_obj)
+    if event_type == "death":
+        # kept with the event too, so attempts can be rebuilt from telemetry_events alone
+        for key in ("x_position", "y_position"):
+            if row_data.get(key) is not None:
+                event_data_obj.setdefault(key, row_data[key])
 
-        cur.execute("""
-        INSERT INTO telemetry_events(user_id, session_id, event_type, event_data, stage_number, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            session_id,
-            event_type,
-            event_data,
-            stage_number,
-            row_data["timestamp"]
-        ))
+    event_data = json.dumps(event_data_obj)
+    event_id = row_data.get("event_id") or None
 
-        if event_type == "death":
-            x = row_data.get("x_position")
-            y = row_data.get("y_position")
-            if x is not None and y is not None:
-                cur.execute("""
-                INSERT INTO death_heatmap(user_id, session_id, stage_number, x_position, y_position, timestamp)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    user_id,
-                    session_id,
-                    stage_number,
-                    float(x),
-                    float(y),
-                    row_data["timestamp"]
-                ))
-
-        if event_type == "logout" and row_data.get("duration_seconds"):
-            duration_ms = int(row_data["duration_seconds"]) * 1000
-            complete_data = json.dumps({
-                "difficulty": difficulty,
-                "result": "win",
-                "duration_ms": ensure_int(duration_ms)
-            })
+    cur.execute("""
+    INSERT OR IGNORE INTO telemetry_events(user_id, session_id, event_type, event_data, stage_number, timestamp, event_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (
+        user_id,
+        session_id,
+        event_type,
+        event_data,
+        stage_number,
+        row_data["timestamp"],
+        event_id
+    ))
+
+    if cur.rowcount == 0:
+        # already stored by an earlier delivery of the same event
+        return False
+
+    if event_type == "death":
+        x = row_data.get("x_position")
+        y = row_data.get("y_position")
+        if x is not None and y is not None:
             cur.execute("""
-            INSERT INTO telemetry_events(user_id, session_id, event_type, event_data, stage_number, timestamp)
+            INSERT INTO death_heatmap(user_id, session_id, stage_number, x_position, y_position, timestamp)
             VALUES (?, ?, ?, ?, ?, ?)
             """, (
                 user_id,
                 session_id,
-                "stage_complete",
-                complete_data,
                 stage_number,
-                row_data.get("logout_time") or row_data["timestamp"]
+                float(x),
+                float(y),
+                row_data["timestamp"]
             ))
 
-        conn.commit()
-        conn.close()
+    if event_type == "logout" and row_data.get("duration_seconds"):
+        duration_ms = int(row_data["duration_seconds"]) * 1000
+        complete_data = json.dumps({
+            "difficulty": difficulty,
+            "result": "win",
+            "duration_ms": ensure_int(duration_ms)
+        })
+        cur.execute("""
+        INSERT OR IGNORE INTO telemetry_events(user_id, session_id, event_type, event_data, stage_number, timestamp, event_id)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            user_id,
+            session_id,
+            "stage_complete",
+            complete_data,
+            stage_number,
+            row_data.get("logout_time") or row_data["timestamp"],
+            f"{event_id}:complete" if event_id else None
+        ))
 
+    return True
+
+
+def write_dashboard_rows(rows: List[dict],
+                         before_commit: Optional[Callable[[List[Optional[bool]]], None]] = None
+                         ) -> List[Optional[bool]]:
+    """
+    Insert a batch of collected events in ONE transaction.
+    Per row: True when stored, False when the event_id was already stored,
+    None if that row failed (its partial writes are rolled back).
+    before_commit(results) runs once the rows are inserted; if it raises,
+    the transaction is rolled back and the exception propagates.
+    """
+    results: List[Optional[bool]] = []
+    hook_failed = False
+    try:
+        conn = sqlite3.connect(DASHBOARD_DB_PATH, isolation_level=None)
     except Exception as e:
         print(f"Dashboard DB update failed: {e}")
+        return [None] * len(rows)
+
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN")
+        with _STEP_SQLITE_INSERT.time():
+            for row in rows:
+                cur.execute("SAVEPOINT ev")
+                try:
+                    results.append(_insert_event(cur, row))
+                    cur.execute("RELEASE ev")
+                except Exception as e:
+                    print(f"Dashboard DB update failed: {e}")
+                    cur.execute("ROLLBACK TO ev")
+                    cur.execute("RELEASE ev")
+                    results.append(None)
+        if before_commit is not None:
+            try:
+                before_commit(results)
+            except Exception:
+                hook_failed = True
+                cur.execute("ROLLBACK")
+                raise
+        with _STEP_SQLITE_COMMIT.time():
+            cur.execute("COMMIT")
+    except Exception as e:
+        if hook_failed:
+            raise
+        print(f"Dashboard DB update failed: {e}")
+        results = [None] * len(rows)
+    finally:
+        conn.close()
+    return results
+
+
+def update_dashboard_db(row_data) -> Optional[bool]:
+    """
+    Insert one collected event into the dashboard DB.
+    Returns True when stored, False when the event_id was already stored,
+    None if the write failed.
+    """
+    return write_dashboard_rows([row_data])[0]
 
 
 def ensure_int(x):
@@ -287,10 +496,61 @@ def ensure_int(x):
         return 0
 
 
+# ===== LIVE ROLLUPS =====
+# Committed events are counted per stage and pushed to /admin/_live/rollups
+# subscribers every LIVE_ROLLUP_INTERVAL seconds
+LIVE_ROLLUP_INTERVAL = float(os.environ.get("LIVE_ROLLUP_INTERVAL", "1.0"))
+# open streams each hold a connection, a queue and a task on this event loop
+LIVE_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_MAX_SUBSCRIBERS", "20"))
+live_rollups = RollupBroker(interval=LIVE_ROLLUP_INTERVAL, max_subscribers=LIVE_MAX_SUBSCRIBERS)
+
+
+def rollup_events(rows: List[dict], results: List[Optional[bool]]):
+    """(stage, difficulty, event_type) for every row the batch actually stored, derived rows included."""
+    for row, stored in zip(rows, results):
+        if not stored:
+            continue
+        difficulty, stage_number = _event_stage(row)
+        yield stage_number, difficulty, row["event_type"]
+        if row["event_type"] == "logout" and row.get("duration_seconds"):
+            yield stage_number, difficulty, "stage_complete"
+
+
+# ===== INGEST WRITER =====
+def _write_ingest_batch(rows: List[dict]) -> List[Optional[bool]]:
+    _BATCH_ROWS.observe(len(rows))
+    appended = []
+
+    def append_new_rows(results):
+        # inside the DB transaction: duplicates the unique index caught (retries
+        # past the LRU, after a restart, from another worker) stay out of the
+        # CSV, and a CSV failure rolls the batch back so clients retry it whole
+        new_rows = [row for row, stored in zip(rows, results) if stored is not False]
+        if new_rows:
+            append_csv_rows(new_rows)
+        appended.append(True)
+
+    results = write_dashboard_rows(rows, before_commit=append_new_rows)
+    if not appended:
+        # the DB failed before it could tell duplicates apart: the CSV keeps everything
+        append_csv_rows(rows)
+    for stored in results:
+        _EVENTS_RESULT[stored].inc()
+    live_rollups.record(rollup_events(rows, results))
+    return results
+
+
+# All disk writes for /api/collect happen on this one thread
+# INGEST_MAX_BATCH=1 turns group commit off (one fsync + commit per event, for benchmarks)
+INGEST_MAX_BATCH = int(os.environ.get("INGEST_MAX_BATCH", "256"))
+ingest_writer = IngestWriter(_write_ingest_batch, max_batch=INGEST_MAX_BATCH)
+
+
 # ===== MODELS (UPDATED) =====
 class UserEvent(BaseModel):
     event_type: str = Field(..., examples=["register", "login", "select_character", "select_mode", "logout", "complete_flow"])
     username: str
+    event_id: Optional[str] = Field(None, max_length=64)  # client-generated, makes retries idempotent
     session_id: Optional[str] = None  # ← NEW!
     password: Optional[str] = None
     mode_level_choice: Optional[str] = None
@@ -311,6 +571,32 @@ class UserEvent(BaseModel):
 def startup():
     ensure_csv_exists()
     ensure_dashboard_tables()
+    dist_files.manifest.reload()  # pick up a build done after import
+    ingest_writer.start()
+
+
+@app.on_event("startup")
+async def start_session_sweeper():
+    global _sweeper_task
+    _sweeper_task = asyncio.create_task(_session_sweeper())
+
+
+@app.on_event("startup")
+async def start_live_rollups():
+    live_rollups.start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+    ingest_writer.stop()
+    session_registry.close()
+
+
+@app.on_event("shutdown")
+async def stop_live_rollups():
+    await live_rollups.stop()
 
 
 # ===== PAGES =====
@@ -323,59 +609,59 @@ def home(request: Request):
 
 
 @app.get("/intro")
-def intro_page():
-    return FileResponse(os.path.join(STATIC_DIR, "intro.html"))
+def intro_page(request: Request):
+    return page_response(request, "intro.html")
 
 
 @app.get("/terms")
-def terms_page():
-    return FileResponse(os.path.join(STATIC_DIR, "terms.html"))
+def terms_page(request: Request):
+    return page_response(request, "terms.html")
 
 
 @app.get("/login")
-def login_page():
-    return FileResponse(os.path.join(STATIC_DIR, "login.html"))
+def login_page(request: Request):
+    return page_response(request, "login.html")
 
 
 @app.get("/main")
 def main_page(request: Request):
     if not get_user(request):
         return RedirectResponse("/login")
-    return FileResponse(os.path.join(STATIC_DIR, "main.html"))
+    return page_response(request, "main.html")
 
 
 @app.get("/character")
 def character_page(request: Request):
     if not get_user(request):
         return RedirectResponse("/login")
-    return FileResponse(os.path.join(STATIC_DIR, "character.html"))
+    return page_response(request, "character.html")
 
 
 @app.get("/game")
 def game_page(request: Request):
     if not get_user(request):
         return RedirectResponse("/login")
-    return FileResponse(os.path.join(STATIC_DIR, "game.html"))
+    return page_response(request, "game.html")
 
 
 # ===== AUTH ENDPOINTS =====
 @app.post("/api/login")
-def api_login(username: str = Form(...), password: str = Form(...)):
+async def api_login(username: str = Form(...), password: str = Form(...)):
     resp = RedirectResponse("/game", status_code=303)
     set_session(resp, username)
 
     # Optional: log login
-    collect_event(UserEvent(event_type="login", username=username, password=password))
+    await collect_event(UserEvent(event_type="login", username=username, password=password))
     return resp
 
 
 @app.post("/api/logout")
-def api_logout(request: Request):
+async def api_logout(request: Request):
     username = get_user(request) or "unknown"
     resp = RedirectResponse("/login", status_code=303)
     clear_session(resp)
 
-    collect_event(UserEvent(event_type="logout", username=username))
+    await collect_event(UserEvent(event_type="logout", username=username))
     return resp
 
 
@@ -390,6 +676,41 @@ def api_me(request: Request):
 def health():
     return {"ok": True}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.get("/api/debug/profile")
+def debug_profile(request: Request):
+    """
+    Sample every thread of this process for ?seconds= (default 10) and
+    return collapsed stacks for a flamegraph. ?interval= sets the tick
+    (default 0.01 s), ?idle=1 keeps parked threads. Needs ADMIN_TOKEN.
+    """
+    if not is_admin(request.headers):
+        return PlainTextResponse("ADMIN_TOKEN required\n", status_code=403)
+    try:
+        seconds, interval, idle = profiler.sample_args(request.query_params)
+        result = profiler.sample(seconds, interval, idle)
+    except ValueError as e:
+        return PlainTextResponse(f"{e}\n", status_code=400)
+    except profiler.ProfilerBusy as e:
+        return PlainTextResponse(f"{e}\n", status_code=409)
+    return PlainTextResponse(result.collapsed(), headers=profiler.sample_headers(result))
+
+@app.get("/api/debug/profiles/{profile_id}")
+def debug_request_profile(profile_id: str, request: Request, format: str = Query("text", pattern="^(text|pstats)$")):
+    """An X-Profile request's cProfile result: pstats report, or ?format=pstats for the .prof file."""
+    if not is_admin(request.headers):
+        return PlainTextResponse("ADMIN_TOKEN required\n", status_code=403)
+    data = profiler.profile_bytes(profile_id) if format == "pstats" else profiler.profile_text(profile_id)
+    if data is None:
+        return PlainTextResponse("no such profile (only the last few are kept)\n", status_code=404)
+    if format == "pstats":
+        return Response(data, media_type="application/octet-stream",
+                        headers={"Content-Disposition": f'attachment; filename="{profile_id}.prof"'})
+    return PlainTextResponse(data)
+
 @app.get("/api/debug/db")
 def debug_db():
     return {
@@ -401,27 +722,40 @@ def debug_db():
 
 
 @app.post("/api/collect")
-def collect_event(ev: UserEvent):
+async def collect_event(ev: UserEvent):
     """
     Main telemetry collection endpoint with privacy features.
     - Anonymizes usernames to user_087 format
     - Guarantees session_id is never empty
     - Stores 10 columns in CSV
+    - Ignores re-deliveries of an event_id it has already stored
+    - Never blocks the event loop: disk writes go through ingest_writer
     """
-    ensure_csv_exists()
-
     ts = ev.timestamp or utc_now_iso()
     
-    # ANONYMIZE username → user_087
-    user_id = user_id_from_username(ev.username)
+    # ANONYMIZE username → user_087 (+ its int form for the DB)
+    user_id, user_num = user_ids_from_username(ev.username)
     
     # GUARANTEE session_id exists
-    session_id = get_or_create_session_id(user_id, ev.session_id or "")
+    session_id = await _registry_call(get_or_create_session_id, user_id, ev.session_id or "")
+
+    # DEDUPLICATE client retries without touching disk
+    event_id = (ev.event_id or "").strip()
+    while event_id:
+        if _recent_event_ids.get(event_id):
+            return {"saved": True, "duplicate": True, "user_id": user_id, "session_id": session_id}
+        pending = _inflight_event_ids.get(event_id)
+        if pending is None:
+            break
+        # the first delivery is still being written; if it fails, this one stores the event
+        await asyncio.shield(pending)
 
     row = {
+        "event_id": event_id,
         "timestamp": ts,
         "event_type": ev.event_type,
         "user_id": user_id,              # ← Anonymous (user_087)
+        "user_num": user_num,            # ← same id as int, for the DB
         "session_id": session_id,        # ← Always has value
         "password_hash": hash_password(ev.password) if ev.password else "",
         "mode_level_choice": ev.mode_level_choice or "",
@@ -435,23 +769,44 @@ def collect_event(ev: UserEvent):
         "extra": ev.extra or {},
     }
 
-    # Write to CSV with flush (reliability)
-    with _csv_lock:
-        with open(CSV_PATH, "a", newline="", encoding="utf-8") as f:
-            writer = csv.DictWriter(f, fieldnames=CSV_HEADERS)
-            csv_row = {k: row.get(k, "") for k in CSV_HEADERS}
-            writer.writerow(csv_row)
-            f.flush()           # ← Ensure data written to disk
-            os.fsync(f.fileno())  # ← Force OS to write
-
-    # Update dashboard database
-    update_dashboard_db(row)
+    # CSV (fsync) + dashboard DB (INSERT OR IGNORE on event_id), group-committed
+    inserted = None
+    if event_id:
+        written = _inflight_event_ids[event_id] = asyncio.get_running_loop().create_future()
+    try:
+        inserted = await ingest_writer.submit(row)
+    finally:
+        if event_id:
+            # None (or an exception): not stored, so a retry must not count as a duplicate
+            del _inflight_event_ids[event_id]
+            if inserted is not None:
+                _recent_event_ids.put(event_id, True)
+            written.set_result(inserted)
     
     # Clear session on logout (allows new session on next login)
     if ev.event_type == "logout":
-        clear_session_id(user_id)
+        await _registry_call(clear_session_id, user_id)
     
-    return {"saved": True, "user_id": user_id, "session_id": session_id}
+    return {"saved": True, "duplicate": inserted is False, "user_id": user_id, "session_id": session_id}
+
+
+# under /admin, so whatever restricts the dashboard restricts it too; declared
+# before the /admin mount, and served by this process even when the dashboard
+# is proxied, since the broker is fed by this process's writer
+@app.get("/admin/_live/rollups")
+async def live_rollup_stream():
+    """
+    Server-sent events: per-stage deltas (starts/completes/fails/quits/deaths)
+    of what the ingest writer committed, one `rollup` event per interval.
+    503 once LIVE_MAX_SUBSCRIBERS streams are open.
+    """
+    if live_rollups.full:
+        return PlainTextResponse("too many live subscribers\n", status_code=503, headers={"Retry-After": "30"})
+    return StreamingResponse(
+        live_rollups.stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 # ===== DEBUG ENDPOINT (NEW!) =====
@@ -478,10 +833,58 @@ def debug_csv():
         "cwd": os.getcwd(),
         "last_5_lines": last_lines,
         "headers_should_be": CSV_HEADERS,
-        "active_sessions": _active_session_by_user,
+        "active_sessions": session_registry.summary(),  # list them via /api/debug/sessions
     }
 
 
+@app.get("/api/debug/sessions")
+def debug_sessions(offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=500)):
+    """Paginated view of active sessions, most recently seen first."""
+    return {
+        **session_registry.summary(),
+        "offset": offset,
+        "limit": limit,
+        "sessions": session_registry.page(offset, limit),
+    }
+
+
+@app.get("/api/debug/static-cache")
+def debug_static_cache():
+    """Hit rate and contents of the in-memory static file cache."""
+    return hot_files.stats()
+
+
 # ===== DASHBOARD INTEGRATION =====
 os.environ["DB_PATH"] = DASHBOARD_DB_PATH
-app.mount("/admin", WSGIMiddleware(dash_entry.app.server))
\ No newline at end of file
+
+
+def _load_admin_app():
+    # Dash + Plotly + pandas: only imported once someone opens /admin
+    import dashboard.app as dash_entry
+    return WSGIMiddleware(dash_entry.app.server)
+
+
+# ADMIN_UPSTREAM=http://127.0.0.1:8050: the dashboard runs in its own process
+# (gunicorn dashboard.wsgi:server) and /admin is only proxied from here.
+ADMIN_UPSTREAM = os.environ.get("ADMIN_UPSTREAM", "").strip()
+# ADMIN_PRELOAD=<seconds>: warm the in-process dashboard in a background
+# thread that long after startup instead of on the first admin request
+ADMIN_PRELOAD = os.environ.get("ADMIN_PRELOAD", "").strip()
+
+if ADMIN_UPSTREAM:
+    admin_app = AdminProxy(ADMIN_UPSTREAM, max_connections=int(os.environ.get("ADMIN_PROXY_CONNECTIONS", "8")))
+else:
+    admin_app = LazyMount(_load_admin_app, name="admin dashboard")
+app.mount("/admin", admin_app)
+
+
+@app.on_event("startup")
+def preload_admin():
+    if ADMIN_PRELOAD and isinstance(admin_app, LazyMount):
+        admin_app.preload_in_background(delay=float(ADMIN_PRELOAD))
+
+
+@app.on_event("shutdown")
+async def close_admin_proxy():
+    if isinstance(admin_app, AdminProxy):
+        await admin_app.aclose()
@@ -0,0 +1,64 @@
+import time
+from typing import Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from dashboard.instrumentation import Histogram
+
+# first matching path prefix -> route label; anything else is "page"
+DEFAULT_ROUTES: Tuple[Tuple[str, str], ...] = (
+    ("/api/collect", "collect"),
+    ("/admin/_live/", "live"),
+    ("/api/", "api"),
+    ("/admin", "admin"),
+    ("/static", "static"),
+    ("/metrics", "metrics"),
+)
+STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class RequestMetrics:
+    """
+    ASGI middleware observing every HTTP request's duration into
+    `histogram`, labelled (route, status class).
+
+    Routes are a fixed prefix table rather than the raw path, so the label
+    set is small and known up front: every child is resolved here, and a
+    request costs a prefix scan, a closure around `send` and one
+    observation. The duration runs to the end of the response body
+    (for /admin/_live/rollups, the length of the stream). A request that
+    raises before answering counts as 5xx.
+    """
+
+    def __init__(self, app: ASGIApp, histogram: Histogram,
+                 routes: Sequence[Tuple[str, str]] = DEFAULT_ROUTES):
+        self.app = app
+        self.prefixes = tuple(prefix for prefix, _ in routes)
+        names = [name for _, name in routes] + ["page"]
+        self._children = [[histogram.labels(name, cls) for cls in STATUS_CLASSES] for name in names]
+
+    def _route(self, path: str) -> int:
+        for i, prefix in enumerate(self.prefixes):
+            if path.startswith(prefix):
+                return i
+        return len(self.prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        t0 = time.perf_counter()
+        status = 500
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            cls = min(max(status // 100, 1), 5) - 1
+            self._children[self._route(scope["path"])][cls].observe(time.perf_counter() - t0)
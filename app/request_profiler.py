@@ -0,0 +1,48 @@
+from typing import Sequence
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from dashboard.profiler import finish_request_profile, new_profile_id, start_request_profile, wants_profile
+
+
+class ProfileRequests:
+    """
+    ASGI middleware: `X-Profile: 1` plus the admin token on a request
+    under one of `paths` runs it under cProfile and answers with an
+    X-Profile-Id header; read the result at /api/debug/profiles/<id>.
+
+    The profiler follows the event loop thread, so coroutines that run
+    while the request awaits are in it too, and /api/collect's disk
+    writes (on the ingest writer thread) only show as the await: the
+    all-thread sampler (/api/debug/profile) and ingest_step_seconds in
+    /metrics cover those. Other paths, and requests without the header,
+    pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp, paths: Sequence[str] = ("/api/collect",)):
+        self.app = app
+        self.paths = tuple(paths)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths) \
+                or not any(k == b"x-profile" for k, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        prof = start_request_profile() if wants_profile(Headers(scope=scope)) else None
+        if prof is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = new_profile_id()
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [
+                    (b"x-profile-id", profile_id.encode("latin-1"))])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            finish_request_profile(prof, f"{scope['method']} {scope['path']}", profile_id)
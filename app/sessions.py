@@ -0,0 +1,281 @@
+"""
+Active-session registry: maps an anonymised user_id to the session id that
+events without an explicit session_id are attributed to.
+
+Two backends:
+  - InProcessSessionRegistry: dict + lock, fine for a single uvicorn worker.
+  - SqliteSessionRegistry: a small indexed table in its own DB file, shared by
+    every worker process (`uvicorn --workers N`).
+
+Both expire sessions that have been idle for `idle_ttl` seconds, so players
+who close the tab without logging out don't stay registered forever, and
+both cap the number of tracked sessions at `max_size` (least recently seen
+are evicted first).
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+def generate_session_id(user_id: str) -> str:
+    """Generate unique session ID"""
+    return f"session_{user_id}_{uuid.uuid4().hex[:12]}"
+
+
+class SessionRegistry(ABC):
+    """Common interface; `blocking` backends do disk I/O and must run off the event loop."""
+
+    blocking = False
+
+    def __init__(self, idle_ttl: float = 1800.0, max_size: int = 50000, clock: Callable[[], float] = time.time):
+        self.idle_ttl = float(idle_ttl)
+        self.max_size = max(1, int(max_size))
+        self.clock = clock
+
+    @abstractmethod
+    def get_or_create(self, user_id: str, provided_session_id: str = "") -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self, user_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Drop idle sessions; returns how many were evicted."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def summary(self) -> Dict[str, Any]:
+        """Cheap aggregate view for debug endpoints (never the full map)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def page(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recently seen sessions first."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Release whatever the backend holds open (called on app shutdown)."""
+
+    def _summary(self, count: int, oldest_seen: Optional[float]) -> Dict[str, Any]:
+        return {
+            "count": count,
+            "max_size": self.max_size,
+            "idle_ttl_s": self.idle_ttl,
+            "oldest_idle_s": round(self.clock() - oldest_seen, 1) if oldest_seen is not None else None,
+        }
+
+    def _expired(self, last_seen: float, now: float) -> bool:
+        return self.idle_ttl > 0 and now - last_seen > self.idle_ttl
+
+
+class InProcessSessionRegistry(SessionRegistry):
+    """
+    Dict kept in last-seen order (OrderedDict + move_to_end), so both the
+    idle sweep and max-size eviction only ever look at the oldest entries.
+    """
+
+    def __init__(self, idle_ttl: float = 1800.0, max_size: int = 50000, clock: Callable[[], float] = time.time):
+        super().__init__(idle_ttl, max_size, clock)
+        self._lock = threading.Lock()
+        # user_id -> (session_id, last_seen), oldest first
+        self._sessions: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._next_sweep = 0.0
+
+    def get_or_create(self, user_id: str, provided_session_id: str = "") -> str:
+        sid = (provided_session_id or "").strip()
+        now = self.clock()
+
+        with self._lock:
+            # amortised cleanup on top of the periodic sweeper
+            if now >= self._next_sweep:
+                self._sweep_locked(now)
+
+            current = self._sessions.get(user_id)
+            if not sid:
+                if current and not self._expired(current[1], now):
+                    sid = current[0]
+                else:
+                    sid = generate_session_id(user_id)
+
+            self._sessions[user_id] = (sid, now)
+            self._sessions.move_to_end(user_id)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+            return sid
+
+    def clear(self, user_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def sweep(self) -> int:
+        with self._lock:
+            return self._sweep_locked(self.clock())
+
+    def _sweep_locked(self, now: float) -> int:
+        evicted = 0
+        while self._sessions:
+            _, (_, seen) = next(iter(self._sessions.items()))
+            if not self._expired(seen, now):
+                break
+            self._sessions.popitem(last=False)
+            evicted += 1
+        self._next_sweep = now + max(1.0, self.idle_ttl / 10.0)
+        return evicted
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            oldest = next(iter(self._sessions.values()))[1] if self._sessions else None
+            return self._summary(len(self._sessions), oldest)
+
+    def page(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        now = self.clock()
+        with self._lock:
+            items = list(islice(reversed(self._sessions.items()), offset, offset + limit))
+        return [{"user_id": u, "session_id": sid, "idle_s": round(now - seen, 1)} for u, (sid, seen) in items]
+
+
+class SqliteSessionRegistry(SessionRegistry):
+    """
+    Registry shared across worker processes through SQLite.
+    Lookups hit the primary key; expiry uses the last_seen index. last_seen
+    is only rewritten every `touch_interval` seconds so the common path is a
+    read, not a write.
+    """
+
+    blocking = True
+
+    def __init__(self, db_path: str, idle_ttl: float = 1800.0, max_size: int = 50000,
+                 touch_interval: float = 60.0, clock: Callable[[], float] = time.time):
+        super().__init__(idle_ttl, max_size, clock)
+        self.db_path = db_path
+        self.touch_interval = float(touch_interval)
+        self._local = threading.local()
+        # every thread's connection, so close() can reach them all; a thread
+        # whose connection was closed opens a new one on its next call
+        self._conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        self._epoch = 0
+        self._ensure_table()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.epoch != self._epoch:
+            conn = sqlite3.connect(self.db_path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._conns_lock:
+                self._conns.append(conn)
+                self._local.conn, self._local.epoch = conn, self._epoch
+        return conn
+
+    def close(self) -> None:
+        with self._conns_lock:
+            conns, self._conns = self._conns, []
+            self._epoch += 1
+        for conn in conns:
+            conn.close()
+
+    def _ensure_table(self) -> None:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS active_sessions (
+            user_id TEXT PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            last_seen REAL NOT NULL
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_active_sessions_last_seen ON active_sessions(last_seen)")
+
+    def _upsert(self, conn: sqlite3.Connection, user_id: str, sid: str, now: float) -> None:
+        conn.execute("""
+        INSERT INTO active_sessions(user_id, session_id, last_seen) VALUES (?, ?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET session_id = excluded.session_id, last_seen = excluded.last_seen
+        """, (user_id, sid, now))
+
+    def get_or_create(self, user_id: str, provided_session_id: str = "") -> str:
+        sid = (provided_session_id or "").strip()
+        now = self.clock()
+        conn = self._conn()
+
+        row = conn.execute(
+            "SELECT session_id, last_seen FROM active_sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+
+        if sid:
+            if row is None or row[0] != sid or now - row[1] >= self.touch_interval:
+                self._upsert(conn, user_id, sid, now)
+            return sid
+
+        if row and not self._expired(row[1], now):
+            if now - row[1] >= self.touch_interval:
+                conn.execute("UPDATE active_sessions SET last_seen = ? WHERE user_id = ?", (now, user_id))
+            return row[0]
+
+        # create under a write lock so two workers can't mint different ids
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT session_id, last_seen FROM active_sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row and not self._expired(row[1], now):
+                new_sid = row[0]
+            else:
+                new_sid = generate_session_id(user_id)
+                self._upsert(conn, user_id, new_sid, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return new_sid
+
+    def clear(self, user_id: str) -> None:
+        self._conn().execute("DELETE FROM active_sessions WHERE user_id = ?", (user_id,))
+
+    def sweep(self) -> int:
+        conn = self._conn()
+        evicted = 0
+        if self.idle_ttl > 0:
+            evicted += conn.execute(
+                "DELETE FROM active_sessions WHERE last_seen < ?", (self.clock() - self.idle_ttl,)
+            ).rowcount
+        # over capacity: drop the least recently seen (walks the last_seen index)
+        evicted += conn.execute("""
+        DELETE FROM active_sessions WHERE user_id IN (
+            SELECT user_id FROM active_sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?
+        )
+        """, (self.max_size,)).rowcount
+        return evicted
+
+    def summary(self) -> Dict[str, Any]:
+        count, oldest = self._conn().execute("SELECT COUNT(*), MIN(last_seen) FROM active_sessions").fetchone()
+        return self._summary(count, oldest)
+
+    def page(self, offset: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+        now = self.clock()
+        rows = self._conn().execute(
+            "SELECT user_id, session_id, last_seen FROM active_sessions ORDER BY last_seen DESC LIMIT ? OFFSET ?",
+            (int(limit), int(offset)),
+        ).fetchall()
+        return [{"user_id": u, "session_id": sid, "idle_s": round(now - seen, 1)} for u, sid, seen in rows]
+
+
+def make_session_registry(backend: str, db_path: Optional[str] = None, idle_ttl: float = 1800.0,
+                          max_size: int = 50000) -> SessionRegistry:
+    """Build the registry selected by SESSION_BACKEND ("memory" or "sqlite")."""
+    backend = (backend or "memory").strip().lower()
+    if backend == "sqlite":
+        if not db_path:
+            raise ValueError("sqlite session backend needs a db_path")
+        return SqliteSessionRegistry(db_path, idle_ttl=idle_ttl, max_size=max_size)
+    if backend in ("memory", "inprocess", "in-process"):
+        return InProcessSessionRegistry(idle_ttl=idle_ttl, max_size=max_size)
+    raise ValueError(f"unknown SESSION_BACKEND: {backend!r}")
@@ -0,0 +1,157 @@
+"""
+StaticFiles that understands the tools/build_assets.py output.
+
+- Content-hashed files (manifest `immutable`) get
+  `Cache-Control: public, max-age=31536000, immutable`; everything else
+  gets `no-cache` so browsers revalidate and usually receive a 304.
+- Strong ETags come from the manifest's content hash (per encoding), not
+  from mtime/size, so they survive redeploys of identical content.
+- `.br` / `.gz` siblings are served when the client accepts them, with
+  `Content-Encoding` and `Vary: Accept-Encoding`. Which variants exist is
+  read from the manifest; the chosen one is stat-ed in the threadpool,
+  never on the event loop.
+
+Without a manifest (unbuilt source tree) it behaves like plain StaticFiles
+plus `Cache-Control: no-cache`. With a `hot_cache` small files are served
+from memory (see app/hot_files.py).
+"""
+import json
+import mimetypes
+import os
+import threading
+from typing import Dict, Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+from app.hot_files import HotFileCache, serve_file
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+ENCODING_SUFFIX = {"br": ".br", "gzip": ".gz"}
+# server preference when the client accepts several
+ENCODING_ORDER = ("br", "gzip")
+# scope key get_response hands the chosen variant to file_response under
+VARIANT_SCOPE_KEY = "asset_static_files.variant"
+
+mimetypes.add_type("application/json", ".tmj")
+mimetypes.add_type("text/javascript", ".js")
+
+
+def accepted_encodings(header: str) -> set:
+    """Codings listed in Accept-Encoding, minus the ones refused with q=0."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                pass
+        accepted.add(coding)
+    if "*" in accepted:
+        accepted.update(ENCODING_ORDER)
+    return accepted
+
+
+class AssetManifest:
+    """dist/manifest.json; reload() is a no-op unless the file changed."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self.files: Dict[str, dict] = {}
+        self.assets: Dict[str, str] = {}
+
+    def reload(self) -> None:
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            self._mtime, self.files, self.assets = None, {}, {}
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.assets = data.get("assets", {})
+            self._mtime = mtime
+
+    def url_for(self, rel: str, prefix: str = "/static/dist/") -> Optional[str]:
+        """Built URL for a source path under static/ (None if not built)."""
+        target = self.assets.get(rel)
+        return prefix + target if target else None
+
+
+class AssetStaticFiles(StaticFiles):
+    def __init__(self, *args, manifest: Optional[AssetManifest] = None,
+                 hot_cache: Optional[HotFileCache] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hot_cache = hot_cache
+        if manifest is None and self.directory is not None:
+            manifest = AssetManifest(os.path.join(str(self.directory), "manifest.json"))
+        self.manifest = manifest
+        if self.manifest is not None:
+            self.manifest.reload()
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        # pick the precompressed variant here, where its stat can go to the
+        # threadpool like Starlette's own; file_response runs on the event loop
+        entry = self.manifest.files.get(os.path.normpath(path).replace(os.sep, "/")) if self.manifest else None
+        if entry and entry.get("encodings"):
+            accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            wanted = [enc for enc in ENCODING_ORDER if enc in entry["encodings"] and enc in accepted]
+            if wanted:
+                variant = await anyio.to_thread.run_sync(self._find_variant, path, wanted)
+                scope = {**scope, VARIANT_SCOPE_KEY: variant}
+        return await super().get_response(path, scope)
+
+    def _find_variant(self, path: str, encodings: list) -> Optional[tuple]:
+        """(encoding, full path, stat) of the first of `encodings` present on disk."""
+        for enc in encodings:
+            full_path, stat_result = self.lookup_path(path + ENCODING_SUFFIX[enc])
+            if stat_result is not None:
+                return enc, full_path, stat_result
+        return None  # manifest is ahead of the files; serve identity
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        entry = self._entry(full_path)
+
+        path, encoding = str(full_path), None
+        variant = scope.get(VARIANT_SCOPE_KEY)
+        if entry and variant is not None:
+            encoding, path, stat_result = variant
+
+        media_type = mimetypes.guess_type(str(full_path))[0] or "application/octet-stream"
+        response = FileResponse(path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+
+        if entry:
+            tag = entry["hash"] + (f"-{encoding}" if encoding else "")
+            response.headers["etag"] = f'"{tag}"'
+            response.headers["cache-control"] = IMMUTABLE if entry.get("immutable") else REVALIDATE
+            if entry.get("encodings"):
+                response.headers["vary"] = "Accept-Encoding"
+            if encoding:
+                response.headers["content-encoding"] = encoding
+        else:
+            response.headers["cache-control"] = REVALIDATE
+
+        return serve_file(response, stat_result, request_headers, self.hot_cache)
+
+    def _entry(self, full_path) -> Optional[dict]:
+        if self.manifest is None or not self.manifest.files or self.directory is None:
+            return None
+        rel = os.path.relpath(str(full_path), os.path.realpath(str(self.directory)))
+        return self.manifest.files.get(rel.replace(os.sep, "/"))
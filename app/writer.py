@@ -0,0 +1,103 @@
+import asyncio
+import queue
+import threading
+from typing import Any, Callable, List, Optional
+
+
+_STOP = object()
+
+
+class IngestWriter:
+    """
+    Single dedicated writer thread for the ingest path.
+
+    Request handlers hand a row over with `await submit(row)`; the event loop
+    only does a non-blocking queue put and then waits on a future. The writer
+    thread drains everything queued so far and passes it to `write_batch` in
+    one call, so N concurrent events cost one CSV fsync and one SQLite commit
+    instead of N (group commit).
+
+    `write_batch(rows)` returns one result per row; if it raises, every
+    waiter in that batch gets the exception.
+    """
+
+    def __init__(self, write_batch: Callable[[List[dict]], List[Any]], max_batch: int = 256):
+        self.write_batch = write_batch
+        self.max_batch = max(1, int(max_batch))
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush whatever is queued, then stop the thread."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            self._queue.put(_STOP)
+            thread.join(timeout)
+            self._thread = None
+
+    async def submit(self, row: dict) -> Any:
+        if not self.running:
+            self.start()
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._queue.put((row, fut, loop))
+        return await fut
+
+    # ----- writer thread -----
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stopping = True
+                    break
+                batch.append(nxt)
+
+            self._write(batch)
+
+    def _write(self, batch) -> None:
+        rows = [row for row, _, _ in batch]
+        try:
+            results = self.write_batch(rows)
+            error = None
+        except Exception as e:  # surfaced to every waiter in the batch
+            results = [None] * len(batch)
+            error = e
+
+        for (_, fut, loop), result in zip(batch, results):
+            try:
+                loop.call_soon_threadsafe(_resolve, fut, result, error)
+            except RuntimeError:
+                pass  # the request's loop is already closed
+
+
+def _resolve(fut: asyncio.Future, result: Any, error: Optional[BaseException]) -> None:
+    if fut.done():  # request was cancelled (client went away)
+        return
+    if error is not None:
+        fut.set_exception(error)
+    else:
+        fut.set_result(result)
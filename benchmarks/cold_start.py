@@ -0,0 +1,141 @@
+"""
+Cold-start report: what `import app.main` costs and how long a freshly
+started server takes to take its first /api/collect and first /admin hit.
+
+    python -m benchmarks.cold_start --runs 5 --out results/cold_start.json
+
+- import profile: `python -X importtime -c "import app.main"` in a fresh
+  interpreter (median of --runs), with the top modules by cumulative and
+  self time and whether the heavy admin stack (dash/plotly/pandas) was
+  pulled in at import.
+- server: spawn uvicorn (optionally pinned with --cpu), then time process
+  start -> /api/health, the first POST /api/collect and the first GET
+  /admin/ (which pays the lazy Dash import).
+
+Compare the JSON across commits to catch cold-start regressions.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Dict, List
+
+from benchmarks.common import PROJECT_ROOT, spawn_server, write_json
+
+HEAVY_MODULES = ("dash", "plotly", "pandas", "numpy")
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def parse_importtime(stderr: str) -> List[Dict]:
+    """-X importtime lines -> [{module, self_us, cumulative_us, depth}]"""
+    rows = []
+    for line in stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            rows.append({
+                "module": m.group(4),
+                "self_us": int(m.group(1)),
+                "cumulative_us": int(m.group(2)),
+                "depth": (len(m.group(3)) - 1) // 2,
+            })
+    return rows
+
+
+def import_profile(target: str = "app.main") -> Dict:
+    with tempfile.TemporaryDirectory(prefix="bbp-cold-") as data_dir:
+        env = dict(os.environ, DATA_DIR=data_dir)
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            cwd=str(PROJECT_ROOT), env=env, capture_output=True, text=True,
+        )
+        wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    rows = parse_importtime(proc.stderr)
+    root = next((r for r in rows if r["module"] == target), None)
+    loaded = {r["module"].split(".")[0] for r in rows}
+    return {
+        "wall_s": wall,
+        "import_s": root["cumulative_us"] / 1e6 if root else None,
+        "rows": rows,
+        "heavy_loaded": sorted(m for m in HEAVY_MODULES if m in loaded),
+    }
+
+
+def top(rows: List[Dict], key: str, n: int) -> List[Dict]:
+    best = sorted(rows, key=lambda r: r[key], reverse=True)[:n]
+    return [{"module": r["module"], "ms": round(r[key] / 1000, 1)} for r in best]
+
+
+def server_timings(cpu=None) -> Dict:
+    import httpx
+
+    t0 = time.perf_counter()
+    with spawn_server(cpu=cpu) as (url, _data_dir):
+        ready = time.perf_counter() - t0
+        with httpx.Client(base_url=url, timeout=60.0) as client:
+            t1 = time.perf_counter()
+            r = client.post("/api/collect", json={
+                "event_id": uuid.uuid4().hex, "username": "cold_start", "event_type": "heartbeat",
+            })
+            first_collect = time.perf_counter() - t1
+            r.raise_for_status()
+
+            t2 = time.perf_counter()
+            client.get("/admin/").raise_for_status()
+            first_admin = time.perf_counter() - t2
+
+            t3 = time.perf_counter()
+            client.get("/admin/").raise_for_status()
+            warm_admin = time.perf_counter() - t3
+
+    return {
+        "ready_s": round(ready, 3),
+        "first_collect_ms": round(first_collect * 1000, 1),
+        "first_admin_ms": round(first_admin * 1000, 1),
+        "warm_admin_ms": round(warm_admin * 1000, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=3, help="fresh interpreters for the import profile")
+    ap.add_argument("--top", type=int, default=15)
+    ap.add_argument("--cpu", type=int, default=None, help="pin the spawned server to this core")
+    ap.add_argument("--no-server", action="store_true", help="only the import profile")
+    ap.add_argument("--out", help="write the result as JSON")
+    args = ap.parse_args()
+
+    profiles = [import_profile() for _ in range(max(1, args.runs))]
+    median = sorted(profiles, key=lambda p: p["import_s"] or 0)[len(profiles) // 2]
+    result = {
+        "import_app_main_s": round(statistics.median(p["import_s"] or 0 for p in profiles), 3),
+        "interpreter_wall_s": round(statistics.median(p["wall_s"] for p in profiles), 3),
+        "heavy_modules_at_import": median["heavy_loaded"],
+        "top_cumulative": top(median["rows"], "cumulative_us", args.top),
+        "top_self": top(median["rows"], "self_us", args.top),
+    }
+    if not args.no_server:
+        result["server"] = server_timings(args.cpu)
+
+    print(f"import app.main: {result['import_app_main_s']}s "
+          f"(interpreter total {result['interpreter_wall_s']}s), "
+          f"heavy at import: {', '.join(result['heavy_modules_at_import']) or 'none'}")
+    print("top cumulative:")
+    for r in result["top_cumulative"]:
+        print(f"  {r['ms']:>9.1f} ms  {r['module']}")
+    if "server" in result:
+        for k, v in result["server"].items():
+            print(f"{k:>18}: {v}")
+    if args.out:
+        write_json(args.out, result)
+
+
+if __name__ == "__main__":
+    main()
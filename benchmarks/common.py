@@ -0,0 +1,94 @@
+"""
+Shared helpers for the benchmark scripts: spawning a throwaway server,
+latency percentiles and JSON result files.
+"""
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_http(url: str, timeout: float = 60.0) -> float:
+    """Poll url until it answers; returns seconds waited."""
+    import httpx
+
+    t0 = time.perf_counter()
+    while True:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return time.perf_counter() - t0
+        except httpx.HTTPError:
+            pass
+        if time.perf_counter() - t0 > timeout:
+            raise TimeoutError(f"{url} did not come up within {timeout}s")
+        time.sleep(0.05)
+
+
+@contextmanager
+def spawn_server(cpu: Optional[int] = None, workers: int = 1, env: Optional[Dict[str, str]] = None,
+                 fsync_delay_ms: float = 0.0):
+    """
+    Run `uvicorn app.main:app` against a temporary DATA_DIR.
+    `cpu` pins the server to one core (taskset) to mimic the shared-CPU VM.
+    `fsync_delay_ms` adds that much to every os.fsync (see benchmarks/slow_fsync.py).
+    Yields (base_url, data_dir).
+    """
+    port = free_port()
+    with tempfile.TemporaryDirectory(prefix="bbp-bench-") as data_dir:
+        launcher = ["benchmarks.slow_fsync", str(fsync_delay_ms)] if fsync_delay_ms > 0 else ["uvicorn"]
+        cmd = [sys.executable, "-m", *launcher, "app.main:app",
+               "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+        if cpu is not None and sys.platform.startswith("linux"):
+            cmd = ["taskset", "-c", str(cpu)] + cmd
+        proc_env = dict(os.environ, DATA_DIR=data_dir, **(env or {}))
+        proc = subprocess.Popen(cmd, cwd=str(PROJECT_ROOT), env=proc_env)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_for_http(base_url + "/api/health")
+            yield base_url, data_dir
+        finally:
+            proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list (q in 0..100)."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def latency_summary(latencies_s: List[float]) -> Dict[str, float]:
+    lat = sorted(latencies_s)
+    return {
+        "p50_ms": round(percentile(lat, 50) * 1000, 2),
+        "p95_ms": round(percentile(lat, 95) * 1000, 2),
+        "p99_ms": round(percentile(lat, 99) * 1000, 2),
+        "max_ms": round(lat[-1] * 1000, 2) if lat else 0.0,
+    }
+
+
+def write_json(path: str, payload: dict) -> None:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
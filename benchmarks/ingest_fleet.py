@@ -0,0 +1,326 @@
+"""
+Fleet load test for POST /api/collect: many simulated players, each
+replaying a realistic session against the server at game pace.
+
+    python -m benchmarks.ingest_fleet --players 200 --duration 60 --speed 10 --cpu 0 \
+        --out results/fleet.json
+    python -m benchmarks.ingest_fleet ... --compare results/fleet.json --tolerance 10
+
+Each player behaves like static/src/telemetry.js: events are queued as
+the (time-compressed) game produces them and flushed every 250 ms, one
+POST at a time, re-sending the tail after a 5xx or a network error.
+Sessions follow the scenes: login, character/mode choice, then per
+stage stage_start -> enemy_spawn / player_hit / enemy_kill / heal_pickup
+-> death + fail + retry or stage_complete, and a logout. How far and how
+cleanly a player gets depends on a per-player skill.
+
+Reported: events/s, requests/s, p50/p95/p99 latency, error rate,
+retries, and (with a spawned server) growth of game.db (+WAL) and
+user_events.csv per stored event. --compare checks throughput and p95
+against an earlier result and exits 1 on a regression.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from benchmarks.common import latency_summary, spawn_server, write_json
+
+FLUSH_MS = 250          # telemetry.js flush timer
+RETRY_DELAY_MS = 2000   # telemetry.js RETRY_DELAY_MS
+DIFFICULTIES = ("easy", "medium", "hard")
+CHARACTERS = ("knight", "mage", "rogue")
+ENEMIES = ("GoblinEnemy", "ArcherEnemy")
+CAUSES = ("GoblinEnemy", "ArcherEnemy", "fall", "spikes")
+STAGES = 2              # LevelOne / LevelTwo
+
+
+# ---------- session scripts ----------
+def session_script(rng: np.random.Generator, username: str) -> Iterator[Tuple[float, dict]]:
+    """
+    One play session as (game-time delay in ms before the event, event).
+    Session ids are assigned by the server, like the real client's first
+    event; events carry the same fields the scenes send.
+    """
+    skill = float(np.clip(rng.lognormal(0.0, 0.35), 0.4, 2.5))
+    difficulty = str(rng.choice(DIFFICULTIES, p=(0.3, 0.5, 0.2)))
+    character = str(rng.choice(CHARACTERS))
+    fail_p = {"easy": 0.15, "medium": 0.3, "hard": 0.5}[difficulty] / skill
+
+    def event(event_type: str, **fields) -> dict:
+        return {"event_id": uuid.uuid4().hex, "username": username, "event_type": event_type, **fields}
+
+    yield 0.0, event("login")
+    yield rng.exponential(3000), event("select_character", character_choice=character)
+    yield rng.exponential(2000), event("select_mode", mode_level_choice=difficulty)
+
+    played_ms = 0.0
+    attempt_id = 0
+    for stage in range(1, STAGES + 1):
+        while True:
+            attempt_id += 1
+            base = {"stage_number": stage, "mode_level_choice": difficulty}
+            run = {"attempt_id": attempt_id, "difficulty": difficulty}
+            yield rng.exponential(1500), event("stage_start", **base, extra={**run, "reason": "start"})
+            elapsed, hp, hits, kills, heals = 0.0, 100.0, 0, 0, 0
+            failed = rng.random() < fail_p
+            n_beats = int(rng.integers(8, 30))
+            death_beat = int(rng.integers(2, n_beats)) if failed else -1
+            for beat in range(n_beats):
+                wait = float(rng.exponential(2500 / skill))
+                elapsed += wait
+                kind = rng.choice(("spawn", "hit", "kill", "heal"), p=(0.25, 0.35, 0.3, 0.1))
+                enemy = str(rng.choice(ENEMIES))
+                x, y = float(rng.uniform(0, 3200)), float(rng.uniform(200, 600))
+                if kind == "spawn":
+                    yield wait, event("enemy_spawn", **base, x_position=x, y_position=y, extra={**run, "enemy": enemy})
+                elif kind == "hit":
+                    damage = float(rng.choice((5, 8)))
+                    hits += 1
+                    yield wait, event("player_hit", **base, extra={**run, "damage": damage, "hp_before": hp,
+                                                                    "hp_after": max(0.0, hp - damage), "enemy": enemy})
+                    hp = max(5.0, hp - damage)
+                elif kind == "kill":
+                    kills += 1
+                    yield wait, event("enemy_kill", **base, x_position=x, y_position=y, extra={**run, "enemy": enemy})
+                else:
+                    heals += 1
+                    yield wait, event("heal_pickup", **base, x_position=x, y_position=y, extra={**run, "amount": 20})
+                    hp = min(100.0, hp + 20)
+                if beat == death_beat:
+                    cause = str(rng.choice(CAUSES))
+                    yield 0.0, event("death", **base, x_position=x, y_position=y, extra={**run, "cause": cause})
+                    summary = {**run, "duration_ms": int(elapsed), "damage_taken": int(100 - hp)}
+                    yield 50.0, event("fail", **base, duration_seconds=int(elapsed / 1000),
+                                      extra={**summary, "result": "fail", "cause": cause, "enemies_killed": kills,
+                                             "heals_picked": heals})
+                    break
+            played_ms += elapsed
+            if not failed:
+                yield 200.0, event("stage_complete", **base, duration_seconds=int(elapsed / 1000),
+                                   extra={**run, "result": "win", "duration_ms": int(elapsed),
+                                          "enemies_killed": kills, "heals_picked": heals})
+                break
+            if rng.random() < 0.15 / skill:          # rage quit
+                yield rng.exponential(2000), event("quit", **base, extra=run)
+                yield 500.0, event("logout", duration_seconds=int(played_ms / 1000))
+                return
+            yield rng.exponential(3000), event("retry", **base, extra={**run, "from": "death"})
+
+    yield rng.exponential(5000), event("logout", duration_seconds=int(played_ms / 1000))
+
+
+# ---------- the fleet ----------
+class FleetStats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.sent = 0          # POSTs, retries included
+        self.stored = 0        # 200 responses that weren't duplicates
+        self.duplicates = 0
+        self.errors = 0        # non-200 responses and transport errors
+        self.retries = 0
+        self.event_types: Counter = Counter()
+        self.sessions = 0
+
+
+async def _player(client: httpx.AsyncClient, idx: int, seed: int, speed: float, deadline: float,
+                  start_delay: float, stats: FleetStats) -> None:
+    rng = np.random.default_rng([seed, idx])
+    username = f"fleet_{idx:05d}"
+    session_id: Optional[str] = None
+    queue: List[dict] = []
+
+    async def flush() -> bool:
+        nonlocal session_id
+        while queue:
+            body = dict(queue[0])
+            if session_id:
+                body.setdefault("session_id", session_id)
+            t0 = time.perf_counter()
+            try:
+                r = await client.post("/api/collect", json=body)
+                ok = r.status_code == 200
+            except httpx.HTTPError:
+                r, ok = None, False
+            stats.latencies.append(time.perf_counter() - t0)
+            stats.sent += 1
+            if not ok:
+                stats.errors += 1
+                if r is not None and r.status_code < 500:
+                    queue.pop(0)              # the client drops 4xx
+                    continue
+                stats.retries += 1
+                return False                  # keep the tail for the retry
+            reply = r.json()
+            session_id = reply.get("session_id") or session_id
+            if reply.get("duplicate"):
+                stats.duplicates += 1
+            else:
+                stats.stored += 1
+                stats.event_types[body["event_type"]] += 1
+            queue.pop(0)
+            if body["event_type"] == "logout":
+                session_id = None
+        return True
+
+    await asyncio.sleep(start_delay)
+    loop = asyncio.get_running_loop()
+    while loop.time() < deadline:
+        stats.sessions += 1
+        pending = 0.0          # wall-clock seconds of game time not slept yet
+        for delay_ms, ev in session_script(rng, username):
+            pending += delay_ms / speed / 1000
+            queue.append(ev)
+            if pending >= FLUSH_MS / 1000:
+                await asyncio.sleep(pending)
+                pending = 0.0
+                if not await flush():
+                    await asyncio.sleep(RETRY_DELAY_MS / 1000)
+            if loop.time() >= deadline:
+                break
+        while queue and not await flush():
+            await asyncio.sleep(RETRY_DELAY_MS / 1000)
+
+
+async def run_fleet(base_url: str, players: int, duration_s: float, speed: float,
+                    ramp_s: float, seed: int, connections: int) -> dict:
+    stats = FleetStats()
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        loop = asyncio.get_running_loop()
+        t_start = loop.time()
+        deadline = t_start + ramp_s + duration_s
+        await asyncio.gather(*(
+            _player(client, i, seed, speed, deadline, ramp_s * i / max(1, players), stats)
+            for i in range(players)
+        ))
+        elapsed = loop.time() - t_start
+
+    return {
+        "players": players,
+        "speed": speed,
+        "elapsed_s": round(elapsed, 3),
+        "sessions": stats.sessions,
+        "requests": stats.sent,
+        "events_stored": stats.stored,
+        "rps": round(stats.sent / elapsed, 1) if elapsed else 0.0,
+        "events_per_s": round(stats.stored / elapsed, 1) if elapsed else 0.0,
+        "errors": stats.errors,
+        "error_rate": round(stats.errors / stats.sent, 5) if stats.sent else 0.0,
+        "retries": stats.retries,
+        "duplicates": stats.duplicates,
+        "event_types": dict(sorted(stats.event_types.items())),
+        **latency_summary(stats.latencies),
+    }
+
+
+# ---------- DB growth ----------
+def storage_snapshot(data_dir: str) -> Dict[str, int]:
+    """Bytes of game.db (+WAL/SHM) and user_events.csv, and the stored row count."""
+    db = os.path.join(data_dir, "game.db")
+    out = {
+        "db_bytes": sum(os.path.getsize(p) for p in (db, db + "-wal", db + "-shm") if os.path.exists(p)),
+        "csv_bytes": os.path.getsize(os.path.join(data_dir, "user_events.csv"))
+        if os.path.exists(os.path.join(data_dir, "user_events.csv")) else 0,
+        "telemetry_rows": 0,
+    }
+    if os.path.exists(db):
+        conn = sqlite3.connect(f"file:{db}?mode=ro", uri=True)
+        try:
+            out["telemetry_rows"] = conn.execute("SELECT COUNT(*) FROM telemetry_events").fetchone()[0]
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+    return out
+
+
+def growth(before: Dict[str, int], after: Dict[str, int]) -> Dict[str, float]:
+    rows = after["telemetry_rows"] - before["telemetry_rows"]
+    db = after["db_bytes"] - before["db_bytes"]
+    csv = after["csv_bytes"] - before["csv_bytes"]
+    return {
+        "rows_added": rows,
+        "db_bytes_added": db,
+        "csv_bytes_added": csv,
+        "db_bytes_per_row": round(db / rows, 1) if rows else 0.0,
+        "csv_bytes_per_row": round(csv / rows, 1) if rows else 0.0,
+    }
+
+
+# ---------- regression check ----------
+def compare(result: dict, baseline: dict, tolerance_pct: float) -> List[str]:
+    """Regressions of `result` against `baseline` beyond tolerance_pct (empty list = pass)."""
+    problems = []
+    tol = tolerance_pct / 100.0
+    for key in ("events_per_s", "rps"):
+        old, new = baseline.get(key), result.get(key)
+        if old and new is not None and new < old * (1 - tol):
+            problems.append(f"{key} {new} < baseline {old} (-{(1 - new / old) * 100:.1f}%)")
+    for key in ("p95_ms", "p99_ms"):
+        old, new = baseline.get(key), result.get(key)
+        if old and new is not None and new > old * (1 + tol):
+            problems.append(f"{key} {new} > baseline {old} (+{(new / old - 1) * 100:.1f}%)")
+    if result.get("error_rate", 0) > baseline.get("error_rate", 0) + tol / 10:
+        problems.append(f"error_rate {result['error_rate']} > baseline {baseline.get('error_rate', 0)}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="target an already running server instead of spawning one (no DB growth figures)")
+    ap.add_argument("--players", type=int, default=100)
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds of steady load after the ramp")
+    ap.add_argument("--ramp", type=float, default=5.0, help="seconds over which players join")
+    ap.add_argument("--speed", type=float, default=10.0, help="game-time compression (10 = ten times real pace)")
+    ap.add_argument("--connections", type=int, default=100, help="client connection pool size")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--cpu", type=int, default=None, help="pin the spawned server to this core")
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--out", help="write the result as JSON")
+    ap.add_argument("--compare", help="earlier result JSON to check against")
+    ap.add_argument("--tolerance", type=float, default=10.0, help="allowed regression for --compare, in percent")
+    args = ap.parse_args()
+
+    def _run(url):
+        return asyncio.run(run_fleet(url, args.players, args.duration, args.speed, args.ramp,
+                                     args.seed, args.connections))
+
+    if args.url:
+        result = _run(args.url)
+    else:
+        env = {"SESSION_BACKEND": "sqlite"} if args.workers > 1 else None
+        with spawn_server(cpu=args.cpu, workers=args.workers, env=env) as (url, data_dir):
+            before = storage_snapshot(data_dir)
+            result = _run(url)
+            time.sleep(0.5)  # let the ingest writer commit its last batch
+            result["storage"] = growth(before, storage_snapshot(data_dir))
+    result["config"] = {k: getattr(args, k) for k in ("players", "duration", "ramp", "speed", "connections",
+                                                       "seed", "cpu", "workers")}
+
+    for k, v in result.items():
+        print(f"{k:>14}: {v}")
+    if args.out:
+        write_json(args.out, result)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            problems = compare(result, json.load(f), args.tolerance)
+        for p in problems:
+            print(f"REGRESSION: {p}")
+        if problems:
+            sys.exit(1)
+        print(f"no regression beyond {args.tolerance}% vs {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
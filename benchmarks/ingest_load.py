@@ -0,0 +1,113 @@
+"""
+Closed-loop load test for POST /api/collect.
+
+    python -m benchmarks.ingest_load --requests 5000 --concurrency 64 --cpu 0
+
+Without --url it starts its own uvicorn (one worker, optionally pinned to a
+single core with --cpu to approximate the 1 shared vCPU Fly machine) against
+a temporary DATA_DIR, so the real data/ files are never touched.
+
+--fsync-delay-ms slows every CSV fsync down like a network volume would;
+--compare-batching then runs the same load twice, with group commit off
+(INGEST_MAX_BATCH=1, one fsync per event as before the writer thread) and on.
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from benchmarks.common import latency_summary, spawn_server, write_json
+
+
+def make_event(i: int) -> dict:
+    return {
+        "event_id": uuid.uuid4().hex,
+        "username": f"load_{i % 200}",
+        "event_type": "player_hit",
+        "stage_number": 1 + i % 2,
+        "x_position": float(i % 1000),
+        "y_position": 300.0,
+        "extra": {"damage": 5, "enemy": "GoblinEnemy", "attempt_id": 1},
+    }
+
+
+async def run_load(base_url: str, n_requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    counter = iter(range(n_requests))
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/api/collect", json=make_event(i))
+                    if r.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        t_start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t_start
+
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(n_requests / elapsed, 1) if elapsed else 0.0,
+        "errors": errors,
+        **latency_summary(latencies),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--url", help="target an already running server instead of spawning one")
+    ap.add_argument("--requests", type=int, default=2000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--cpu", type=int, default=None, help="pin the spawned server to this core")
+    ap.add_argument("--warmup", type=int, default=200)
+    ap.add_argument("--fsync-delay-ms", type=float, default=0.0, help="added latency per fsync in the spawned server")
+    ap.add_argument("--max-batch", type=int, default=None, help="INGEST_MAX_BATCH for the spawned server")
+    ap.add_argument("--compare-batching", action="store_true",
+                    help="run with group commit off (max batch 1) and on, and report both")
+    ap.add_argument("--out", help="write the result as JSON")
+    args = ap.parse_args()
+
+    def _run(url):
+        if args.warmup:
+            asyncio.run(run_load(url, args.warmup, min(args.concurrency, 8)))
+        return asyncio.run(run_load(url, args.requests, args.concurrency))
+
+    def _spawn_and_run(max_batch):
+        env = {"INGEST_MAX_BATCH": str(max_batch)} if max_batch else None
+        with spawn_server(cpu=args.cpu, env=env, fsync_delay_ms=args.fsync_delay_ms) as (url, _data_dir):
+            return dict(_run(url), fsync_delay_ms=args.fsync_delay_ms, max_batch=max_batch or "default")
+
+    if args.url:
+        result = _run(args.url)
+    elif args.compare_batching:
+        result = {"per_event": _spawn_and_run(1), "group_commit": _spawn_and_run(args.max_batch)}
+        result["rps_speedup"] = round(result["group_commit"]["rps"] / max(result["per_event"]["rps"], 0.1), 2)
+    else:
+        result = _spawn_and_run(args.max_batch)
+
+    for k, v in result.items():
+        if isinstance(v, dict):
+            print(f"{k}:")
+            for kk, vv in v.items():
+                print(f"  {kk:>14}: {vv}")
+        else:
+            print(f"{k:>12}: {v}")
+    if args.out:
+        write_json(args.out, result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Micro-benchmarks for the dashboard's metric functions and the balancing
+simulator, with stored baselines.
+
+    python -m benchmarks.micro                          # 1k / 100k events, 200 / 800 runs
+    python -m benchmarks.micro --full                   # + 1M events, 100k runs
+    python -m benchmarks.micro --only funnel_by_stage,run_simulation
+    python -m benchmarks.micro --save-baseline          # write benchmarks/baselines/micro.json
+    python -m benchmarks.micro --check --threshold 30   # exit 1 on a regression
+
+Each case is timed with timeit after one warm-up call (best and median
+of --repeat runs, the repeat count shrinking for slow cases), then run once more under
+tracemalloc for its peak allocation. Inputs are built once per scale
+and not timed: normalize_events gets raw telemetry_events rows from
+dashboard/synthetic.py, the metric functions get its output, and
+rollup_events gets the raw rows in ROLLUP_CHUNK-row chunks, as the
+dashboard reads them.
+
+The best time is also stored relative to a fixed reference workload
+timed in the same process (`ref_units`), and --check compares that, so a
+baseline recorded on one machine still means something on a CI runner.
+Peak memory is compared as is.
+"""
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import PROJECT_ROOT, write_json
+
+sys.path.insert(0, str(PROJECT_ROOT))
+
+from dashboard.balancing_toolkit import DEFAULT_PARAMS, compare_simulations, run_simulation  # noqa: E402
+from dashboard.metrics import (  # noqa: E402
+    combat_by_stage, fail_reasons, funnel_by_stage, hits_by_enemy, normalize_events, rollup_events, time_by_stage,
+)
+from dashboard.synthetic import events_frame  # noqa: E402
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "micro.json"
+
+EVENT_SCALES = {"1k": 1_000, "100k": 100_000, "1M": 1_000_000}
+RUN_SCALES = {"200": 200, "800": 800, "100k": 100_000}
+QUICK_EVENTS, QUICK_RUNS = ("1k", "100k"), ("200", "800")
+MIN_SAMPLE_S = 0.2
+ROLLUP_CHUNK = 32_768
+
+EVENTS_PER_SESSION = 150       # roughly, for the generator's defaults
+
+
+# ---------- inputs ----------
+def synthetic_events(n: int, seed: int = 0) -> pd.DataFrame:
+    """The first n telemetry_events rows (in time order) of a generated data set."""
+    df = events_frame(n // EVENTS_PER_SESSION + 2, seed=seed)
+    while len(df) < n:
+        df = events_frame(2 * len(df["session_id"].unique()), seed=seed)
+    return df.iloc[:n].copy()
+
+
+SIM_FUNNEL = pd.DataFrame({"stage_id": [1, 2], "completion_rate": [0.7, 0.5], "fail_rate": [0.3, 0.5],
+                           "dropoff_rate": [0.1, 0.2]})
+SIM_TIMES = pd.DataFrame({"stage_id": [1, 2], "median_duration_ms": [60_000.0, 90_000.0]})
+
+
+# ---------- cases ----------
+@dataclass
+class Case:
+    name: str
+    scale: str
+    fn: Callable[[], object]
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.scale}"
+
+
+def build_cases(event_scales, run_scales, only: Optional[set] = None) -> List[Case]:
+    cases: List[Case] = []
+
+    def want(name):
+        return not only or name in only
+
+    for scale in event_scales:
+        raw = synthetic_events(EVENT_SCALES[scale])
+        if want("normalize_events"):
+            cases.append(Case("normalize_events", scale, lambda raw=raw: normalize_events(raw)))
+        if want("rollup_events"):
+            cases.append(Case("rollup_events", scale, lambda raw=raw: rollup_events(
+                raw.iloc[i:i + ROLLUP_CHUNK] for i in range(0, len(raw), ROLLUP_CHUNK))))
+        metric_names = ("funnel_by_stage", "combat_by_stage", "time_by_stage", "fail_reasons", "hits_by_enemy")
+        if not any(want(n) for n in metric_names):
+            continue
+        df = normalize_events(raw)
+        metric_calls = {
+            "funnel_by_stage": lambda df=df: funnel_by_stage(df),
+            "combat_by_stage": lambda df=df: combat_by_stage(df),
+            "time_by_stage": lambda df=df: time_by_stage(df, None),
+            "fail_reasons": lambda df=df: fail_reasons(df),
+            "hits_by_enemy": lambda df=df: hits_by_enemy(df),
+        }
+        cases.extend(Case(name, scale, fn) for name, fn in metric_calls.items() if want(name))
+
+    for scale in run_scales:
+        n = RUN_SCALES[scale]
+        if want("run_simulation"):
+            cases.append(Case("run_simulation", scale,
+                              lambda n=n: run_simulation(SIM_FUNNEL, SIM_TIMES, DEFAULT_PARAMS, n_runs=n)))
+        if want("compare_simulations"):
+            proposed = dict(DEFAULT_PARAMS, enemyDamageMult=1.2)
+            cases.append(Case("compare_simulations", scale,
+                              lambda n=n: compare_simulations(SIM_FUNNEL, SIM_TIMES, proposed, n_runs=n, seed=123)))
+    return cases
+
+
+# ---------- measuring ----------
+def reference_seconds() -> float:
+    """Best-of-5 time of a fixed mixed Python/NumPy workload (the unit for ref_units)."""
+    def work():
+        total = 0
+        for i in range(200_000):
+            total += i * i % 7
+        a = np.arange(1_000_000, dtype=np.float64)
+        return total + float(np.sort(a[::-1])[0])
+    return min(timeit.repeat(work, number=1, repeat=5))
+
+
+def measure(case: Case, repeat: int, budget_s: float) -> Dict[str, float]:
+    gc.collect()
+    # the first call pays for lazy imports and caches; it only sizes the repeats
+    first = timeit.timeit(case.fn, number=1)
+    # fast cases loop for >= MIN_SAMPLE_S per sample; slow ones get fewer repeats, down to three
+    number = max(1, int(MIN_SAMPLE_S / max(first, 1e-9)))
+    n = max(min(3, repeat), min(repeat, int(budget_s / max(first * number, 1e-9))))
+    runs = [t / number for t in timeit.repeat(case.fn, number=number, repeat=n)]
+
+    gc.collect()
+    tracemalloc.start()
+    case.fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "best_s": round(min(runs), 6),
+        "median_s": round(statistics.median(runs), 6),
+        "repeats": len(runs),
+        "peak_mb": round(peak / 2**20, 3),
+    }
+
+
+def run(cases: List[Case], repeat: int, budget_s: float) -> dict:
+    ref = reference_seconds()
+    results = {}
+    for case in cases:
+        results[case.key] = measure(case, repeat, budget_s)
+    # timed again at the end so a noisy start doesn't skew every ratio
+    ref = min(ref, reference_seconds())
+    for key, r in results.items():
+        r["ref_units"] = round(r["best_s"] / ref, 4)
+        print(f"{key:<32} median {r['median_s'] * 1000:10.2f} ms  best {r['best_s'] * 1000:10.2f} ms  "
+              f"x{r['repeats']:<3} peak {r['peak_mb']:9.2f} MB  ({r['ref_units']} ref)")
+    return {
+        "reference_s": round(ref, 6),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "results": results,
+    }
+
+
+def check(current: dict, baseline: dict, threshold_pct: float, min_mb: float = 1.0) -> List[str]:
+    """
+    Regressions beyond threshold_pct: time in reference units and peak
+    memory (ignored below min_mb, where allocator noise dominates).
+    Cases missing from the baseline aren't checked.
+    """
+    problems = []
+    limit = 1 + threshold_pct / 100.0
+    for key, now in current["results"].items():
+        base = baseline.get("results", {}).get(key)
+        if not base:
+            continue
+        if base["ref_units"] > 0 and now["ref_units"] > base["ref_units"] * limit:
+            problems.append(f"{key}: time {now['ref_units']} ref units vs baseline {base['ref_units']} "
+                            f"(+{(now['ref_units'] / base['ref_units'] - 1) * 100:.0f}%)")
+        if max(base["peak_mb"], now["peak_mb"]) >= min_mb and now["peak_mb"] > base["peak_mb"] * limit:
+            problems.append(f"{key}: peak {now['peak_mb']} MB vs baseline {base['peak_mb']} MB "
+                            f"(+{(now['peak_mb'] / max(base['peak_mb'], 1e-9) - 1) * 100:.0f}%)")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--full", action="store_true", help="include 1M events and 100k simulated runs")
+    ap.add_argument("--only", help="comma-separated function names")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--budget", type=float, default=3.0, help="seconds of repeats per case")
+    ap.add_argument("--out", help="write the result as JSON")
+    ap.add_argument("--baseline", default=str(BASELINE_PATH))
+    ap.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    ap.add_argument("--check", action="store_true", help="compare with the baseline, exit 1 on a regression")
+    ap.add_argument("--threshold", type=float, default=25.0, help="allowed regression for --check, in percent")
+    args = ap.parse_args()
+
+    event_scales = tuple(EVENT_SCALES) if args.full else QUICK_EVENTS
+    run_scales = tuple(RUN_SCALES) if args.full else QUICK_RUNS
+    only = set(args.only.split(",")) if args.only else None
+    result = run(build_cases(event_scales, run_scales, only), args.repeat, args.budget)
+
+    if args.out:
+        write_json(args.out, result)
+    if args.save_baseline:
+        baseline = {}
+        if Path(args.baseline).exists():
+            baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        # merge, so a partial (--only / quick) run doesn't drop the other cases
+        merged = dict(result, results={**baseline.get("results", {}), **result["results"]})
+        write_json(args.baseline, merged)
+        print(f"baseline written to {args.baseline}")
+    if args.check:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        problems = check(result, baseline, args.threshold)
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if problems:
+            sys.exit(1)
+        print(f"no regression beyond {args.threshold}% vs {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
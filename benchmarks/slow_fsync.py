@@ -0,0 +1,33 @@
+"""
+Run uvicorn with every os.fsync delayed, to mimic a network volume where a
+sync costs milliseconds rather than the ~1 ms of a local SSD.
+
+    python -m benchmarks.slow_fsync 10 app.main:app --port 8000
+
+The first argument is the added delay in ms; the rest go to uvicorn. Only
+fsyncs issued from Python (the CSV append) are delayed; SQLite syncs its own
+files from C and runs at local disk speed.
+"""
+import os
+import sys
+import time
+
+
+def main():
+    delay = float(sys.argv[1]) / 1000.0
+    real_fsync = os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(delay)
+        real_fsync(fd)
+
+    os.fsync = slow_fsync
+
+    import uvicorn
+
+    sys.argv = ["uvicorn"] + sys.argv[2:]
+    uvicorn.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Shared-secret check for the operator endpoints (profiling, query stats).
+
+Set ADMIN_TOKEN and send it as `Authorization: Bearer <token>` or
+`X-Admin-Token: <token>`. Without ADMIN_TOKEN those endpoints refuse
+every request.
+"""
+import hmac
+import os
+from typing import Mapping, Optional
+
+
+def admin_token() -> str:
+    return os.environ.get("ADMIN_TOKEN", "").strip()
+
+
+def _presented(headers: Mapping[str, str]) -> Optional[str]:
+    auth = headers.get("authorization") or ""
+    if auth[:7].lower() == "bearer ":
+        return auth[7:].strip()
+    return headers.get("x-admin-token")
+
+
+def is_admin(headers: Mapping[str, str]) -> bool:
+    """True when the request carries ADMIN_TOKEN (headers: any case-insensitive mapping)."""
+    expected = admin_token()
+    presented = _presented(headers)
+    if not expected or not presented:
+        return False
+    return hmac.compare_digest(presented.encode(), expected.encode())
@@ -1,10 +1,14 @@
 import pandas as pd
 import plotly.express as px
-from dash import Dash, html, dcc, Input, Output, State
+from dash import Dash, html, dcc, Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import dash
+import flask
+from . import cohorts, data, figures, instrumentation, profiler, query_stats, replica
+from .admin_auth import is_admin
 from .db import query_df
-from .metrics import normalize_events, funnel_by_stage, time_by_stage, spike_detection, combat_by_stage, hits_by_enemy, fail_reasons
 import json
+import os
 from datetime import datetime
 
 from .balancing_toolkit import (
@@ -24,15 +28,33 @@ app = Dash(
 
 app.title = "Telemetry Dashboard (Admin)"
 
-def load_data():
-    events = query_df("SELECT * FROM telemetry_events")
-    deaths = query_df("SELECT * FROM death_heatmap")
-    balance = query_df("SELECT * FROM game_balance")
-    return events, deaths, balance
 
-def difficulty_options(df_norm):
-    opts = sorted([x for x in df_norm["difficulty"].dropna().unique().tolist()])
-    return [{"label": d, "value": d} for d in (opts if opts else ["easy","medium","hard"])]
+# /admin/metrics: this process's compute timings, for when it runs on its
+# own (dashboard/wsgi.py); in-process they are also in the API's /metrics
+@app.server.route(app.config.routes_pathname_prefix + "metrics")
+def prometheus_metrics():
+    return instrumentation.REGISTRY.render(), 200, {"Content-Type": instrumentation.CONTENT_TYPE}
+
+
+# /admin/_queries: the Queries tab as JSON (?n= statements); needs ADMIN_TOKEN
+@app.server.route(app.config.routes_pathname_prefix + "_queries")
+def query_stats_json():
+    if not is_admin(flask.request.headers):
+        return "ADMIN_TOKEN required\n", 403, {"Content-Type": "text/plain"}
+    n = flask.request.args.get("n", 20, type=int)
+    return flask.jsonify(slow_query_ms=query_stats.SLOW_QUERY_MS, top=query_stats.top(n),
+                         slow=query_stats.slow_log(), replica=replica.status())
+
+
+# /admin/_profile (all-thread sampler) and X-Profile on callbacks, read
+# back at /admin/_profile/<id>; both need ADMIN_TOKEN
+profiler.install_flask(app.server, app.config.routes_pathname_prefix)
+
+
+# COHORT_PREWARM=0 to skip: otherwise the first Cohorts view of the day
+# waits for a full read of telemetry_events
+if os.environ.get("COHORT_PREWARM", "1") != "0":
+    cohorts.warm_in_background()
 
 app.layout = html.Div([
     html.H2("📊 Telemetry Analytics Dashboard"),
@@ -48,27 +70,51 @@ app.layout = html.Div([
         ], style={"width": "250px", "display": "inline-block"}),
     ], style={"marginBottom": "16px"}),
 
-    dcc.Tabs([
-        dcc.Tab(label="Overview", children=[
+    # live counters: deltas streamed from /admin/_live/rollups (assets/live.js),
+    # applied in the browser without re-querying
+    html.Div(id="live-counters", style={"color": "#666", "marginBottom": "12px"}),
+    dcc.Interval(id="live-tick", interval=1000),
+    dcc.Store(id="live-deltas"),
+
+    dcc.Tabs(id="main-tabs", value="overview", children=[
+        dcc.Tab(label="Overview", value="overview", children=[
             html.Div(id="kpi-row", style={"display": "flex", "gap": "12px", "marginTop": "12px"}),
             dcc.Graph(id="spike-table"),
             dcc.Graph(id="time-curve"),
         ]),
-        dcc.Tab(label="Funnel", children=[
+        dcc.Tab(label="Funnel", value="funnel", children=[
             dcc.Graph(id="funnel-graph"),
             dcc.Graph(id="fail-drop-graph"),
         ]),
-        dcc.Tab(label="Heatmap", children=[
+        dcc.Tab(label="Heatmap", value="heatmap", children=[
             dcc.Graph(id="death-heatmap"),
         ]),
-        dcc.Tab(label="Combat & Healing", children=[
+        dcc.Tab(label="Combat & Healing", value="combat", children=[
             dcc.Graph(id="combat-summary"),
+            dcc.Graph(id="attempt-outcomes"),
             html.Div([
                 dcc.Graph(id="hits-by-enemy"),
                 dcc.Graph(id="death-causes"),
             ], style={"display":"grid","gridTemplateColumns":"1fr 1fr","gap":"12px"}),
         ]),
-        dcc.Tab(label="Balancing Toolkit", children=[
+        dcc.Tab(label="Cohorts", value="cohorts", children=[
+            html.Div([
+                html.Label("Group players by"),
+                dcc.Dropdown(
+                    id="cohort-dim",
+                    options=[{"label": label, "value": key} for key, label in cohorts.COHORT_DIMENSIONS.items()],
+                    value="cohort_week",
+                    clearable=False,
+                ),
+            ], style={"width": "250px", "marginTop": "12px"}),
+            html.Div(id="cohort-summary", style={"color": "#666", "marginTop": "8px"}),
+            dcc.Graph(id="cohort-retention"),
+            html.Div([
+                dcc.Graph(id="cohort-sessions"),
+                dcc.Graph(id="cohort-depth"),
+            ], style={"display":"grid","gridTemplateColumns":"1fr 1fr","gap":"12px"}),
+        ]),
+        dcc.Tab(label="Balancing Toolkit", value="balancing", children=[
             html.H3("Combat Tuning Toolkit (Prototype)"),
 
             html.Div([
@@ -159,7 +205,20 @@ app.layout = html.Div([
             ], style={"marginTop":"10px","marginBottom":"10px"}),
 
             dcc.Graph(id="decision-log-table"),
-        ])
+        ]),
+        dcc.Tab(label="Queries", value="queries", children=[
+            html.Div([
+                # same policy as /admin/_queries: the statements carry parameters
+                dcc.Input(id="queries-token", type="password", placeholder="ADMIN_TOKEN",
+                          debounce=True, style={"marginRight": "8px"}),
+                html.Button("Refresh", id="queries-refresh", n_clicks=0),
+                html.Span(id="queries-summary", style={"marginLeft": "10px", "color": "#666"}),
+            ], style={"marginTop": "12px"}),
+            html.H4("Statements by total time"),
+            html.Div(id="queries-top"),
+            html.H4("Slow statements (most recent first)"),
+            html.Div(id="queries-slow"),
+        ]),
 
 
     ])
@@ -172,47 +231,68 @@ app.layout = html.Div([
     Input("difficulty-dd", "value")
 )
 def init_dropdowns(_):
-    events, deaths, _balance = load_data()
-
-    # difficulty options
-    if events is None or events.empty:
-        diff_opts = [{"label": d, "value": d} for d in ["easy","medium","hard"]]
-    else:
-        df = normalize_events(events)
-        diff_opts = difficulty_options(df)
-
-    # stage options
-    if deaths is None or deaths.empty or "stage_number" not in deaths.columns:
-        stages = list(range(1, 11))
-    else:
-        stages = sorted(pd.to_numeric(deaths["stage_number"], errors="coerce").dropna().astype(int).unique().tolist())
+    diffs = data.difficulties()
+    diff_opts = [{"label": d, "value": d} for d in (diffs if diffs else ["easy","medium","hard"])]
 
+    stages = data.stages() or list(range(1, 11))
     stage_opts = [{"label": f"Stage {s}", "value": s} for s in stages]
     return diff_opts, stage_opts
 
 
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="drain"),
+    Output("live-deltas", "data"),
+    Input("live-tick", "n_intervals"),
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="counters"),
+    Output("live-counters", "children"),
+    Input("live-deltas", "data"),
+    Input("difficulty-dd", "value"),
+)
+
+app.clientside_callback(
+    ClientsideFunction(namespace="live", function_name="funnel"),
+    Output("funnel-graph", "figure", allow_duplicate=True),
+    Input("live-deltas", "data"),
+    State("difficulty-dd", "value"),
+    State("funnel-graph", "figure"),
+    prevent_initial_call=True,
+)
+
+
+# Each figure group below has its own callback keyed on only the inputs it
+# depends on (the stage dropdown only drives the heatmap, hits and causes),
+# and skips the work while its tab is hidden; switching to the tab fires it.
+def _require_tab(active_tab, tab):
+    if active_tab != tab:
+        raise PreventUpdate
+
+
+def _default_stage(stage_value):
+    if stage_value is not None:
+        return stage_value
+    stages = data.stages()
+    return stages[0] if stages else 1
+
+
+def _kpi_card(title, value):
+    return html.Div([html.H4(title), html.H3(value)], style={"padding":"12px","border":"1px solid #ddd","borderRadius":"10px"})
+
 
 @app.callback(
     Output("kpi-row", "children"),
-    Output("funnel-graph", "figure"),
-    Output("fail-drop-graph", "figure"),
-    Output("time-curve", "figure"),
     Output("spike-table", "figure"),
-    Output("death-heatmap", "figure"),
-    Output("combat-summary", "figure"),
-    Output("hits-by-enemy", "figure"),
-    Output("death-causes", "figure"),
+    Output("time-curve", "figure"),
     Input("difficulty-dd", "value"),
-    Input("stage-dd", "value"),
+    Input("main-tabs", "value"),
 )
-def update_dashboard(difficulty, stage_value):
-    events, deaths, balance = load_data()
-    df = normalize_events(events)
-
-    # Funnel + Time
-    funnel = funnel_by_stage(df, difficulty=difficulty)
-    tdf = time_by_stage(df, difficulty=difficulty)
-    spikes = spike_detection(funnel, tdf)
+def update_overview(difficulty, active_tab):
+    _require_tab(active_tab, "overview")
+    funnel = data.funnel(difficulty)
+    tdf = data.times(difficulty)
+    spikes = data.spikes(difficulty)
 
     # KPI
     total_starts = int(funnel["starts"].sum()) if len(funnel) else 0
@@ -220,82 +300,224 @@ def update_dashboard(difficulty, stage_value):
     completion_rate = (total_completes / total_starts) if total_starts else 0
 
     kpi = [
-        html.Div([html.H4("Sessions (starts)"), html.H3(f"{total_starts}")], style={"padding":"12px","border":"1px solid #ddd","borderRadius":"10px"}),
-        html.Div([html.H4("Completions"), html.H3(f"{total_completes}")], style={"padding":"12px","border":"1px solid #ddd","borderRadius":"10px"}),
-        html.Div([html.H4("Completion Rate"), html.H3(f"{completion_rate:.2%}")], style={"padding":"12px","border":"1px solid #ddd","borderRadius":"10px"}),
-        html.Div([html.H4("Spike Stages"), html.H3(f"{int(spikes['is_spike'].sum()) if len(spikes) else 0}")], style={"padding":"12px","border":"1px solid #ddd","borderRadius":"10px"}),
+        _kpi_card("Sessions (starts)", f"{total_starts}"),
+        _kpi_card("Completions", f"{total_completes}"),
+        _kpi_card("Completion Rate", f"{completion_rate:.2%}"),
+        _kpi_card("Spike Stages", f"{int(spikes['is_spike'].sum()) if len(spikes) else 0}"),
     ]
 
-    # Funnel graph
-    fig_funnel = px.bar(
-        funnel, x="stage_id", y=["completes", "fails", "quits"],
-        title="Stage Funnel Counts (complete/fail/quit)", barmode="stack"
-    )
-
-    fig_rates = px.line(
-        funnel, x="stage_id", y=["completion_rate", "fail_rate", "dropoff_rate"],
-        title="Stage Rates"
+    # Spike table (scatter)
+    spikes_view = spikes.copy()
+    spikes_view["spike_label"] = spikes_view["is_spike"].map({True: "SPIKE", False: "ok"})
+    fig_spike = figures.scatter(
+        spikes_view, x="fail_rate", y="median_duration_ms", color="spike_label", hover_data=["stage_id"],
+        title="Spike Detection (fail_rate vs median_duration_ms)"
     )
 
     # Time curve
-    fig_time = px.line(
-        tdf, x="stage_id", y=["median_duration_ms", "p75_duration_ms", "p90_duration_ms"],
+    fig_time = figures.line(
+        tdf, x="stage_id", ys=["median_duration_ms", "p75_duration_ms", "p90_duration_ms"],
         title="Time-to-complete percentiles (ms)"
     )
+    return kpi, fig_spike, fig_time
 
-    # Spike table (scatter)
-    spikes_view = spikes.copy()
-    spikes_view["spike_label"] = spikes_view["is_spike"].map({True: "SPIKE", False: "ok"})
-    fig_spike = px.scatter(
-        spikes_view, x="fail_rate", y="median_duration_ms", color="spike_label", hover_data=["stage_id"],
-        title="Spike Detection (fail_rate vs median_duration_ms)"
+
+@app.callback(
+    Output("funnel-graph", "figure"),
+    Output("fail-drop-graph", "figure"),
+    Input("difficulty-dd", "value"),
+    Input("main-tabs", "value"),
+)
+def update_funnel(difficulty, active_tab):
+    _require_tab(active_tab, "funnel")
+    funnel = data.funnel(difficulty)
+
+    fig_funnel = px.bar(
+        funnel, x="stage_id", y=["completes", "fails", "quits"],
+        title="Stage Funnel Counts (complete/fail/quit)", barmode="stack"
     )
 
-    # Death heatmap
-    if stage_value is None:
-        stage_value = int(deaths["stage_number"].dropna().iloc[0]) if len(deaths) else 1
+    fig_rates = figures.line(
+        funnel, x="stage_id", ys=["completion_rate", "fail_rate", "dropoff_rate"],
+        title="Stage Rates"
+    )
+    return fig_funnel, fig_rates
 
-    d = deaths[deaths["stage_number"] == stage_value].copy() if len(deaths) else pd.DataFrame(columns=["x_position","y_position"])
-    if len(d):
-        # 2D histogram heatmap
-        fig_heat = px.density_heatmap(
-            d, x="x_position", y="y_position", nbinsx=40, nbinsy=25,
-            title=f"Death Heatmap (Stage {stage_value})"
-        )
-    else:
-        fig_heat = px.scatter(title=f"Death Heatmap (Stage {stage_value}) - no data")
 
-    # Balance table
-    if len(balance):
-        fig_balance = px.bar(balance, x="setting_name", y="setting_value", title="Game Balance Settings (Sprint 2)")
-    else:
-        fig_balance = px.scatter(title="Game Balance Settings - no data")
+@app.callback(
+    Output("death-heatmap", "figure"),
+    Input("stage-dd", "value"),
+    Input("main-tabs", "value"),
+)
+def update_heatmap(stage_value, active_tab):
+    _require_tab(active_tab, "heatmap")
+    stage_value = _default_stage(stage_value)
+    title = f"Death Heatmap (Stage {stage_value})"
+    # binned while reading: the payload is 40x25 counts however many deaths there are
+    bins = data.death_bins(stage_value, 40, 25)
+    if bins is None:
+        return figures.empty(f"{title} - no data")
+    return figures.binned_heatmap(*bins, x="x_position", y="y_position", title=title)
 
-    # Combat report
 
-    combat = combat_by_stage(df, difficulty=difficulty)
-    fig_combat = px.bar(
-        combat,
+@app.callback(
+    Output("combat-summary", "figure"),
+    Input("difficulty-dd", "value"),
+    Input("main-tabs", "value"),
+)
+def update_combat(difficulty, active_tab):
+    _require_tab(active_tab, "combat")
+    return px.bar(
+        data.combat(difficulty),
         x="stage_id",
         y=["enemy_kills","player_hits","heal_pickups","deaths","retries"],
         barmode="group",
         title="Combat & Healing volume by stage"
     )
 
-    hb = hits_by_enemy(df, difficulty=difficulty, stage_id=stage_value)
+
+@app.callback(
+    Output("attempt-outcomes", "figure"),
+    Input("difficulty-dd", "value"),
+    Input("main-tabs", "value"),
+)
+def update_attempts(difficulty, active_tab):
+    _require_tab(active_tab, "combat")
+    summary = data.attempt_summary(difficulty)
+    if summary.empty:
+        return figures.empty("No attempts reconstructed yet.")
+    return px.bar(
+        summary,
+        x="stage_id",
+        y=["wins", "fails", "quits", "abandoned", "open"],
+        hover_data=["win_rate", "median_duration_s", "hits_per_attempt", "heals_per_attempt", "kills_per_attempt"],
+        title="Attempt outcomes by stage",
+    )
+
+
+@app.callback(
+    Output("hits-by-enemy", "figure"),
+    Output("death-causes", "figure"),
+    Input("difficulty-dd", "value"),
+    Input("stage-dd", "value"),
+    Input("main-tabs", "value"),
+)
+def update_stage_combat(difficulty, stage_value, active_tab):
+    _require_tab(active_tab, "combat")
+    stage_value = _default_stage(stage_value)
+
+    hb = data.hits(difficulty, stage_value)
     fig_hits_enemy = px.pie(
         hb, names="enemy_type", values="hits",
         title="Who is hitting the player? (hits by enemy type)"
     ) if len(hb) else px.scatter(title="No player_hit events yet.")
 
-    fr = fail_reasons(df, difficulty=difficulty, stage_id=stage_value)
+    fr = data.causes(difficulty, stage_value)
     fig_fail_causes = px.bar(
         fr, x="cause", y="count",
         title="Death causes"
     ) if len(fr) else px.scatter(title="No death events yet.")
 
+    return fig_hits_enemy, fig_fail_causes
+
+@app.callback(
+    Output("cohort-summary", "children"),
+    Output("cohort-retention", "figure"),
+    Output("cohort-sessions", "figure"),
+    Output("cohort-depth", "figure"),
+    Input("cohort-dim", "value"),
+    Input("main-tabs", "value"),
+)
+def update_cohorts(by, active_tab):
+    _require_tab(active_tab, "cohorts")
+    players = cohorts.players()
+    table = cohorts.cohort_table(players, by=by)
+    label = cohorts.COHORT_DIMENSIONS[by]
+
+    if not len(table):
+        empty_fig = figures.empty("No players yet.")
+        return "No players yet.", empty_fig, empty_fig, empty_fig
+
+    summary = (f"{len(players):,} players, {int(players['sessions'].sum()):,} sessions "
+               f"(recomputed daily; as of {players['last_seen'].max():%Y-%m-%d %H:%M} UTC)")
+
+    fig_ret = px.bar(
+        table, x=by, y=["d1_retention", "d7_retention"], barmode="group",
+        hover_data=["players", "d1_eligible", "d7_eligible"],
+        title=f"D1 / D7 retention by {label.lower()}"
+    )
+    fig_ret.update_layout(yaxis_tickformat=".0%", xaxis_title=label, yaxis_title="retained")
+
+    fig_sessions = px.bar(
+        table, x=by, y=["sessions_per_player", "median_sessions"], barmode="group",
+        title="Sessions per player"
+    )
+    fig_sessions.update_layout(xaxis_title=label, yaxis_title="sessions")
+
+    fig_depth = px.bar(
+        table, x=by, y=["mean_depth", "median_depth"], barmode="group",
+        title="Progression depth (highest stage completed)"
+    )
+    fig_depth.update_layout(xaxis_title=label, yaxis_title="stage")
+    return summary, fig_ret, fig_sessions, fig_depth
+
+
+def _cell_style(align="left"):
+    return {"padding": "4px 8px", "borderBottom": "1px solid #eee", "textAlign": align, "verticalAlign": "top"}
+
+
+def _stats_table(rows, columns):
+    """rows: dicts; columns: (key, header, right-aligned) triples"""
+    head = html.Tr([html.Th(h, style=_cell_style("right" if right else "left")) for _, h, right in columns])
+    body = [
+        html.Tr([html.Td(_fmt_cell(r.get(k)), style=_cell_style("right" if right else "left")) for k, _, right in columns])
+        for r in rows
+    ]
+    return html.Table([html.Thead(head), html.Tbody(body)], style={"borderCollapse": "collapse", "fontSize": "13px"})
+
+
+def _fmt_cell(value):
+    if isinstance(value, list):
+        return html.Pre("\n".join(map(str, value)), style={"margin": 0}) if value else ""
+    if isinstance(value, float):
+        return f"{value:,.1f}"
+    if isinstance(value, int):
+        return f"{value:,}"
+    return html.Code(value) if value else ""
+
+
+@app.callback(
+    Output("queries-summary", "children"),
+    Output("queries-top", "children"),
+    Output("queries-slow", "children"),
+    Input("queries-refresh", "n_clicks"),
+    Input("main-tabs", "value"),
+    Input("queries-token", "value"),
+)
+def update_queries(_, active_tab, token):
+    _require_tab(active_tab, "queries")
+    if not (is_admin(flask.request.headers) or is_admin({"x-admin-token": token or ""})):
+        return "ADMIN_TOKEN required: enter it above, or send it with the request.", None, None
+    top = query_stats.top(25)
+    slow = query_stats.slow_log(25)
+    scanning = sum(1 for r in top if r["scans"])
+    summary = (f"{len(top)} statements shown, {scanning} scanning whole tables; "
+               f"slow = over {query_stats.SLOW_QUERY_MS:g} ms (SLOW_QUERY_MS). This process only.")
+    for r in replica.status().values():
+        age = "not built yet" if r["age_s"] is None else f"{r['age_s']:.0f} s old"
+        summary += f" Reading the replica ({age}{'; last refresh failed: ' + r['last_error'] if r['last_error'] else ''})."
+
+    top_table = _stats_table(top, [
+        ("fingerprint", "statement", False), ("calls", "calls", True), ("total_ms", "total ms", True),
+        ("mean_ms", "mean ms", True), ("max_ms", "max ms", True), ("rows", "rows", True),
+        ("slow", "slow", True), ("scans", "full scans", False), ("plan", "query plan", False),
+    ])
+    slow_table = _stats_table(slow, [
+        ("at", "at (UTC)", False), ("ms", "ms", True), ("rows", "rows", True), ("sql", "statement", False),
+        ("params", "params", False), ("plan", "query plan", False),
+    ]) if slow else html.Div("None yet.", style={"color": "#666"})
+    return summary, top_table, slow_table
 
-    return kpi, fig_funnel, fig_rates, fig_time, fig_spike, fig_heat, fig_combat, fig_hits_enemy, fig_fail_causes
 
 @app.callback(
     Output("sim-mode-badge", "children"),
@@ -309,14 +531,13 @@ def update_dashboard(difficulty, stage_value):
     Input("p-enemyDamageMult", "value"),
     Input("p-playerDamageMult", "value"),
     Input("difficulty-dd", "value"),
+    Input("main-tabs", "value"),
     State("sim-seed", "value"),
 )
-def toolkit_update(n_clicks, enemyHpMult, enemyDamageMult, playerDamageMult, difficulty, seed):
-    events, deaths, balance = load_data()
-    df = normalize_events(events)
-
-    funnel = funnel_by_stage(df, difficulty=difficulty)
-    tdf = time_by_stage(df, difficulty=difficulty)
+def toolkit_update(n_clicks, enemyHpMult, enemyDamageMult, playerDamageMult, difficulty, active_tab, seed):
+    _require_tab(active_tab, "balancing")
+    funnel = data.funnel(difficulty)
+    tdf = data.times(difficulty)
 
     if funnel is None or funnel.empty:
         empty_fig = px.scatter(title="No telemetry data for this filter (try another difficulty).")
@@ -356,14 +577,21 @@ def toolkit_update(n_clicks, enemyHpMult, enemyDamageMult, playerDamageMult, dif
     n_runs = 800 if full_run else 200
     badge = ("Full simulation (800 runs)" if full_run else "Preview (200 runs)")
 
+    # run_simulation simulates the first stage; use the constants fitted to it
+    sim_stage = int(pd.to_numeric(funnel["stage_id"], errors="coerce").min())
+    constants = data.calibrated_constants(sim_stage, difficulty)
+    badge += (f" · calibrated to stage {sim_stage} attempts" if constants
+              else " · default constants (not enough attempts to calibrate)")
+
     frames = compare_simulations(
         funnel=funnel,
         tdf=tdf,
         proposed_params=proposed_params,
         n_runs=n_runs,
         seed=int(seed or 123),
-        stage_id=None,      # or set a specific stage id
+        stage_id=sim_stage,
         n_enemies=15,
+        constants=constants,
     )
 
     # --- KPI delta cards ---
@@ -395,10 +623,10 @@ def toolkit_update(n_clicks, enemyHpMult, enemyDamageMult, playerDamageMult, dif
 
     # --- FIGURE 1: Distribution plot (repurposes sim-reach-curve) ---
     # Show how tuning changes the distribution of fails_total (very convincing for retries)
-    dist = frames["dist"].copy()
+    dist = frames["dist"]
 
-    # Histogram of fails per run (shows retries)
-    fig_dist = px.histogram(
+    # Histogram of fails per run (shows retries), binned server-side
+    fig_dist = figures.histogram(
         dist,
         x="fails_total",
         color="variant",
@@ -447,10 +675,8 @@ def toolkit_update(n_clicks, enemyHpMult, enemyDamageMult, playerDamageMult, dif
 def save_decision_cb(n_clicks, designer, stage_id, difficulty, rationale,
                      enemyHpMult, enemyDamageMult, playerDamageMult):
     # compute evidence snapshot from current telemetry filters
-    events, deaths, balance = load_data()
-    df = normalize_events(events)
-    funnel = funnel_by_stage(df, difficulty=difficulty)
-    tdf = time_by_stage(df, difficulty=difficulty)
+    funnel = data.funnel(difficulty)
+    tdf = data.times(difficulty)
     suggestions = generate_suggestions(funnel, tdf)
 
     changes = {
@@ -490,13 +716,15 @@ def save_decision_cb(n_clicks, designer, stage_id, difficulty, rationale,
 )
 def refresh_decision_log(_):
     init_balancing_tables()
-    df = query_df("SELECT ts_iso, designer, stage_id, difficulty, changes_json, rationale_text FROM balance_decisions ORDER BY ts_iso DESC LIMIT 50")
+    # written by this process: read the primary, not the replica
+    df = query_df("SELECT ts_iso, designer, stage_id, difficulty, changes_json, rationale_text FROM balance_decisions ORDER BY ts_iso DESC LIMIT 50",
+                  primary=True)
     if not len(df):
         return px.scatter(title="No decisions saved yet.")
     # show as a simple bar/table-like chart (Dash DataTable is also fine, but you already use figures)
     df["changes_json"] = df["changes_json"].apply(lambda s: (s or "")[:120] + ("..." if s and len(s) > 120 else ""))
-    return px.scatter(df, x="ts_iso", y="designer", hover_data=["stage_id","difficulty","changes_json","rationale_text"],
-                      title="Decision Log (hover for details)")
+    return figures.scatter(df, x="ts_iso", y="designer", hover_data=["stage_id","difficulty","changes_json","rationale_text"],
+                           title="Decision Log (hover for details)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+// Live rollups: per-stage deltas pushed by the API over server-sent events
+// (GET /admin/_live/rollups, see app/live.py). Batches are queued here and
+// drained by the clientside callbacks in dashboard/app.py, which add them
+// to the figures already on screen. Nothing here calls back to the server.
+(function () {
+  "use strict";
+
+  const STREAM_URL = window.LIVE_ROLLUPS_URL || "/admin/_live/rollups";
+  const COLUMNS = ["starts", "completes", "fails", "quits", "deaths"];
+
+  const state = {
+    queue: [],        // rollup messages not yet drained
+    totals: {},       // difficulty -> {starts, completes, ...} since page load
+    status: "connecting",
+    lastTs: null,
+  };
+
+  function connect() {
+    if (!window.EventSource) {
+      state.status = "unsupported";
+      return;
+    }
+    const source = new window.EventSource(STREAM_URL);
+    source.addEventListener("hello", () => { state.status = "live"; });
+    // every stream slot taken (LIVE_MAX_SUBSCRIBERS): retried after the server's retry delay
+    source.addEventListener("busy", () => { state.status = "busy"; });
+    source.addEventListener("rollup", (e) => {
+      try {
+        state.queue.push(JSON.parse(e.data));
+      } catch (err) {
+        // a malformed message only costs that delta
+      }
+    });
+    source.onerror = () => {
+      // EventSource retries on its own; CLOSED means the endpoint isn't there
+      // (or answered 503: too many subscribers)
+      state.status = source.readyState === window.EventSource.CLOSED ? "offline" : "reconnecting";
+    };
+  }
+
+  function addTotals(rows) {
+    for (const row of rows) {
+      const t = state.totals[row.difficulty] || (state.totals[row.difficulty] = {});
+      for (const c of COLUMNS) t[c] = (t[c] || 0) + (row[c] || 0);
+    }
+  }
+
+  function matches(row, difficulty) {
+    return !difficulty || row.difficulty === difficulty;
+  }
+
+  window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    live: {
+      // live-tick -> live-deltas: hand over everything received since the last tick
+      drain: function () {
+        if (!state.queue.length) return window.dash_clientside.no_update;
+        const batches = state.queue.splice(0);
+        for (const b of batches) addTotals(b.rows || []);
+        state.lastTs = batches[batches.length - 1].ts;
+        return { seq: batches[batches.length - 1].seq, rows: batches.flatMap((b) => b.rows || []) };
+      },
+
+      counters: function (_deltas, difficulty) {
+        const sum = {};
+        for (const [diff, t] of Object.entries(state.totals)) {
+          if (difficulty && diff !== difficulty) continue;
+          for (const c of COLUMNS) sum[c] = (sum[c] || 0) + (t[c] || 0);
+        }
+        const parts = COLUMNS.map((c) => `${c} +${sum[c] || 0}`).join(" · ");
+        const when = state.lastTs ? ` (last ${new Date(state.lastTs).toLocaleTimeString()})` : "";
+        return `Live [${state.status}] since page load: ${parts}${when}`;
+      },
+
+      // add completes/fails/quits to the stacked funnel bars, in place
+      funnel: function (deltas, difficulty, figure) {
+        if (!deltas || !figure || !Array.isArray(figure.data) || !figure.data.length) {
+          return window.dash_clientside.no_update;
+        }
+        const traces = figure.data.map((tr) => Object.assign({}, tr, {
+          x: Array.isArray(tr.x) ? tr.x.slice() : tr.x,
+          y: Array.isArray(tr.y) ? tr.y.slice() : tr.y,
+        }));
+        let changed = false;
+        for (const row of deltas.rows) {
+          if (!matches(row, difficulty)) continue;
+          for (const tr of traces) {
+            // typed-array encoded traces are left for the next server render
+            if (!Array.isArray(tr.x) || !Array.isArray(tr.y) || !(tr.name in row) || !row[tr.name]) continue;
+            let i = tr.x.indexOf(row.stage);
+            if (i < 0) {
+              tr.x.push(row.stage);
+              tr.y.push(0);
+              i = tr.x.length - 1;
+            }
+            tr.y[i] += row[tr.name];
+            changed = true;
+          }
+        }
+        return changed ? Object.assign({}, figure, { data: traces }) : window.dash_clientside.no_update;
+      },
+    },
+  });
+
+  connect();
+})();
@@ -0,0 +1,443 @@
+"""
+Attempt-level reconstruction of runs from raw telemetry.
+
+An attempt is one try at one stage: it starts at a `stage_start` and
+collects everything the scene reports until the next one (or until the
+client's attempt_id changes). Events are loaded as plain columns
+(json_extract pulls the attempt fields out of event_data in SQLite),
+sorted once by (session, stage, time), and every per-attempt figure is
+computed from that order with numpy: boundaries where the session or
+stage changes or a new attempt begins, then bincount over the attempt
+index. There are no per-attempt Python loops.
+
+Per attempt:
+- started_ms / ended_ms / duration_ms: the terminal event's duration_ms
+  when the client sent one, else last event - first event
+- hits_taken / damage_taken, heals / heal_amount, kills
+- outcome: win (stage_complete), fail (fail or death), quit, abandoned
+  (a later attempt at the stage began without this one ending), open
+  (the latest attempt at the stage, no ending yet)
+- death_cause / death_x / death_y: from the attempt's last death
+
+The result is persisted to an `attempts` table and refreshed
+incrementally: refresh() reads only events past the stored watermark,
+plus the events of the stored attempts they can change. For each
+(session, stage) the new events touch, that is the attempt their
+earliest timestamp falls in and every later one, so an attempt that was
+still open, or an earlier one a late-delivered event belongs to, is
+rebuilt whole and replaced; the result equals a full rebuild. New events
+are read and folded in db.chunk_rows() at a time (the first build goes
+through the whole table that way), so memory follows DASH_MEMORY_MB,
+not the size of the event log. The table
+(and calibration's sim_calibration) lives in ATTEMPTS_DB_PATH, by
+default attempts.db next to DB_PATH, never in the telemetry database:
+writes from Dash callbacks would compete with the ingest writer for its
+write lock.
+"""
+import os
+import threading
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+from .db import chunk_rows, execute, execute_batch, get_db_path, query_chunks, query_df
+
+EVENT_TYPES = ("stage_start", "player_hit", "heal_pickup", "enemy_kill",
+               "death", "fail", "retry", "stage_complete", "quit")
+_KIND = {name: code for code, name in enumerate(EVENT_TYPES)}
+_TERMINAL = (_KIND["fail"], _KIND["stage_complete"], _KIND["quit"])
+
+OUTCOMES = ("win", "fail", "quit", "abandoned", "open")
+
+ATTEMPT_COLUMNS = [
+    "attempt_key", "session_id", "user_id", "stage_id", "attempt_id", "difficulty",
+    "started_ms", "ended_ms", "duration_ms", "events", "hits_taken", "damage_taken",
+    "heals", "heal_amount", "kills", "outcome", "death_cause", "death_x", "death_y",
+    "first_event_id", "last_event_id",
+]
+
+_NULLABLE_REAL_COLUMNS = ("death_x", "death_y")
+
+_IN = ", ".join(f"'{name}'" for name in EVENT_TYPES)
+
+# Everything per row is resolved by SQLite: the timestamp as epoch
+# milliseconds and the attempt fields the scenes put in event_data.
+EVENTS_SQL = f"""
+SELECT id,
+       user_id,
+       COALESCE(session_id, '') AS session_id,
+       stage_number AS stage_id,
+       CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER) AS ts_ms,
+       event_type,
+       json_extract(event_data, '$.attempt_id') AS attempt_id,
+       NULLIF(json_extract(event_data, '$.difficulty'), '') AS difficulty,
+       json_extract(event_data, '$.duration_ms') AS duration_ms,
+       json_extract(event_data, '$.damage') AS damage,
+       COALESCE(json_extract(event_data, '$.amount'), json_extract(event_data, '$.heal_amount')) AS heal_amount,
+       COALESCE(json_extract(event_data, '$.cause'), json_extract(event_data, '$.fail_reason')) AS cause,
+       COALESCE(json_extract(event_data, '$.x_position'), json_extract(event_data, '$.x')) AS x,
+       COALESCE(json_extract(event_data, '$.y_position'), json_extract(event_data, '$.y')) AS y
+FROM telemetry_events
+WHERE id > ? AND id <= ? AND stage_number IS NOT NULL AND event_type IN ({_IN})
+ORDER BY id
+"""
+
+_MAX_ID = 2**63 - 1
+
+
+def attempts_db_path() -> str:
+    return os.environ.get("ATTEMPTS_DB_PATH") or os.path.join(os.path.dirname(get_db_path()), "attempts.db")
+
+
+def load_event_chunks(after_id: int = 0, upto_id: int = _MAX_ID) -> Iterator[pd.DataFrame]:
+    """EVENTS_SQL rows with after_id < id <= upto_id, in frames of at most chunk_rows() rows."""
+    try:
+        yield from query_chunks(EVENTS_SQL, (int(after_id), int(upto_id)), chunk_rows())
+    except Exception:  # telemetry_events not created yet
+        return
+
+
+def load_events(after_id: int = 0, upto_id: int = _MAX_ID) -> pd.DataFrame:
+    """EVENTS_SQL rows with after_id < id <= upto_id, in one frame."""
+    return _concat(load_event_chunks(after_id, upto_id))
+
+
+def _concat(frames) -> pd.DataFrame:
+    """
+    pd.concat of EVENTS_SQL frames. A column that is NULL throughout one
+    frame comes back as object; it takes the dtype the other frames give
+    it (float for numbers) so concat doesn't have to guess around it.
+    """
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame()
+    dtypes = {}
+    for frame in frames:
+        for column in frame.columns:
+            if column not in dtypes and frame[column].notna().any():
+                dtypes[column] = frame[column].dtype
+    aligned = []
+    for frame in frames:
+        casts = {column: "float64" if dtypes[column].kind in "iub" else dtypes[column]
+                 for column in frame.columns
+                 if column in dtypes and frame[column].dtype != dtypes[column] and frame[column].isna().all()}
+        aligned.append(frame.astype(casts) if casts else frame)
+    return pd.concat(aligned, ignore_index=True)
+
+
+def _numeric(events: pd.DataFrame, column: str) -> np.ndarray:
+    if column not in events.columns:
+        return np.full(len(events), np.nan)
+    return pd.to_numeric(events[column], errors="coerce").to_numpy(dtype=float)
+
+
+def _last_per_group(values: np.ndarray, present: np.ndarray, group: np.ndarray, size: int) -> np.ndarray:
+    """Last present value of each group (rows already in group order); None where a group has none."""
+    out = np.full(size, None, dtype=object)
+    idx = np.flatnonzero(present)
+    if len(idx):
+        g = group[idx]
+        last = np.r_[g[1:] != g[:-1], True]
+        out[g[last]] = values[idx[last]]
+    return out
+
+
+def _first_per_group(values: np.ndarray, present: np.ndarray, group: np.ndarray, size: int) -> np.ndarray:
+    out = np.full(size, None, dtype=object)
+    idx = np.flatnonzero(present)
+    if len(idx):
+        g = group[idx]
+        first = np.r_[True, g[1:] != g[:-1]]
+        out[g[first]] = values[idx[first]]
+    return out
+
+
+def build_attempts(events: pd.DataFrame) -> pd.DataFrame:
+    """One row per attempt (see the module docstring) from EVENTS_SQL-shaped events."""
+    if events is None or events.empty:
+        return pd.DataFrame(columns=ATTEMPT_COLUMNS)
+
+    ts = _numeric(events, "ts_ms")
+    stage_all = _numeric(events, "stage_id")
+    keep = ~np.isnan(ts) & ~np.isnan(stage_all)
+    if not keep.all():
+        events = events[keep]
+        ts, stage_all = ts[keep], stage_all[keep]
+    if events.empty:
+        return pd.DataFrame(columns=ATTEMPT_COLUMNS)
+
+    session_codes, session_ids = pd.factorize(events["session_id"].fillna("").to_numpy())
+    ids = events["id"].to_numpy(dtype=np.int64)
+    # every per-row array below is in (session, stage, time, id) order
+    order = np.lexsort((ids, ts, stage_all, session_codes))
+    session = session_codes[order]
+    stage = stage_all[order].astype(np.int64)
+    t = ts[order].astype(np.int64)
+    ids = ids[order]
+    kind = events["event_type"].map(_KIND).fillna(-1).to_numpy(dtype=np.int64)[order]
+    attempt_id = _numeric(events, "attempt_id")[order]
+    n = len(t)
+
+    # ---- attempt boundaries ----
+    new_group = np.r_[True, (session[1:] != session[:-1]) | (stage[1:] != stage[:-1])]
+    known = ~np.isnan(attempt_id)
+    new_attempt_id = np.r_[False, known[1:] & known[:-1] & (attempt_id[1:] != attempt_id[:-1])]
+    boundary = new_group | (kind == _KIND["stage_start"]) | new_attempt_id
+    starts = np.flatnonzero(boundary)
+    ends = np.r_[starts[1:], n] - 1
+    attempt = np.cumsum(boundary) - 1
+    size = len(starts)
+
+    def count(event_type: str) -> np.ndarray:
+        return np.bincount(attempt, weights=kind == _KIND[event_type], minlength=size).astype(np.int64)
+
+    def total(column: str, event_type: str) -> np.ndarray:
+        values = np.nan_to_num(_numeric(events, column)[order]) * (kind == _KIND[event_type])
+        return np.bincount(attempt, weights=values, minlength=size)
+
+    hits, heals, kills = count("player_hit"), count("heal_pickup"), count("enemy_kill")
+    deaths, fails = count("death"), count("fail")
+    wins, quits = count("stage_complete"), count("quit")
+
+    # ---- duration: what the client measured, else the span of the events ----
+    terminal = np.isin(kind, _TERMINAL)
+    reported = np.where(terminal, _numeric(events, "duration_ms")[order], np.nan)
+    duration = np.fmax.reduceat(reported, starts)
+    span = (t[ends] - t[starts]).astype(float)
+    duration = np.where(np.isnan(duration), span, duration)
+
+    # ---- outcome ----
+    last_in_group = np.r_[new_group[starts][1:], True]
+    outcome = np.where(wins > 0, "win",
+              np.where((fails > 0) | (deaths > 0), "fail",
+              np.where(quits > 0, "quit",
+              np.where(last_in_group, "open", "abandoned")))).astype(object)
+
+    # ---- death cause and position: the attempt's last death, else its fail ----
+    is_death = kind == _KIND["death"]
+    cause = events["cause"].to_numpy(dtype=object)[order] if "cause" in events.columns else np.full(n, None, dtype=object)
+    has_cause = pd.notna(cause) & (cause != "")
+    death_cause = _last_per_group(cause, is_death & has_cause, attempt, size)
+    fail_cause = _last_per_group(cause, (kind == _KIND["fail"]) & has_cause, attempt, size)
+    death_cause = np.where(pd.isna(death_cause), fail_cause, death_cause)
+    death_x = _last_per_group(_numeric(events, "x")[order], is_death, attempt, size)
+    death_y = _last_per_group(_numeric(events, "y")[order], is_death, attempt, size)
+
+    def first_known(column: str) -> np.ndarray:
+        if column not in events.columns:
+            return np.full(size, None, dtype=object)
+        values = events[column].to_numpy(dtype=object)[order]
+        return _first_per_group(values, pd.notna(values), attempt, size)
+
+    return pd.DataFrame({
+        "attempt_key": ids[starts],
+        "session_id": session_ids[session[starts]],
+        "user_id": pd.to_numeric(first_known("user_id"), errors="coerce"),
+        "stage_id": stage[starts],
+        "attempt_id": pd.to_numeric(first_known("attempt_id"), errors="coerce"),
+        "difficulty": first_known("difficulty"),
+        "started_ms": t[starts],
+        "ended_ms": t[ends],
+        "duration_ms": duration.round().astype(np.int64),
+        "events": np.diff(np.r_[starts, n]),
+        "hits_taken": hits,
+        "damage_taken": total("damage", "player_hit"),
+        "heals": heals,
+        "heal_amount": total("heal_amount", "heal_pickup"),
+        "kills": kills,
+        "outcome": outcome,
+        "death_cause": death_cause,
+        "death_x": pd.to_numeric(death_x, errors="coerce"),
+        "death_y": pd.to_numeric(death_y, errors="coerce"),
+        "first_event_id": np.minimum.reduceat(ids, starts),
+        "last_event_id": np.maximum.reduceat(ids, starts),
+    }, columns=ATTEMPT_COLUMNS)
+
+
+# ---------- persisted table ----------
+def init_attempt_tables() -> None:
+    db_path = attempts_db_path()
+    columns = query_df("PRAGMA table_info(attempts)", db_path=db_path)
+    if len(columns) and "first_event_id" not in set(columns["name"]):
+        # a table from before first_event_id: it is derived, so rebuild it from scratch
+        execute("DROP TABLE attempts", db_path=db_path)
+        execute("DROP TABLE IF EXISTS attempts_state", db_path=db_path)
+    execute("""
+    CREATE TABLE IF NOT EXISTS attempts (
+        attempt_key INTEGER PRIMARY KEY,
+        session_id TEXT NOT NULL,
+        user_id INTEGER,
+        stage_id INTEGER NOT NULL,
+        attempt_id INTEGER,
+        difficulty TEXT,
+        started_ms INTEGER NOT NULL,
+        ended_ms INTEGER NOT NULL,
+        duration_ms INTEGER,
+        events INTEGER NOT NULL,
+        hits_taken INTEGER NOT NULL,
+        damage_taken REAL NOT NULL,
+        heals INTEGER NOT NULL,
+        heal_amount REAL NOT NULL,
+        kills INTEGER NOT NULL,
+        outcome TEXT NOT NULL,
+        death_cause TEXT,
+        death_x REAL,
+        death_y REAL,
+        first_event_id INTEGER NOT NULL,
+        last_event_id INTEGER NOT NULL
+    )
+    """, db_path=db_path)
+    execute("CREATE INDEX IF NOT EXISTS idx_attempts_group ON attempts(session_id, stage_id, attempt_key)",
+            db_path=db_path)
+    execute("CREATE INDEX IF NOT EXISTS idx_attempts_stage ON attempts(stage_id, difficulty)", db_path=db_path)
+    execute("CREATE TABLE IF NOT EXISTS attempts_state (key TEXT PRIMARY KEY, value INTEGER)", db_path=db_path)
+
+
+def _watermark() -> int:
+    df = query_df("SELECT value FROM attempts_state WHERE key = 'last_event_id'", db_path=attempts_db_path())
+    return int(df["value"].iloc[0]) if len(df) else 0
+
+
+def _stored(sessions: np.ndarray, chunk: int = 500) -> pd.DataFrame:
+    """Where each stored attempt of the given sessions starts, and its smallest event id."""
+    frames = []
+    for i in range(0, len(sessions), chunk):
+        part = [str(s) for s in sessions[i:i + chunk]]
+        marks = ", ".join("?" * len(part))
+        frames.append(query_df(
+            f"SELECT session_id, stage_id, attempt_key, started_ms, first_event_id FROM attempts "
+            f"WHERE session_id IN ({marks})",
+            tuple(part), db_path=attempts_db_path(),
+        ))
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=["session_id", "stage_id", "attempt_key", "started_ms", "first_event_id"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _reopen(new: pd.DataFrame) -> pd.DataFrame:
+    """
+    The stored attempts `new` events can change: per (session, stage), the
+    one the earliest new timestamp falls in (the last to start at or
+    before it; every attempt if none did) and all that start after it.
+    """
+    stored = _stored(new["session_id"].unique())
+    if stored.empty:
+        return stored
+    touched = (new.assign(ts_ms=_numeric(new, "ts_ms"))
+               .groupby(["session_id", "stage_id"], as_index=False)["ts_ms"].min())
+    stored = stored.merge(touched, on=["session_id", "stage_id"])
+    # events without a timestamp are dropped by build_attempts: they can only extend the latest attempt
+    stored["ts_ms"] = stored["ts_ms"].fillna(np.inf)
+    stored = stored.sort_values(["session_id", "stage_id", "started_ms", "attempt_key"], ignore_index=True)
+    before = stored["started_ms"] <= stored["ts_ms"]    # a prefix of each group
+    next_before = before.groupby([stored["session_id"], stored["stage_id"]]).shift(-1, fill_value=False)
+    return stored[~before | ~next_before.astype(bool)]
+
+
+def _store(attempts: pd.DataFrame, replaced: list, last_event_id: int) -> None:
+    frame = attempts[ATTEMPT_COLUMNS].astype(object).where(attempts[ATTEMPT_COLUMNS].notna(), None)
+    marks = ", ".join("?" * len(ATTEMPT_COLUMNS))
+    # one transaction: the watermark moves only with the rows, so a crash in
+    # between just rebuilds (and replaces) the same attempts next time
+    execute_batch([
+        ("DELETE FROM attempts WHERE attempt_key = ?", [(int(key),) for key in replaced]),
+        (f"INSERT OR REPLACE INTO attempts ({', '.join(ATTEMPT_COLUMNS)}) VALUES ({marks})",
+         frame.itertuples(index=False, name=None)),
+        ("INSERT OR REPLACE INTO attempts_state (key, value) VALUES ('last_event_id', ?)",
+         [(int(last_event_id),)]),
+    ], db_path=attempts_db_path())
+
+
+_refresh_lock = threading.Lock()
+
+
+def refresh() -> int:
+    """Bring the attempts table up to date with telemetry_events; returns the number of attempts written."""
+    with _refresh_lock:
+        init_attempt_tables()
+        last_id = _watermark()
+        written = 0
+        # chunk by chunk, each folded in like the events of a separate refresh
+        for new in load_event_chunks(after_id=last_id):
+            if new.empty:
+                continue
+            written += _fold(new, last_id)
+            last_id = int(new["id"].max())
+        return written
+
+
+def _reopened_events(reopened: pd.DataFrame, last_id: int) -> pd.DataFrame:
+    """The stored events of the reopened attempts: each group's from where its first reopened attempt starts."""
+    bounds = (reopened.groupby(["session_id", "stage_id"], as_index=False)
+              .first()[["session_id", "stage_id", "started_ms", "attempt_key"]])
+    parts = []
+    for old in load_event_chunks(after_id=int(reopened["first_event_id"].min()) - 1, upto_id=last_id):
+        old = old.merge(bounds, on=["session_id", "stage_id"])
+        ts = _numeric(old, "ts_ms")
+        later = (ts > old["started_ms"]) | ((ts == old["started_ms"]) & (old["id"] >= old["attempt_key"]))
+        if later.any():
+            parts.append(old[later].drop(columns=["started_ms", "attempt_key"]))
+    return _concat(parts)
+
+
+def _fold(new: pd.DataFrame, last_id: int) -> int:
+    """Rebuild the attempts `new` events (all past last_id) touch, store them, move the watermark."""
+    reopened = _reopen(new)
+    events = _concat([_reopened_events(reopened, last_id), new]) if len(reopened) else new
+    attempts = build_attempts(events)
+    _store(attempts, reopened["attempt_key"].tolist(), int(new["id"].max()))
+    return len(attempts)
+
+
+def load_attempts(difficulty: Optional[str] = None) -> pd.DataFrame:
+    """The stored attempts table (without refreshing it)."""
+    sql = f"SELECT {', '.join(ATTEMPT_COLUMNS)} FROM attempts"
+    params: tuple = ()
+    if difficulty:
+        sql += " WHERE difficulty = ?"
+        params = (difficulty,)
+    try:
+        df = query_df(sql + " ORDER BY attempt_key", params, db_path=attempts_db_path())
+    except Exception:  # not built yet
+        return pd.DataFrame(columns=ATTEMPT_COLUMNS)
+    if not len(df.columns):
+        return pd.DataFrame(columns=ATTEMPT_COLUMNS)
+    # a REAL column SQLite returns only NULLs for comes back as object: NaN, as build_attempts has it
+    for column in _NULLABLE_REAL_COLUMNS:
+        df[column] = pd.to_numeric(df[column])
+    return df
+
+
+def attempt_summary(attempts: pd.DataFrame) -> pd.DataFrame:
+    """Per-stage attempt outcomes and per-attempt means."""
+    cols = ["stage_id", "attempts", "wins", "fails", "quits", "abandoned", "open", "win_rate",
+            "median_duration_s", "hits_per_attempt", "damage_per_attempt", "heals_per_attempt",
+            "kills_per_attempt"]
+    if attempts is None or attempts.empty:
+        return pd.DataFrame(columns=cols)
+
+    g = attempts.groupby("stage_id", sort=True)
+    outcomes = pd.crosstab(attempts["stage_id"], attempts["outcome"]).reindex(columns=OUTCOMES, fill_value=0)
+    out = pd.DataFrame({
+        "attempts": g.size(),
+        "wins": outcomes["win"],
+        "fails": outcomes["fail"],
+        "quits": outcomes["quit"],
+        "abandoned": outcomes["abandoned"],
+        "open": outcomes["open"],
+        "median_duration_s": (g["duration_ms"].median() / 1000).round(1),
+        "hits_per_attempt": g["hits_taken"].mean().round(2),
+        "damage_per_attempt": g["damage_taken"].mean().round(2),
+        "heals_per_attempt": g["heals"].mean().round(2),
+        "kills_per_attempt": g["kills"].mean().round(2),
+    })
+    ended = out["wins"] + out["fails"] + out["quits"] + out["abandoned"]
+    out["win_rate"] = (out["wins"] / ended.replace(0, np.nan)).round(4)
+    return out.reset_index()[cols]
+
+
+if __name__ == "__main__":
+    written = refresh()
+    print(f"attempts: {written} rebuilt, watermark {_watermark()} ({attempts_db_path()})")
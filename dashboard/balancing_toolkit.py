@@ -8,6 +8,7 @@ from typing import Dict, Any, List, Tuple, Optional
 import pandas as pd
 
 from .db import execute
+from .instrumentation import COMPUTE_SECONDS, timed
 
 # ---------- DB INIT ----------
 def init_balancing_tables() -> None:
@@ -174,6 +175,29 @@ def _lognormal_params_from_median(median: float, sigma: float) -> Tuple[float, f
     mu = math.log(max(median, 1.0))
     return mu, sigma
 
+# Combat stats and pacing/variance knobs of the attempt model. These are
+# the uncalibrated defaults: dashboard/calibration.py fits the tunable
+# ones per stage/difficulty from the attempts table, and run_simulation
+# takes the fitted values through `constants`.
+SIM_CONSTANTS: Dict[str, float] = {
+    "PLAYER_MAX_HP": 50.0,
+    "PLAYER_BASE_DMG": 7.0,
+    "ARCHER_HP": 15.0,
+    "GOBLIN_HP": 30.0,
+    "ARCHER_DMG": 5.0,
+    "GOBLIN_DMG": 8.0,
+    "OVERHEAD_FRAC": 0.20,     # non-combat time fraction
+    "PLAYER_HPS": 1.5,         # player hits per second
+    "ENEMY_HPS": 0.6,          # enemy attacks per second
+    "EXPOSURE": 0.4,           # % damage that lands
+    "SKILL_SIGMA": 0.18,       # player-to-player variability
+    "DMG_NOISE_SIGMA": 0.30,   # attempt-to-attempt variability
+    "HP_BUFFER_MIN": 0.90,     # effective HP buffer range
+    "HP_BUFFER_MAX": 1.10,
+}
+
+
+@timed(COMPUTE_SECONDS)
 def run_simulation(
     funnel: pd.DataFrame,
     tdf: pd.DataFrame,
@@ -182,6 +206,7 @@ def run_simulation(
     seed: int = 123,
     stage_id: int | None = None,
     n_enemies: int = 15,
+    constants: Optional[Dict[str, float]] = None,
 ) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
     Combat stats:
@@ -197,17 +222,11 @@ def run_simulation(
       - Exposure factor models parry/block/dodge.
       - Each attempt fails if sampled damage >= sampled effective HP buffer.
       - After each fail, player may quit with probability p_quit derived from telemetry dropoff_rate.
+
+    `constants` overrides entries of SIM_CONSTANTS (e.g. a calibrated set).
     """
     import random
 
-    def _sigmoid(x: float) -> float:
-        # stable-ish sigmoid
-        if x >= 0:
-            z = math.exp(-x)
-            return 1.0 / (1.0 + z)
-        z = math.exp(x)
-        return z / (1.0 + z)
-
     def _lognormal(median: float, sigma: float, rng: random.Random) -> float:
         mu = math.log(max(median, 1.0))
         return math.exp(rng.gauss(mu, sigma))
@@ -247,24 +266,24 @@ def run_simulation(
     # Quit probability after each fail
     p_quit = max(0.02, min(0.12, base_drop * 0.4))
 
-    # Combat stats 
-    PLAYER_MAX_HP = 50.0
-    PLAYER_BASE_DMG = 7.0
-
-    ARCHER_HP = 15.0
-    GOBLIN_HP = 30.0
-    ARCHER_DMG = 5.0
-    GOBLIN_DMG = 8.0
-
-    # Pacing/variance knobs
-    OVERHEAD_FRAC = 0.20     # non-combat time fraction
-    PLAYER_HPS = 1.5         # player hits per second
-    ENEMY_HPS = 0.6         # enemy attacks per second
-    EXPOSURE = 0.4          # % damage that lands
-    SKILL_SIGMA = 0.18       # player-to-player variability
-    DMG_NOISE_SIGMA = 0.30   # attempt-to-attempt variability
-    HP_BUFFER_MIN = 0.90     # effective HP buffer range
-    HP_BUFFER_MAX = 1.10
+    # Combat stats and pacing/variance knobs
+    c = {**SIM_CONSTANTS, **(constants or {})}
+    PLAYER_MAX_HP = float(c["PLAYER_MAX_HP"])
+    PLAYER_BASE_DMG = float(c["PLAYER_BASE_DMG"])
+
+    ARCHER_HP = float(c["ARCHER_HP"])
+    GOBLIN_HP = float(c["GOBLIN_HP"])
+    ARCHER_DMG = float(c["ARCHER_DMG"])
+    GOBLIN_DMG = float(c["GOBLIN_DMG"])
+
+    OVERHEAD_FRAC = float(c["OVERHEAD_FRAC"])
+    PLAYER_HPS = float(c["PLAYER_HPS"])
+    ENEMY_HPS = float(c["ENEMY_HPS"])
+    EXPOSURE = float(c["EXPOSURE"])
+    SKILL_SIGMA = float(c["SKILL_SIGMA"])
+    DMG_NOISE_SIGMA = float(c["DMG_NOISE_SIGMA"])
+    HP_BUFFER_MIN = float(c["HP_BUFFER_MIN"])
+    HP_BUFFER_MAX = float(c["HP_BUFFER_MAX"])
 
     # Enemy counts (even split-ish)
     N_TOTAL = int(n_enemies)
@@ -276,7 +295,6 @@ def run_simulation(
         base_overhead_ms = 500.0  # avoid degenerate overhead
 
     run_rows: List[Dict[str, Any]] = []
-    attempt_fail_estimates: List[float] = []
 
     for r in range(int(n_runs)):
         # Player skill multiplier (affects outgoing DPS and implicitly reduces exposure a bit)
@@ -325,12 +343,6 @@ def run_simulation(
             # Determine fail
             failed = damage >= hp_buffer
 
-            # Derive a smooth fail-prob estimate for reporting/charts
-            # ratio = 0 means damage equals HP; >0 means likely fail.
-            ratio = (damage - PLAYER_MAX_HP) / max(1e-6, PLAYER_MAX_HP)
-            p_fail_est = _sigmoid(4.0 * ratio)   # 4.0 controls steepness
-            attempt_fail_estimates.append(float(p_fail_est))
-
             # Time accounting: overhead + combat time
             combat_s = (N_ARCHERS * t_archer) + (N_GOBLINS * t_goblin)
             combat_ms = combat_s * 1000.0
@@ -358,7 +370,8 @@ def run_simulation(
 
     runs_df = pd.DataFrame(run_rows)
 
-    pred_attempt_fail_rate = float(sum(attempt_fail_estimates) / max(1, len(attempt_fail_estimates)))
+    # share of simulated attempts that failed (the quantity calibration matches to telemetry)
+    pred_attempt_fail_rate = float(runs_df["fails_total"].sum() / max(1, runs_df["attempts"].sum()))
     stage_df = pd.DataFrame([{
         "stage_id": stage_id,
         "pred_attempt_fail_rate": pred_attempt_fail_rate,
@@ -382,6 +395,7 @@ def build_reach_curve(runs_df: pd.DataFrame) -> pd.DataFrame:
     ys = [(runs_df["stage_reached"] >= k).mean() for k in xs]
     return pd.DataFrame({"stage": xs, "reach_rate": ys})
 
+@timed(COMPUTE_SECONDS)
 def compare_simulations(
     funnel: pd.DataFrame,
     tdf: pd.DataFrame,
@@ -390,6 +404,7 @@ def compare_simulations(
     seed: int,
     stage_id: int | None = None,
     n_enemies: int = 15,
+    constants: Optional[Dict[str, float]] = None,
 ) -> Dict[str, pd.DataFrame]:
     """
     ONE-STAGE baseline vs proposed comparison.
@@ -400,11 +415,11 @@ def compare_simulations(
     """
     base_runs, base_stage = run_simulation(
         funnel, tdf, DEFAULT_PARAMS,
-        n_runs=n_runs, seed=seed, stage_id=stage_id, n_enemies=n_enemies
+        n_runs=n_runs, seed=seed, stage_id=stage_id, n_enemies=n_enemies, constants=constants
     )
     prop_runs, prop_stage = run_simulation(
         funnel, tdf, proposed_params,
-        n_runs=n_runs, seed=seed, stage_id=stage_id, n_enemies=n_enemies
+        n_runs=n_runs, seed=seed, stage_id=stage_id, n_enemies=n_enemies, constants=constants
     )
 
     # --- Stage chart frames (attempt fail rate + run time) ---
@@ -0,0 +1,332 @@
+"""
+Calibration of the balancing simulator's constants from telemetry.
+
+run_simulation's attempt model has knobs that were picked by hand
+(SIM_CONSTANTS in balancing_toolkit). This module fits the ones the
+attempts table can pin down, per stage and difficulty, by the method of
+moments:
+
+- ARCHER_DMG / GOBLIN_DMG: scaled together so the damage of a landed
+  hit matches the observed damage per player_hit (closed form)
+- PLAYER_HPS: median duration of won attempts (sets time-to-kill)
+- SKILL_SIGMA: spread (IQR of log duration) of won attempts
+- EXPOSURE and DMG_NOISE_SIGMA: fail rate and hits taken per attempt
+
+Only the product EXPOSURE * ENEMY_HPS is identified by these moments,
+so ENEMY_HPS keeps its default and EXPOSURE absorbs the fit. The same
+goes for enemy HP against PLAYER_HPS.
+
+The moments are evaluated on a vectorized copy of run_simulation's
+attempt model over a fixed set of random draws (common random numbers),
+so every moment is a smooth, monotone function of the parameter being
+solved for and plain bisection finds it. EXPOSURE is solved for every
+DMG_NOISE_SIGMA on a grid at once ((grid, draws) arrays), and the noise
+level whose hits-per-attempt is closest to the observed one wins.
+
+Fits are stored in `sim_calibration` (next to the attempts table) with
+the number of attempts they used. calibrate() only re-fits a stage /
+difficulty once it has grown by CALIBRATION_REFIT_GROWTH, warm-started
+from the stored fit.
+"""
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .attempts import attempts_db_path
+from .balancing_toolkit import SIM_CONSTANTS
+from .db import execute, query_df
+from .instrumentation import COMPUTE_SECONDS, timed
+
+FITTED = ("ARCHER_DMG", "GOBLIN_DMG", "PLAYER_HPS", "SKILL_SIGMA", "EXPOSURE", "DMG_NOISE_SIGMA")
+
+MIN_ATTEMPTS = int(os.environ.get("CALIBRATION_MIN_ATTEMPTS", "30"))
+REFIT_GROWTH = float(os.environ.get("CALIBRATION_REFIT_GROWTH", "0.10"))
+N_DRAWS = int(os.environ.get("CALIBRATION_DRAWS", "8000"))
+MIN_WINS = 5                     # fewer won attempts say nothing about durations
+
+N_ENEMIES = 15                   # what the balancing tab simulates
+OVERHEAD_SIGMA = 0.35            # run_simulation's overhead lognormal
+NOISE_GRID = np.linspace(0.05, 1.0, 20)
+ALL_DIFFICULTIES = ""            # difficulty key of the all-difficulties fit
+
+
+@dataclass
+class Draws:
+    """Standard-normal / uniform draws shared by every evaluation of the model."""
+    skill: np.ndarray
+    noise: np.ndarray
+    buffer: np.ndarray
+    overhead: np.ndarray
+
+
+def make_draws(n: int = N_DRAWS, seed: int = 0) -> Draws:
+    rng = np.random.default_rng(seed)
+    return Draws(rng.standard_normal(n), rng.standard_normal(n), rng.random(n), rng.standard_normal(n))
+
+
+def simulate_attempts(constants: Dict[str, float], draws: Draws, median_ms: float = 60_000.0,
+                      n_enemies: int = N_ENEMIES, noise_sigma=None, exposure=None) -> Dict[str, np.ndarray]:
+    """
+    One attempt per draw, with run_simulation's formulas (default tuning).
+    noise_sigma / exposure may be (k, 1) arrays to evaluate k settings at
+    once; the outputs then have shape (k, draws).
+    """
+    c = {**SIM_CONSTANTS, **constants}
+    n_archers = n_enemies // 2
+    n_goblins = n_enemies - n_archers
+
+    skill = np.clip(np.exp(c["SKILL_SIGMA"] * draws.skill), 0.60, 1.80)
+    player_dps = np.maximum(0.5, c["PLAYER_BASE_DMG"] * skill) * c["PLAYER_HPS"]
+    t_archer = c["ARCHER_HP"] / np.maximum(0.1, player_dps)
+    t_goblin = c["GOBLIN_HP"] / np.maximum(0.1, player_dps)
+    combat_s = n_archers * t_archer + n_goblins * t_goblin
+
+    sigma = c["DMG_NOISE_SIGMA"] if noise_sigma is None else noise_sigma
+    expo = c["EXPOSURE"] if exposure is None else exposure
+    landed = expo * c["ENEMY_HPS"] * np.exp(sigma * draws.noise)
+    attacks = landed * combat_s
+    damage = landed * (n_archers * t_archer * c["ARCHER_DMG"] + n_goblins * t_goblin * c["GOBLIN_DMG"])
+
+    hp_buffer = c["PLAYER_MAX_HP"] * (c["HP_BUFFER_MIN"] + (c["HP_BUFFER_MAX"] - c["HP_BUFFER_MIN"]) * draws.buffer)
+    failed = damage >= hp_buffer
+    # a failed attempt ends at the death: only the hits up to then are seen
+    hits = np.where(failed, attacks * hp_buffer / np.maximum(damage, 1e-9), attacks)
+
+    overhead_ms = max(500.0, median_ms * c["OVERHEAD_FRAC"]) * np.exp(OVERHEAD_SIGMA * draws.overhead)
+    return {
+        "failed": failed,
+        "hits": hits,
+        "damage": damage,
+        "duration_ms": overhead_ms + combat_s * 1000.0,
+    }
+
+
+def _log_iqr(values: np.ndarray) -> float:
+    if len(values) < 4:
+        return float("nan")
+    q25, q75 = np.percentile(np.log(values), [25, 75])
+    return float(q75 - q25)
+
+
+def model_moments(constants: Dict[str, float], draws: Draws, median_ms: float) -> Dict[str, float]:
+    sim = simulate_attempts(constants, draws, median_ms)
+    won = sim["duration_ms"][~sim["failed"]]
+    return {
+        "fail_rate": float(sim["failed"].mean()),
+        "hits_per_attempt": float(sim["hits"].mean()),
+        "median_win_ms": float(np.median(won)) if len(won) else float("nan"),
+        "win_log_iqr": _log_iqr(won),
+    }
+
+
+# ---------- observed moments ----------
+def observed_moments(attempts: pd.DataFrame) -> pd.DataFrame:
+    """
+    Moments per (stage_id, difficulty) from the attempts table, plus an
+    all-difficulties row per stage (difficulty ALL_DIFFICULTIES). Only
+    attempts that ended in a win or a fail count.
+    """
+    cols = ["stage_id", "difficulty", "attempts", "wins", "fail_rate", "hits_per_attempt",
+            "damage_per_hit", "median_win_ms", "win_log_iqr"]
+    if attempts is None or attempts.empty:
+        return pd.DataFrame(columns=cols)
+    ended = attempts[attempts["outcome"].isin(["win", "fail"])]
+    if ended.empty:
+        return pd.DataFrame(columns=cols)
+
+    ended = pd.concat([
+        ended.assign(difficulty=ended["difficulty"].fillna("unknown")),
+        ended.assign(difficulty=ALL_DIFFICULTIES),
+    ], ignore_index=True)
+    ended = ended.assign(
+        won=ended["outcome"] == "win",
+        win_log_ms=np.log(ended["duration_ms"].where((ended["outcome"] == "win") & (ended["duration_ms"] > 0))),
+    )
+    g = ended.groupby(["stage_id", "difficulty"], sort=True)
+    out = pd.DataFrame({
+        "attempts": g.size(),
+        "wins": g["won"].sum(),
+        # no player_hit at all means the client didn't report hits, not a flawless stage
+        "hits_per_attempt": g["hits_taken"].mean().where(g["hits_taken"].sum() > 0),
+        "damage_per_hit": g["damage_taken"].sum() / g["hits_taken"].sum().replace(0, np.nan),
+        "median_win_ms": np.exp(g["win_log_ms"].median()),
+        "win_log_iqr": g["win_log_ms"].quantile(0.75) - g["win_log_ms"].quantile(0.25),
+    })
+    out["fail_rate"] = 1.0 - out["wins"] / out["attempts"]
+    out[["median_win_ms", "win_log_iqr"]] = out[["median_win_ms", "win_log_iqr"]].where(out["wins"] >= MIN_WINS)
+    return out.reset_index()[cols]
+
+
+# ---------- fitting ----------
+def _bisect(f, target: float, lo: float, hi: float, increasing: bool = True,
+            log: bool = False, iters: int = 30):
+    """
+    Solve f(x) = target for a monotone f, elementwise over array bounds.
+    Targets outside f's range end at the nearer bound.
+    """
+    lo, hi = np.asarray(lo, dtype=float), np.asarray(hi, dtype=float)
+    for _ in range(iters):
+        mid = np.sqrt(lo * hi) if log else (lo + hi) / 2
+        below = f(mid) < target
+        go_up = below if increasing else ~below
+        lo, hi = np.where(go_up, mid, lo), np.where(go_up, hi, mid)
+    return np.sqrt(lo * hi) if log else (lo + hi) / 2
+
+
+@timed(COMPUTE_SECONDS)
+def fit_stage(observed: Dict[str, float], draws: Optional[Draws] = None,
+              start: Optional[Dict[str, float]] = None, max_rounds: int = 12,
+              tol: float = 1e-3) -> Dict[str, float]:
+    """
+    Fitted FITTED constants for one row of observed_moments (see the
+    module docstring). The parameters are solved in turn, round after
+    round, until no fitted value moves by more than `tol` (relative).
+    """
+    draws = draws or make_draws()
+    c = {**SIM_CONSTANTS, **(start or {})}
+    median_ms = float(observed.get("median_win_ms") or float("nan"))
+    have_time = np.isfinite(median_ms) and median_ms > 0
+    fail_rate = float(observed.get("fail_rate", float("nan")))
+    hits = float(observed.get("hits_per_attempt", float("nan")))
+
+    # damage per landed hit doesn't depend on anything else: closed form
+    dph = float(observed.get("damage_per_hit", float("nan")))
+    if np.isfinite(dph) and dph > 0:
+        n_arch = N_ENEMIES // 2
+        w_arch, w_gob = n_arch * SIM_CONSTANTS["ARCHER_HP"], (N_ENEMIES - n_arch) * SIM_CONSTANTS["GOBLIN_HP"]
+        model_dph = (w_arch * SIM_CONSTANTS["ARCHER_DMG"] + w_gob * SIM_CONSTANTS["GOBLIN_DMG"]) / (w_arch + w_gob)
+        scale = dph / model_dph
+        c["ARCHER_DMG"] = SIM_CONSTANTS["ARCHER_DMG"] * scale
+        c["GOBLIN_DMG"] = SIM_CONSTANTS["GOBLIN_DMG"] * scale
+    base_ms = median_ms if have_time else 60_000.0
+
+    def won_durations(constants):
+        sim = simulate_attempts(constants, draws, base_ms)
+        won = sim["duration_ms"][~sim["failed"]]
+        return won if len(won) else sim["duration_ms"]
+
+    for _ in range(max_rounds):
+        before = np.array([c[k] for k in FITTED], dtype=float)
+        if np.isfinite(fail_rate):
+            grid = NOISE_GRID[:, None]
+            exposure = _bisect(
+                lambda e: simulate_attempts(c, draws, base_ms, noise_sigma=grid, exposure=e[:, None])["failed"].mean(axis=1),
+                fail_rate, np.full(len(NOISE_GRID), 1e-3), np.full(len(NOISE_GRID), 10.0), log=True)
+            if np.isfinite(hits):
+                model_hits = simulate_attempts(c, draws, base_ms, noise_sigma=grid,
+                                               exposure=exposure[:, None])["hits"].mean(axis=1)
+                best = int(np.argmin(np.abs(model_hits - hits)))
+            else:
+                best = int(np.argmin(np.abs(NOISE_GRID - c["DMG_NOISE_SIGMA"])))
+            c["EXPOSURE"] = float(exposure[best])
+            c["DMG_NOISE_SIGMA"] = float(NOISE_GRID[best])
+
+        if have_time:
+            c["PLAYER_HPS"] = float(_bisect(
+                lambda v: np.median(won_durations({**c, "PLAYER_HPS": float(v)})),
+                median_ms, 0.05, 50.0, increasing=False, log=True))
+            iqr = float(observed.get("win_log_iqr", float("nan")))
+            if np.isfinite(iqr):
+                c["SKILL_SIGMA"] = float(_bisect(
+                    lambda v: _log_iqr(won_durations({**c, "SKILL_SIGMA": float(v)})),
+                    iqr, 0.0, 1.0))
+
+        after = np.array([c[k] for k in FITTED], dtype=float)
+        if np.all(np.abs(after - before) <= tol * np.maximum(np.abs(before), 1e-9)):
+            break
+
+    return {k: round(float(c[k]), 6) for k in FITTED}
+
+
+# ---------- cached fits ----------
+def init_calibration_table() -> None:
+    execute("""
+    CREATE TABLE IF NOT EXISTS sim_calibration (
+        stage_id INTEGER NOT NULL,
+        difficulty TEXT NOT NULL,
+        attempts INTEGER NOT NULL,
+        constants_json TEXT NOT NULL,
+        observed_json TEXT NOT NULL,
+        fitted_json TEXT NOT NULL,
+        fitted_at TEXT NOT NULL,
+        PRIMARY KEY (stage_id, difficulty)
+    )
+    """, db_path=attempts_db_path())
+
+
+def load_calibration() -> pd.DataFrame:
+    cols = ["stage_id", "difficulty", "attempts", "constants_json", "observed_json", "fitted_json", "fitted_at"]
+    try:
+        df = query_df(f"SELECT {', '.join(cols)} FROM sim_calibration ORDER BY stage_id, difficulty",
+                      db_path=attempts_db_path())
+    except Exception:  # nothing fitted yet
+        return pd.DataFrame(columns=cols)
+    return df if len(df.columns) else pd.DataFrame(columns=cols)
+
+
+def _clean(moments: Dict[str, float]) -> Dict[str, Optional[float]]:
+    return {k: (None if v is None or not np.isfinite(v) else round(float(v), 6)) for k, v in moments.items()}
+
+
+def calibrate(attempts: pd.DataFrame, force: bool = False, draws: Optional[Draws] = None,
+              only: Optional[Iterable[Tuple[int, str]]] = None) -> pd.DataFrame:
+    """
+    Fit every stage/difficulty (or just the (stage_id, difficulty) keys in
+    `only`) with at least MIN_ATTEMPTS ended attempts whose stored fit is
+    missing or has been outgrown by REFIT_GROWTH; returns the stored fits.
+    """
+    init_calibration_table()
+    stored = load_calibration()
+    previous = {(int(r.stage_id), r.difficulty): r for r in stored.itertuples(index=False)}
+    draws = draws or make_draws()
+
+    moments = observed_moments(attempts)
+    wanted = None if only is None else {(int(stage), difficulty or ALL_DIFFICULTIES) for stage, difficulty in only}
+    for row in moments[moments["attempts"] >= MIN_ATTEMPTS].itertuples(index=False):
+        key = (int(row.stage_id), row.difficulty)
+        if wanted is not None and key not in wanted:
+            continue
+        old = previous.get(key)
+        if not force and old is not None and row.attempts < old.attempts * (1 + REFIT_GROWTH):
+            continue
+        observed = {k: float(getattr(row, k)) for k in
+                    ("fail_rate", "hits_per_attempt", "damage_per_hit", "median_win_ms", "win_log_iqr")}
+        # a re-fit starts from the previous solution and converges in a round or two
+        start = json.loads(old.constants_json) if old is not None else None
+        constants = fit_stage(observed, draws, start=start)
+        base_ms = observed["median_win_ms"] if np.isfinite(observed["median_win_ms"]) else 60_000.0
+        fitted = model_moments(constants, draws, base_ms)
+        execute(
+            """INSERT OR REPLACE INTO sim_calibration
+               (stage_id, difficulty, attempts, constants_json, observed_json, fitted_json, fitted_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (key[0], key[1], int(row.attempts), json.dumps(constants), json.dumps(_clean(observed)),
+             json.dumps(_clean(fitted)), datetime.now(timezone.utc).isoformat(timespec="seconds")),
+            db_path=attempts_db_path(),
+        )
+    return load_calibration()
+
+
+def constants_for(fits: pd.DataFrame, stage_id: int, difficulty: Optional[str]) -> Optional[Dict[str, float]]:
+    """Fitted constants for a stage (all difficulties when difficulty is empty), or None."""
+    if fits is None or fits.empty:
+        return None
+    hit = fits[(fits["stage_id"] == int(stage_id)) & (fits["difficulty"] == (difficulty or ALL_DIFFICULTIES))]
+    if hit.empty:
+        return None
+    return json.loads(hit["constants_json"].iloc[0])
+
+
+if __name__ == "__main__":
+    from .attempts import load_attempts, refresh
+
+    refresh()
+    fits = calibrate(load_attempts(), force=True)
+    for r in fits.itertuples(index=False):
+        print(f"stage {r.stage_id} [{r.difficulty or 'all'}] n={r.attempts}: {r.constants_json}")
+        print(f"    observed {r.observed_json}\n    fitted   {r.fitted_json}")
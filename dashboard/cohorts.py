@@ -0,0 +1,466 @@
+"""
+Cohort and retention analytics.
+
+Events are loaded as plain columns (SQLite parses the timestamps, and
+json_extract pulls difficulty and character out of event_data, so there
+is no per-row parsing in Python), sorted once by (user, time), and every
+per-player and per-session figure is then computed from that order with
+numpy: boundaries where the user changes, gaps that start a session,
+reduceat over the slices. There are no per-user Python loops.
+
+Per player:
+- cohort_week: Monday of the week the player was first seen (UTC)
+- character / difficulty: first value the player recorded
+- sessions: runs of events with no gap longer than SESSION_GAP_MINUTES
+- depth: highest stage completed (0 = none)
+- d1 / d7: seen again exactly 1 / 7 days after the first-seen day.
+  A player only counts toward a day-N rate once day N has been observed
+  (`d1_eligible` / `d7_eligible`), so the newest cohorts aren't shown
+  as churned.
+
+`players()` is cached per UTC day: retention is a daily metric, and
+the dashboard only rebuilds it the first time it is asked for each day.
+Events are read in chunks (DASH_MEMORY_MB, see db.chunk_rows) and folded
+into per-player partials (PlayerRollup) that are kept between rebuilds
+(EventLog), so a rebuild only reads the rows added since the previous
+one and never holds more than one chunk of events.
+"""
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .db import chunk_rows, get_db_path, query_chunks
+
+SESSION_GAP_MINUTES = float(os.environ.get("SESSION_GAP_MINUTES", "30"))
+_DAY_MS = 86_400_000
+
+COHORT_DIMENSIONS = {
+    "cohort_week": "First-seen week",
+    "character": "Character",
+    "difficulty": "Difficulty",
+}
+
+# Everything per row is resolved by SQLite in C: the timestamp as epoch
+# milliseconds (julianday understands our ISO forms, offsets and 'Z'
+# included; naive times are UTC), the completed stage, and the attributes
+# pulled out of event_data with empty strings turned into NULL.
+EVENTS_SQL = """
+SELECT id,
+       user_id,
+       CAST(round((julianday(timestamp) - 2440587.5) * 86400000) AS INTEGER) AS ts_ms,
+       CASE WHEN event_type = 'stage_complete' THEN stage_number ELSE 0 END AS completed_stage,
+       NULLIF(json_extract(event_data, '$.difficulty'), '') AS difficulty,
+       NULLIF(json_extract(event_data, '$.character'), '') AS character
+FROM telemetry_events
+WHERE user_id IS NOT NULL AND id > ?
+ORDER BY id
+"""
+
+
+def prepare_events(raw: pd.DataFrame) -> pd.DataFrame:
+    """Same columns as EVENTS_SQL, from a frame of raw telemetry_events columns."""
+    ts = pd.to_datetime(raw["timestamp"], utc=True, errors="coerce", format="ISO8601")
+    stage = pd.to_numeric(raw["stage_number"], errors="coerce").fillna(0)
+    out = pd.DataFrame({
+        "user_id": raw["user_id"],
+        "ts_ms": (ts.astype("int64") // 10**6).where(ts.notna()),
+        "completed_stage": stage.where(raw["event_type"] == "stage_complete", 0),
+    })
+    for column in ("difficulty", "character"):
+        values = raw[column] if column in raw.columns else pd.Series(None, index=raw.index, dtype=object)
+        out[column] = values.where(values != "")
+    return out
+
+
+PLAYERS_COLUMNS = ["user_id", "first_seen", "last_seen", "cohort_week", "character", "difficulty",
+                   "events", "sessions", "active_days", "depth", "d1_eligible", "d1", "d7_eligible", "d7"]
+
+
+def _sort_order(user: np.ndarray, ts_ms: np.ndarray) -> np.ndarray:
+    """Row order by (user, time): one argsort of a packed int64 key, lexsort if it wouldn't fit."""
+    t0 = ts_ms.min()
+    span = int(ts_ms.max() - t0) + 1
+    if span * (int(user.max()) + 1) < 2**62:
+        return np.argsort(user.astype(np.int64) * span + (ts_ms - t0), kind="stable")
+    return np.lexsort((ts_ms, user))
+
+
+def _first_per_group(values: np.ndarray, present: np.ndarray, order: np.ndarray,
+                     starts: np.ndarray) -> np.ndarray:
+    """
+    First present value of each group, rows taken in `order` (groups
+    start at `starts` in that order); None where a group has none.
+    Only the boolean mask is reordered; values are read for the winners.
+    """
+    out = np.full(len(starts), None, dtype=object)
+    idx = np.flatnonzero(present[order])
+    if len(idx):
+        group = np.searchsorted(starts, idx, side="right") - 1
+        first = np.r_[True, group[1:] != group[:-1]]
+        out[group[first]] = values[order[idx[first]]]
+    return out
+
+
+def build_players(events: pd.DataFrame, as_of: Optional[pd.Timestamp] = None,
+                  session_gap_minutes: float = SESSION_GAP_MINUTES) -> pd.DataFrame:
+    """
+    One row per player (see the module docstring) from EVENTS_SQL-shaped
+    events: user_id, ts_ms, completed_stage, difficulty, character.
+    """
+    columns = PLAYERS_COLUMNS
+    if events is None or events.empty:
+        return pd.DataFrame(columns=columns)
+
+    keep = events["ts_ms"].notna().to_numpy() & events["user_id"].notna().to_numpy()
+    if not keep.all():
+        events = events[keep]
+    if events.empty:
+        return pd.DataFrame(columns=columns)
+
+    ts_ms = events["ts_ms"].to_numpy(dtype=np.int64)
+    user_codes, user_ids = pd.factorize(events["user_id"].to_numpy())
+    # every per-row array below is in (user, time) order
+    order = _sort_order(user_codes, ts_ms)
+    user = user_codes[order]
+    t = ts_ms[order]
+    n = len(t)
+
+    # ---- player boundaries ----
+    new_user = np.r_[True, user[1:] != user[:-1]]
+    starts = np.flatnonzero(new_user)
+    ends = np.r_[starts[1:], n] - 1
+    first_ms, last_ms = t[starts], t[ends]
+
+    # ---- sessions: a new user or a long gap starts one ----
+    gap = np.r_[True, np.diff(t) > session_gap_minutes * 60_000]
+    sessions = np.add.reduceat((new_user | gap).astype(np.int64), starts)
+
+    # ---- active days and day-N returns ----
+    day = t // _DAY_MS
+    first_day = first_ms // _DAY_MS
+    day_rows = np.flatnonzero(new_user | np.r_[True, day[1:] != day[:-1]])
+    player_of_day = np.searchsorted(starts, day_rows, side="right") - 1
+    offset = day[day_rows] - first_day[player_of_day]
+    active_days = np.bincount(player_of_day, minlength=len(starts))
+    returned_d1 = np.zeros(len(starts), dtype=bool)
+    returned_d7 = np.zeros(len(starts), dtype=bool)
+    returned_d1[player_of_day[offset == 1]] = True
+    returned_d7[player_of_day[offset == 7]] = True
+
+    as_of_day = (pd.Timestamp(as_of).value // 10**6 if as_of is not None else t.max()) // _DAY_MS
+    d1_eligible = first_day + 1 <= as_of_day
+    d7_eligible = first_day + 7 <= as_of_day
+
+    # ---- progression depth: highest completed stage ----
+    completed = pd.to_numeric(events["completed_stage"], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+    depth = np.maximum.reduceat(completed[order], starts)
+
+    # ---- first recorded attributes ----
+    attrs = {}
+    for column in ("character", "difficulty"):
+        values = events[column]
+        first = _first_per_group(values.to_numpy(dtype=object), values.notna().to_numpy(), order, starts)
+        attrs[column] = pd.Series(first, dtype=object).fillna("unknown").to_numpy()
+
+    # Monday of the first-seen week (1970-01-01 was a Thursday)
+    week = (first_day - (first_day + 3) % 7).astype("datetime64[D]").astype(str)
+
+    return pd.DataFrame({
+        "user_id": user_ids[user[starts]],
+        "first_seen": pd.to_datetime(first_ms, unit="ms", utc=True),
+        "last_seen": pd.to_datetime(last_ms, unit="ms", utc=True),
+        "cohort_week": week,
+        "character": attrs["character"],
+        "difficulty": attrs["difficulty"],
+        "events": np.diff(np.r_[starts, n]),
+        "sessions": sessions,
+        "active_days": active_days,
+        "depth": depth,
+        "d1_eligible": d1_eligible,
+        "d1": returned_d1 & d1_eligible,
+        "d7_eligible": d7_eligible,
+        "d7": returned_d7 & d7_eligible,
+    }, columns=columns)
+
+
+def cohort_table(players: pd.DataFrame, by: str = "cohort_week") -> pd.DataFrame:
+    """Retention, sessions per player and progression depth per value of `by`."""
+    if by not in COHORT_DIMENSIONS:
+        raise ValueError(f"unknown cohort dimension {by!r}")
+    cols = [by, "players", "d1_eligible", "d1_retention", "d7_eligible", "d7_retention",
+            "sessions_per_player", "median_sessions", "mean_depth", "median_depth"]
+    if players is None or players.empty:
+        return pd.DataFrame(columns=cols)
+
+    g = players.groupby(by, sort=True)
+    out = pd.DataFrame({
+        "players": g.size(),
+        "d1_eligible": g["d1_eligible"].sum(),
+        "d1_returned": g["d1"].sum(),
+        "d7_eligible": g["d7_eligible"].sum(),
+        "d7_returned": g["d7"].sum(),
+        "sessions_per_player": g["sessions"].mean().round(2),
+        "median_sessions": g["sessions"].median(),
+        "mean_depth": g["depth"].mean().round(2),
+        "median_depth": g["depth"].median(),
+    })
+    out["d1_retention"] = (out["d1_returned"] / out["d1_eligible"].replace(0, np.nan)).round(4)
+    out["d7_retention"] = (out["d7_returned"] / out["d7_eligible"].replace(0, np.nan)).round(4)
+    return out.reset_index()[cols]
+
+
+# ---------- mergeable per-player partials + per-day cache ----------
+_ATTRIBUTES = ("character", "difficulty")
+_PLAYER_COLUMNS = ["user_id", "first_pos", "first_ms", "last_ms", "events", "depth"] + [
+    f"{column}{suffix}" for column in _ATTRIBUTES for suffix in ("", "_ms", "_pos")]
+
+
+class PlayerRollup:
+    """
+    What build_players needs, folded per player so chunks of events can be
+    merged: first/last seen, event count, depth and the first recorded
+    attributes (with their time and position, to pick the earliest), the
+    set of active days, and sessions as (start, end) intervals. Its size
+    follows players, active days and sessions, not events. `of(events)`
+    builds one; `merge(later)` combines it with the rollup of the events
+    that come right after it, without changing either; `players()` is
+    build_players over all of them.
+    """
+
+    def __init__(self, players: pd.DataFrame, days: pd.DataFrame, sessions: pd.DataFrame, rows: int,
+                 session_gap_minutes: float):
+        self.players = players
+        self.days = days
+        self.sessions = sessions
+        self.rows = rows
+        self.session_gap_minutes = session_gap_minutes
+
+    @classmethod
+    def empty(cls, session_gap_minutes: float = SESSION_GAP_MINUTES) -> "PlayerRollup":
+        return cls(pd.DataFrame(columns=_PLAYER_COLUMNS), pd.DataFrame(columns=["user_id", "day"]),
+                   pd.DataFrame(columns=["user_id", "start_ms", "end_ms"]), 0, session_gap_minutes)
+
+    @classmethod
+    def of(cls, events: pd.DataFrame, session_gap_minutes: float = SESSION_GAP_MINUTES) -> "PlayerRollup":
+        """The rollup of EVENTS_SQL-shaped events (rows in id order)."""
+        rows = 0 if events is None else len(events)
+        out = cls.empty(session_gap_minutes)
+        out.rows = rows
+        if not rows:
+            return out
+        keep = events["ts_ms"].notna().to_numpy() & events["user_id"].notna().to_numpy()
+        position = np.flatnonzero(keep)
+        if not keep.all():
+            events = events[keep]
+        if events.empty:
+            return out
+
+        # the same (user, time) order and boundaries as build_players
+        ts_ms = events["ts_ms"].to_numpy(dtype=np.int64)
+        user_codes, user_ids = pd.factorize(events["user_id"].to_numpy())
+        order = _sort_order(user_codes, ts_ms)
+        user = user_codes[order]
+        t = ts_ms[order]
+        n = len(t)
+        new_user = np.r_[True, user[1:] != user[:-1]]
+        starts = np.flatnonzero(new_user)
+        ends = np.r_[starts[1:], n] - 1
+        completed = pd.to_numeric(events["completed_stage"], errors="coerce").fillna(0).to_numpy(dtype=np.int64)
+
+        players = {
+            "user_id": user_ids[user[starts]],
+            "first_pos": np.minimum.reduceat(position[order], starts),
+            "first_ms": t[starts],
+            "last_ms": t[ends],
+            "events": np.diff(np.r_[starts, n]),
+            "depth": np.maximum.reduceat(completed[order], starts),
+        }
+        for column in _ATTRIBUTES:
+            values = events[column]
+            present = values.notna().to_numpy()
+            first = _first_per_group(np.arange(n), present, order, starts)
+            found = pd.notna(first)
+            rows_at = np.where(found, first, 0).astype(np.int64)
+            players[column] = np.where(found, values.to_numpy(dtype=object)[rows_at], None)
+            players[f"{column}_ms"] = np.where(found, ts_ms[rows_at], np.iinfo(np.int64).max)
+            players[f"{column}_pos"] = np.where(found, position[rows_at], np.iinfo(np.int64).max)
+
+        day = t // _DAY_MS
+        day_rows = np.flatnonzero(new_user | np.r_[True, day[1:] != day[:-1]])
+        days = pd.DataFrame({"user_id": user_ids[user[day_rows]], "day": day[day_rows]})
+
+        session_start = np.flatnonzero(new_user | np.r_[True, np.diff(t) > session_gap_minutes * 60_000])
+        session_end = np.r_[session_start[1:], n] - 1
+        sessions = pd.DataFrame({"user_id": user_ids[user[session_start]],
+                                 "start_ms": t[session_start], "end_ms": t[session_end]})
+        return cls(pd.DataFrame(players, columns=_PLAYER_COLUMNS), days, sessions, rows, session_gap_minutes)
+
+    def merge(self, later: "PlayerRollup") -> "PlayerRollup":
+        """This rollup followed by `later` (positions in `later` come after all of ours)."""
+        rows = self.rows + later.rows
+        if later.players.empty:
+            return PlayerRollup(self.players, self.days, self.sessions, rows, self.session_gap_minutes)
+        shifted = later.players.assign(**{column: later.players[column] + self.rows
+                                          for column in ["first_pos"] + [f"{c}_pos" for c in _ATTRIBUTES]})
+        if self.players.empty:
+            return PlayerRollup(shifted, later.days, later.sessions, rows, self.session_gap_minutes)
+
+        both = pd.concat([self.players, shifted], ignore_index=True)
+        g = both.groupby("user_id", sort=False)
+        players = pd.DataFrame({
+            "first_pos": g["first_pos"].min(),
+            "first_ms": g["first_ms"].min(),
+            "last_ms": g["last_ms"].max(),
+            "events": g["events"].sum(),
+            "depth": g["depth"].max(),
+        })
+        for column in _ATTRIBUTES:
+            # the earliest recorded value: smallest (time, position)
+            earliest = (both.sort_values([f"{column}_ms", f"{column}_pos"], kind="stable")
+                        .drop_duplicates("user_id").set_index("user_id"))
+            for suffix in ("", "_ms", "_pos"):
+                players[column + suffix] = earliest[column + suffix]
+        players = players.reset_index()[_PLAYER_COLUMNS]
+
+        days = pd.concat([self.days, later.days], ignore_index=True).drop_duplicates(ignore_index=True)
+        sessions = _merge_sessions(pd.concat([self.sessions, later.sessions], ignore_index=True),
+                                   self.session_gap_minutes)
+        return PlayerRollup(players, days, sessions, rows, self.session_gap_minutes)
+
+    def build(self, as_of: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """build_players over every event folded in."""
+        if self.players.empty:
+            return pd.DataFrame(columns=PLAYERS_COLUMNS)
+        players = self.players.sort_values("first_pos", kind="stable", ignore_index=True)
+        user_ids = players["user_id"]
+        first_ms = players["first_ms"].to_numpy(dtype=np.int64)
+        last_ms = players["last_ms"].to_numpy(dtype=np.int64)
+        first_day = first_ms // _DAY_MS
+
+        sessions = self.sessions.groupby("user_id", sort=False).size()
+        active_days = self.days.groupby("user_id", sort=False).size()
+        seen = pd.MultiIndex.from_frame(self.days[["user_id", "day"]])
+        returned_d1 = pd.MultiIndex.from_arrays([user_ids, first_day + 1]).isin(seen)
+        returned_d7 = pd.MultiIndex.from_arrays([user_ids, first_day + 7]).isin(seen)
+
+        as_of_day = (pd.Timestamp(as_of).value // 10**6 if as_of is not None else last_ms.max()) // _DAY_MS
+        d1_eligible = first_day + 1 <= as_of_day
+        d7_eligible = first_day + 7 <= as_of_day
+        week = (first_day - (first_day + 3) % 7).astype("datetime64[D]").astype(str)
+
+        return pd.DataFrame({
+            "user_id": user_ids.to_numpy(),
+            "first_seen": pd.to_datetime(first_ms, unit="ms", utc=True),
+            "last_seen": pd.to_datetime(last_ms, unit="ms", utc=True),
+            "cohort_week": week,
+            "character": players["character"].fillna("unknown").to_numpy(dtype=object),
+            "difficulty": players["difficulty"].fillna("unknown").to_numpy(dtype=object),
+            "events": players["events"].to_numpy(dtype=np.int64),
+            "sessions": sessions.reindex(user_ids).to_numpy(dtype=np.int64),
+            "active_days": active_days.reindex(user_ids).to_numpy(dtype=np.int64),
+            "depth": players["depth"].to_numpy(dtype=np.int64),
+            "d1_eligible": d1_eligible,
+            "d1": returned_d1 & d1_eligible,
+            "d7_eligible": d7_eligible,
+            "d7": returned_d7 & d7_eligible,
+        }, columns=PLAYERS_COLUMNS)
+
+
+def _merge_sessions(sessions: pd.DataFrame, session_gap_minutes: float) -> pd.DataFrame:
+    """
+    Join (start, end) session intervals per user that overlap or are at
+    most the session gap apart; exactly the sessions of all their events.
+    """
+    if sessions.empty:
+        return sessions
+    s = sessions.sort_values(["user_id", "start_ms"], kind="stable", ignore_index=True)
+    user = s["user_id"].to_numpy()
+    start = s["start_ms"].to_numpy(dtype=np.int64)
+    reach = s.groupby("user_id", sort=False)["end_ms"].cummax().to_numpy(dtype=np.int64)
+    new_user = np.r_[True, user[1:] != user[:-1]]
+    new = new_user | np.r_[True, start[1:] - reach[:-1] > session_gap_minutes * 60_000]
+    return pd.DataFrame({
+        "user_id": user[new],
+        "start_ms": start[new],
+        "end_ms": np.maximum.reduceat(s["end_ms"].to_numpy(dtype=np.int64), np.flatnonzero(new)),
+    })
+
+
+def load_event_chunks(after_id: int = 0, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """EVENTS_SQL rows with id > after_id, in frames of at most `chunksize` (default chunk_rows()) rows."""
+    return query_chunks(EVENTS_SQL, (int(after_id),), chunksize or chunk_rows())
+
+
+class EventLog:
+    """
+    The PlayerRollup of one database, kept between rebuilds. refresh()
+    only reads rows past the highest id already folded in, chunk by
+    chunk, so the daily rebuild re-reads a day of events rather than the
+    whole table (telemetry_events is append-only), and no rebuild holds
+    more than one chunk of events.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.rollup = PlayerRollup.empty()
+        self.last_id = 0
+
+    def refresh(self) -> PlayerRollup:
+        for chunk in load_event_chunks(self.last_id):
+            if len(chunk):
+                self.last_id = int(chunk["id"].iloc[-1])
+                self.rollup = self.rollup.merge(PlayerRollup.of(chunk))
+        return self.rollup
+
+
+_cache_lock = threading.Lock()
+_cache: Dict[Tuple[str, str], pd.DataFrame] = {}
+_logs: Dict[str, EventLog] = {}
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def players(day: Optional[str] = None) -> pd.DataFrame:
+    """build_players over the whole event log, built once per (database, UTC day)."""
+    key = (get_db_path(), day or _today())
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            return cached
+        log = _logs.get(key[0])
+        if log is None:
+            log = _logs[key[0]] = EventLog(key[0])
+        result = log.refresh().build()
+        # only today's table is worth keeping
+        _cache.clear()
+        _cache[key] = result
+        return result
+
+
+def warm_in_background() -> threading.Thread:
+    """Build today's players table off the request path (the first load reads the whole log, in chunks)."""
+    def run():
+        try:
+            players()
+        except Exception as e:
+            print(f"Cohort warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name="cohort-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def cohorts(by: str = "cohort_week", day: Optional[str] = None) -> pd.DataFrame:
+    return cohort_table(players(day), by=by)
+
+
+def clear_cache() -> None:
+    with _cache_lock:
+        _cache.clear()
+        _logs.clear()
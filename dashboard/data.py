@@ -0,0 +1,351 @@
+"""
+Memoized data access for the dashboard callbacks.
+
+Every metric here is cached per (data version, arguments), where the
+data version is the highest row id in telemetry_events / death_heatmap,
+plus the (name, mtime, size) of the files a Parquet ANALYTICS_SOURCE
+matches (or of an ANALYTICS_SOURCE SQLite file).
+Until a new event lands, re-rendering a figure (switching tabs, flipping
+the stage dropdown back and forth, several callbacks firing for one UI
+change) reuses the event rollup and the metric tables instead of
+re-reading and re-parsing the event log.
+
+The event log is never loaded whole. It is read in chunks sized from
+DASH_MEMORY_MB (default 256) and folded into a metrics.EventRollup; when
+new events land (new ids in SQLite, new files sorting after the others
+in a Parquet directory), only those are read and merged into the
+previous rollup.
+Death heatmaps are binned chunk by chunk the same way.
+
+Cached frames are shared between callers: treat them as read-only and
+`.copy()` before adding columns.
+
+The metric tables come from the rollup, or with
+ANALYTICS_BACKEND=duckdb (or "duckdb" as a call's backend_name) from the same
+computations run in DuckDB over ANALYTICS_SOURCE (default: the file
+query_df reads), see sql_metrics.py. Both give the same frames; duckdb
+falls back to pandas when it isn't installed.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import attempts as attempt_table
+from . import calibration as sim_calibration
+from . import replica, sql_metrics
+from .db import chunk_rows, get_db_path, parquet_chunks, parquet_files, query_chunks, query_df
+from .metrics import EventRollup, rollup_events, spike_detection
+
+# how long a data version is trusted before asking SQLite again; one UI
+# change fires several callbacks and they should agree on the version
+VERSION_TTL_SECONDS = float(os.environ.get("DASH_DATA_VERSION_TTL", "2"))
+
+_version_lock = threading.Lock()
+_version: Tuple[float, Optional[tuple]] = (0.0, None)
+
+
+def _max_id(table: str) -> Optional[int]:
+    try:
+        df = query_df(f"SELECT MAX(id) AS v FROM {table}")
+    except Exception:  # table not created yet
+        return None
+    if df.empty or pd.isna(df["v"].iloc[0]):
+        return None
+    return int(df["v"].iloc[0])
+
+
+def _files_version(paths: list) -> tuple:
+    version = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:  # removed meanwhile
+            continue
+        version.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(version)
+
+
+def source_version() -> Optional[tuple]:
+    """What ANALYTICS_SOURCE holds right now: its files' (name, mtime, size); None without one."""
+    source = os.environ.get("ANALYTICS_SOURCE")
+    if not source:
+        return None
+    if _is_parquet(source):
+        return _files_version(parquet_files(source))
+    return _files_version([source, source + "-wal"])
+
+
+def data_version() -> tuple:
+    """
+    (db path, last telemetry_events id, last death_heatmap id, source_version()),
+    re-read at most every VERSION_TTL_SECONDS.
+    """
+    global _version
+    now = time.monotonic()
+    with _version_lock:
+        expires, version = _version
+        if version is not None and now < expires:
+            return version
+    version = (os.environ.get("DB_PATH"), _max_id("telemetry_events"), _max_id("death_heatmap"), source_version())
+    with _version_lock:
+        _version = (now + VERSION_TTL_SECONDS, version)
+    return version
+
+
+def invalidate() -> None:
+    """Forget the cached data version (the next call re-reads it)."""
+    global _version
+    with _version_lock:
+        _version = (0.0, None)
+
+
+def memoized(maxsize: int = 16):
+    """
+    Cache a function's result per (data_version(), args).
+    A miss is computed under the function's lock, so concurrent callbacks
+    asking for the same thing wait for one computation.
+    """
+    def decorator(fn):
+        cache: "OrderedDict[tuple, object]" = OrderedDict()
+        lock = threading.Lock()
+        stats = {"hits": 0, "misses": 0}
+
+        @wraps(fn)
+        def wrapper(*args):
+            key = (data_version(), args)
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    stats["hits"] += 1
+                    return cache[key]
+                stats["misses"] += 1
+                value = fn(*args)
+                cache[key] = value
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+                return value
+
+        def cache_info():
+            with lock:
+                return dict(stats, size=len(cache))
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                stats["hits"] = stats["misses"] = 0
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+BACKENDS = ("pandas", "duckdb")
+
+
+def backend(name: Optional[str] = None) -> str:
+    """The backend a metric call runs on: `name`, else ANALYTICS_BACKEND (default pandas)."""
+    name = name or os.environ.get("ANALYTICS_BACKEND", "pandas")
+    if name not in BACKENDS:
+        raise ValueError(f"unknown analytics backend {name!r}, expected one of {BACKENDS}")
+    if name == "duckdb" and not sql_metrics.available():
+        return "pandas"
+    return name
+
+
+def analytics_source() -> str:
+    """What the duckdb backend reads: ANALYTICS_SOURCE (SQLite file or Parquet), else DB_PATH's read file."""
+    return os.environ.get("ANALYTICS_SOURCE") or replica.read_path(get_db_path())
+
+
+def _is_parquet(source: str) -> bool:
+    return os.path.isdir(source) or source.lower().endswith(".parquet")
+
+
+# ---------- raw tables ----------
+# (file, last id, rollup) of the last SQLite rollup, extended by the next one
+_last_rollup: Tuple[Optional[str], int, Optional[EventRollup]] = (None, 0, None)
+# (source, its files' versions, rollup) of the last Parquet rollup
+_last_parquet_rollup: Tuple[Optional[str], tuple, Optional[EventRollup]] = (None, (), None)
+
+
+def _tracking_ids(chunks, seen: list):
+    for chunk in chunks:
+        if len(chunk):
+            seen[0] = max(seen[0], int(chunk["id"].iloc[-1]))
+        yield chunk
+
+
+@memoized(maxsize=1)
+def rollup() -> EventRollup:
+    """telemetry_events folded into a metrics.EventRollup, chunk_rows() events at a time."""
+    global _last_rollup
+    source = os.environ.get("ANALYTICS_SOURCE")
+    if source and _is_parquet(source):
+        return _parquet_rollup(source)
+
+    path = source or replica.read_path(get_db_path())
+    last_path, last_id, base = _last_rollup
+    # another file, or DB_PATH recreated with fewer events: start over
+    if last_path != path or (not source and (data_version()[1] or 0) < last_id):
+        last_id, base = 0, None
+    seen = [last_id]
+    chunks = query_chunks("SELECT id, stage_number, event_type, event_data FROM telemetry_events "
+                          "WHERE id > ? ORDER BY id", (last_id,), chunk_rows(), db_path=path)
+    result = rollup_events(_tracking_ids(chunks, seen), base)
+    _last_rollup = (path, seen[0], result)
+    return result
+
+
+def _parquet_rollup(source: str) -> EventRollup:
+    """
+    The rollup of a Parquet source. Files already folded in, unchanged and
+    still first in name order, are not read again: only the ones after them.
+    """
+    global _last_parquet_rollup
+    files = _files_version(parquet_files(source))
+    last_source, folded, base = _last_parquet_rollup
+    if last_source != source or files[:len(folded)] != folded:
+        folded, base = (), None
+    if base is not None and len(files) == len(folded):
+        return base
+    new_files = [path for path, _, _ in files[len(folded):]]
+    result = rollup_events(parquet_chunks(new_files, chunk_rows(), ["stage_number", "event_type", "event_data"]),
+                           base)
+    _last_parquet_rollup = (source, files, result)
+    return result
+
+
+@memoized(maxsize=16)
+def death_bins(stage_id: int, nbinsx: int = 40, nbinsy: int = 25) -> Optional[tuple]:
+    """
+    (counts, x edges, y edges) of a stage's death positions, as
+    np.histogram2d gives them for all of them at once, built chunk by chunk;
+    None without deaths.
+    """
+    where = "FROM death_heatmap WHERE stage_number = ? AND x_position IS NOT NULL AND y_position IS NOT NULL"
+    try:
+        bounds = query_df(f"SELECT MIN(x_position) AS x0, MAX(x_position) AS x1, "
+                          f"MIN(y_position) AS y0, MAX(y_position) AS y1 {where}", (stage_id,))
+    except Exception:  # table not created yet
+        return None
+    if bounds.empty or pd.isna(bounds["x0"].iloc[0]):
+        return None
+    b = bounds.iloc[0]
+    span = [[float(b["x0"]), float(b["x1"])], [float(b["y0"]), float(b["y1"])]]
+    counts = np.zeros((nbinsx, nbinsy))
+    xedges = yedges = None
+    for chunk in query_chunks(f"SELECT x_position, y_position {where}", (stage_id,), chunk_rows()):
+        part, xedges, yedges = np.histogram2d(chunk["x_position"].to_numpy(dtype=float),
+                                              chunk["y_position"].to_numpy(dtype=float),
+                                              bins=[nbinsx, nbinsy], range=span)
+        counts += part
+    if xedges is None:
+        return None
+    return counts, xedges, yedges
+
+
+# ---------- metrics ----------
+@memoized()
+def funnel(difficulty: Optional[str], backend_name: Optional[str] = None) -> pd.DataFrame:
+    if backend(backend_name) == "duckdb":
+        return sql_metrics.funnel_by_stage(analytics_source(), difficulty)
+    return rollup().funnel(difficulty)
+
+
+@memoized()
+def times(difficulty: Optional[str], backend_name: Optional[str] = None) -> pd.DataFrame:
+    if backend(backend_name) == "duckdb":
+        return sql_metrics.time_by_stage(analytics_source(), difficulty)
+    return rollup().times(difficulty)
+
+
+@memoized()
+def spikes(difficulty: Optional[str], backend_name: Optional[str] = None) -> pd.DataFrame:
+    # no backend_name: the same cache entries as the callbacks' funnel(difficulty)
+    by = (backend_name,) if backend_name else ()
+    return spike_detection(funnel(difficulty, *by), times(difficulty, *by))
+
+
+@memoized()
+def combat(difficulty: Optional[str], backend_name: Optional[str] = None) -> pd.DataFrame:
+    if backend(backend_name) == "duckdb":
+        return sql_metrics.combat_by_stage(analytics_source(), difficulty)
+    return rollup().combat(difficulty)
+
+
+@memoized(maxsize=64)
+def hits(difficulty: Optional[str], stage_id: Optional[int], backend_name: Optional[str] = None) -> pd.DataFrame:
+    if backend(backend_name) == "duckdb":
+        return sql_metrics.hits_by_enemy(analytics_source(), difficulty, stage_id)
+    return rollup().hits_by_enemy(difficulty, stage_id)
+
+
+@memoized(maxsize=64)
+def causes(difficulty: Optional[str], stage_id: Optional[int], backend_name: Optional[str] = None) -> pd.DataFrame:
+    if backend(backend_name) == "duckdb":
+        return sql_metrics.fail_reasons(analytics_source(), difficulty, stage_id)
+    return rollup().fail_reasons(difficulty, stage_id)
+
+
+@memoized(maxsize=2)
+def attempts() -> pd.DataFrame:
+    """The attempts table, brought up to date first (see dashboard/attempts.py)."""
+    attempt_table.refresh()
+    return attempt_table.load_attempts()
+
+
+@memoized()
+def attempt_summary(difficulty: Optional[str]) -> pd.DataFrame:
+    use = attempts()
+    if difficulty:
+        use = use[use["difficulty"] == difficulty]
+    return attempt_table.attempt_summary(use)
+
+
+@memoized(maxsize=64)
+def calibrated_constants(stage_id: int, difficulty: Optional[str]) -> Optional[dict]:
+    """Simulator constants fitted to this stage's attempts (fitted on first use), or None."""
+    fits = sim_calibration.calibrate(attempts(), only=[(stage_id, difficulty)])
+    return sim_calibration.constants_for(fits, stage_id, difficulty)
+
+
+@memoized()
+def difficulties() -> list:
+    if backend() == "duckdb":
+        return sql_metrics.difficulties(analytics_source())
+    return sorted(rollup().difficulties)
+
+
+@memoized()
+def stages() -> list:
+    try:
+        d = query_df("SELECT DISTINCT stage_number FROM death_heatmap")
+    except Exception:  # table not created yet
+        return []
+    if d.empty or "stage_number" not in d.columns:
+        return []
+    return sorted(pd.to_numeric(d["stage_number"], errors="coerce").dropna().astype(int).unique().tolist())
+
+
+CACHED = (rollup, death_bins, funnel, times, spikes, combat, hits, causes, attempts, attempt_summary,
+          calibrated_constants, difficulties, stages)
+
+
+def cache_stats() -> dict:
+    return {fn.__name__: fn.cache_info() for fn in CACHED}
+
+
+def clear_caches() -> None:
+    global _last_rollup, _last_parquet_rollup
+    invalidate()
+    _last_rollup = (None, 0, None)
+    _last_parquet_rollup = (None, (), None)
+    for fn in CACHED:
+        fn.cache_clear()
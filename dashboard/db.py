@@ -1,34 +1,163 @@
+import glob
 import os
 import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+
 import pandas as pd
 
+try:
+    from . import query_stats, replica
+except ImportError:  # imported as a plain module, with dashboard/ on sys.path
+    import query_stats
+    import replica
+
+# the dashboard's data work should fit in this; a quarter of it goes to the
+# chunk being read and normalized, the rest is rollups, cached tables, Dash
+MEMORY_MB = float(os.environ.get("DASH_MEMORY_MB", "256"))
+# peak bytes per telemetry_events row while a chunk is read and normalized
+BYTES_PER_EVENT = 2048
+
+
+def chunk_rows() -> int:
+    """Rows per query_chunks/parquet_chunks frame for a whole-table read under DASH_MEMORY_MB."""
+    return max(1000, int(MEMORY_MB * 2**20 / 4 / BYTES_PER_EVENT))
+
+
 def get_db_path() -> str:
     return os.environ.get("DB_PATH", "/data/game.db")
 
 
-def query_df(sql: str, params: tuple = ()) -> pd.DataFrame:
-    db_path = get_db_path()
-    
+def _connect_for_read(db_path: str) -> sqlite3.Connection:
+    # DB_READONLY=1 (set by dashboard/wsgi.py): the separate dashboard process
+    # can't take write locks on the ingest DB, only read it
+    if os.environ.get("DB_READONLY") == "1":
+        return sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+    return sqlite3.connect(db_path)
+
+
+def query_df(sql: str, params: tuple = (), db_path: Optional[str] = None, primary: bool = False) -> pd.DataFrame:
+    """
+    Read into a DataFrame. Reads of DB_PATH go to the read replica when
+    DB_REPLICA=1 (see replica.py); primary=True, or passing db_path,
+    reads that file itself (for tables the dashboard writes).
+    """
+    if db_path is None:
+        db_path = get_db_path()
+        if not primary:
+            db_path = replica.read_path(db_path)
+
     # Check if database exists
     if not os.path.exists(db_path):
         print(f"Database not found at {db_path}")
         return pd.DataFrame()
-    
-    conn = sqlite3.connect(db_path)
+
+    conn = _connect_for_read(db_path)
     try:
+        t0 = time.perf_counter()
         df = pd.read_sql_query(sql, conn, params=params)
+        query_stats.record(conn, sql, params, time.perf_counter() - t0, len(df), "read", db_path)
         return df
     finally:
         conn.close()
 
-def execute(sql: str, params: tuple = ()) -> None:
+def query_chunks(sql: str, params: tuple = (), chunksize: int = 50_000, db_path: Optional[str] = None,
+                 primary: bool = False) -> Iterator[pd.DataFrame]:
+    """
+    query_df in frames of at most `chunksize` rows, all from one read
+    transaction. The statement is recorded once the last chunk is read,
+    with the time spent fetching (not the caller's time between chunks).
+    """
+    if db_path is None:
+        db_path = get_db_path()
+        if not primary:
+            db_path = replica.read_path(db_path)
+
+    if not os.path.exists(db_path):
+        print(f"Database not found at {db_path}")
+        return
+
+    conn = _connect_for_read(db_path)
+    try:
+        chunks = pd.read_sql_query(sql, conn, params=params, chunksize=chunksize)
+        rows, spent = 0, 0.0
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(chunks, None)
+            spent += time.perf_counter() - t0
+            if chunk is None:
+                break
+            rows += len(chunk)
+            yield chunk
+        query_stats.record(conn, sql, params, spent, rows, "read", db_path)
+    finally:
+        conn.close()
+
+
+def parquet_files(source: str) -> list:
+    """The Parquet files `source` names (a file, a glob, or a directory's events-*.parquet), in name order."""
+    if os.path.isdir(source):
+        source = os.path.join(source, "events-*.parquet")
+    return sorted(glob.glob(source))
+
+
+def parquet_chunks(source, chunksize: int = 50_000, columns: Optional[list] = None) -> Iterator[pd.DataFrame]:
+    """
+    Rows of Parquet files (`source` as parquet_files takes it, or a list
+    of files, as dashboard.synthetic writes them) in frames of at most
+    `chunksize` rows, files in name order. Needs pyarrow.
+    """
+    import pyarrow.parquet as pq
+
+    files = parquet_files(source) if isinstance(source, str) else source
+    for path in files:
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+
+
+def execute(sql: str, params: tuple = (), db_path: Optional[str] = None) -> None:
     """Run INSERT/UPDATE/CREATE statements safely."""
-    db_path = get_db_path()
+    db_path = db_path or get_db_path()
     os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
     conn = sqlite3.connect(db_path)
     try:
+        t0 = time.perf_counter()
         cur = conn.cursor()
         cur.execute(sql, params)
         conn.commit()
+        query_stats.record(conn, sql, params, time.perf_counter() - t0, cur.rowcount, "write", db_path)
+    finally:
+        conn.close()
+
+
+def executemany(sql: str, rows: Iterable[tuple], db_path: Optional[str] = None) -> None:
+    """Run one statement for every row, in a single transaction."""
+    db_path = db_path or get_db_path()
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        t0 = time.perf_counter()
+        cur = conn.executemany(sql, rows)
+        conn.commit()
+        # no single parameter row to explain with
+        query_stats.record(conn, sql, (), time.perf_counter() - t0, cur.rowcount, "write", db_path,
+                           explainable=False)
+    finally:
+        conn.close()
+
+
+def execute_batch(statements: Iterable[Tuple[str, Iterable[tuple]]], db_path: Optional[str] = None) -> None:
+    """executemany for each (sql, rows) in turn, all in a single transaction."""
+    db_path = db_path or get_db_path()
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        with conn:
+            for sql, rows in statements:
+                t0 = time.perf_counter()
+                cur = conn.executemany(sql, rows)
+                query_stats.record(conn, sql, (), time.perf_counter() - t0, cur.rowcount, "write", db_path,
+                                   explainable=False)
     finally:
         conn.close()
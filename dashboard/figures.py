@@ -0,0 +1,190 @@
+"""
+Figure builders that keep callback payloads small.
+
+Plotly Express serializes every input row into the figure JSON, so a
+histogram of 10k simulated runs or a heatmap of every recorded death
+ships the raw data to the browser to be binned there. The builders here
+aggregate on the server instead:
+
+- histogram() / heatmap2d(): bin with numpy, send only the counts
+- line(): LTTB-downsample long series to MAX_LINE_POINTS per trace
+- scatter(): cap at MAX_SCATTER_POINTS (evenly spaced sample, extremes
+  kept), WebGL (scattergl) above WEBGL_THRESHOLD points
+
+and every figure is checked against MAX_FIGURE_BYTES of JSON; a figure
+over the cap is rebuilt from fewer points.
+"""
+import os
+from typing import List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+WEBGL_THRESHOLD = int(os.environ.get("DASH_WEBGL_THRESHOLD", "1000"))
+MAX_SCATTER_POINTS = int(os.environ.get("DASH_MAX_SCATTER_POINTS", "5000"))
+MAX_LINE_POINTS = int(os.environ.get("DASH_MAX_LINE_POINTS", "1000"))
+MAX_FIGURE_BYTES = int(os.environ.get("DASH_MAX_FIGURE_KB", "512")) * 1024
+
+
+def payload_bytes(fig: go.Figure) -> int:
+    return len(fig.to_json())
+
+
+def empty(title: str) -> go.Figure:
+    return px.scatter(title=title)
+
+
+# ---------- downsampling ----------
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indices of `threshold` points that keep
+    the visual shape of y(x). First and last points are always kept;
+    x must be sorted.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    # n-2 inner points split into threshold-2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    keep = np.empty(threshold, dtype=int)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # average of the next bucket (or the last point) is the third vertex
+        nlo, nhi = edges[i + 1], (edges[i + 2] if i + 2 < len(edges) else n)
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def sample_rows(df: pd.DataFrame, max_points: int, keep_extremes: Sequence[str] = ()) -> pd.DataFrame:
+    """Evenly spaced rows (deterministic, so re-renders don't flicker) plus each column's min/max row."""
+    if len(df) <= max_points:
+        return df
+    picks = set(np.linspace(0, len(df) - 1, max_points).astype(int).tolist())
+    for col in keep_extremes:
+        values = pd.to_numeric(df[col], errors="coerce")
+        if values.notna().any():
+            picks.add(int(np.nanargmin(values.to_numpy(dtype=float))))
+            picks.add(int(np.nanargmax(values.to_numpy(dtype=float))))
+    return df.iloc[sorted(picks)]
+
+
+# ---------- builders ----------
+def _fit(build, df: pd.DataFrame, max_points: int, max_bytes: int, keep_extremes=()) -> go.Figure:
+    fig = build(sample_rows(df, max_points, keep_extremes))
+    size = payload_bytes(fig)
+    while size > max_bytes and max_points > 50:
+        max_points = int(max_points * max_bytes / size * 0.9)
+        fig = build(sample_rows(df, max(50, max_points), keep_extremes))
+        size = payload_bytes(fig)
+    return fig
+
+
+def scatter(df: pd.DataFrame, x: str, y: str, title: str, color: Optional[str] = None,
+            hover_data: Optional[List[str]] = None, max_points: Optional[int] = None,
+            max_bytes: Optional[int] = None) -> go.Figure:
+    max_points = MAX_SCATTER_POINTS if max_points is None else max_points
+    max_bytes = MAX_FIGURE_BYTES if max_bytes is None else max_bytes
+    total = len(df)
+
+    def build(view):
+        fig = px.scatter(view, x=x, y=y, color=color, hover_data=hover_data, title=title,
+                         render_mode="webgl" if len(view) > WEBGL_THRESHOLD else "svg")
+        if len(view) < total:
+            fig.update_layout(title=f"{title} ({len(view):,} of {total:,} points)")
+        return fig
+
+    numeric = [c for c in (x, y) if pd.api.types.is_numeric_dtype(df[c])] if total else []
+    return _fit(build, df, max_points, max_bytes, keep_extremes=numeric)
+
+
+def line(df: pd.DataFrame, x: str, ys: List[str], title: str,
+         max_points: Optional[int] = None) -> go.Figure:
+    """One trace per column in `ys`, each LTTB-downsampled to max_points."""
+    max_points = MAX_LINE_POINTS if max_points is None else max_points
+    fig = go.Figure(layout={"title": title})
+    fig.update_layout(xaxis_title=x, yaxis_title="value", legend_title_text="variable")
+    if not len(df):
+        return fig
+
+    view = df.sort_values(x)
+    xs = view[x].to_numpy()
+    if pd.api.types.is_datetime64_any_dtype(view[x]):
+        xnum = view[x].astype("int64").to_numpy(dtype=float)
+    else:
+        xnum = pd.to_numeric(view[x], errors="coerce").to_numpy(dtype=float)
+    for col in ys:
+        yv = pd.to_numeric(view[col], errors="coerce").to_numpy(dtype=float)
+        idx = np.flatnonzero(~np.isnan(xnum) & ~np.isnan(yv))
+        keep = idx[lttb(xnum[idx], yv[idx], max_points)]
+        fig.add_trace(go.Scatter(x=xs[keep], y=yv[keep], mode="lines", name=col))
+    return fig
+
+
+def _bin_edges(values: np.ndarray, nbins: int) -> np.ndarray:
+    lo, hi = float(values.min()), float(values.max())
+    if np.all(np.mod(values, 1) == 0) and hi - lo + 1 <= nbins:
+        # small integer range (e.g. fails per run): one bar per value
+        return np.arange(lo - 0.5, hi + 1.5)
+    if lo == hi:
+        return np.array([lo - 0.5, hi + 0.5])
+    return np.histogram_bin_edges(values, bins=nbins)
+
+
+def histogram(df: pd.DataFrame, x: str, title: str, color: Optional[str] = None,
+              nbins: int = 20, barmode: str = "overlay") -> go.Figure:
+    """Counts per bin (bins shared across `color` groups) instead of the raw column."""
+    values = pd.to_numeric(df[x], errors="coerce") if len(df) else pd.Series(dtype=float)
+    if not values.notna().any():
+        return empty(f"{title} - no data")
+    edges = _bin_edges(values.dropna().to_numpy(dtype=float), nbins)
+    centers = (edges[:-1] + edges[1:]) / 2
+    widths = np.diff(edges)
+
+    groups = [(None, values)] if color is None else [
+        (name, values[df[color] == name]) for name in pd.unique(df[color].dropna())
+    ]
+    fig = go.Figure(layout={"title": title, "barmode": barmode})
+    for name, vals in groups:
+        counts, _ = np.histogram(vals.dropna().to_numpy(dtype=float), bins=edges)
+        fig.add_trace(go.Bar(x=centers, y=counts, width=widths, name=str(name) if name is not None else x,
+                             opacity=0.6 if barmode == "overlay" and color else 1.0,
+                             showlegend=name is not None))
+    fig.update_layout(xaxis_title=x, yaxis_title="count", bargap=0)
+    return fig
+
+
+def heatmap2d(df: pd.DataFrame, x: str, y: str, title: str,
+              nbinsx: int = 40, nbinsy: int = 25) -> go.Figure:
+    """2D histogram binned server-side: nbinsx * nbinsy counts whatever the row count."""
+    xs = pd.to_numeric(df[x], errors="coerce") if len(df) else pd.Series(dtype=float)
+    ys = pd.to_numeric(df[y], errors="coerce") if len(df) else pd.Series(dtype=float)
+    ok = xs.notna() & ys.notna()
+    if not ok.any():
+        return empty(f"{title} - no data")
+    counts, xedges, yedges = np.histogram2d(xs[ok].to_numpy(dtype=float), ys[ok].to_numpy(dtype=float),
+                                            bins=[nbinsx, nbinsy])
+    return binned_heatmap(counts, xedges, yedges, x, y, title)
+
+
+def binned_heatmap(counts: np.ndarray, xedges: np.ndarray, yedges: np.ndarray, x: str, y: str,
+                   title: str) -> go.Figure:
+    """heatmap2d from counts binned elsewhere (np.histogram2d's output)."""
+    fig = go.Figure(go.Heatmap(
+        x=(xedges[:-1] + xedges[1:]) / 2,
+        y=(yedges[:-1] + yedges[1:]) / 2,
+        z=counts.T.astype(int),
+        colorbar={"title": "count"},
+    ), layout={"title": title})
+    fig.update_layout(xaxis_title=x, yaxis_title=y)
+    return fig
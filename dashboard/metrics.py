@@ -1,6 +1,12 @@
 import json
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Iterable, Optional
+
+try:
+    from .instrumentation import COMPUTE_SECONDS, timed
+except ImportError:  # imported as a plain module, with dashboard/ on sys.path
+    from instrumentation import COMPUTE_SECONDS, timed
 
 # Evaluation Logic
 
@@ -16,8 +22,10 @@ def _safe_json_loads(x):
 
 # metrics.py (or wherever normalize_events lives)
 
+@timed(COMPUTE_SECONDS)
 def normalize_events(events_df: pd.DataFrame) -> pd.DataFrame:
-    df = events_df.copy()
+    # new columns go on a shallow copy: the caller's frame is untouched, its data isn't duplicated
+    df = events_df.copy(deep=False)
 
     # timestamp
     if "timestamp" in df.columns:
@@ -53,7 +61,9 @@ def normalize_events(events_df: pd.DataFrame) -> pd.DataFrame:
 
     # common top-level fields
     df["difficulty"] = pick("difficulty", None)
-    df["attempt_id"] = pd.to_numeric(pick("attempt_id", None), errors="coerce")
+    # both object: combine_first concatenates them, and an inferred int64 next to an empty side warns
+    attempt_id = pick("attempt_id", None).astype(object).combine_first(pick_extra("attempt_id", None).astype(object))
+    df["attempt_id"] = pd.to_numeric(attempt_id, errors="coerce")
     df["duration_ms"] = pd.to_numeric(pick("duration_ms", None), errors="coerce")
     df["damage_taken"] = pd.to_numeric(pick("damage_taken", None), errors="coerce")
 
@@ -99,36 +109,91 @@ def normalize_events(events_df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
-def combat_by_stage(df: pd.DataFrame, difficulty: Optional[str] = None) -> pd.DataFrame:
-    use = df.copy()
-    if difficulty:
-        use = use[use["difficulty"] == difficulty]
-    use = use[use["stage_id"].notna()]
+# ---------- shared finishing ----------
+# The stage tables are built from small count frames: the pandas path
+# counts a normalized event frame, sql_metrics.py counts the same things
+# in DuckDB, and both hand them to the functions below.
+
+def stage_event_counts(use: pd.DataFrame) -> pd.DataFrame:
+    """Events per stage (index, sorted) and event name (columns); rows without a stage are dropped."""
+    staged = use[["stage_id", "event_name"]][use["stage_id"].notna()]
+    size = staged.groupby([staged["stage_id"].astype("int64"), staged["event_name"]], dropna=False).size()
+    return stage_counts_table(size.rename_axis(["stage_id", "event_name"]))
 
-    # totals
-    hits = use[use["event_name"] == "player_hit"].groupby("stage_id").size()
-    heals = use[use["event_name"] == "heal_pickup"].groupby("stage_id").size()
-    heal_amt = use[use["event_name"] == "heal_pickup"].groupby("stage_id")["heal_amount"].sum(min_count=1)
-    kills = use[use["event_name"] == "enemy_kill"].groupby("stage_id").size()
-    retries = use[use["event_name"] == "retry"].groupby("stage_id").size()
-    deaths = use[use["event_name"] == "death"].groupby("stage_id").size()
-
-    out = pd.DataFrame({"stage_id": sorted(use["stage_id"].dropna().astype(int).unique())})
-    out["player_hits"] = out["stage_id"].map(hits).fillna(0).astype(int)
-    out["heal_pickups"] = out["stage_id"].map(heals).fillna(0).astype(int)
-    out["heal_amount_total"] = out["stage_id"].map(heal_amt).fillna(0).astype(float)
-    out["enemy_kills"] = out["stage_id"].map(kills).fillna(0).astype(int)
-    out["retries"] = out["stage_id"].map(retries).fillna(0).astype(int)
-    out["deaths"] = out["stage_id"].map(deaths).fillna(0).astype(int)
+
+def stage_counts_table(counts: pd.Series) -> pd.DataFrame:
+    """(stage_id, event_name) -> count as the wide int64 table stage_event_counts returns."""
+    wide = counts.unstack("event_name", fill_value=0)
+    wide.index = wide.index.astype("int64")
+    return wide.sort_index().astype("int64")
+
+
+def _event_count(wide: pd.DataFrame, event: str) -> pd.Series:
+    if event in wide.columns:
+        return wide[event]
+    return pd.Series(0, index=wide.index, dtype="int64")
+
+
+def combat_table(wide: pd.DataFrame, heal_amount: pd.Series) -> pd.DataFrame:
+    """combat_by_stage from stage_event_counts and the healed amount per stage (NaN: no amounts)."""
+    out = pd.DataFrame({"stage_id": wide.index.values.astype("int64")})
+    out["player_hits"] = _event_count(wide, "player_hit").values
+    out["heal_pickups"] = _event_count(wide, "heal_pickup").values
+    out["heal_amount_total"] = out["stage_id"].map(heal_amount).fillna(0).astype(float)
+    out["enemy_kills"] = _event_count(wide, "enemy_kill").values
+    out["retries"] = _event_count(wide, "retry").values
+    out["deaths"] = _event_count(wide, "death").values
+    # every attempt opens with a stage_start (retries only follow failed ones)
+    out["attempts"] = _event_count(wide, "stage_start").values
 
     # ratios that feel “useful”
-    out["heals_per_death"] = (out["heal_pickups"] / out["deaths"].replace(0, pd.NA)).fillna(0).round(2)
-    out["hits_per_run"] = (out["player_hits"] / out["retries"].replace(0, pd.NA)).fillna(out["player_hits"]).round(2)
+    out["heals_per_death"] = (out["heal_pickups"] / out["deaths"].where(out["deaths"] > 0)).fillna(0).round(2)
+    out["hits_per_run"] = (out["player_hits"] / out["attempts"].where(out["attempts"] > 0)).fillna(out["player_hits"]).astype(float).round(2)
+    return out
 
-    return out.sort_values("stage_id")
 
+def funnel_table(wide: pd.DataFrame) -> pd.DataFrame:
+    """funnel_by_stage from stage_event_counts."""
+    out = pd.DataFrame({
+        "stage_id": wide.index.values.astype("int64"),
+        "starts": _event_count(wide, "stage_start").values,
+        "completes": _event_count(wide, "stage_complete").values,
+        "fails": _event_count(wide, "fail").values,
+        "quits": _event_count(wide, "quit").values,
+    })
+    out["completion_rate"] = (out["completes"] / out["starts"]).round(4)
+    out["fail_rate"] = (out["fails"] / out["starts"]).round(4)
+    out["dropoff_rate"] = (out["quits"] / out["starts"]).round(4)
+    return out
+
+
+def ranked_counts(keys: list, counts: list, columns: list) -> pd.DataFrame:
+    """
+    `values.value_counts().reset_index()` given the distinct values in
+    order of first appearance and their counts: value_counts sorts that
+    order by count, so ties come out the same way.
+    """
+    vc = pd.Series(counts, index=pd.Index(keys, dtype=object), dtype="int64").sort_values(ascending=False)
+    out = vc.reset_index()
+    out.columns = columns
+    return out
+
+
+@timed(COMPUTE_SECONDS)
+def combat_by_stage(df: pd.DataFrame, difficulty: Optional[str] = None) -> pd.DataFrame:
+    # filters copy rows: only of the columns needed
+    use = df[["stage_id", "event_name", "heal_amount"]]
+    if difficulty:
+        use = use[df["difficulty"] == difficulty]
+    use = use[use["stage_id"].notna()]
+
+    heals = use[use["event_name"] == "heal_pickup"]
+    heal_amt = heals.groupby(heals["stage_id"].astype("int64"))["heal_amount"].sum(min_count=1)
+    return combat_table(stage_event_counts(use), heal_amt)
+
+@timed(COMPUTE_SECONDS)
 def fail_reasons(df: pd.DataFrame, difficulty: Optional[str] = None, stage_id: Optional[int] = None) -> pd.DataFrame:
-    use = df.copy()
+    use = df
     if difficulty:
         use = use[use["difficulty"] == difficulty]
     if stage_id is not None:
@@ -142,14 +207,15 @@ def fail_reasons(df: pd.DataFrame, difficulty: Optional[str] = None, stage_id: O
     vc.columns = ["cause", "count"]
     return vc
 
+@timed(COMPUTE_SECONDS)
 def hits_by_enemy(df: pd.DataFrame, difficulty: Optional[str] = None, stage_id: Optional[int] = None) -> pd.DataFrame:
-    use = df.copy()
+    use = df
     if difficulty:
         use = use[use["difficulty"] == difficulty]
     if stage_id is not None:
         use = use[use["stage_id"] == stage_id]
 
-    hits = use[use["event_name"] == "player_hit"].copy()
+    hits = use[use["event_name"] == "player_hit"]
     if hits.empty:
         return pd.DataFrame(columns=["enemy_type", "hits"])
 
@@ -158,36 +224,15 @@ def hits_by_enemy(df: pd.DataFrame, difficulty: Optional[str] = None, stage_id:
     return vc
 
 
+@timed(COMPUTE_SECONDS)
 def funnel_by_stage(df: pd.DataFrame, difficulty: Optional[str] = None) -> pd.DataFrame:
-    use = df.copy()
+    use = df[["stage_id", "event_name"]]
     if difficulty:
-        use = use[use["difficulty"] == difficulty]
-
-    # eliminate row if stage_id is null
-    use = use[use["stage_id"].notna()]
-
-    def cnt(ev):
-        return (use["event_name"] == ev).groupby(use["stage_id"]).sum().astype(int)
-
-    start = cnt("stage_start")
-    complete = cnt("stage_complete")
-    fail = cnt("fail")
-    quit_ = cnt("quit")
-
-    out = pd.DataFrame({
-        "stage_id": start.index.astype(int),
-        "starts": start.values,
-        "completes": complete.reindex(start.index, fill_value=0).values,
-        "fails": fail.reindex(start.index, fill_value=0).values,
-        "quits": quit_.reindex(start.index, fill_value=0).values
-    })
-
-    out["completion_rate"] = (out["completes"] / out["starts"]).round(4)
-    out["fail_rate"] = (out["fails"] / out["starts"]).round(4)
-    out["dropoff_rate"] = (out["quits"] / out["starts"]).round(4)
-    return out.sort_values("stage_id")
+        use = use[df["difficulty"] == difficulty]
+    return funnel_table(stage_event_counts(use))
 
 
+@timed(COMPUTE_SECONDS)
 def spike_detection(funnel_df: pd.DataFrame, time_df: pd.DataFrame) -> pd.DataFrame:
     # spike rule example
     merged = funnel_df.merge(time_df, on="stage_id", how="left")
@@ -196,10 +241,11 @@ def spike_detection(funnel_df: pd.DataFrame, time_df: pd.DataFrame) -> pd.DataFr
     return merged
 
 
+@timed(COMPUTE_SECONDS)
 def time_by_stage(df: pd.DataFrame, difficulty: Optional[str]) -> pd.DataFrame:
-    use = df.copy()
+    use = df[["stage_id", "event_name", "duration_ms"]]
     if difficulty:
-        use = use[use["difficulty"] == difficulty]
+        use = use[df["difficulty"] == difficulty]
     use = use[(use["event_name"] == "stage_complete") & (use["duration_ms"].notna()) & (use["stage_id"].notna())]
 
     g = use.groupby(use["stage_id"].astype(int))["duration_ms"]
@@ -210,3 +256,225 @@ def time_by_stage(df: pd.DataFrame, difficulty: Optional[str]) -> pd.DataFrame:
         "p90_duration_ms": g.quantile(0.90).values
     })
     return out.sort_values("stage_id")
+
+
+# ---------- chunked ----------
+# The dashboard never holds the whole event log: it reads events in chunks
+# (db.query_chunks / db.parquet_chunks), normalizes each one, folds it into
+# an EventRollup and drops it. The tables above then come from the rollup.
+# Its size depends on how many distinct difficulties, stages, event names,
+# causes, enemies and durations there are, not on how many events there are.
+
+# distinct (difficulty, stage, duration) entries kept exactly; past this,
+# durations are rounded to 10 ms, then 100 ms, ... to stay under it
+MAX_DURATION_VALUES = 200_000
+
+_EVENT_KEYS = ["difficulty", "stage_id", "event_name"]
+_STAGE_KEYS = ["difficulty", "stage_id"]
+_DURATION_KEYS = ["difficulty", "stage_id", "duration_ms"]
+_RANKED_KEYS = ["difficulty", "stage_id", "key"]
+
+
+def compact_events(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The normalized columns an EventRollup uses, in small dtypes
+    (categories, the smallest nullable int for stages), plus each row's
+    position for first-appearance order.
+    """
+    difficulty = df["difficulty"]
+    # only a string can equal the dropdown's value; anything else counts for "all difficulties" only
+    difficulty = difficulty.where(difficulty.map(lambda v: isinstance(v, str)))
+    return pd.DataFrame({
+        "position": np.arange(len(df), dtype="int64"),
+        "difficulty": difficulty.astype("category").values,
+        "stage_id": pd.to_numeric(df["stage_id"], downcast="integer").values,
+        "event_name": pd.Series(df["event_name"]).astype("category").values,
+        "duration_ms": df["duration_ms"].values,
+        "heal_amount": df["heal_amount"].values,
+        "enemy_type": df["enemy_type"].astype("category").values,
+        "fail_cause": df["fail_cause"].astype("category").values,
+    })
+
+
+def _plain(grouped, keys: list) -> pd.DataFrame:
+    """A groupby result as a frame indexed by object/int levels (categories don't concat cleanly)."""
+    flat = grouped.reset_index()
+    for key in keys:
+        if isinstance(flat[key].dtype, pd.CategoricalDtype):
+            flat[key] = flat[key].astype(object)
+    return flat.set_index(keys)
+
+
+def _round_durations(durations: pd.DataFrame, step: int) -> pd.DataFrame:
+    if not step or durations.empty:
+        return durations
+    flat = durations.reset_index()
+    flat["duration_ms"] = (flat["duration_ms"] / step).round() * step
+    return flat.groupby(_DURATION_KEYS, dropna=False, sort=False).sum()
+
+
+def _quantile(values: np.ndarray, counts: np.ndarray, q: float) -> float:
+    """Series.quantile(q) (linear) of `values` repeated `counts` times; values sorted."""
+    ends = np.cumsum(counts)
+    h = (ends[-1] - 1) * q
+    lo = int(np.floor(h))
+    below = values[np.searchsorted(ends, lo, side="right")]
+    above = values[np.searchsorted(ends, min(lo + 1, ends[-1] - 1), side="right")]
+    return float(below + (above - below) * (h - lo))
+
+
+class EventRollup:
+    """
+    Mergeable partial aggregates of normalized events: per difficulty and
+    stage, the event counts, healed amounts, completion durations (value ->
+    count), and death causes and enemy hits (count and first position).
+    `of(chunk)` builds one, `merge(later)` combines it with the rollup of the
+    events that come right after it. Neither changes its inputs, so a cached
+    rollup can be extended with new events.
+    """
+
+    def __init__(self, events=None, heals=None, durations=None, causes=None, enemies=None,
+                 difficulties=frozenset(), rows: int = 0, duration_step: int = 0):
+        self.events = events if events is not None else _empty(_EVENT_KEYS, ["n"])
+        self.heals = heals if heals is not None else _empty(_STAGE_KEYS, ["amount", "n"])
+        self.durations = durations if durations is not None else _empty(_DURATION_KEYS, ["n"])
+        self.causes = causes if causes is not None else _empty(_RANKED_KEYS, ["n", "first"])
+        self.enemies = enemies if enemies is not None else _empty(_RANKED_KEYS, ["n", "first"])
+        self.difficulties = frozenset(difficulties)
+        self.rows = rows
+        self.duration_step = duration_step
+
+    @classmethod
+    def of(cls, events: pd.DataFrame, duration_step: int = 0) -> "EventRollup":
+        """The rollup of one normalized chunk."""
+        c = compact_events(events)
+        staged = c[c["stage_id"].notna()]
+        staged = staged.assign(stage_id=staged["stage_id"].astype("int64"))
+        counts = staged.groupby(_EVENT_KEYS, dropna=False, observed=True).size().rename("n")
+
+        heal_rows = staged[staged["event_name"] == "heal_pickup"]
+        heals = heal_rows.groupby(_STAGE_KEYS, dropna=False, observed=True)["heal_amount"].agg(["sum", "count"])
+        heals.columns = ["amount", "n"]
+
+        done = staged[(staged["event_name"] == "stage_complete") & staged["duration_ms"].notna()]
+        durations = done.groupby(_DURATION_KEYS, dropna=False, observed=True).size().rename("n")
+
+        rollup = cls(
+            events=_plain(counts, _EVENT_KEYS),
+            heals=_plain(heals, _STAGE_KEYS),
+            durations=_round_durations(_plain(durations, _DURATION_KEYS), duration_step),
+            causes=_ranked_partial(c, "death", "fail_cause"),
+            enemies=_ranked_partial(c, "player_hit", "enemy_type"),
+            difficulties=c["difficulty"].dropna().unique().tolist(),
+            rows=len(c),
+            duration_step=duration_step,
+        )
+        return rollup._bounded()
+
+    def merge(self, later: "EventRollup") -> "EventRollup":
+        """This rollup followed by `later`."""
+        step = max(self.duration_step, later.duration_step)
+
+        def add(a, b, keys, how):
+            if b.empty:
+                return a
+            if a.empty:
+                return b
+            return pd.concat([a, b]).groupby(level=keys, dropna=False, sort=False).agg(how)
+
+        def shifted(t):
+            return t.assign(first=t["first"] + self.rows)
+
+        merged = EventRollup(
+            events=add(self.events, later.events, _EVENT_KEYS, "sum"),
+            heals=add(self.heals, later.heals, _STAGE_KEYS, "sum"),
+            durations=add(_round_durations(self.durations, step), _round_durations(later.durations, step),
+                          _DURATION_KEYS, "sum"),
+            causes=add(self.causes, shifted(later.causes), _RANKED_KEYS, {"n": "sum", "first": "min"}),
+            enemies=add(self.enemies, shifted(later.enemies), _RANKED_KEYS, {"n": "sum", "first": "min"}),
+            difficulties=self.difficulties | later.difficulties,
+            rows=self.rows + later.rows,
+            duration_step=step,
+        )
+        return merged._bounded()
+
+    def _bounded(self) -> "EventRollup":
+        while len(self.durations) > MAX_DURATION_VALUES:
+            self.duration_step = self.duration_step * 10 if self.duration_step else 10
+            self.durations = _round_durations(self.durations, self.duration_step)
+        return self
+
+    # ---------- tables ----------
+    @staticmethod
+    def _pick(table: pd.DataFrame, difficulty: Optional[str], stage_id: Optional[int] = None) -> pd.DataFrame:
+        if difficulty:
+            table = table[table.index.get_level_values("difficulty") == difficulty]
+        if stage_id is not None:
+            table = table[table.index.get_level_values("stage_id") == stage_id]
+        return table
+
+    def stage_event_counts(self, difficulty: Optional[str] = None) -> pd.DataFrame:
+        counts = self._pick(self.events, difficulty)["n"]
+        counts = counts.groupby(level=["stage_id", "event_name"], dropna=False).sum()
+        return stage_counts_table(counts.astype("int64"))
+
+    def funnel(self, difficulty: Optional[str] = None) -> pd.DataFrame:
+        return funnel_table(self.stage_event_counts(difficulty))
+
+    def combat(self, difficulty: Optional[str] = None) -> pd.DataFrame:
+        heals = self._pick(self.heals, difficulty).groupby(level="stage_id").sum()
+        amount = heals["amount"].where(heals["n"] > 0)
+        return combat_table(self.stage_event_counts(difficulty), amount)
+
+    def times(self, difficulty: Optional[str] = None) -> pd.DataFrame:
+        picked = self._pick(self.durations, difficulty)["n"]
+        picked = picked.groupby(level=["stage_id", "duration_ms"]).sum().sort_index()
+        rows = []
+        for stage, per_value in picked.groupby(level="stage_id"):
+            values = per_value.index.get_level_values("duration_ms").to_numpy(dtype="float64")
+            counts = per_value.to_numpy()
+            rows.append((int(stage), _quantile(values, counts, 0.5), _quantile(values, counts, 0.75),
+                         _quantile(values, counts, 0.9)))
+        out = pd.DataFrame(rows, columns=["stage_id", "median_duration_ms", "p75_duration_ms", "p90_duration_ms"])
+        return out.astype({"stage_id": "int64", "median_duration_ms": "float64",
+                           "p75_duration_ms": "float64", "p90_duration_ms": "float64"})
+
+    def _ranked(self, table: pd.DataFrame, difficulty, stage_id, columns: list) -> pd.DataFrame:
+        picked = self._pick(table, difficulty, stage_id)
+        if picked.empty:
+            return pd.DataFrame(columns=columns)
+        per_key = picked.groupby(level="key", sort=False).agg({"n": "sum", "first": "min"}).sort_values("first")
+        return ranked_counts(per_key.index.tolist(), per_key["n"].tolist(), columns)
+
+    def fail_reasons(self, difficulty: Optional[str] = None, stage_id: Optional[int] = None) -> pd.DataFrame:
+        return self._ranked(self.causes, difficulty, stage_id, ["cause", "count"])
+
+    def hits_by_enemy(self, difficulty: Optional[str] = None, stage_id: Optional[int] = None) -> pd.DataFrame:
+        return self._ranked(self.enemies, difficulty, stage_id, ["enemy_type", "hits"])
+
+
+def _empty(keys: list, columns: list) -> pd.DataFrame:
+    index = pd.MultiIndex.from_arrays([[] for _ in keys], names=keys)
+    return pd.DataFrame({c: pd.Series(dtype="float64" if c == "amount" else "int64") for c in columns}, index=index)
+
+
+def _ranked_partial(c: pd.DataFrame, event: str, column: str) -> pd.DataFrame:
+    rows = c[c["event_name"] == event]
+    keyed = pd.DataFrame({
+        "difficulty": rows["difficulty"].astype(object),
+        "stage_id": rows["stage_id"].astype("float64"),
+        "key": rows[column].astype(object).fillna("unknown"),
+        "position": rows["position"],
+    })
+    ranked = keyed.groupby(_RANKED_KEYS, dropna=False, sort=False)["position"].agg(["size", "min"])
+    ranked.columns = ["n", "first"]
+    return ranked
+
+
+@timed(COMPUTE_SECONDS)
+def rollup_events(chunks: Iterable[pd.DataFrame], base: Optional[EventRollup] = None) -> EventRollup:
+    """Fold raw telemetry_events chunks (in log order) into `base`, or into a new rollup."""
+    rollup = base or EventRollup()
+    for chunk in chunks:
+        rollup = rollup.merge(EventRollup.of(normalize_events(chunk), duration_step=rollup.duration_step))
+    return rollup
@@ -0,0 +1,288 @@
+"""
+Profiling the running server without attaching anything to it.
+
+Sampling, all threads: `sample(seconds)` wakes every `interval`, reads
+each thread's Python stack from sys._current_frames() and counts
+identical stacks; `SampleResult.collapsed()` writes them in the
+collapsed format ("thread;outer;...;leaf count" per line) that
+flamegraph.pl, inferno and speedscope read. The clock is wall time, so
+a thread blocked in fsync or on a lock is counted where it waits.
+Threads parked with nothing to do (an idle pool worker, the event loop
+in select) are left out unless idle=True. One sampling run at a time
+per process; it costs one walk over every stack per tick, done on the
+caller's thread (reported as overhead).
+
+Per request: `start_request_profile()` / `finish_request_profile()`
+run one request under cProfile and keep the result in a small ring
+under an id (sent back as X-Profile-Id). `profile_text()` and
+`profile_bytes()` read it back as a pstats report or as a .prof file
+for snakeviz / pstats. One request is profiled at a time; concurrent
+ones run unprofiled meanwhile.
+
+`install_flask(server, prefix)` wires both into the Dash server.
+"""
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import CodeType
+from typing import Dict, Mapping, Optional, Tuple
+
+from .admin_auth import is_admin
+
+DEFAULT_INTERVAL = 0.01
+MAX_SECONDS = 120.0
+KEEP_PROFILES = 20
+
+# leaf frames of threads waiting for work rather than doing any
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socketserver.py", "serve_forever"),
+}
+
+_THREAD_NUMBER = re.compile(r"[-_]\d+")
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+@dataclass
+class SampleResult:
+    # (thread name, code objects leaf first) -> samples
+    stacks: Dict[Tuple[str, Tuple[CodeType, ...]], int]
+    samples: int
+    seconds: float
+    busy_seconds: float
+
+    @property
+    def overhead(self) -> float:
+        """Share of the wall time spent walking stacks."""
+        return self.busy_seconds / self.seconds if self.seconds else 0.0
+
+    def collapsed(self) -> str:
+        labels: Dict[CodeType, str] = {}
+        lines = {}
+        for (thread, codes), n in self.stacks.items():
+            frames = [thread]
+            for code in reversed(codes):
+                label = labels.get(code)
+                if label is None:
+                    label = labels[code] = _frame_label(code)
+                frames.append(label)
+            line = ";".join(frames)
+            lines[line] = lines.get(line, 0) + n
+        return "".join(f"{line} {n}\n" for line, n in sorted(lines.items(), key=lambda kv: -kv[1]))
+
+
+def _frame_label(code: CodeType) -> str:
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+def _thread_names() -> Dict[int, str]:
+    return {t.ident: _THREAD_NUMBER.sub("", t.name) for t in threading.enumerate()}
+
+
+_sampling = threading.Lock()
+
+
+def sample(seconds: float, interval: float = DEFAULT_INTERVAL, idle: bool = False) -> SampleResult:
+    """Sample every other thread's stack each `interval` for `seconds` (raises ProfilerBusy if already running)."""
+    if not _sampling.acquire(blocking=False):
+        raise ProfilerBusy("a sampling run is already in progress")
+    try:
+        me = threading.get_ident()
+        names = _thread_names()
+        idle_codes: Dict[CodeType, bool] = {}
+        stacks: Dict[Tuple[str, Tuple[CodeType, ...]], int] = {}
+        samples, busy = 0, 0.0
+        start = next_tick = time.perf_counter()
+        deadline = start + seconds
+        while True:
+            t0 = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                codes = []
+                while frame is not None:
+                    codes.append(frame.f_code)
+                    frame = frame.f_back
+                if not idle and codes:
+                    leaf = codes[0]
+                    parked = idle_codes.get(leaf)
+                    if parked is None:
+                        parked = idle_codes[leaf] = (os.path.basename(leaf.co_filename), leaf.co_name) in IDLE_LEAVES
+                    if parked:
+                        continue
+                if ident not in names:
+                    names = _thread_names()
+                key = (names.get(ident, f"thread-{ident}"), tuple(codes))
+                stacks[key] = stacks.get(key, 0) + 1
+            samples += 1
+            busy += time.perf_counter() - t0
+
+            next_tick += interval
+            if next_tick >= deadline:
+                break
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.perf_counter()     # fell behind: skip ticks, don't burst
+        return SampleResult(stacks, samples, time.perf_counter() - start, busy)
+    finally:
+        _sampling.release()
+
+
+def sample_args(args: Mapping[str, str]) -> Tuple[float, float, bool]:
+    """(seconds, interval, idle) from query args; ValueError when out of range."""
+    seconds = float(args.get("seconds", 10))
+    interval = float(args.get("interval", DEFAULT_INTERVAL))
+    idle = str(args.get("idle", "0")).lower() in ("1", "true", "yes")
+    if not 0 < seconds <= MAX_SECONDS:
+        raise ValueError(f"seconds must be in (0, {MAX_SECONDS:g}]")
+    if not 0.001 <= interval <= 1.0:
+        raise ValueError("interval must be in [0.001, 1]")
+    return seconds, interval, idle
+
+
+def sample_headers(result: SampleResult) -> Dict[str, str]:
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+    return {
+        "Content-Disposition": f'attachment; filename="profile-{os.getpid()}-{stamp}.folded"',
+        "X-Profile-Samples": str(result.samples),
+        "X-Profile-Overhead": f"{result.overhead:.4f}",
+    }
+
+
+# ---------- per request (cProfile) ----------
+_cprofile = threading.Lock()
+_profiles_lock = threading.Lock()
+_profiles: "OrderedDict[str, Tuple[str, cProfile.Profile]]" = OrderedDict()
+
+
+def wants_profile(headers: Mapping[str, str]) -> bool:
+    """X-Profile: 1 from an admin."""
+    return (headers.get("x-profile") or "").lower() in ("1", "true", "yes") and is_admin(headers)
+
+
+def new_profile_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def start_request_profile() -> Optional[cProfile.Profile]:
+    """An enabled profiler for this thread, or None when another request holds it."""
+    if not _cprofile.acquire(blocking=False):
+        return None
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+    except ValueError:          # some other profiler is active
+        _cprofile.release()
+        return None
+    return prof
+
+
+def finish_request_profile(prof: cProfile.Profile, label: str, profile_id: Optional[str] = None) -> str:
+    prof.disable()
+    _cprofile.release()
+    profile_id = profile_id or new_profile_id()
+    with _profiles_lock:
+        _profiles[profile_id] = (label, prof)
+        while len(_profiles) > KEEP_PROFILES:
+            _profiles.popitem(last=False)
+    return profile_id
+
+
+def _stored(profile_id: str) -> Optional[Tuple[str, cProfile.Profile]]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def profile_text(profile_id: str, limit: int = 40, sort: str = "cumulative") -> Optional[str]:
+    stored = _stored(profile_id)
+    if stored is None:
+        return None
+    label, prof = stored
+    buf = io.StringIO()
+    buf.write(f"{label}\n")
+    pstats.Stats(prof, stream=buf).strip_dirs().sort_stats(sort).print_stats(limit)
+    return buf.getvalue()
+
+
+def profile_bytes(profile_id: str) -> Optional[bytes]:
+    """The profile in the format cProfile.Profile.dump_stats writes."""
+    stored = _stored(profile_id)
+    if stored is None:
+        return None
+    prof = stored[1]
+    prof.create_stats()
+    return marshal.dumps(prof.stats)
+
+
+# ---------- Dash / Flask ----------
+def install_flask(server, prefix: str = "/", callback_suffix: str = "_dash-update-component") -> None:
+    """
+    Routes `<prefix>_profile` (sampling) and `<prefix>_profile/<id>`, and
+    X-Profile on Dash callback requests (`callback_suffix`).
+    """
+    from flask import Response, g, request
+
+    @server.before_request
+    def _start_profile():
+        if request.path.endswith(callback_suffix) and wants_profile(request.headers):
+            g.request_profile = start_request_profile()
+
+    @server.after_request
+    def _finish_profile(response):
+        prof = g.pop("request_profile", None)
+        if prof is not None:
+            response.headers["X-Profile-Id"] = finish_request_profile(prof, f"{request.method} {request.path}")
+        return response
+
+    @server.teardown_request
+    def _drop_profile(_exc):
+        # after_request did not run (the response failed to build)
+        prof = g.pop("request_profile", None)
+        if prof is not None:
+            finish_request_profile(prof, f"{request.method} {request.path} (failed)")
+
+    @server.route(prefix + "_profile")
+    def sampling_profile():
+        if not is_admin(request.headers):
+            return Response("ADMIN_TOKEN required\n", status=403, mimetype="text/plain")
+        try:
+            seconds, interval, idle = sample_args(request.args)
+            result = sample(seconds, interval, idle)
+        except ValueError as e:
+            return Response(f"{e}\n", status=400, mimetype="text/plain")
+        except ProfilerBusy as e:
+            return Response(f"{e}\n", status=409, mimetype="text/plain")
+        return Response(result.collapsed(), mimetype="text/plain", headers=sample_headers(result))
+
+    @server.route(prefix + "_profile/<profile_id>")
+    def request_profile(profile_id):
+        if not is_admin(request.headers):
+            return Response("ADMIN_TOKEN required\n", status=403, mimetype="text/plain")
+        if request.args.get("format") == "pstats":
+            data = profile_bytes(profile_id)
+            mimetype, headers = "application/octet-stream", {
+                "Content-Disposition": f'attachment; filename="{profile_id}.prof"'}
+        else:
+            data, mimetype, headers = profile_text(profile_id), "text/plain", {}
+        if data is None:
+            return Response("no such profile (only the last few are kept)\n", status=404, mimetype="text/plain")
+        return Response(data, mimetype=mimetype, headers=headers)
@@ -0,0 +1,182 @@
+"""
+Timing of every statement that goes through dashboard/db.py.
+
+db.py calls `record()` with each statement's wall time while its
+connection is still open. Statements are grouped by fingerprint
+(whitespace collapsed, literals and IN lists turned into ?), and each
+fingerprint keeps calls, total / max time, rows and the EXPLAIN QUERY
+PLAN taken the first time it ran, with the tables its plan scans
+without an index. At most MAX_FINGERPRINTS are kept; past that the one
+with the least total time is dropped.
+
+Statements over SLOW_QUERY_MS (env, default 250) also get their plan
+re-taken and are logged as one JSON line on the "dashboard.slow_query"
+logger with their parameters; the last SLOW_LOG_SIZE stay in memory.
+`top()` and `slow_log()` feed the dashboard's Queries tab and
+/admin/_queries. Numbers are per process.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    from .instrumentation import REGISTRY
+except ImportError:  # imported as a plain module, with dashboard/ on sys.path
+    from instrumentation import REGISTRY
+
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "250"))
+MAX_FINGERPRINTS = 500
+SLOW_LOG_SIZE = 100
+PARAMS_CHARS = 200
+
+logger = logging.getLogger("dashboard.slow_query")
+
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "Statements run through dashboard/db.py", ("kind",),
+)
+_KIND = {"read": DB_QUERY_SECONDS.labels("read"), "write": DB_QUERY_SECONDS.labels("write")}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE = re.compile(r"\s+")
+# "SCAN telemetry_events" / "SCAN t USING COVERING INDEX i": every row is read
+_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)([^\s(]\S*)")
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql: str) -> str:
+    fp = _STRING.sub("?", sql)
+    fp = _NUMBER.sub("?", fp)
+    fp = _IN_LIST.sub("(?...)", fp)
+    return _SPACE.sub(" ", fp).strip()
+
+
+@dataclass
+class QueryStat:
+    fingerprint: str
+    kind: str
+    calls: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+    rows: int = 0
+    slow: int = 0
+    plan: Optional[List[str]] = None
+    scans: Tuple[str, ...] = ()
+    last_params: str = ""
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "fingerprint": self.fingerprint,
+            "kind": self.kind,
+            "calls": self.calls,
+            "total_ms": round(self.total_s * 1000, 3),
+            "mean_ms": round(self.total_s * 1000 / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max_s * 1000, 3),
+            "rows": self.rows,
+            "slow": self.slow,
+            "scans": list(self.scans),
+            "plan": self.plan,
+            "last_params": self.last_params,
+        }
+
+
+_lock = threading.Lock()
+_stats: Dict[str, QueryStat] = {}
+_slow: deque = deque(maxlen=SLOW_LOG_SIZE)
+
+
+def _short_params(params: Any) -> str:
+    text = repr(tuple(params)) if isinstance(params, (list, tuple)) else repr(params)
+    return text if len(text) <= PARAMS_CHARS else text[:PARAMS_CHARS] + "..."
+
+
+def explain(conn: sqlite3.Connection, sql: str, params: Sequence = ()) -> Optional[List[str]]:
+    """EXPLAIN QUERY PLAN details (indented by depth), or None if the statement can't be explained."""
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, tuple(params or ())).fetchall()
+    except sqlite3.Error:
+        return None
+    depth: Dict[int, int] = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def scanned_tables(plan: Optional[List[str]]) -> Tuple[str, ...]:
+    found = []
+    for line in plan or ():
+        m = _SCAN.match(line.strip())
+        if m and m.group(1) not in found:
+            found.append(m.group(1))
+    return tuple(found)
+
+
+def record(conn: sqlite3.Connection, sql: str, params: Any, seconds: float, rows: int,
+           kind: str = "read", db_path: str = "", explainable: bool = True) -> None:
+    """Account one finished statement; `conn` is only used for EXPLAIN QUERY PLAN."""
+    _KIND[kind].observe(seconds)
+    fp = fingerprint(sql)
+    slow = seconds * 1000 >= SLOW_QUERY_MS
+    with _lock:
+        stat = _stats.get(fp)
+        new = stat is None
+        if new:
+            if len(_stats) >= MAX_FINGERPRINTS:
+                del _stats[min(_stats, key=lambda k: _stats[k].total_s)]
+            stat = _stats[fp] = QueryStat(fp, kind)
+        stat.calls += 1
+        stat.total_s += seconds
+        stat.max_s = max(stat.max_s, seconds)
+        stat.rows += max(rows, 0)
+        stat.slow += slow
+        stat.last_params = _short_params(params)
+
+    if not (new or slow) or not explainable:
+        return
+    plan = explain(conn, sql, params)
+    with _lock:
+        if new or stat.plan is None:
+            stat.plan, stat.scans = plan, scanned_tables(plan)
+    if slow:
+        entry = {
+            "event": "slow_query",
+            "at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "db": os.path.basename(db_path),
+            "sql": _SPACE.sub(" ", sql).strip(),
+            "params": _short_params(params),
+            "plan": plan,
+            "scans": list(scanned_tables(plan)),
+        }
+        _slow.append(entry)
+        logger.warning(json.dumps(entry))
+
+
+def top(n: int = 20, by: str = "total_s") -> List[Dict[str, Any]]:
+    with _lock:
+        stats = sorted(_stats.values(), key=lambda s: getattr(s, by), reverse=True)[:n]
+        return [s.as_dict() for s in stats]
+
+
+def slow_log(n: int = SLOW_LOG_SIZE) -> List[Dict[str, Any]]:
+    """Most recent first."""
+    with _lock:
+        return list(reversed(_slow))[:n]
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+        _slow.clear()
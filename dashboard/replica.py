@@ -0,0 +1,385 @@
+"""
+Read-only copy of the telemetry database for the dashboard.
+
+With DB_REPLICA=1, query_df() reads DB_PATH through a replica file
+(DB_REPLICA_PATH, default `<name>.replica.db` next to it) instead of
+the file the ingest writer commits to. It is opt-in: start.sh only sets
+it for the dashboard's own process (ADMIN_MODE=process), so refreshes
+never run in the API process unless asked for.
+
+The first refresh builds the replica:
+
+1. copies the primary with SQLite's online backup API into a temp file,
+   DB_REPLICA_PAGES pages per step with a short sleep in between so the
+   copy yields disk and CPU to ingest (WAL: the writer is never blocked).
+   A commit to the primary restarts the copy; after MAX_RESTARTS of
+   those it is redone in one step, one read transaction over one
+   consistent snapshot (about 0.2 s per 100 MB);
+2. makes the copy read-optimized: the ANALYTICS_INDEXES, the
+   stage_event_counts table and events_flat view, a sampled ANALYZE;
+3. switches it to WAL and moves it into place with os.replace.
+
+Every later refresh keeps the file and its indexes and only applies
+what is new, in one transaction with the primary attached read-only:
+rows with an id past the replica's last one (the primary's tables are
+append-only), with stage_event_counts updated from those rows alone
+(stage_event_sessions remembers which sessions each count has seen, so
+the distinct session counts stay exact), then PRAGMA optimize. A table
+whose schema changed (a migration) or whose ids went backwards (a
+recreated database) is copied again whole. Readers keep the snapshot
+they started on while it commits (WAL).
+
+`<replica>.stamp`'s mtime is the moment the last refresh started. A
+read finding it older than DB_REPLICA_MAX_STALENESS seconds (default
+300) starts a refresh in a background thread and reads the current file
+meanwhile, so reads never wait on one; until the replica exists they go
+to the primary. Refreshes only happen while someone reads, so an idle
+dashboard costs nothing. An flock on `<replica>.lock` keeps gunicorn
+workers from refreshing it at the same time.
+
+Tables the dashboard itself writes (balance decisions, attempts,
+calibration) must be read with query_df(..., primary=True) or an
+explicit db_path.
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, workers may both rebuild
+    fcntl = None
+
+try:
+    from .instrumentation import REGISTRY
+except ImportError:  # imported as a plain module, with dashboard/ on sys.path
+    from instrumentation import REGISTRY
+
+PAGES_PER_STEP = int(os.environ.get("DB_REPLICA_PAGES", "2048"))
+STEP_SLEEP = 0.005
+MAX_RESTARTS = 1
+ANALYSIS_LIMIT = 1000    # rows sampled per index by ANALYZE
+
+# (name, table, columns): only created when the table exists
+ANALYTICS_INDEXES = (
+    ("idx_replica_events_type_stage", "telemetry_events", "event_type, stage_number"),
+    ("idx_replica_events_session", "telemetry_events", "session_id, stage_number, id"),
+    ("idx_replica_events_user", "telemetry_events", "user_id, timestamp"),
+    ("idx_replica_deaths_stage", "death_heatmap", "stage_number"),
+)
+
+# the replica's own tables, never copied from the primary. Keys have the
+# telemetry_events columns' types (difficulty, a json_extract value, none),
+# so lookups from rows of it can use idx_stage_event_sessions.
+PRECOMPUTED = (
+    """CREATE TABLE IF NOT EXISTS stage_event_counts (
+       stage_number INTEGER, difficulty, event_type TEXT, events INTEGER NOT NULL, sessions INTEGER NOT NULL)""",
+    """CREATE TABLE IF NOT EXISTS stage_event_sessions (
+       stage_number INTEGER, difficulty, event_type TEXT, session_id TEXT)""",
+    """CREATE INDEX IF NOT EXISTS idx_stage_event_sessions
+       ON stage_event_sessions(event_type, stage_number, difficulty, session_id)""",
+    """CREATE VIEW IF NOT EXISTS events_flat AS
+       SELECT id, user_id, session_id, stage_number, timestamp, event_type,
+              NULLIF(json_extract(event_data, '$.difficulty'), '') AS difficulty,
+              json_extract(event_data, '$.attempt_id') AS attempt_id,
+              json_extract(event_data, '$.duration_ms') AS duration_ms,
+              json_extract(event_data, '$.damage') AS damage,
+              json_extract(event_data, '$.enemy') AS enemy,
+              COALESCE(json_extract(event_data, '$.cause'), json_extract(event_data, '$.fail_reason')) AS cause
+       FROM telemetry_events""",
+)
+DERIVED = ("stage_event_counts", "stage_event_sessions", "events_flat")
+
+# stage_event_counts plus the events with id > :after. A count's sessions
+# grow by the (group, session) pairs stage_event_sessions hasn't seen yet.
+COUNT_NEW = (
+    "DROP TABLE IF EXISTS temp.fresh",
+    "DROP TABLE IF EXISTS temp.first_seen",
+    "DROP TABLE IF EXISTS temp.merged",
+    """CREATE TEMP TABLE fresh AS
+       SELECT stage_number,
+              NULLIF(json_extract(event_data, '$.difficulty'), '') AS difficulty,
+              event_type,
+              session_id,
+              COUNT(*) AS events
+       FROM telemetry_events
+       WHERE id > :after
+       GROUP BY 1, 2, 3, 4""",
+    """CREATE TEMP TABLE first_seen AS
+       SELECT stage_number, difficulty, event_type, session_id
+       FROM temp.fresh AS f
+       WHERE session_id IS NOT NULL AND NOT EXISTS (
+           SELECT 1 FROM stage_event_sessions AS s
+           WHERE s.event_type IS f.event_type AND s.stage_number IS f.stage_number
+             AND s.difficulty IS f.difficulty AND s.session_id = f.session_id)""",
+    "INSERT INTO stage_event_sessions SELECT * FROM temp.first_seen",
+    """CREATE TEMP TABLE merged AS
+       SELECT stage_number, difficulty, event_type, SUM(events) AS events, SUM(sessions) AS sessions
+       FROM (SELECT stage_number, difficulty, event_type, events, sessions FROM stage_event_counts
+             UNION ALL
+             SELECT stage_number, difficulty, event_type, events, 0 FROM temp.fresh
+             UNION ALL
+             SELECT stage_number, difficulty, event_type, 0, 1 FROM temp.first_seen)
+       GROUP BY 1, 2, 3""",
+    "DELETE FROM stage_event_counts",
+    "INSERT INTO stage_event_counts SELECT * FROM temp.merged",
+)
+
+REFRESH_SECONDS = REGISTRY.histogram(
+    "db_replica_refresh_seconds", "Time to build or update the dashboard's read replica", ("step",),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+_COPY_SECONDS = REFRESH_SECONDS.labels("copy")
+_PREPARE_SECONDS = REFRESH_SECONDS.labels("prepare")
+_APPLY_SECONDS = REFRESH_SECONDS.labels("apply")
+REFRESH_FAILURES = REGISTRY.counter("db_replica_refresh_failures_total", "Replica refreshes that raised")
+
+
+def enabled() -> bool:
+    return os.environ.get("DB_REPLICA") == "1"
+
+
+def max_staleness() -> float:
+    return float(os.environ.get("DB_REPLICA_MAX_STALENESS", "300"))
+
+
+def default_path(primary: str) -> str:
+    p = Path(primary)
+    return os.environ.get("DB_REPLICA_PATH") or str(p.with_name(p.stem + ".replica" + p.suffix))
+
+
+class Restarted(Exception):
+    pass
+
+
+class Replica:
+    def __init__(self, primary: str, path: Optional[str] = None, staleness: Optional[float] = None):
+        self.primary = primary
+        self.path = path or default_path(primary)
+        self.stamp = self.path + ".stamp"
+        self.staleness = staleness
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.restarts = 0
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last refresh started, None if there is no replica yet."""
+        try:
+            return max(0.0, time.time() - os.path.getmtime(self.stamp))
+        except OSError:
+            return None
+
+    def read_path(self) -> str:
+        """The file to read: the replica when one exists (refreshed in the background once stale)."""
+        age = self.age()
+        limit = self.staleness if self.staleness is not None else max_staleness()
+        if age is None or age > limit:
+            self.refresh_in_background()
+        return self.primary if age is None else self.path
+
+    def refresh_in_background(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._refresh_quietly, name="replica-refresh", daemon=True)
+            self._thread.start()
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _refresh_quietly(self) -> None:
+        try:
+            self.refresh()
+            self.last_error = None
+        except Exception as e:
+            REFRESH_FAILURES.inc()
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Replica refresh failed: {self.last_error}")
+
+    def refresh(self) -> bool:
+        """Build the replica, or apply what is new to it; False if another process is already at it."""
+        if not os.path.exists(self.primary):
+            raise FileNotFoundError(self.primary)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path + ".lock", "w") as lock_file:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    return False
+            started = time.time()
+            if os.path.exists(self.path):
+                with _APPLY_SECONDS.time():
+                    self._apply()
+            else:
+                self._build()
+            with open(self.stamp, "a"):
+                pass
+            os.utime(self.stamp, (started, started))
+        return True
+
+    def _build(self) -> None:
+        tmp = f"{self.path}.tmp-{os.getpid()}"
+        try:
+            with _COPY_SECONDS.time():
+                self._copy(tmp)
+            with _PREPARE_SECONDS.time():
+                prepare(tmp)
+            # a -wal/-shm left by an earlier replica file would be read as this one's
+            for leftover in (self.path + "-wal", self.path + "-shm"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            os.replace(tmp, self.path)
+        finally:
+            for leftover in (tmp, tmp + "-journal", tmp + "-wal", tmp + "-shm"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+
+    def _apply(self) -> None:
+        conn = sqlite3.connect(self.path, isolation_level=None, uri=True)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("ATTACH ? AS src", (Path(self.primary).resolve().as_uri() + "?mode=ro",))
+            conn.execute("BEGIN IMMEDIATE")
+            recount = "stage_event_sessions" not in _tables(conn, "main")
+            after = {name: _sync_table(conn, name, sql) for name, sql in _tables(conn, "src").items()}
+            for name in set(_tables(conn, "main")) - set(after) - set(DERIVED):
+                conn.execute(f"DROP TABLE main.{name}")
+            _derive(conn, 0 if recount else after.get("telemetry_events", 0))
+            conn.execute("COMMIT")
+            conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+            conn.execute("PRAGMA optimize")
+        finally:
+            conn.close()
+
+    def _copy(self, tmp: str) -> None:
+        src = sqlite3.connect(Path(self.primary).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            for attempt in range(MAX_RESTARTS + 1):
+                dst = sqlite3.connect(tmp)
+                seen = {"remaining": None}
+
+                def progress(status, remaining, total):
+                    # remaining going up again: the primary changed and the copy started over
+                    if seen["remaining"] is not None and remaining > seen["remaining"]:
+                        raise Restarted
+                    seen["remaining"] = remaining
+
+                try:
+                    if attempt < MAX_RESTARTS:
+                        src.backup(dst, pages=PAGES_PER_STEP, progress=progress, sleep=STEP_SLEEP)
+                    else:
+                        src.backup(dst)     # one step: one read transaction, one snapshot
+                    return
+                except Restarted:
+                    self.restarts += 1
+                finally:
+                    dst.close()
+        finally:
+            src.close()
+
+
+def _tables(conn: sqlite3.Connection, schema: str) -> Dict[str, str]:
+    """name -> CREATE TABLE statement of a schema's tables (not SQLite's own)."""
+    rows = conn.execute(f"SELECT name, sql FROM {schema}.sqlite_master "
+                        "WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+    return {name: sql for name, sql in rows}
+
+
+def _sync_table(conn: sqlite3.Connection, name: str, sql: str) -> int:
+    """
+    Bring main.`name` up to src.`name`: the rows past its last id, or all
+    of them when the schema differs or the ids went backwards. Returns the
+    id the new rows start after (0: copied whole).
+    """
+    columns = conn.execute(f"PRAGMA src.table_info({name})").fetchall()
+    keyed = any(col[1] == "id" and col[5] == 1 for col in columns)
+    if _tables(conn, "main").get(name) != sql:
+        conn.execute(f"DROP TABLE IF EXISTS main.{name}")
+        conn.execute(sql)
+        indexes = conn.execute("SELECT sql FROM src.sqlite_master WHERE type = 'index' AND tbl_name = ? "
+                               "AND sql IS NOT NULL", (name,)).fetchall()
+        for (index_sql,) in indexes:
+            conn.execute(index_sql)
+        last = 0
+    elif keyed:
+        last = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM main.{name}").fetchone()[0]
+        newest = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM src.{name}").fetchone()[0]
+        if newest < last:
+            conn.execute(f"DELETE FROM main.{name}")
+            last = 0
+    else:
+        conn.execute(f"DELETE FROM main.{name}")
+        last = 0
+    where = " WHERE id > ?" if keyed and last else ""
+    conn.execute(f"INSERT INTO main.{name} SELECT * FROM src.{name}{where}", (last,) if where else ())
+    return last
+
+
+def _derive(conn: sqlite3.Connection, after_id: int) -> None:
+    """The analytics indexes, and stage_event_counts for the events past after_id (0: recounted)."""
+    tables = _tables(conn, "main")
+    for name, table, columns in ANALYTICS_INDEXES:
+        if table in tables:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})")
+    if "telemetry_events" not in tables:
+        return
+    if not after_id:
+        conn.execute("DROP TABLE IF EXISTS stage_event_counts")
+        conn.execute("DROP TABLE IF EXISTS stage_event_sessions")
+        conn.execute("DROP VIEW IF EXISTS events_flat")
+    for statement in PRECOMPUTED:
+        conn.execute(statement)
+    for statement in COUNT_NEW:
+        conn.execute(statement, {"after": after_id} if ":after" in statement else {})
+
+
+def prepare(path: str) -> None:
+    """Make a fresh copy read-optimized (analytics indexes, pre-computed tables, statistics), then WAL."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        # the bulk of the work goes through a rollback journal, not a WAL to checkpoint
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.execute("BEGIN")
+        _derive(conn, 0)
+        conn.execute("COMMIT")
+        conn.execute(f"PRAGMA analysis_limit={ANALYSIS_LIMIT}")
+        conn.execute("ANALYZE")
+        # later refreshes commit to it in place while the dashboard reads it
+        conn.execute("PRAGMA journal_mode=WAL")
+    finally:
+        conn.close()
+
+
+_replicas: Dict[str, Replica] = {}
+_replicas_lock = threading.Lock()
+
+
+def for_primary(primary: str) -> Replica:
+    with _replicas_lock:
+        replica = _replicas.get(primary)
+        if replica is None:
+            replica = _replicas[primary] = Replica(primary)
+        return replica
+
+
+def read_path(primary: str) -> str:
+    """Where a read of `primary` should go (the primary itself unless DB_REPLICA=1)."""
+    if not enabled():
+        return primary
+    return for_primary(primary).read_path()
+
+
+def status() -> Dict[str, dict]:
+    with _replicas_lock:
+        replicas = list(_replicas.values())
+    return {
+        r.primary: {"path": r.path, "age_s": r.age(), "restarts": r.restarts, "last_error": r.last_error}
+        for r in replicas
+    }
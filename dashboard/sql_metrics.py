@@ -0,0 +1,242 @@
+"""
+The metrics.py tables computed by an embedded DuckDB.
+
+Instead of pulling `SELECT *` into pandas and parsing every event_data
+in Python (normalize_events), these run the funnel, combat, percentile,
+fail-cause and hits-by-enemy computations as SQL over the events where
+they are stored:
+
+- a SQLite file, attached read-only through DuckDB's sqlite extension.
+  If the extension can't be loaded (it is downloaded on first use),
+  only id, stage_number, event_type and event_data are read with
+  sqlite3, db.chunk_rows() at a time, and copied into a DuckDB table,
+  which still does all of the parsing;
+- Parquet files with the telemetry_events columns (a path or glob
+  ending in .parquet, or a directory written by
+  `python -m dashboard.synthetic --parquet`), read directly.
+
+JSON extraction follows normalize_events field for field, and the
+aggregates go through the same finishing code in metrics.py, so every
+function returns the frame its pandas counterpart returns for the same
+events (including tie order; percentiles are linear like
+Series.quantile). DuckDB is optional: `available()` is False without
+it, and dashboard/data.py then stays on pandas.
+
+Each call opens its own in-memory DuckDB (DuckDB connections are not
+safe to share across the dashboard's threads) with DUCKDB_THREADS
+threads (default: one per core) and at most DUCKDB_MEMORY_LIMIT
+(default 256MB) before it spills to disk.
+"""
+import os
+from typing import Optional
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # optional dependency
+    duckdb = None
+
+from . import metrics
+from .db import chunk_rows, query_chunks
+from .instrumentation import COMPUTE_SECONDS, timed
+
+MEMORY_LIMIT = os.environ.get("DUCKDB_MEMORY_LIMIT", "256MB")
+THREADS = int(os.environ.get("DUCKDB_THREADS", "0"))    # 0: DuckDB's default
+
+RAW_COLUMNS = "id, stage_number, event_type, event_data"
+
+# normalize_events in SQL: only the columns the metrics use. Unused ones
+# are pruned by DuckDB before any JSON is touched.
+EVENTS_VIEW = """
+CREATE VIEW events AS
+WITH parsed AS (
+    SELECT id, stage_number, event_type,
+           CASE WHEN json_valid(event_data) THEN event_data::JSON END AS p
+    FROM raw
+), with_extra AS (
+    SELECT *,
+           -- extra is an object, or sometimes an object saved as a JSON string
+           CASE json_type(p, '$.extra')
+               WHEN 'OBJECT' THEN p->'$.extra'
+               WHEN 'VARCHAR' THEN CASE WHEN json_valid(p->>'$.extra') THEN
+                   CASE WHEN json_type((p->>'$.extra')::JSON) = 'OBJECT' THEN (p->>'$.extra')::JSON END END
+           END AS x
+    FROM parsed
+)
+SELECT id,
+       TRY_CAST(stage_number AS BIGINT) AS stage_id,
+       event_type AS event_name,
+       CASE WHEN json_type(p, '$.difficulty') = 'VARCHAR' THEN p->>'$.difficulty' END AS difficulty,
+       TRY_CAST(p->>'$.duration_ms' AS DOUBLE) AS duration_ms,
+       TRY_CAST(COALESCE(x->>'$.amount', x->>'$.heal_amount') AS DOUBLE) AS heal_amount,
+       COALESCE(x->>'$.enemy', x->>'$.enemyType', x->>'$.enemy_type') AS enemy_type,
+       COALESCE(x->>'$.cause', p->>'$.cause', p->>'$.fail_reason', x->>'$.fail_reason') AS fail_cause
+FROM with_extra
+"""
+
+_EMPTY_RAW = pd.DataFrame({
+    "id": pd.Series(dtype="int64"),
+    "stage_number": pd.Series(dtype="float64"),
+    "event_type": pd.Series(dtype="string"),
+    "event_data": pd.Series(dtype="string"),
+})
+
+# None: not tried yet; False: it couldn't be loaded, don't try again
+_sqlite_extension: Optional[bool] = None
+
+
+def available() -> bool:
+    return duckdb is not None
+
+
+def _quote(text: str) -> str:
+    return "'" + text.replace("'", "''") + "'"
+
+
+def _attach_sqlite(con, path: str) -> bool:
+    global _sqlite_extension
+    if _sqlite_extension is False or not os.path.exists(path):
+        return False
+    try:
+        con.execute(f"ATTACH {_quote(path)} AS src (TYPE sqlite, READ_ONLY)")
+    except duckdb.Error as e:
+        if _sqlite_extension is None:
+            print(f"DuckDB sqlite extension unavailable, reading through sqlite3: {e}")
+        _sqlite_extension = False
+        return False
+    _sqlite_extension = True
+    con.execute(f"CREATE VIEW raw AS SELECT {RAW_COLUMNS} FROM src.telemetry_events")
+    return True
+
+
+def _parquet_view(con, source: str) -> None:
+    if os.path.isdir(source):
+        source = os.path.join(source, "events-*.parquet")
+    files = f"read_parquet({_quote(source)}, filename = true, file_row_number = true)"
+    columns = {row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {files}").fetchall()}
+    # without ids (dashboard.synthetic --parquet), rows are ordered by file name, then position
+    order = "id" if "id" in columns else "(filename, file_row_number) AS id"
+    con.execute(f"CREATE VIEW raw AS SELECT {order}, stage_number, event_type, event_data FROM {files}")
+
+
+def _copy_sqlite(con, path: str) -> None:
+    """Copy the raw columns into a DuckDB table a chunk at a time, so pandas never holds the whole table."""
+    con.register("chunk", _EMPTY_RAW)
+    con.execute("CREATE TABLE raw AS SELECT * FROM chunk")
+    for frame in query_chunks(f"SELECT {RAW_COLUMNS} FROM telemetry_events", (), chunk_rows(), db_path=path):
+        con.register("chunk", frame)
+        con.execute("INSERT INTO raw SELECT * FROM chunk")
+    con.unregister("chunk")
+
+
+def connect(source: str):
+    """An in-memory DuckDB with an `events` view over `source` (SQLite file or Parquet)."""
+    config = {"memory_limit": MEMORY_LIMIT}
+    if THREADS > 0:
+        config["threads"] = THREADS
+    con = duckdb.connect(config=config)
+    try:
+        if os.path.isdir(source) or source.lower().endswith(".parquet"):
+            _parquet_view(con, source)
+        elif not _attach_sqlite(con, source):
+            _copy_sqlite(con, source)
+        con.execute(EVENTS_VIEW)
+    except Exception:
+        con.close()
+        raise
+    return con
+
+
+def _query(source: str, sql: str, params: list) -> pd.DataFrame:
+    con = connect(source)
+    try:
+        return con.execute(sql, params).df()
+    finally:
+        con.close()
+
+
+def _where(difficulty: Optional[str], stage_id: Optional[int] = None, *conditions: str):
+    clauses, params = list(conditions), []
+    if difficulty:
+        clauses.append("difficulty = ?")
+        params.append(difficulty)
+    if stage_id is not None:
+        clauses.append("stage_id = ?")
+        params.append(int(stage_id))
+    return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def _stage_counts(source: str, difficulty: Optional[str]) -> pd.DataFrame:
+    where, params = _where(difficulty, None, "stage_id IS NOT NULL")
+    return _query(source, f"""
+        SELECT stage_id, event_name, COUNT(*) AS events,
+               SUM(heal_amount) FILTER (WHERE event_name = 'heal_pickup') AS heal_amount
+        FROM events{where}
+        GROUP BY stage_id, event_name
+    """, params)
+
+
+def _wide(long: pd.DataFrame) -> pd.DataFrame:
+    counts = long.set_index(["stage_id", "event_name"])["events"].astype("int64")
+    return metrics.stage_counts_table(counts)
+
+
+@timed(COMPUTE_SECONDS, "duckdb.funnel_by_stage")
+def funnel_by_stage(source: str, difficulty: Optional[str] = None) -> pd.DataFrame:
+    return metrics.funnel_table(_wide(_stage_counts(source, difficulty)))
+
+
+@timed(COMPUTE_SECONDS, "duckdb.combat_by_stage")
+def combat_by_stage(source: str, difficulty: Optional[str] = None) -> pd.DataFrame:
+    long = _stage_counts(source, difficulty)
+    heals = long[long["event_name"] == "heal_pickup"]
+    heal_amount = heals.set_index(heals["stage_id"].astype("int64"))["heal_amount"]
+    return metrics.combat_table(_wide(long), heal_amount)
+
+
+@timed(COMPUTE_SECONDS, "duckdb.time_by_stage")
+def time_by_stage(source: str, difficulty: Optional[str]) -> pd.DataFrame:
+    where, params = _where(difficulty, None, "event_name = 'stage_complete'",
+                           "duration_ms IS NOT NULL", "stage_id IS NOT NULL")
+    out = _query(source, f"""
+        SELECT stage_id,
+               quantile_cont(duration_ms, 0.5) AS median_duration_ms,
+               quantile_cont(duration_ms, 0.75) AS p75_duration_ms,
+               quantile_cont(duration_ms, 0.9) AS p90_duration_ms
+        FROM events{where}
+        GROUP BY stage_id
+        ORDER BY stage_id
+    """, params)
+    return out.astype({"stage_id": "int64", "median_duration_ms": "float64",
+                       "p75_duration_ms": "float64", "p90_duration_ms": "float64"})
+
+
+def _ranked(source: str, column: str, event: str, difficulty: Optional[str], stage_id: Optional[int],
+            columns: list) -> pd.DataFrame:
+    where, params = _where(difficulty, stage_id, f"event_name = '{event}'")
+    counts = _query(source, f"""
+        SELECT COALESCE({column}, 'unknown') AS key, COUNT(*) AS n, MIN(id) AS first_id
+        FROM events{where}
+        GROUP BY 1
+        ORDER BY first_id
+    """, params)
+    if counts.empty:
+        return pd.DataFrame(columns=columns)
+    return metrics.ranked_counts(counts["key"].tolist(), counts["n"].tolist(), columns)
+
+
+@timed(COMPUTE_SECONDS, "duckdb.fail_reasons")
+def fail_reasons(source: str, difficulty: Optional[str] = None, stage_id: Optional[int] = None) -> pd.DataFrame:
+    return _ranked(source, "fail_cause", "death", difficulty, stage_id, ["cause", "count"])
+
+
+@timed(COMPUTE_SECONDS, "duckdb.hits_by_enemy")
+def hits_by_enemy(source: str, difficulty: Optional[str] = None, stage_id: Optional[int] = None) -> pd.DataFrame:
+    return _ranked(source, "enemy_type", "player_hit", difficulty, stage_id, ["enemy_type", "hits"])
+
+
+def difficulties(source: str) -> list:
+    """The difficulty dropdown's options (string difficulties only)."""
+    df = _query(source, "SELECT DISTINCT difficulty FROM events WHERE difficulty IS NOT NULL ORDER BY 1", [])
+    return df["difficulty"].tolist()
@@ -0,0 +1,671 @@
+"""
+Deterministic synthetic telemetry at production volume.
+
+    python -m dashboard.synthetic --sessions 200000 --db data/perf.db
+    python -m dashboard.synthetic --sessions 2000000 --parquet data/perf/
+    python -m dashboard.synthetic --sessions 40 --db ./demo_game.db
+
+Rows look like what /api/collect stores for the real client: the same
+telemetry_events columns, event_data built the way _insert_event builds
+it (difficulty and character, then the scene's attempt fields and
+extra), a 32-hex client event_id, and a death_heatmap row per death.
+
+The model follows the scenes:
+- players have a skill (lognormal around 1), a usual difficulty and a
+  character; sessions pick a player and start in the evening-heavy
+  hours of --days days
+- a session is complete_flow, then the stages in order (LevelOne,
+  LevelTwo), then logout. At each stage the player makes attempts until
+  a win. They may leave after any failed attempt, and may quit or close
+  the tab mid-attempt, which ends the session without a logout.
+- an attempt is stage_start, an enemy_spawn per spawn point of the map,
+  a heartbeat every 10 s, player_hit / parry_success / enemy_kill /
+  pickup_spawn / heal_pickup, a dialogue on the stage's first attempt,
+  and then death + fail (+ retry), stage_complete or quit
+- hp is tracked through hits and heals: survivors never drop to 0, and
+  a death that isn't a fall happens at the hit that empties the bar,
+  whose source is the cause ("Goblin", "projectile", "tile_damage")
+- deaths are placed from the Tiled maps: next to a goblin spawn, in bow
+  range of an archer spawn, on a damage tile, or over a pit for "fell"
+
+Everything is drawn with NumPy per block of BLOCK_SESSIONS sessions,
+each block from its own child generator. The output depends only on the
+seed and the counts, and memory stays bounded by the block size.
+Blocks are written with executemany, one transaction per block, or as
+one Parquet file per block (needs pyarrow).
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+MAPS_DIR = Path(__file__).resolve().parent.parent / "static" / "assets" / "maps"
+DB_PATH = os.getenv("GAME_DB_PATH", "./demo_game.db")
+
+BLOCK_SESSIONS = 5_000
+MAX_ATTEMPTS = 40             # per stage and session
+HEARTBEAT_MS = 10_000         # the scenes' heartbeat timer
+START = "2026-01-01"
+
+DIFFICULTIES = ("easy", "medium", "hard")
+DIFFICULTY_WEIGHTS = (0.3, 0.5, 0.2)
+CHARACTERS = ("knight", "woman")
+# difficulty.js playerIncomingDamageMult
+DAMAGE_MULT = np.array([0.5, 1.0, 1.5])
+BASE_FAIL = np.array([0.2, 0.35, 0.55])
+# the server files session-level events under a stage by difficulty (app/main.py _event_stage)
+SESSION_STAGE = np.array([2, 5, 8])
+
+# player_hit "enemy" -> base damage, as the scenes report them
+HIT_SOURCES = {"Goblin": 8, "Archer": 5, "tile": 5}
+# ... and the death cause the scene logs when that hit is the last
+DEATH_CAUSE = {"Goblin": "Goblin", "Archer": "projectile", "tile": "tile_damage"}
+
+EVENTS_COLUMNS = ["user_id", "session_id", "event_type", "event_data", "stage_number", "timestamp", "event_id"]
+DEATH_COLUMNS = ["user_id", "session_id", "stage_number", "x_position", "y_position", "timestamp"]
+
+
+@dataclass(frozen=True)
+class Stage:
+    number: int
+    map_name: str
+    win_ms: float                 # median clear time of an average player
+    fail_mult: float
+    fall_share: float             # failed attempts that end in a pit rather than out of hp
+    hits: Dict[str, float]        # player_hit source -> share
+
+
+STAGES = (
+    Stage(1, "desertMap", 90_000, 1.0, 0.2, {"Goblin": 0.55, "Archer": 0.45}),
+    Stage(2, "forestMap", 120_000, 1.3, 0.15, {"Goblin": 0.4, "Archer": 0.3, "tile": 0.3}),
+)
+
+
+# ---------- map geometry ----------
+@dataclass(frozen=True)
+class MapGeometry:
+    width_px: int
+    height_px: int
+    goblins: np.ndarray           # (n, 2) spawn points
+    archers: np.ndarray
+    pits: np.ndarray              # x centres of columns without floor
+    damage_tiles: np.ndarray      # (n, 2) tile centres
+
+
+@lru_cache(maxsize=None)
+def load_map(name: str) -> MapGeometry:
+    tmj = json.loads((MAPS_DIR / f"{name}.tmj").read_text(encoding="utf-8"))
+    w, h, tw, th = tmj["width"], tmj["height"], tmj["tilewidth"], tmj["tileheight"]
+    layers = {layer["name"].lower(): layer for layer in tmj["layers"]}
+
+    def grid(*names):
+        for n in names:
+            if n in layers:
+                return np.asarray(layers[n]["data"]).reshape(h, w) > 0
+        return np.zeros((h, w), dtype=bool)
+
+    def points(name):
+        objects = layers.get(name, {}).get("objects", [])
+        return np.array([(o["x"], o["y"]) for o in objects], dtype=float).reshape(-1, 2)
+
+    floor, damage = grid("floor"), grid("dmg", "damage")
+    rows, cols = np.nonzero(damage)
+    return MapGeometry(
+        width_px=w * tw,
+        height_px=h * th,
+        goblins=points("goblins"),
+        archers=points("archers"),
+        pits=(np.flatnonzero(~floor.any(axis=0)) + 0.5) * tw,
+        damage_tiles=np.column_stack([(cols + 0.5) * tw, (rows + 0.5) * th]),
+    )
+
+
+def death_positions(rng: np.random.Generator, stage: Stage, cause: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Where the player was when they died, by cause, from the stage's map."""
+    geo = load_map(stage.map_name)
+    n = len(cause)
+    x = rng.uniform(0, geo.width_px, n)
+    y = np.full(n, geo.height_px / 2)
+
+    def near(mask, anchors, dx, dy):
+        k = int(mask.sum())
+        if not k or not len(anchors):
+            return
+        pick = anchors[rng.integers(0, len(anchors), k)]
+        x[mask] = pick[:, 0] + dx(k)
+        y[mask] = pick[:, 1] + dy(k)
+
+    near(cause == "Goblin", geo.goblins, lambda k: rng.normal(0, 40, k), lambda k: rng.normal(0, 8, k))
+    # archers shoot from range, either side
+    near(cause == "projectile", geo.archers,
+         lambda k: rng.choice((-1, 1), k) * rng.uniform(80, 320, k), lambda k: rng.normal(0, 60, k))
+    near(cause == "tile_damage", geo.damage_tiles, lambda k: rng.uniform(-12, 12, k), lambda k: rng.uniform(-16, 0, k))
+    fell = cause == "fell"
+    if fell.any() and len(geo.pits):
+        x[fell] = geo.pits[rng.integers(0, len(geo.pits), int(fell.sum()))] + rng.uniform(-12, 12, int(fell.sum()))
+        y[fell] = geo.height_px
+    return np.clip(x, 0, geo.width_px).round(1), np.clip(y, 0, geo.height_px).round(1)
+
+
+# ---------- helpers ----------
+def _within(counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """For items repeated counts[i] times: (owner index, position within the owner)."""
+    counts = np.asarray(counts, dtype=np.int64)
+    owner = np.repeat(np.arange(len(counts)), counts)
+    first = np.cumsum(counts) - counts
+    return owner, np.arange(int(counts.sum())) - first[owner]
+
+
+def _group_cumsum(values: np.ndarray, group_start: np.ndarray) -> np.ndarray:
+    """Running sum restarting wherever group_start is True (rows already grouped)."""
+    total = np.cumsum(values)
+    starts = np.flatnonzero(group_start)
+    offset = np.repeat(total[starts] - values[starts], np.diff(np.r_[starts, len(values)]))
+    return total - offset
+
+
+def _fields(n: int, fields: List[Tuple[str, object]]) -> pd.Series:
+    """', "key": value' pieces for n rows; values are scalars or arrays."""
+    out = pd.Series("", index=range(n), dtype=object)
+    for key, value in fields:
+        if value is None or np.isscalar(value):
+            out = out + f', "{key}": {json.dumps(value)}'
+            continue
+        arr = np.asarray(value)
+        if arr.dtype.kind in "OUS":
+            out = out + f', "{key}": "' + pd.Series(arr, dtype=object).astype(str).values + '"'
+        else:
+            out = out + f', "{key}": ' + pd.Series(arr).astype(str).values
+    return out
+
+
+def _js_round(x):
+    """Math.round, which the scenes use for damage (half up, unlike numpy's half-to-even)."""
+    return np.floor(np.asarray(x, dtype=float) + 0.5)
+
+
+def _hp_line(group: np.ndarray, delta: np.ndarray, can_die: np.ndarray):
+    """
+    hp through hits (negative delta) and heals, rows grouped per attempt
+    and in time order, starting at 100 and capped at 100. A hit that
+    would kill is dropped unless can_die (a survivor dodged it); in a
+    can_die attempt the first such hit is lethal and later rows are
+    dropped. Returns (hp_before, hp_after, kept, lethal) per row.
+
+    The recurrence runs over the position within the attempt, so there
+    are as many steps as the longest attempt has rows, each a vector op.
+    """
+    n = len(group)
+    start = np.r_[True, group[1:] != group[:-1]] if n else np.zeros(0, dtype=bool)
+    g = np.cumsum(start) - 1
+    pos = np.arange(n) - np.flatnonzero(start)[g] if n else np.zeros(0, dtype=np.int64)
+    by_pos = np.argsort(pos, kind="stable")
+    bounds = np.searchsorted(pos[by_pos], np.arange((pos.max() + 2) if n else 1))
+    hp = np.full(int(g.max()) + 1 if n else 0, 100.0)
+    dead = np.zeros(len(hp), dtype=bool)
+    hp_before, hp_after = np.empty(n), np.empty(n)
+    kept, lethal = np.ones(n, dtype=bool), np.zeros(n, dtype=bool)
+    for k in range(len(bounds) - 1):
+        rows = by_pos[bounds[k]:bounds[k + 1]]
+        gg = g[rows]
+        before = hp[gg]
+        after = np.clip(before + delta[rows], 0, 100)
+        kills = (after <= 0) & ~dead[gg]
+        drop = dead[gg] | (kills & ~can_die[rows])
+        hit_dead = kills & can_die[rows]
+        after = np.where(drop, before, after)
+        hp_before[rows], hp_after[rows] = before, after
+        kept[rows], lethal[rows] = ~drop, hit_dead
+        hp[gg] = after
+        dead[gg] |= hit_dead
+    return hp_before, hp_after, kept, lethal
+
+
+def _hex_ids(rng: np.random.Generator, n: int, width: int) -> np.ndarray:
+    """n random lowercase hex strings of the given (even) width, like uuid4().hex."""
+    raw = rng.bytes(n * width // 2).hex().encode()
+    return np.frombuffer(raw, dtype=f"S{width}").astype(str)
+
+
+# ---------- players and sessions ----------
+@dataclass
+class Players:
+    user_id: np.ndarray
+    skill: np.ndarray
+    difficulty: np.ndarray        # usual difficulty, index into DIFFICULTIES
+    character: np.ndarray
+
+
+def make_players(n: int, seed: int) -> Players:
+    rng = np.random.default_rng([seed, 0])
+    return Players(
+        user_id=rng.permutation(n) + 1,
+        skill=np.clip(rng.lognormal(0.0, 0.35, n), 0.4, 2.5),
+        difficulty=rng.choice(3, n, p=DIFFICULTY_WEIGHTS),
+        character=rng.integers(0, len(CHARACTERS), n),
+    )
+
+
+def session_starts(n: int, seed: int, days: int, start: str = START) -> np.ndarray:
+    """Sorted session start times (epoch ms): evenings busiest, a floor of play all day."""
+    rng = np.random.default_rng([seed, 1])
+    day = rng.integers(0, days, n)
+    evening = rng.random(n) < 0.7
+    secs = np.where(evening, rng.normal(20.5 * 3600, 2.5 * 3600, n), rng.uniform(0, 86_400, n)) % 86_400
+    base = pd.Timestamp(start, tz="UTC").value // 1_000_000
+    return np.sort(base + (day * 86_400 + secs) * 1000).astype(np.int64)
+
+
+# ---------- attempts ----------
+OUTCOME_WIN, OUTCOME_FAIL, OUTCOME_QUIT, OUTCOME_CLOSED = 0, 1, 2, 3
+
+
+def plan_attempts(rng: np.random.Generator, skill: np.ndarray, difficulty: np.ndarray) -> pd.DataFrame:
+    """
+    Attempt sequences for a block of sessions, one row per attempt:
+    session (block-local index), stage, attempt_id (per stage, like the
+    scenes' counter), outcome, last (ends the session).
+    """
+    n = len(skill)
+    playing = np.ones(n, dtype=bool)
+    parts = []
+    p_leave = np.clip(0.12 / skill, 0.02, 0.5)   # after a failed attempt
+    for stage in STAGES:
+        p_fail = np.clip(BASE_FAIL[difficulty] * stage.fail_mult / skill, 0.03, 0.9)
+        fails_before_win = rng.geometric(1 - p_fail) - 1
+        leave_after = rng.geometric(p_leave)               # leave after this many fails
+        exit_at = rng.geometric(0.02, n)                   # quit / close the tab during this attempt
+        won = fails_before_win < leave_after
+        n_att = np.minimum(fails_before_win, leave_after) + won
+        exits = exit_at <= n_att
+        n_att = np.minimum(np.where(exits, exit_at, n_att), MAX_ATTEMPTS)
+        won &= ~exits & (n_att <= MAX_ATTEMPTS)
+        n_att = np.where(playing, n_att, 0)
+
+        session, idx = _within(n_att)
+        last_of_stage = idx == n_att[session] - 1
+        outcome = np.full(len(session), OUTCOME_FAIL)
+        outcome[last_of_stage & won[session]] = OUTCOME_WIN
+        exiting = last_of_stage & exits[session]
+        outcome[exiting] = np.where(rng.random(int(exiting.sum())) < 0.6, OUTCOME_QUIT, OUTCOME_CLOSED)
+
+        # some winners call it a day before the next stage
+        playing &= won & (rng.random(n) >= 0.1)
+        parts.append(pd.DataFrame({
+            "session": session, "stage": stage.number, "attempt_id": idx + 1, "outcome": outcome,
+            "last": last_of_stage & ~playing[session],
+        }))
+    out = pd.concat(parts, ignore_index=True)
+    return out.sort_values(["session", "stage", "attempt_id"], kind="stable", ignore_index=True)
+
+
+# ---------- a block ----------
+def generate_block(block: int, n_sessions: int, players: Players, starts: np.ndarray,
+                   seed: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(telemetry_events rows, death_heatmap rows) of one block of sessions, in time order."""
+    rng = np.random.default_rng([seed, 2, block])
+    player = rng.integers(0, len(players.user_id), n_sessions)
+    skill = players.skill[player]
+    # mostly the usual difficulty
+    difficulty = np.where(rng.random(n_sessions) < 0.85, players.difficulty[player],
+                          rng.choice(3, n_sessions, p=DIFFICULTY_WEIGHTS))
+    character = players.character[player]
+    user_id = players.user_id[player]
+    width = max(3, len(str(len(players.user_id))))
+    session_id = ("session_user_" + pd.Series(user_id).astype(str).str.zfill(width) + "_"
+                  + _hex_ids(rng, n_sessions, 12)).to_numpy(dtype=object)
+
+    att = plan_attempts(rng, skill, difficulty)
+    a_sess = att["session"].to_numpy()
+    a_stage = att["stage"].to_numpy()
+    a_out = att["outcome"].to_numpy()
+    n_att = len(att)
+
+    # ---- durations and timing ----
+    win_ms = np.select([a_stage == s.number for s in STAGES], [s.win_ms for s in STAGES])
+    full = rng.lognormal(np.log(win_ms / np.sqrt(skill[a_sess])), 0.25)
+    share = np.select([a_out == OUTCOME_WIN, a_out == OUTCOME_FAIL],
+                      [1.0, rng.uniform(0.08, 0.95, n_att)], rng.uniform(0.05, 0.6, n_att))
+    duration = np.maximum(3_000, full * share).astype(np.int64)
+    first_of_stage = att["attempt_id"].to_numpy() == 1
+    # menus and loading before the first stage, the death screen between retries, a transition between stages
+    gap = np.where(first_of_stage, rng.exponential(6_000, n_att) + 1_500, rng.exponential(3_500, n_att) + 800)
+    new_session = np.r_[True, a_sess[1:] != a_sess[:-1]]
+    gap = np.where(new_session, rng.exponential(15_000, n_att) + 4_000, gap).astype(np.int64)
+    t0 = starts[a_sess] + _group_cumsum(gap + duration, new_session) - duration
+    t_end = t0 + duration
+
+    # ---- what happens in each attempt ----
+    secs = duration / 1000.0
+    spawns = {s.number: (len(load_map(s.map_name).goblins), len(load_map(s.map_name).archers)) for s in STAGES}
+    n_spawn = np.select([a_stage == n for n in spawns], [sum(v) for v in spawns.values()])
+    progress = np.where(a_out == OUTCOME_WIN, 1.0, share)
+    n_kill = rng.binomial(n_spawn, np.clip(progress * 0.95, 0, 1))
+    n_parry = rng.poisson(0.03 * secs * skill[a_sess])
+    n_beat = (duration // HEARTBEAT_MS).astype(np.int64)
+    dialogue = first_of_stage & (rng.random(n_att) < 0.5)
+    mult = DAMAGE_MULT[difficulty[a_sess]]
+
+    # kills, the hearts 30% of them drop (handleSwordHit), and the hearts picked up
+    k_att, _ = _within(n_kill)
+    k_t = t0[k_att] + (rng.random(len(k_att)) * duration[k_att]).astype(np.int64)
+    drop = rng.random(len(k_att)) < 0.3
+    p_att, p_t = k_att[drop], k_t[drop] + 10
+    take = rng.random(len(p_att)) < 0.8
+    l_att = p_att[take]
+    l_t = np.minimum(p_t[take] + rng.exponential(3_000, len(l_att)).astype(np.int64), t_end[l_att] - 1)
+
+    # hits: a failed attempt that isn't a fall gets enough of them to run out of hp
+    falls = np.select([a_stage == s.number for s in STAGES], [s.fall_share for s in STAGES])
+    by_hits = (a_out == OUTCOME_FAIL) & (rng.random(n_att) >= falls)
+    heals_planned = np.bincount(l_att, minlength=n_att)
+    lethal_n = np.ceil((100 + 10 * heals_planned) / _js_round(5 * mult)).astype(np.int64)
+    n_hit = np.where(by_hits, lethal_n, rng.poisson(0.07 * secs / skill[a_sess]))
+    h_att, _ = _within(n_hit)
+    h_t = t0[h_att] + (rng.random(len(h_att)) * duration[h_att]).astype(np.int64)
+    h_src = np.empty(len(h_att), dtype=object)
+    for s in STAGES:
+        m = a_stage[h_att] == s.number
+        h_src[m] = rng.choice(list(s.hits), int(m.sum()), p=list(s.hits.values()))
+    h_dmg = _js_round(pd.Series(h_src, dtype=object).map(HIT_SOURCES).to_numpy(dtype=float) * mult[h_att])
+
+    # ---- the hp line: hits and heals in time order per attempt ----
+    hp_att = np.r_[h_att, l_att]
+    order = np.lexsort((np.r_[h_t, l_t], hp_att))
+    hp_att = hp_att[order]
+    hp_t = np.r_[h_t, l_t][order]
+    delta = np.r_[-h_dmg, np.full(len(l_att), 10.0)][order]
+    hp_before, hp_after, kept, lethal = _hp_line(hp_att, delta, by_hits[hp_att])
+    is_hit = order < len(h_att)
+    src = np.r_[h_src, np.full(len(l_att), "", dtype=object)][order]
+
+    # a death by hits happens at the lethal hit; everything after it is cut
+    t_cut = t_end.copy()
+    t_cut[hp_att[lethal]] = hp_t[lethal]
+    duration = np.where(a_out == OUTCOME_FAIL, t_cut - t0, duration)
+
+    cols: Dict[str, List[np.ndarray]] = {k: [] for k in ("attempt", "t", "type", "body")}
+
+    def emit(attempt: np.ndarray, t: np.ndarray, event_type: str, fields: list, cut: bool = True):
+        keep = t <= t_cut[attempt] if cut else np.ones(len(attempt), dtype=bool)
+        attempt, t = attempt[keep], t[keep]
+        fields = [(k, v if v is None or np.isscalar(v) else np.asarray(v)[keep]) for k, v in fields]
+        cols["attempt"].append(attempt)
+        cols["t"].append(t.astype(np.int64))
+        cols["type"].append(np.full(len(attempt), event_type, dtype=object))
+        cols["body"].append(np.asarray(_fields(len(attempt), fields), dtype=object))
+        return attempt
+
+    aid = att["attempt_id"].to_numpy()
+    idx_all = np.arange(n_att)
+
+    # the scene's attempt fields; their difficulty lands on the key the server already set
+    def base(a):
+        return [("attempt_id", aid[a])]
+
+    reason = np.where(first_of_stage, "scene_create", "stage_start").astype(object)
+    emit(idx_all, t0, "stage_start", base(idx_all) + [("reason", reason)])
+
+    # enemy_spawn for every spawn point, right after the scene starts
+    a, k = _within(n_spawn)
+    goblins = np.select([a_stage[a] == n for n in spawns], [g for g, _ in spawns.values()])
+    enemy = np.where(k < goblins, "GoblinEnemy", "ArcherEnemy").astype(object)
+    emit(a, t0[a] + 5 * k + 1, "enemy_spawn", base(a) + [("enemy", enemy)])
+
+    # dialogue with the stage's NPC, before the first fight
+    a = np.flatnonzero(dialogue)
+    d_start = np.minimum(t0[a] + rng.integers(1_000, 8_000, len(a)), t_cut[a] - 4)
+    d_end = np.minimum(d_start + rng.integers(4_000, 20_000, len(a)), t_cut[a] - 2)
+    npc = [("dialogue_id", np.where(a_stage[a] == 1, "intro", "forest_guide").astype(object)), ("npc", "Npc")]
+    emit(a, d_start, "dialogue_start", base(a) + npc)
+    emit(a, d_end, "dialogue_end", base(a) + npc)
+
+    a, k = _within(n_beat)
+    remaining = n_spawn[a] - np.floor(n_kill[a] * (k + 1) * HEARTBEAT_MS / np.maximum(duration[a], 1)).astype(np.int64)
+    emit(a, t0[a] + (k + 1) * HEARTBEAT_MS, "heartbeat", base(a) + [("hp", None), ("enemies_remaining", np.maximum(remaining, 0))])
+
+    a, _ = _within(n_parry)
+    parried = np.where(rng.random(len(a)) < 0.6, "GoblinEnemy", "ArcherEnemy").astype(object)
+    emit(a, t0[a] + (rng.random(len(a)) * duration[a]).astype(np.int64), "parry_success", base(a) + [("enemy", parried)])
+    parries = np.bincount(cols["attempt"][-1], minlength=n_att)
+
+    killed = np.where(rng.random(len(k_att)) < 0.55, "GoblinEnemy", "ArcherEnemy").astype(object)
+    kills = np.bincount(emit(k_att, k_t, "enemy_kill", base(k_att) + [
+        ("enemy", killed), ("hp_max", np.where(killed == "GoblinEnemy", 30, 15))]), minlength=n_att)
+    emit(p_att, p_t, "pickup_spawn", base(p_att) + [("type", "heart"), ("heal_amount", 10)])
+
+    hit = is_hit & kept
+    a = hp_att[hit]
+    emit(a, hp_t[hit], "player_hit", base(a) + [
+        ("damage", (-delta[hit]).astype(np.int64)), ("hp_before", hp_before[hit].astype(np.int64)),
+        ("hp_after", hp_after[hit].astype(np.int64)), ("enemy", src[hit])])
+    damage_taken = np.bincount(a, weights=-delta[hit], minlength=n_att).astype(np.int64)
+    heal = ~is_hit & kept
+    a = hp_att[heal]
+    emit(a, hp_t[heal], "heal_pickup", base(a) + [
+        ("amount", 10), ("hp_before", hp_before[heal].astype(np.int64)), ("hp_after", hp_after[heal].astype(np.int64))])
+    heals = np.bincount(a, minlength=n_att)
+
+    def summary(a, result):
+        return [("attempt_id", aid[a]), ("duration_ms", duration[a]), ("damage_taken", damage_taken[a]),
+                ("result", result), ("enemies_killed", kills[a]), ("heals_picked", heals[a]), ("parries", parries[a])]
+
+    a = np.flatnonzero(a_out == OUTCOME_WIN)
+    emit(a, t_end[a], "stage_complete", summary(a, "win"), cut=False)
+
+    # deaths: death + fail at the cut, then a retry when the player goes again
+    a = np.flatnonzero(a_out == OUTCOME_FAIL)
+    cause = np.full(n_att, "fell", dtype=object)
+    cause[hp_att[lethal]] = pd.Series(src[lethal], dtype=object).map(DEATH_CAUSE).to_numpy()
+    cause = cause[a]
+    death_x, death_y = np.zeros(len(a)), np.zeros(len(a))
+    for s in STAGES:
+        m = a_stage[a] == s.number
+        death_x[m], death_y[m] = death_positions(rng, s, cause[m])
+    emit(a, t_cut[a], "death", base(a) + [("cause", cause), ("x_position", death_x), ("y_position", death_y)], cut=False)
+    emit(a, t_cut[a] + 5, "fail", summary(a, "fail") + [("cause", cause)], cut=False)
+    ra = a[~att["last"].to_numpy()[a]]
+    emit(ra, t_cut[ra] + gap[ra + 1] - rng.integers(100, 700, len(ra)), "retry", base(ra) + [("from", "death_screen")], cut=False)
+    deaths = pd.DataFrame({"attempt": a, "t": t_cut[a], "x_position": death_x, "y_position": death_y})
+
+    a = np.flatnonzero(a_out == OUTCOME_QUIT)
+    emit(a, t_end[a], "quit", base(a), cut=False)
+
+    # ---- assemble ----
+    # attempts were scheduled with their planned length; pull everything after an early death forward
+    lost = t_end - t_cut
+    shift = _group_cumsum(lost, new_session) - lost
+    events = pd.DataFrame({
+        "attempt": np.concatenate(cols["attempt"]),
+        "t": np.concatenate(cols["t"]),
+        "event_type": np.concatenate(cols["type"]),
+        "body": np.concatenate(cols["body"]),
+    })
+    ev_att = events["attempt"].to_numpy()
+    events["t"] -= shift[ev_att]
+    events["session"] = a_sess[ev_att]
+    events["stage_number"] = a_stage[ev_att]
+
+    # session-level events: complete_flow before the first attempt, logout after the last one
+    s_first = np.flatnonzero(new_session)
+    s_last = np.r_[s_first[1:], n_att] - 1
+    logged_out = a_out[s_last] != OUTCOME_CLOSED
+    s_end = t_cut[s_last] - shift[s_last]
+    played = np.zeros(n_sessions, dtype=np.int64)
+    played[a_sess[s_last]] = (s_end - starts[a_sess[s_last]]) // 1000
+    sess_all = np.arange(n_sessions)
+    out_sess = a_sess[s_last][logged_out]
+    session_events = pd.DataFrame({
+        "attempt": -1,
+        "t": np.r_[starts, s_end[logged_out] + rng.integers(2_000, 30_000, int(logged_out.sum()))],
+        "event_type": np.r_[np.full(n_sessions, "complete_flow", dtype=object), np.full(len(out_sess), "logout", dtype=object)],
+        "body": np.r_[np.full(n_sessions, "", dtype=object),
+                      _fields(len(out_sess), [("duration_seconds", played[out_sess])]).to_numpy()],
+        "session": np.r_[sess_all, out_sess],
+    })
+    session_events["stage_number"] = SESSION_STAGE[difficulty[session_events["session"].to_numpy()]]
+    events = pd.concat([events, session_events], ignore_index=True)
+    events = events.sort_values(["t", "session"], kind="stable", ignore_index=True)
+
+    s = events["session"].to_numpy()
+    prefix = ('{"difficulty": "' + np.asarray(DIFFICULTIES, dtype=object)[difficulty[s]]
+              + '", "character": "' + np.asarray(CHARACTERS, dtype=object)[character[s]] + '"')
+    out = pd.DataFrame({
+        "user_id": user_id[s],
+        "session_id": session_id[s],
+        "event_type": events["event_type"].to_numpy(),
+        "event_data": prefix + events["body"].to_numpy() + "}",
+        "stage_number": events["stage_number"].to_numpy(),
+        "timestamp": _iso(events["t"].to_numpy()),
+        "event_id": _hex_ids(rng, len(events), 32),
+    })
+
+    deaths["t"] -= shift[deaths["attempt"].to_numpy()]
+    deaths = deaths.sort_values("t", kind="stable")
+    ds = a_sess[deaths["attempt"].to_numpy()]
+    death_rows = pd.DataFrame({
+        "user_id": user_id[ds],
+        "session_id": session_id[ds],
+        "stage_number": a_stage[deaths["attempt"].to_numpy()],
+        "x_position": deaths["x_position"].to_numpy(),
+        "y_position": deaths["y_position"].to_numpy(),
+        "timestamp": _iso(deaths["t"].to_numpy()),
+    })
+    return out, death_rows
+
+
+def _iso(ms: np.ndarray) -> np.ndarray:
+    """Epoch ms -> ISO 8601 with the +00:00 offset the server writes."""
+    return pd.Series(np.datetime_as_string(ms.astype("datetime64[ms]"), unit="ms")).add("+00:00").to_numpy(dtype=object)
+
+
+def generate(sessions: int, seed: int = 0, players: Optional[int] = None, days: int = 30,
+             start: str = START) -> Iterator[Tuple[pd.DataFrame, pd.DataFrame]]:
+    """(telemetry_events, death_heatmap) frames, one per block of BLOCK_SESSIONS sessions."""
+    pl = make_players(players or max(1, sessions // 3), seed)
+    starts = session_starts(sessions, seed, days, start)
+    for block, lo in enumerate(range(0, sessions, BLOCK_SESSIONS)):
+        hi = min(sessions, lo + BLOCK_SESSIONS)
+        yield generate_block(block, hi - lo, pl, starts[lo:hi], seed)
+
+
+def events_frame(sessions: int, seed: int = 0, **kwargs) -> pd.DataFrame:
+    """All telemetry_events rows of a small run in one frame, with ids, as the dashboard reads them."""
+    df = pd.concat([events for events, _ in generate(sessions, seed, **kwargs)], ignore_index=True)
+    df.insert(0, "id", np.arange(1, len(df) + 1))
+    return df
+
+
+# ---------- writers ----------
+def ensure_tables(conn: sqlite3.Connection) -> None:
+    """The ingest schema (app/main.py ensure_dashboard_tables)."""
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS telemetry_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        session_id TEXT,
+        event_type TEXT,
+        event_data TEXT,
+        stage_number INTEGER,
+        timestamp TEXT,
+        event_id TEXT
+    );
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS death_heatmap (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        session_id TEXT,
+        stage_number INTEGER,
+        x_position REAL,
+        y_position REAL,
+        timestamp TEXT
+    );
+    """)
+    conn.commit()
+
+
+def write_sqlite(db_path: str, blocks, append: bool = False) -> Tuple[int, int]:
+    """
+    Bulk-load blocks with executemany, one transaction per block. The
+    event_id index is built after the load when the table is new.
+    Returns (events, deaths) written.
+    """
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        ensure_tables(conn)
+        existing = conn.execute("SELECT COUNT(*) FROM telemetry_events").fetchone()[0]
+        if existing and not append:
+            raise SystemExit(f"{db_path} already has {existing} events (use --append)")
+        conn.execute("PRAGMA synchronous=OFF")
+        n_events = n_deaths = 0
+        ev_sql = f"INSERT INTO telemetry_events({', '.join(EVENTS_COLUMNS)}) VALUES ({', '.join('?' * len(EVENTS_COLUMNS))})"
+        dh_sql = f"INSERT INTO death_heatmap({', '.join(DEATH_COLUMNS)}) VALUES ({', '.join('?' * len(DEATH_COLUMNS))})"
+        for events, deaths in blocks:
+            conn.execute("BEGIN")
+            conn.executemany(ev_sql, events.itertuples(index=False, name=None))
+            conn.executemany(dh_sql, deaths.itertuples(index=False, name=None))
+            conn.execute("COMMIT")
+            n_events += len(events)
+            n_deaths += len(deaths)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_telemetry_events_event_id ON telemetry_events(event_id)")
+        conn.execute("PRAGMA synchronous=FULL")
+        return n_events, n_deaths
+    finally:
+        conn.close()
+
+
+def write_parquet(out_dir: str, blocks) -> Tuple[int, int]:
+    """One events-NNNNN.parquet and deaths-NNNNN.parquet per block (needs pyarrow)."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise SystemExit("--parquet needs pyarrow: pip install pyarrow")
+    os.makedirs(out_dir, exist_ok=True)
+    n_events = n_deaths = 0
+    for i, (events, deaths) in enumerate(blocks):
+        events.to_parquet(os.path.join(out_dir, f"events-{i:05d}.parquet"), index=False)
+        deaths.to_parquet(os.path.join(out_dir, f"deaths-{i:05d}.parquet"), index=False)
+        n_events += len(events)
+        n_deaths += len(deaths)
+    return n_events, n_deaths
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sessions", type=int, default=40)
+    ap.add_argument("--players", type=int, help="default: a third of the sessions")
+    ap.add_argument("--days", type=int, default=30)
+    ap.add_argument("--start", default=START, help="first day (UTC)")
+    ap.add_argument("--seed", type=int, default=0)
+    out = ap.add_mutually_exclusive_group()
+    out.add_argument("--db", default=DB_PATH, help="SQLite file (default: $GAME_DB_PATH or ./demo_game.db)")
+    out.add_argument("--parquet", help="write Parquet files to this directory instead")
+    ap.add_argument("--append", action="store_true", help="add to a DB that already has events")
+    args = ap.parse_args()
+
+    t = time.perf_counter()
+    blocks = generate(args.sessions, args.seed, args.players, args.days, args.start)
+    if args.parquet:
+        n_events, n_deaths = write_parquet(args.parquet, blocks)
+        target = args.parquet
+    else:
+        n_events, n_deaths = write_sqlite(args.db, blocks, append=args.append)
+        target = args.db
+    took = time.perf_counter() - t
+    print(f"{args.sessions} sessions -> {n_events} events, {n_deaths} deaths in {target} "
+          f"({took:.1f}s, {n_events / max(took, 1e-9):,.0f} events/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+WSGI entry point for running the admin dashboard as its own process:
+
+    gunicorn dashboard.wsgi:server --workers 2 --bind 127.0.0.1:8050
+
+and start the API with ADMIN_UPSTREAM=http://127.0.0.1:8050 so /admin is
+reverse-proxied to it (start.sh does both with ADMIN_MODE=process).
+Telemetry reads go through read-only SQLite connections; the balancing
+decision log and the attempts tables (ATTEMPTS_DB_PATH, see
+dashboard/attempts.py) are the only things this process writes.
+"""
+import os
+from pathlib import Path
+
+_ROOT = Path(__file__).resolve().parent.parent
+
+# same DB the API writes to (app.main: DATA_DIR/game.db)
+_DATA_DIR = os.environ.get("DATA_DIR") or str(_ROOT / "data")
+os.environ.setdefault("DB_PATH", os.path.join(_DATA_DIR, "game.db"))
+os.environ.setdefault("DB_READONLY", "1")
+
+from dashboard.app import app  # noqa: E402
+
+server = app.server
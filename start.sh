@@ -3,4 +3,20 @@ set -e
 
 export DB_PATH=${DB_PATH:-/data/game.db}
 
+# ADMIN_MODE=process (the Docker image's default): run the Dash admin in its
+# own (lower priority) gunicorn process and let the API reverse-proxy /admin
+# to it, so dashboard load doesn't compete with /api/collect for the API's
+# event loop and threads. ADMIN_MODE=inprocess (the default here) mounts the
+# dashboard inside the API on the first /admin request.
+if [ "${ADMIN_MODE:-inprocess}" = "process" ]; then
+  ADMIN_PORT=${ADMIN_PORT:-8050}
+  export ADMIN_UPSTREAM=${ADMIN_UPSTREAM:-http://127.0.0.1:${ADMIN_PORT}}
+  # only the dashboard process reads (and refreshes) the replica of game.db
+  # (dashboard/replica.py); the API process doesn't get DB_REPLICA
+  DB_PATH="${DATA_DIR:-$(pwd)/data}/game.db" DB_REPLICA=${DB_REPLICA:-1} nice -n "${ADMIN_NICE:-10}" \
+    gunicorn dashboard.wsgi:server \
+      --workers "${ADMIN_WORKERS:-2}" \
+      --bind "127.0.0.1:${ADMIN_PORT}" &
+fi
+
 exec uvicorn app.main:app --host 0.0.0.0 --port "${PORT:-8000}"
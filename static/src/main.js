@@ -1,6 +1,7 @@
 import { Start } from './scenes/Start.js';
 import { LevelOne } from './scenes/LevelOne.js';
 import { LevelTwo } from './scenes/LevelTwo.js';
+import { loadAtlasIndex } from './utils/atlases.js';
 
 const config = {
     type: Phaser.AUTO,
@@ -28,5 +29,6 @@ const config = {
     }
 }
 
-new Phaser.Game(config);
+// scenes need the atlas index in preload; without one they load file by file
+loadAtlasIndex().finally(() => new Phaser.Game(config));
             
\ No newline at end of file
@@ -11,6 +11,7 @@ import { KnightNpc } from "../entities/npc/knightNpc.js";
 import { CATS } from "../utils/physicsCategories.js";
 import { getDifficultyConfig } from "../config/difficulty.js";
 import HeartPickup from "../entities/pickups/HeartPickups.js";
+import { usePackedAtlases } from "../utils/atlases.js";
 
 const AssetKeys = {
   BACKGROUND: "bg_forest",
@@ -29,6 +30,9 @@ export class LevelTwo extends Phaser.Scene {
   }
 
   preload() {
+    // atlases (when built) replace most of the single-file loads below
+    usePackedAtlases(this);
+
     this.load.image(
       AssetKeys.BACKGROUND,
       "/static/assets/LevelDesign/PlatformerTiles/background/bg/bg_sky.png"
@@ -31,9 +31,26 @@ async function getUsername() {
   return usernamePromise;
 }
 
+// one id per event, reused on every retry so the server can drop duplicates
+function newEventId() {
+  if (globalThis.crypto?.randomUUID) return crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+}
+
 // simple queue to avoid spamming POSTs
 const queue = [];
 let flushTimer = null;
+const RETRY_DELAY_MS = 2000;
+
+const ATTEMPT_FIELDS = ["attempt_id", "difficulty", "duration_ms", "damage_taken"];
+
+function attemptFields(payload) {
+  const out = {};
+  for (const key of ATTEMPT_FIELDS) {
+    if (payload[key] != null) out[key] = payload[key];
+  }
+  return out;
+}
 
 export function sendTelemetry(event_type, payload = {}) {
   if (!cachedUsername) {
@@ -42,6 +59,7 @@ export function sendTelemetry(event_type, payload = {}) {
   }
 
   const evt = {
+    event_id: newEventId(),
     username: cachedUsername,
     event_type,
     timestamp: new Date().toISOString(),
@@ -55,8 +73,9 @@ export function sendTelemetry(event_type, payload = {}) {
       payload.duration_ms != null ? Math.round(payload.duration_ms / 1000) : null
     ),
 
-    // everything else goes in `extra`
-    extra: payload.extra ?? payload,
+    // everything else goes in `extra`; scenes that pass their own `extra`
+    // still get the attempt fields stored with it
+    extra: payload.extra ? { ...attemptFields(payload), ...payload.extra } : payload,
   };
 
   queue.push(evt);
@@ -69,6 +88,7 @@ async function flush() {
   if (!queue.length) return;
 
   const batch = queue.splice(0, queue.length);
+  let done = 0;
 
   try {
     // POST one by one
@@ -81,11 +101,22 @@ async function flush() {
 
       if (!res.ok) {
         console.error("telemetry /api/collect failed", res.status, await res.text());
+        // a 4xx will never succeed, drop it; a 5xx is retried below
+        if (res.status < 500) {
+          done++;
+          continue;
+        }
         break;
       }
+      done++;
     }
   } catch (e) {
-    // requeue on network failure
-    queue.unshift(...batch);
+    // network failure: fall through and requeue what didn't land
+  }
+
+  // requeue the unsent tail; event_id makes re-sending an accepted event harmless
+  if (done < batch.length) {
+    queue.unshift(...batch.slice(done));
+    if (!flushTimer) flushTimer = setTimeout(flush, RETRY_DELAY_MS);
   }
 }
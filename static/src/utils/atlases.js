@@ -0,0 +1,120 @@
+// utils/atlases.js
+// Packed texture atlases built by `python -m tools.pack_atlases`.
+//
+// main.js loads static/atlases/index.json before the game starts. In a
+// scene's preload, usePackedAtlases(this) then:
+//   - queues the scene's atlases (a few requests instead of one per image),
+//   - makes this.load.image / this.load.spritesheet skip every key that an
+//     atlas already carries,
+//   - when an atlas arrives, redraws each packed key onto a canvas of its
+//     original size and registers it under the original key (spritesheets
+//     with their original frame config), then drops the atlas texture.
+// Game code keeps using the same texture keys and frame numbers. Without an
+// index (atlases not built) everything loads file by file as before.
+
+const INDEX_URL = "/static/atlases/index.json";
+
+let atlasIndex = null;
+
+export async function loadAtlasIndex(url = INDEX_URL) {
+  try {
+    const r = await fetch(url);
+    atlasIndex = r.ok ? await r.json() : null;
+  } catch {
+    atlasIndex = null;
+  }
+  return atlasIndex;
+}
+
+function sameUrl(a, b) {
+  return String(a).replace(/^\/+/, "") === String(b).replace(/^\/+/, "");
+}
+
+function isPacked(key, url, atlases) {
+  const entry = typeof key === "string" ? atlasIndex?.keys?.[key] : null;
+  return !!entry && atlases.includes(entry.atlas) && (url === undefined || sameUrl(entry.url, url));
+}
+
+function drawFrame(ctx, frame, dx, dy) {
+  const trim = frame.data?.spriteSourceSize ?? { x: 0, y: 0 };
+  ctx.drawImage(
+    frame.source.image,
+    frame.cutX, frame.cutY, frame.cutWidth, frame.cutHeight,
+    dx + trim.x, dy + trim.y, frame.cutWidth, frame.cutHeight
+  );
+}
+
+function sheetCells(entry) {
+  const cfg = entry.config;
+  const fw = cfg.frameWidth;
+  const fh = cfg.frameHeight ?? fw;
+  const margin = cfg.margin ?? 0;
+  const spacing = cfg.spacing ?? 0;
+  const cols = Math.floor((entry.width - margin + spacing) / (fw + spacing));
+  const start = cfg.startFrame ?? 0;
+
+  const cells = [];
+  for (let i = 0; i < entry.frames; i++) {
+    const n = start + i;
+    cells.push([margin + (n % cols) * (fw + spacing), margin + Math.floor(n / cols) * (fh + spacing)]);
+  }
+  return cells;
+}
+
+function unpackAtlas(scene, atlasName) {
+  const textures = scene.textures;
+
+  for (const [key, entry] of Object.entries(atlasIndex.keys)) {
+    if (entry.atlas !== atlasName || textures.exists(key)) continue;
+
+    const canvas = document.createElement("canvas");
+    canvas.width = entry.width;
+    canvas.height = entry.height;
+    const ctx = canvas.getContext("2d");
+
+    if (entry.type === "spritesheet") {
+      sheetCells(entry).forEach(([x, y], i) => {
+        drawFrame(ctx, textures.getFrame(atlasName, `${key}/${i}`), x, y);
+      });
+      textures.addSpriteSheet(key, canvas, entry.config);
+    } else {
+      drawFrame(ctx, textures.getFrame(atlasName, key), 0, 0);
+      textures.addCanvas(key, canvas);
+    }
+  }
+
+  // every key now has its own texture; free the page(s)
+  textures.remove(atlasName);
+}
+
+export function usePackedAtlases(scene) {
+  const atlases = atlasIndex?.scenes?.[scene.sys.settings.key] ?? [];
+  if (!atlases.length) return;
+
+  const load = scene.load;
+
+  for (const name of atlases) {
+    const keys = Object.keys(atlasIndex.keys).filter((k) => atlasIndex.keys[k].atlas === name);
+    if (keys.every((k) => scene.textures.exists(k))) continue; // unpacked by an earlier scene
+
+    load.once(`filecomplete-multiatlas-${name}`, () => unpackAtlas(scene, name));
+    load.multiatlas(name, atlasIndex.atlases[name], "");
+  }
+
+  if (load.__packedAtlases) {
+    load.__packedAtlases = atlases;
+    return;
+  }
+  load.__packedAtlases = atlases;
+
+  const image = load.image;
+  const spritesheet = load.spritesheet;
+  load.image = function (key, url, ...rest) {
+    if (isPacked(key, url, this.__packedAtlases)) return this;
+    return image.call(this, key, url, ...rest);
+  };
+  load.spritesheet = function (key, url, ...rest) {
+    if (isPacked(key, url, this.__packedAtlases)) return this;
+    return spritesheet.call(this, key, url, ...rest);
+  };
+}
@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.admin_proxy import AdminProxy
+
+
+def _echo_upstream(request: httpx.Request) -> httpx.Response:
+    """Stands in for the gunicorn dashboard: echoes what it received."""
+    body = {
+        "url": str(request.url),
+        "method": request.method,
+        "body": request.content.decode(),
+        "headers": {k: v for k, v in request.headers.items()},
+    }
+    return httpx.Response(200, json=body, headers=[("set-cookie", "a=1"), ("set-cookie", "b=2"),
+                                                   ("connection", "close")])
+
+
+def _client(transport) -> TestClient:
+    proxy = AdminProxy("http://dash.internal:8050", transport=transport)
+    return TestClient(Starlette(routes=[Mount("/admin", proxy)]))
+
+
+class TestAdminProxy:
+    """Reverse proxy used when the dashboard runs in its own process"""
+
+    def test_forwards_path_below_mount_query_and_body(self):
+        # Act
+        resp = _client(httpx.MockTransport(_echo_upstream)).post(
+            "/admin/_dash-update-component?x=1", content=b'{"output": "kpi-row"}',
+            headers={"content-type": "application/json"},
+        )
+
+        # Assert
+        seen = resp.json()
+        assert resp.status_code == 200
+        assert seen["url"] == "http://dash.internal:8050/_dash-update-component?x=1"
+        assert seen["method"] == "POST"
+        assert json.loads(seen["body"]) == {"output": "kpi-row"}
+        assert seen["headers"]["x-forwarded-proto"] == "http"
+        assert seen["headers"]["x-forwarded-host"] == "testserver"
+
+    def test_keeps_repeated_headers_and_drops_hop_by_hop(self):
+        resp = _client(httpx.MockTransport(_echo_upstream)).get("/admin/")
+
+        assert resp.headers.get_list("set-cookie") == ["a=1", "b=2"]
+        assert "connection" not in resp.headers
+
+    def test_upstream_down_is_502(self):
+        def refuse(request):
+            raise httpx.ConnectError("connection refused", request=request)
+
+        resp = _client(httpx.MockTransport(refuse)).get("/admin/")
+
+        assert resp.status_code == 502
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from tools.pack_atlases import discover_scenes, pack, pack_scenes, parse_loads, sheet_grid
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def game_tree(tmp_path):
+    """static/ with one scene, one entity helper, an image and a 2x1 spritesheet."""
+    static = tmp_path / "static"
+    (static / "src" / "scenes").mkdir(parents=True)
+    (static / "src" / "entities").mkdir()
+    (static / "assets").mkdir()
+
+    (static / "src" / "scenes" / "Level.js").write_text("""
+import { Goblin } from "../entities/Goblin.js";
+const AssetKeys = { HP: "hpFill" };
+export class Level extends Phaser.Scene {
+  constructor() { super("Level"); }
+  preload() {
+    this.load.image(AssetKeys.HP, "/static/assets/hp.png");
+    Goblin.preload(this);
+  }
+}
+""", encoding="utf-8")
+    (static / "src" / "entities" / "Goblin.js").write_text("""
+export class Goblin {
+  static preload(scene) {
+    scene.load.spritesheet('goblin', '/static/assets/goblin.png', {
+      frameWidth: 16,
+      frameHeight: 16
+    });
+  }
+}
+""", encoding="utf-8")
+
+    hp = Image.new("RGBA", (40, 10), (0, 0, 0, 0))
+    hp.paste((255, 0, 0, 255), (5, 2, 35, 8))
+    hp.save(static / "assets" / "hp.png")
+
+    sheet = Image.new("RGBA", (32, 16), (0, 0, 0, 0))
+    sheet.paste((0, 255, 0, 255), (4, 4, 12, 12))
+    sheet.paste((0, 255, 0, 255), (20, 4, 28, 12))  # same pixels as frame 0
+    sheet.save(static / "assets" / "goblin.png")
+    return static
+
+
+class TestSceneParsing:
+    """Unit tests for finding what a scene preloads"""
+
+    def test_follows_constants_and_preload_helpers(self, game_tree):
+        calls = parse_loads(game_tree / "src" / "scenes" / "Level.js")
+
+        by_key = {c.key: c for c in calls}
+        assert set(by_key) == {"hpFill", "goblin"}
+        assert by_key["goblin"].kind == "spritesheet"
+        assert by_key["goblin"].config == {"frameWidth": 16, "frameHeight": 16}
+
+    def test_sheet_grid_matches_phaser_order(self):
+        cells = sheet_grid(40, 20, {"frameWidth": 10, "frameHeight": 10})
+
+        assert cells[:5] == [(0, 0), (10, 0), (20, 0), (30, 0), (0, 10)]
+        assert len(cells) == 8
+
+
+class TestPacking:
+    """Shelf packing into power-of-two pages"""
+
+    def test_pages_are_power_of_two_without_overlap(self):
+        rects = [(f"r{i}", 10 + i * 7, 5 + i * 3) for i in range(12)]
+
+        pages = pack(rects, max_size=256)
+
+        placed = {}
+        for (w, h), page in pages:
+            assert w & (w - 1) == 0 and h & (h - 1) == 0
+            for rid, (x, y) in page.items():
+                placed[rid] = (x, y, w, h)
+        assert set(placed) == {r[0] for r in rects}
+        boxes = [(x, y, x + rw, y + rh) for (rid, rw, rh) in rects for x, y, _, _ in [placed[rid]]]
+        for i, a in enumerate(boxes):
+            for b in boxes[i + 1:]:
+                assert a[2] <= b[0] or b[2] <= a[0] or a[3] <= b[1] or b[3] <= a[1]
+
+    def test_spills_onto_more_pages(self):
+        pages = pack([("a", 60, 60), ("b", 60, 60)], max_size=64)
+
+        assert len(pages) == 2
+
+    def test_oversized_sprite_is_rejected(self):
+        with pytest.raises(ValueError):
+            pack([("huge", 300, 10)], max_size=256)
+
+
+class TestPackScenes:
+    """End to end: scene sources -> atlas pages + index.json"""
+
+    def test_trims_dedupes_and_indexes(self, game_tree):
+        # Arrange
+        out = game_tree / "atlases"
+
+        # Act
+        index = pack_scenes(discover_scenes(game_tree / "src" / "scenes"), game_tree, out)
+
+        # Assert
+        assert index["scenes"] == {"Level": ["Level"]}
+        assert index["atlases"]["Level"] == "/static/atlases/Level.json"
+        assert index["keys"]["goblin"]["frames"] == 2
+        assert index["keys"]["hpFill"]["width"] == 40
+
+        atlas = json.loads((out / "Level.json").read_text())
+        frames = {f["filename"]: f for t in atlas["textures"] for f in t["frames"]}
+        assert frames["hpFill"]["frame"]["w"] == 30                       # trimmed
+        assert frames["hpFill"]["spriteSourceSize"]["x"] == 5
+        assert frames["hpFill"]["sourceSize"] == {"w": 40, "h": 10}
+        assert frames["goblin/0"]["frame"] == frames["goblin/1"]["frame"]  # stored once
+        assert atlas["textures"][0]["image"] == "/static/atlases/Level-0.png"
+
+    def test_output_outside_static_is_refused_before_writing(self, game_tree, tmp_path):
+        out = tmp_path / "elsewhere" / "atlases"
+
+        with pytest.raises(ValueError, match="must be inside"):
+            pack_scenes(discover_scenes(game_tree / "src" / "scenes"), game_tree, out)
+
+        assert not out.exists()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
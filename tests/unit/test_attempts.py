@@ -0,0 +1,290 @@
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import attempts
+from dashboard.attempts import attempt_summary, build_attempts
+from dashboard.metrics import combat_by_stage, normalize_events
+
+COLUMNS = ["id", "user_id", "session_id", "stage_id", "ts_ms", "event_type", "attempt_id",
+           "difficulty", "duration_ms", "damage", "heal_amount", "cause", "x", "y"]
+
+
+def _event(i, ts, event_type, attempt_id=None, session="s1", stage=1, **fields):
+    row = dict.fromkeys(COLUMNS)
+    row.update(id=i, user_id=7, session_id=session, stage_id=stage, ts_ms=ts,
+               event_type=event_type, attempt_id=attempt_id, difficulty="easy")
+    row.update(fields)
+    return row
+
+
+class TestBuildAttempts:
+    """Sort-and-segment of raw events into attempts"""
+
+    def test_two_attempts_fail_then_win(self):
+        # Arrange (shuffled: the builder sorts)
+        rows = [
+            _event(1, 0, "stage_start", 1),
+            _event(2, 1_000, "player_hit", 1, damage=10),
+            _event(3, 2_000, "player_hit", 1, damage=15),
+            _event(4, 3_000, "heal_pickup", 1, heal_amount=20),
+            _event(5, 4_000, "enemy_kill", 1),
+            _event(6, 5_000, "death", 1, cause="spikes", x=120.0, y=40.0),
+            _event(7, 5_001, "fail", 1, duration_ms=5_000, cause="spikes"),
+            _event(8, 6_000, "retry", 1),
+            _event(9, 7_000, "stage_start", 2),
+            _event(10, 8_000, "enemy_kill", 2),
+            _event(11, 19_000, "stage_complete", 2, duration_ms=12_000),
+        ]
+        events = pd.DataFrame(rows).sample(frac=1, random_state=3)
+
+        # Act
+        out = build_attempts(events).set_index("attempt_key")
+
+        # Assert
+        assert out.index.tolist() == [1, 9]
+        first, second = out.loc[1], out.loc[9]
+        assert first["outcome"] == "fail"
+        assert (first["hits_taken"], first["damage_taken"]) == (2, 25.0)
+        assert (first["heals"], first["heal_amount"], first["kills"]) == (1, 20.0, 1)
+        assert first["duration_ms"] == 5_000
+        assert (first["death_cause"], first["death_x"], first["death_y"]) == ("spikes", 120.0, 40.0)
+        assert first["events"] == 8                      # the retry stays with the failed attempt
+        assert second["outcome"] == "win"
+        assert second["duration_ms"] == 12_000
+        assert second["kills"] == 1 and second["hits_taken"] == 0
+        assert pd.isna(second["death_cause"])
+
+    def test_segments_without_attempt_ids_and_open_attempts(self):
+        # Arrange: legacy events (no attempt_id), two sessions, two stages
+        rows = [
+            _event(1, 0, "stage_start"),
+            _event(2, 500, "player_hit", damage=5),
+            _event(3, 900, "stage_start"),                 # restarted without ending
+            _event(4, 1_500, "player_hit", damage=5),
+            _event(5, 0, "stage_start", session="s2", stage=2),
+            _event(6, 4_000, "quit", session="s2", stage=2),
+        ]
+
+        # Act
+        out = build_attempts(pd.DataFrame(rows)).set_index("attempt_key")
+
+        # Assert
+        assert out["outcome"].to_dict() == {1: "abandoned", 3: "open", 5: "quit"}
+        assert out.loc[3, "duration_ms"] == 600           # span of its events
+        assert out.loc[5, "duration_ms"] == 4_000
+
+    def test_matches_a_groupby_reference(self):
+        # Arrange
+        rng = np.random.default_rng(11)
+        n = 4_000
+        kinds = rng.choice(list(attempts.EVENT_TYPES), n)
+        events = pd.DataFrame({
+            "id": np.arange(1, n + 1),
+            "user_id": 1,
+            "session_id": rng.choice(["a", "b", "c"], n),
+            "stage_id": rng.integers(1, 4, n),
+            "ts_ms": rng.permutation(n) * 1_000,
+            "event_type": kinds,
+            "attempt_id": None,
+            "difficulty": "hard",
+            "duration_ms": None,
+            "damage": rng.integers(1, 20, n),
+            "heal_amount": None, "cause": None, "x": None, "y": None,
+        })
+
+        # Act
+        out = build_attempts(events)
+
+        # Assert: attempts = stage_starts, plus one leading segment per group that doesn't open with one
+        ordered = events.sort_values(["session_id", "stage_id", "ts_ms"])
+        leading = ordered.groupby(["session_id", "stage_id"])["event_type"].first() != "stage_start"
+        assert len(out) == int((kinds == "stage_start").sum()) + int(leading.sum())
+        assert out["events"].sum() == n
+        assert out["hits_taken"].sum() == int((kinds == "player_hit").sum())
+        assert out["damage_taken"].sum() == events.loc[kinds == "player_hit", "damage"].sum()
+
+
+class TestAttemptSummary:
+    """Per-stage aggregation of attempts"""
+
+    def test_rates_and_means(self):
+        table = pd.DataFrame({
+            "stage_id": [1, 1, 1, 2],
+            "outcome": ["win", "fail", "open", "quit"],
+            "duration_ms": [10_000, 4_000, 1_000, 2_000],
+            "hits_taken": [1, 3, 0, 2], "damage_taken": [5.0, 30.0, 0.0, 8.0],
+            "heals": [0, 1, 0, 0], "kills": [4, 2, 0, 1],
+        })
+
+        summary = attempt_summary(table).set_index("stage_id")
+
+        assert summary.loc[1, "attempts"] == 3
+        assert summary.loc[1, "win_rate"] == 0.5           # open attempts don't count yet
+        assert summary.loc[1, "hits_per_attempt"] == pytest.approx(4 / 3, abs=0.01)
+        assert summary.loc[2, "quits"] == 1
+
+
+class TestIncrementalRefresh:
+    """The persisted table only reads new events, and rebuilds the attempts they can change"""
+
+    @pytest.fixture
+    def events_db(self, tmp_path, monkeypatch):
+        db_path = str(tmp_path / "game.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE telemetry_events (id INTEGER PRIMARY KEY, user_id INTEGER, session_id TEXT, "
+                     "event_type TEXT, event_data TEXT, stage_number INTEGER, timestamp TEXT)")
+        conn.commit()
+        conn.close()
+        monkeypatch.setenv("DB_PATH", db_path)
+        monkeypatch.delenv("ATTEMPTS_DB_PATH", raising=False)
+        return db_path
+
+    @staticmethod
+    def _insert(db_path, event_type, ts, attempt_id, session="s1", stage=1, **extra):
+        conn = sqlite3.connect(db_path)
+        data = {"difficulty": "easy", "character": "", "attempt_id": attempt_id, **extra}
+        conn.execute("INSERT INTO telemetry_events (user_id, session_id, event_type, event_data, stage_number, "
+                     "timestamp) VALUES (?, ?, ?, ?, ?, ?)", (1, session, event_type, json.dumps(data), stage, ts))
+        conn.commit()
+        conn.close()
+
+    def test_open_attempt_is_rebuilt_with_its_new_events(self, events_db, monkeypatch):
+        # Arrange
+        self._insert(events_db, "stage_start", "2026-03-04T09:00:00Z", 1)
+        self._insert(events_db, "player_hit", "2026-03-04T09:00:05Z", 1, damage=10)
+        self._insert(events_db, "stage_start", "2026-03-04T09:00:00Z", 1, session="s2")
+        loads = []
+        real_load = attempts.load_event_chunks
+        monkeypatch.setattr(attempts, "load_event_chunks",
+                            lambda after_id=0, upto_id=attempts._MAX_ID: loads.append((after_id, upto_id))
+                            or real_load(after_id, upto_id))
+
+        # Act
+        attempts.refresh()
+        before = attempts.load_attempts().set_index("attempt_key")
+        self._insert(events_db, "death", "2026-03-04T09:00:09Z", 1, cause="slime", x_position=3, y_position=4)
+        self._insert(events_db, "fail", "2026-03-04T09:00:09Z", 1, duration_ms=9_000)
+        attempts.refresh()
+        after = attempts.load_attempts().set_index("attempt_key")
+
+        # Assert
+        assert before.loc[1, "outcome"] == "open"
+        assert loads == [(0, attempts._MAX_ID), (3, attempts._MAX_ID), (0, 3)]   # new rows, then the open attempt's
+        assert len(after) == 2
+        row = after.loc[1]
+        assert (row["outcome"], row["hits_taken"], row["duration_ms"]) == ("fail", 1, 9_000)
+        assert (row["death_cause"], row["death_x"], row["death_y"]) == ("slime", 3.0, 4.0)
+        assert after.loc[3, "outcome"] == "open"          # s2 untouched
+        assert attempts.refresh() == 0                   # nothing new
+
+    def test_tables_stay_out_of_the_telemetry_db(self, events_db):
+        # Arrange
+        self._insert(events_db, "stage_start", "2026-03-04T09:00:00Z", 1)
+
+        # Act
+        attempts.refresh()
+
+        # Assert
+        assert attempts.attempts_db_path() == os.path.join(os.path.dirname(events_db), "attempts.db")
+        conn = sqlite3.connect(events_db)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conn.close()
+        assert tables == {"telemetry_events"}
+        assert len(attempts.load_attempts()) == 1
+
+    def test_late_event_rejoins_its_attempt(self, events_db):
+        # Arrange: attempt 1 ends, attempt 2 starts, then a hit from attempt 1 arrives late
+        self._insert(events_db, "stage_start", "2026-03-04T09:00:00Z", 1)
+        self._insert(events_db, "player_hit", "2026-03-04T09:00:02Z", 1, damage=5)
+        self._insert(events_db, "death", "2026-03-04T09:00:04Z", 1, cause="slime")
+        self._insert(events_db, "fail", "2026-03-04T09:00:04Z", 1)
+        self._insert(events_db, "stage_start", "2026-03-04T09:00:10Z", 2)
+        attempts.refresh()
+
+        # Act
+        self._insert(events_db, "player_hit", "2026-03-04T09:00:03Z", 1, damage=5)
+        attempts.refresh()
+
+        # Assert
+        stored = attempts.load_attempts().set_index("attempt_key")
+        assert sorted(stored.index) == [1, 5]
+        assert stored.loc[1, "hits_taken"] == 2 and stored.loc[1, "events"] == 5
+        full = build_attempts(attempts.load_events()).set_index("attempt_key").sort_index()
+        pd.testing.assert_frame_equal(stored, full, check_dtype=False)
+
+    def test_out_of_order_delivery_matches_a_full_rebuild(self, events_db):
+        # Arrange: two sessions' events, delivered in shuffled batches
+        rng = np.random.default_rng(3)
+        kinds = ["stage_start", "player_hit", "heal_pickup", "enemy_kill", "death", "fail", "stage_complete"]
+        rows = []
+        for session in ("s1", "s2"):
+            for i in range(60):
+                kind = rng.choice(kinds, p=[0.2, 0.3, 0.1, 0.1, 0.1, 0.1, 0.1])
+                rows.append((session, int(rng.integers(1, 3)), kind, f"2026-03-04T09:{i // 60:02d}:{i % 60:02d}Z",
+                             i // 8))
+        order = rng.permutation(len(rows))
+
+        # Act
+        for batch in np.array_split(order, 12):
+            for i in batch:
+                session, stage, kind, ts, attempt_id = rows[i]
+                self._insert(events_db, kind, ts, attempt_id, session=session, stage=stage, damage=1)
+            attempts.refresh()
+
+        # Assert
+        stored = attempts.load_attempts().set_index("attempt_key")
+        full = build_attempts(attempts.load_events()).set_index("attempt_key").sort_index()
+        pd.testing.assert_frame_equal(stored, full, check_dtype=False)
+
+    def test_first_build_reads_in_chunks(self, events_db, monkeypatch):
+        # Arrange: attempts spanning chunk boundaries
+        for attempt_id in range(1, 5):
+            for session in ("s1", "s2"):
+                self._insert(events_db, "stage_start", f"2026-03-04T09:0{attempt_id}:00Z", attempt_id, session=session)
+                self._insert(events_db, "player_hit", f"2026-03-04T09:0{attempt_id}:10Z", attempt_id,
+                             session=session, damage=3)
+        self._insert(events_db, "fail", "2026-03-04T09:01:20Z", 1)
+        monkeypatch.setattr(attempts, "chunk_rows", lambda: 3)
+        reads = []
+        real_chunks = attempts.query_chunks
+        monkeypatch.setattr(attempts, "query_chunks",
+                            lambda *args: (chunk for chunk in real_chunks(*args) if reads.append(len(chunk)) or True))
+
+        # Act
+        attempts.refresh()
+
+        # Assert
+        assert reads and max(reads) <= 3
+        stored = attempts.load_attempts().set_index("attempt_key")
+        full = build_attempts(attempts.load_events()).set_index("attempt_key").sort_index()
+        pd.testing.assert_frame_equal(stored, full, check_dtype=False)
+        assert stored["outcome"].tolist() == ["fail"] + ["abandoned"] * 5 + ["open"] * 2
+
+
+class TestHitsPerRun:
+    """combat_by_stage divides hits by attempts, not retries"""
+
+    def test_hits_per_run_uses_stage_starts(self):
+        raw = pd.DataFrame({
+            "event_type": ["stage_start", "player_hit", "player_hit", "retry", "stage_start", "player_hit"],
+            "stage_number": [1] * 6,
+            "event_data": [json.dumps({"difficulty": "easy", "attempt_id": a}) for a in (1, 1, 1, 1, 2, 2)],
+        })
+
+        out = combat_by_stage(normalize_events(raw)).set_index("stage_id")
+
+        assert out.loc[1, "attempts"] == 2
+        assert out.loc[1, "hits_per_run"] == 1.5
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
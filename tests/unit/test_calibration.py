@@ -0,0 +1,137 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import calibration
+from dashboard.balancing_toolkit import DEFAULT_PARAMS, SIM_CONSTANTS, run_simulation
+from dashboard.calibration import fit_stage, make_draws, observed_moments, simulate_attempts
+
+TRUTH = {"ARCHER_DMG": 6.0, "GOBLIN_DMG": 9.6, "PLAYER_HPS": 0.9,
+         "SKILL_SIGMA": 0.3, "EXPOSURE": 0.22, "DMG_NOISE_SIGMA": 0.45}
+
+
+def _synthetic_attempts(truth, n=4_000, seed=99, stage=1, difficulty="easy"):
+    """Attempts played by the model itself with known constants."""
+    draws = make_draws(n, seed=seed)
+    # the overhead is a fraction of the median win, so find that fixed point
+    median_ms = 60_000.0
+    for _ in range(30):
+        sim = simulate_attempts(truth, draws, median_ms)
+        median_ms = float(np.median(sim["duration_ms"][~sim["failed"]]))
+    c = {**SIM_CONSTANTS, **truth}
+    per_hit = (7 * c["ARCHER_HP"] * c["ARCHER_DMG"] + 8 * c["GOBLIN_HP"] * c["GOBLIN_DMG"]) / (7 * c["ARCHER_HP"] + 8 * c["GOBLIN_HP"])
+    return pd.DataFrame({
+        "stage_id": stage,
+        "difficulty": difficulty,
+        "outcome": np.where(sim["failed"], "fail", "win"),
+        "duration_ms": sim["duration_ms"],
+        "hits_taken": sim["hits"],
+        "damage_taken": sim["hits"] * per_hit,
+    })
+
+
+class TestFitStage:
+    """Method-of-moments fit against the vectorized attempt model"""
+
+    def test_recovers_known_constants(self):
+        # Arrange
+        observed = observed_moments(_synthetic_attempts(TRUTH)).set_index("difficulty").loc["easy"].to_dict()
+
+        # Act
+        fitted = fit_stage(observed, make_draws(4_000, seed=1))
+
+        # Assert
+        for key, value in TRUTH.items():
+            assert fitted[key] == pytest.approx(value, rel=0.15), key
+
+    def test_fitted_moments_match_observed(self):
+        observed = observed_moments(_synthetic_attempts(TRUTH)).iloc[0].to_dict()
+        draws = make_draws(4_000, seed=1)
+
+        moments = calibration.model_moments(fit_stage(observed, draws), draws, observed["median_win_ms"])
+
+        assert moments["fail_rate"] == pytest.approx(observed["fail_rate"], abs=0.01)
+        assert moments["hits_per_attempt"] == pytest.approx(observed["hits_per_attempt"], rel=0.02)
+        assert moments["median_win_ms"] == pytest.approx(observed["median_win_ms"], rel=0.01)
+
+
+class TestObservedMoments:
+    """Moments per stage/difficulty from the attempts table"""
+
+    def test_only_ended_attempts_count(self):
+        attempts = pd.DataFrame({
+            "stage_id": [1, 1, 1, 1],
+            "difficulty": ["easy", "easy", "hard", "easy"],
+            "outcome": ["win", "fail", "fail", "open"],
+            "duration_ms": [10_000, 3_000, 2_000, 500],
+            "hits_taken": [2, 4, 6, 9],
+            "damage_taken": [10.0, 20.0, 30.0, 90.0],
+        })
+
+        out = observed_moments(attempts).set_index("difficulty")
+
+        assert out.loc["easy", "attempts"] == 2
+        assert out.loc["easy", "fail_rate"] == 0.5
+        assert pd.isna(out.loc["easy", "median_win_ms"])   # one win is too few to time the stage
+        assert out.loc["", "attempts"] == 3                # all difficulties
+        assert out.loc["", "damage_per_hit"] == 5.0
+
+
+class TestRunSimulationConstants:
+    """run_simulation takes calibrated constants"""
+
+    def test_override_changes_prediction_and_defaults_are_unchanged(self):
+        # Arrange
+        funnel = pd.DataFrame({"stage_id": [1], "completion_rate": [0.5], "fail_rate": [0.5], "dropoff_rate": [0.1]})
+        tdf = pd.DataFrame({"stage_id": [1], "median_duration_ms": [60_000]})
+
+        # Act
+        _, default = run_simulation(funnel, tdf, DEFAULT_PARAMS, n_runs=100)
+        _, same = run_simulation(funnel, tdf, DEFAULT_PARAMS, n_runs=100, constants={})
+        _, harder = run_simulation(funnel, tdf, DEFAULT_PARAMS, n_runs=100, constants={"EXPOSURE": 0.8})
+
+        # Assert
+        pd.testing.assert_frame_equal(default, same)
+        assert harder["pred_attempt_fail_rate"].iloc[0] > default["pred_attempt_fail_rate"].iloc[0]
+
+
+class TestCachedCalibration:
+    """Fits are stored and only redone once the data has grown"""
+
+    def test_refit_only_after_growth(self, tmp_path, monkeypatch):
+        # Arrange
+        monkeypatch.setenv("ATTEMPTS_DB_PATH", str(tmp_path / "attempts.db"))
+        monkeypatch.setattr(calibration, "MIN_ATTEMPTS", 50)
+        calls = []
+        real_fit = calibration.fit_stage
+        monkeypatch.setattr(calibration, "fit_stage",
+                            lambda observed, draws=None, start=None: calls.append(start) or real_fit(observed, draws, start))
+        draws = make_draws(1_000)
+        attempts = _synthetic_attempts(TRUTH, n=400)
+
+        # Act
+        first = calibration.calibrate(attempts, draws=draws, only=[(1, "easy")])
+        calibration.calibrate(attempts.iloc[:-10], draws=draws, only=[(1, "easy")])
+        grown = pd.concat([attempts, _synthetic_attempts(TRUTH, n=100, seed=5)], ignore_index=True)
+        calibration.calibrate(grown, draws=draws, only=[(1, "easy")])
+
+        # Assert
+        assert len(calls) == 2
+        assert calls[0] is None and calls[1] is not None       # the re-fit is warm-started
+        assert first["difficulty"].tolist() == ["easy"]
+        stored = calibration.load_calibration()
+        assert stored["attempts"].tolist() == [500]
+        assert set(json.loads(stored["constants_json"].iloc[0])) == set(calibration.FITTED)
+        assert calibration.constants_for(stored, 1, "easy") is not None
+        assert calibration.constants_for(stored, 1, None) is None      # the all-difficulties fit wasn't asked for
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,203 @@
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import cohorts
+from dashboard.cohorts import build_players, cohort_table, prepare_events
+
+
+def _events(rows):
+    return pd.DataFrame(rows, columns=["user_id", "timestamp", "event_type", "stage_number", "difficulty", "character"])
+
+
+class TestBuildPlayers:
+    """Per-player sessionization and retention"""
+
+    def test_sessions_split_on_gaps(self):
+        # Arrange: two events 10 min apart, then one 2 hours later (unsorted input)
+        events = _events([
+            (1, "2026-03-02T12:00:00+00:00", "stage_start", 1, "easy", "knight"),
+            (1, "2026-03-02T10:10:00+00:00", "stage_start", 1, "easy", "knight"),
+            (1, "2026-03-02T10:00:00+00:00", "login", None, None, ""),
+        ])
+
+        # Act
+        players = build_players(prepare_events(events), session_gap_minutes=30)
+
+        # Assert
+        assert players["sessions"].tolist() == [2]
+        assert players["events"].tolist() == [3]
+
+    def test_retention_depth_and_attributes(self):
+        # Arrange
+        events = _events([
+            # user 1: first seen Wed 2026-03-04, back on day 1 and day 7
+            (1, "2026-03-04T09:00:00", "stage_complete", 2, "hard", "mage"),
+            (1, "2026-03-05T09:00:00", "stage_complete", 5, "easy", "rogue"),
+            (1, "2026-03-11T09:00:00", "stage_start", 6, "easy", "rogue"),
+            # user 2: first seen 2026-03-10, only back on day 2
+            (2, "2026-03-10T23:00:00", "login", None, None, None),
+            (2, "2026-03-12T01:00:00", "stage_start", 1, "easy", None),
+        ])
+
+        # Act
+        players = build_players(prepare_events(events)).set_index("user_id")
+
+        # Assert
+        one, two = players.loc[1], players.loc[2]
+        assert one["cohort_week"] == "2026-03-02"          # Monday of that week
+        assert (one["character"], one["difficulty"]) == ("mage", "hard")   # first recorded
+        assert one["depth"] == 5
+        assert bool(one["d1"]) and bool(one["d7"])
+        assert one["active_days"] == 3
+        assert (two["character"], two["difficulty"]) == ("unknown", "easy")
+        assert bool(two["d1_eligible"]) and not bool(two["d1"])
+        assert not bool(two["d7_eligible"])              # day 7 not observed yet
+        assert two["depth"] == 0
+
+    def test_matches_a_per_user_reference(self):
+        # Arrange
+        rng = np.random.default_rng(7)
+        n = 5_000
+        base = pd.Timestamp("2026-01-05", tz="UTC")
+        ts = base + pd.to_timedelta(rng.integers(0, 20 * 86_400, n), unit="s")
+        events = _events({
+            "user_id": rng.integers(0, 200, n),
+            "timestamp": ts.strftime("%Y-%m-%dT%H:%M:%S+00:00"),
+            "event_type": rng.choice(["stage_start", "stage_complete", "death"], n),
+            "stage_number": rng.integers(1, 10, n),
+            "difficulty": rng.choice(["easy", "hard"], n),
+            "character": rng.choice(["knight", "mage"], n),
+        })
+
+        # Act
+        players = build_players(prepare_events(events), session_gap_minutes=30).set_index("user_id")
+
+        # Assert
+        frame = events.assign(ts=pd.to_datetime(events["timestamp"], utc=True))
+        for uid, g in frame.sort_values("ts", kind="stable").groupby("user_id"):
+            gaps = g["ts"].diff().dt.total_seconds().fillna(np.inf)
+            days = (g["ts"].dt.floor("D") - g["ts"].iloc[0].floor("D")).dt.days
+            done = g.loc[g["event_type"] == "stage_complete", "stage_number"]
+            row = players.loc[uid]
+            assert row["sessions"] == int((gaps > 1800).sum())
+            assert bool(row["d1"]) == bool((days == 1).any())
+            assert row["depth"] == (int(done.max()) if len(done) else 0)
+
+
+class TestCohortTable:
+    """Aggregation of players into cohorts"""
+
+    def test_groups_and_rates(self):
+        # Arrange
+        players = pd.DataFrame({
+            "difficulty": ["easy", "easy", "hard"],
+            "d1_eligible": [True, True, True], "d1": [True, False, False],
+            "d7_eligible": [True, False, False], "d7": [True, False, False],
+            "sessions": [4, 2, 1], "depth": [5, 1, 0],
+        })
+
+        # Act
+        table = cohort_table(players, by="difficulty").set_index("difficulty")
+
+        # Assert
+        assert table.loc["easy", "players"] == 2
+        assert table.loc["easy", "d1_retention"] == 0.5
+        assert table.loc["easy", "d7_retention"] == 1.0
+        assert pd.isna(table.loc["hard", "d7_retention"])   # nobody eligible yet
+        assert table.loc["easy", "sessions_per_player"] == 3.0
+
+    def test_unknown_dimension(self):
+        with pytest.raises(ValueError):
+            cohort_table(pd.DataFrame(), by="country")
+
+
+class TestPlayerRollup:
+    """Chunked per-player partials give build_players' table"""
+
+    @pytest.mark.parametrize("chunk", [10_000, 250, 97])
+    def test_same_players_for_any_chunk_size(self, chunk):
+        # Arrange: ids in delivery order, timestamps out of order, some rows unusable
+        rng = np.random.default_rng(8)
+        n = 3_000
+        events = pd.DataFrame({
+            "id": np.arange(1, n + 1),
+            "user_id": rng.integers(1, 60, n),
+            "ts_ms": rng.integers(0, 20 * 86_400_000, n) // 60_000 * 60_000,
+            "completed_stage": rng.choice([0, 0, 0, 1, 2, 5], n),
+            "difficulty": rng.choice(["easy", "hard", None], n),
+            "character": rng.choice(["knight", "mage", None, None], n),
+        })
+        events.loc[rng.choice(n, 40), "ts_ms"] = None
+
+        # Act
+        rollup = cohorts.PlayerRollup.empty()
+        for i in range(0, n, chunk):
+            rollup = rollup.merge(cohorts.PlayerRollup.of(events.iloc[i:i + chunk]))
+
+        # Assert
+        expected = build_players(events, as_of=pd.Timestamp("2026-01-01", tz="UTC"))
+        pd.testing.assert_frame_equal(rollup.build(as_of=pd.Timestamp("2026-01-01", tz="UTC")), expected)
+        pd.testing.assert_frame_equal(rollup.build(), build_players(events))
+        assert rollup.rows == n
+
+
+class TestDailyCache:
+    """players() is rebuilt once per day, from only the new rows"""
+
+    @pytest.fixture
+    def events_db(self, tmp_path, monkeypatch):
+        db_path = str(tmp_path / "game.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE telemetry_events (id INTEGER PRIMARY KEY, user_id INTEGER, session_id TEXT, "
+                     "event_type TEXT, event_data TEXT, stage_number INTEGER, timestamp TEXT)")
+        conn.commit()
+        conn.close()
+        monkeypatch.setenv("DB_PATH", db_path)
+        cohorts.clear_cache()
+        yield db_path
+        cohorts.clear_cache()
+
+    @staticmethod
+    def _insert(db_path, user_id, event_type, stage, ts, character=""):
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO telemetry_events (user_id, event_type, event_data, stage_number, timestamp) "
+                     "VALUES (?, ?, ?, ?, ?)",
+                     (user_id, event_type, json.dumps({"difficulty": "easy", "character": character}), stage, ts))
+        conn.commit()
+        conn.close()
+
+    def test_cached_per_day_and_incremental(self, events_db, monkeypatch):
+        # Arrange
+        self._insert(events_db, 1, "stage_complete", 3, "2026-03-04T09:00:00", character="mage")
+        loads = []
+        real_load = cohorts.load_event_chunks
+        monkeypatch.setattr(cohorts, "load_event_chunks",
+                            lambda after_id=0: loads.append(after_id) or real_load(after_id))
+
+        # Act
+        first = cohorts.players(day="2026-03-04")
+        again = cohorts.players(day="2026-03-04")
+        self._insert(events_db, 1, "stage_complete", 4, "2026-03-05T09:00:00+00:00", character="rogue")
+        next_day = cohorts.players(day="2026-03-05")
+
+        # Assert
+        assert first is again
+        assert loads == [0, 1]                 # second build only read rows after id 1
+        assert first.iloc[0]["character"] == "mage"
+        assert first.iloc[0]["depth"] == 3
+        assert next_day.iloc[0]["depth"] == 4
+        assert bool(next_day.iloc[0]["d1"])
+        assert next_day.iloc[0]["character"] == "mage"    # still the first recorded
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
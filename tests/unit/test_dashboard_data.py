@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import data
+
+
+def _insert_event(db_path, event_type, stage, difficulty="easy", **payload):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO telemetry_events (user_id, session_id, event_type, event_data, stage_number) VALUES (1, 's', ?, ?, ?)",
+        (event_type, json.dumps({"difficulty": difficulty, **payload}), stage),
+    )
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def dashboard_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "game.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE telemetry_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, session_id TEXT,
+            event_type TEXT NOT NULL, event_data TEXT, stage_number INTEGER,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE death_heatmap (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, stage_number INTEGER,
+            x_position REAL, y_position REAL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        INSERT INTO death_heatmap (user_id, stage_number, x_position, y_position) VALUES (1, 2, 10, 20);
+    """)
+    conn.commit()
+    conn.close()
+    for ev, stage in [("stage_start", 1), ("stage_complete", 1), ("stage_start", 2), ("fail", 2)]:
+        _insert_event(db_path, ev, stage, duration_ms=1000)
+
+    monkeypatch.setenv("DB_PATH", db_path)
+    monkeypatch.setattr(data, "VERSION_TTL_SECONDS", 0.0)
+    data.clear_caches()
+    yield db_path
+    data.clear_caches()
+
+
+class TestMemoizedMetrics:
+    """Metric tables are reused until the data changes"""
+
+    def test_repeat_calls_hit_the_cache(self, dashboard_db):
+        # Act
+        first = data.funnel("easy")
+        second = data.funnel("easy")
+
+        # Assert
+        assert first is second
+        assert data.funnel.cache_info()["misses"] == 1
+        assert data.rollup.cache_info()["misses"] == 1
+
+    def test_stage_dependent_metrics_leave_funnel_alone(self, dashboard_db):
+        # Arrange
+        data.funnel(None)
+
+        # Act
+        data.hits(None, 1)
+        data.causes(None, 2)
+        data.hits(None, 2)
+
+        # Assert
+        assert data.funnel.cache_info() == {"hits": 0, "misses": 1, "size": 1}
+        assert data.rollup.cache_info()["misses"] == 1
+
+    def test_new_events_invalidate(self, dashboard_db):
+        # Arrange
+        before = data.funnel(None)
+
+        # Act
+        _insert_event(dashboard_db, "stage_start", 3)
+        after = data.funnel(None)
+
+        # Assert
+        assert 3 not in before["stage_id"].tolist()
+        assert 3 in after["stage_id"].tolist()
+
+    def test_version_is_reused_within_ttl(self, dashboard_db, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(data, "VERSION_TTL_SECONDS", 60.0)
+        data.invalidate()
+        version = data.data_version()
+
+        # Act
+        _insert_event(dashboard_db, "stage_start", 3)
+
+        # Assert
+        assert data.data_version() == version
+        data.invalidate()
+        assert data.data_version() != version
+
+    def test_missing_database_gives_empty_options(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("DB_PATH", str(tmp_path / "missing.db"))
+        data.clear_caches()
+
+        assert data.stages() == []
+        assert data.difficulties() == []
+        data.clear_caches()
+
+
+class TestDashboardCallbacks:
+    """Each figure callback only computes what it needs"""
+
+    @pytest.fixture
+    def dash_app(self, dashboard_db):
+        pytest.importorskip("dash")
+        from dashboard import app as dash_app
+        return dash_app
+
+    def test_heatmap_does_not_compute_funnel(self, dash_app):
+        # Act
+        fig = dash_app.update_heatmap(2, "heatmap")
+
+        # Assert
+        assert "Stage 2" in fig.layout.title.text
+        assert data.funnel.cache_info()["misses"] == 0
+        assert data.rollup.cache_info()["misses"] == 0
+
+    def test_hidden_tab_is_skipped(self, dash_app):
+        from dash.exceptions import PreventUpdate
+
+        with pytest.raises(PreventUpdate):
+            dash_app.update_funnel(None, "overview")
+        assert data.rollup.cache_info()["misses"] == 0
+
+    def test_overview_and_funnel_share_one_funnel_computation(self, dash_app):
+        # Act
+        dash_app.update_overview("easy", "overview")
+        dash_app.update_funnel("easy", "funnel")
+
+        # Assert
+        assert data.funnel.cache_info()["misses"] == 1
+        assert data.rollup.cache_info()["misses"] == 1
+
+    def test_queries_tab_needs_the_admin_token(self, dash_app, monkeypatch):
+        # Arrange
+        monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+
+        # Act
+        with dash_app.app.server.test_request_context():
+            refused = dash_app.update_queries(0, "queries", "wrong")
+            shown = dash_app.update_queries(0, "queries", "s3cret")
+        with dash_app.app.server.test_request_context(headers={"X-Admin-Token": "s3cret"}):
+            by_header = dash_app.update_queries(0, "queries", None)
+
+        # Assert
+        assert refused[0].startswith("ADMIN_TOKEN required") and refused[1:] == (None, None)
+        assert "statements shown" in shown[0]
+        assert "statements shown" in by_header[0]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -81,6 +81,18 @@ class TestQueryDf:
             assert len(result) == 0
             assert list(result.columns) == ["id", "name", "value"]
 
+    def test_query_df_read_only_connection(self):
+        with patch("db.get_db_path", return_value=self.db_path), \
+                patch.dict(os.environ, {"DB_READONLY": "1"}):
+            result = query_df("SELECT * FROM test_table")
+            assert len(result) == 3
+            with pytest.raises(Exception, match="readonly"):
+                query_df("DELETE FROM test_table")
+
+        conn = sqlite3.connect(self.db_path)
+        assert conn.execute("SELECT COUNT(*) FROM test_table").fetchone()[0] == 3
+        conn.close()
+
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
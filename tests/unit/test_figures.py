@@ -0,0 +1,126 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import figures
+from dashboard.figures import heatmap2d, histogram, line, lttb, payload_bytes, scatter
+
+
+class TestLttb:
+    """Largest-Triangle-Three-Buckets downsampling"""
+
+    def test_keeps_endpoints_and_size(self):
+        x = np.arange(10_000, dtype=float)
+        y = np.sin(x / 100)
+
+        keep = lttb(x, y, 500)
+
+        assert len(keep) == 500
+        assert keep[0] == 0 and keep[-1] == 9_999
+        assert np.all(np.diff(keep) > 0)
+
+    def test_keeps_a_single_spike(self):
+        # Arrange
+        x = np.arange(5_000, dtype=float)
+        y = np.zeros(5_000)
+        y[3_217] = 100.0
+
+        # Act
+        keep = lttb(x, y, 100)
+
+        # Assert
+        assert 3_217 in keep
+
+    def test_short_series_untouched(self):
+        assert lttb(np.arange(10.0), np.arange(10.0), 50).tolist() == list(range(10))
+
+
+class TestBuilders:
+    """Server-side aggregation keeps payloads independent of row counts"""
+
+    def test_histogram_sends_counts_not_rows(self):
+        # Arrange
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({
+            "fails_total": rng.poisson(3, 20_000),
+            "variant": np.repeat(["baseline", "proposed"], 10_000),
+        })
+
+        # Act
+        fig = histogram(df, x="fails_total", color="variant", nbins=20, title="fails")
+
+        # Assert
+        assert [t.name for t in fig.data] == ["baseline", "proposed"]
+        assert sum(fig.data[0].y) == 10_000
+        assert len(fig.data[0].x) <= 20
+        assert payload_bytes(fig) < 10_000
+
+    def test_heatmap_is_fixed_size(self):
+        # Arrange
+        rng = np.random.default_rng(2)
+        df = pd.DataFrame({"x_position": rng.uniform(0, 800, 50_000), "y_position": rng.uniform(0, 600, 50_000)})
+
+        # Act
+        fig = heatmap2d(df, "x_position", "y_position", title="deaths", nbinsx=40, nbinsy=25)
+
+        # Assert
+        z = np.array(fig.data[0].z)
+        assert z.shape == (25, 40)
+        assert z.sum() == 50_000
+
+    def test_heatmap_without_rows(self):
+        fig = heatmap2d(pd.DataFrame(columns=["x_position", "y_position"]), "x_position", "y_position", title="deaths")
+
+        assert "no data" in fig.layout.title.text
+
+    def test_scatter_caps_points_and_switches_to_webgl(self):
+        # Arrange
+        df = pd.DataFrame({"a": np.arange(20_000, dtype=float), "b": np.arange(20_000) % 97})
+
+        # Act
+        fig = scatter(df, x="a", y="b", title="big", max_points=2_000)
+
+        # Assert
+        assert fig.data[0].type == "scattergl"
+        assert len(fig.data[0].x) <= 2_002
+        assert fig.data[0].x[-1] == 19_999          # extremes kept
+        assert "of 20,000 points" in fig.layout.title.text
+
+    def test_small_scatter_stays_svg_and_complete(self):
+        df = pd.DataFrame({"a": [1.0, 2.0, 3.0], "b": [3.0, 1.0, 2.0]})
+
+        fig = scatter(df, x="a", y="b", title="small")
+
+        assert fig.data[0].type == "scatter"
+        assert len(fig.data[0].x) == 3
+
+    def test_scatter_respects_payload_cap(self):
+        # Arrange: long hover strings make each point expensive
+        df = pd.DataFrame({"a": np.arange(3_000, dtype=float), "b": np.ones(3_000), "note": ["x" * 200] * 3_000})
+
+        # Act
+        fig = scatter(df, x="a", y="b", hover_data=["note"], title="notes", max_bytes=100_000)
+
+        # Assert
+        assert payload_bytes(fig) <= 100_000
+
+    def test_line_downsamples_each_trace(self, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(figures, "MAX_LINE_POINTS", 200)
+        df = pd.DataFrame({"t": np.arange(10_000), "p50": np.random.default_rng(3).random(10_000), "p90": 1.0})
+
+        # Act
+        fig = line(df, x="t", ys=["p50", "p90"], title="latency")
+
+        # Assert
+        assert [len(tr.x) for tr in fig.data] == [200, 200]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
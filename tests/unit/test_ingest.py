@@ -0,0 +1,288 @@
+import asyncio
+import csv
+import os
+import sys
+import sqlite3
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app import main
+from app.cache import LRUCache
+from app.writer import IngestWriter
+
+
+@pytest.fixture
+def ingest_paths(tmp_path, monkeypatch):
+    """Point the ingest API at a throwaway CSV + dashboard DB."""
+    db_path = str(tmp_path / "game.db")
+    monkeypatch.setattr(main, "CSV_PATH", str(tmp_path / "user_events.csv"))
+    monkeypatch.setattr(main, "DASHBOARD_DB_PATH", db_path)
+    main._recent_event_ids.clear()
+    main.ensure_dashboard_tables()
+    yield db_path
+    main._recent_event_ids.clear()
+
+
+def _count_rows(db_path, event_type=None):
+    conn = sqlite3.connect(db_path)
+    try:
+        if event_type:
+            return conn.execute("SELECT COUNT(*) FROM telemetry_events WHERE event_type = ?", (event_type,)).fetchone()[0]
+        return conn.execute("SELECT COUNT(*) FROM telemetry_events").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _csv_rows():
+    with open(main.CSV_PATH, newline="", encoding="utf-8") as f:
+        return list(csv.DictReader(f))
+
+
+class TestLRUCache:
+    """Unit tests for the bounded LRU used on the ingest path"""
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")          # a is now most recent
+        cache.put("c", 3)
+
+        assert "a" in cache
+        assert "b" not in cache
+        assert len(cache) == 2
+
+    def test_add_if_absent(self):
+        cache = LRUCache(maxsize=10)
+
+        assert cache.add_if_absent("ev-1") is True
+        assert cache.add_if_absent("ev-1") is False
+
+
+class TestIngestWriter:
+    """Unit tests for the single-thread group-commit writer"""
+
+    def test_concurrent_submits_are_batched(self):
+        # Arrange: block the first write so the rest pile up in the queue
+        batches = []
+        gate = threading.Event()
+
+        def write_batch(rows):
+            gate.wait(5)
+            batches.append([r["n"] for r in rows])
+            return [r["n"] * 10 for r in rows]
+
+        writer = IngestWriter(write_batch)
+
+        async def run():
+            first = asyncio.ensure_future(writer.submit({"n": 0}))
+            await asyncio.sleep(0.05)
+            rest = [asyncio.ensure_future(writer.submit({"n": i})) for i in range(1, 6)]
+            await asyncio.sleep(0.05)
+            gate.set()
+            return await asyncio.gather(first, *rest)
+
+        # Act
+        results = asyncio.run(run())
+        writer.stop()
+
+        # Assert
+        assert results == [0, 10, 20, 30, 40, 50]
+        assert batches == [[0], [1, 2, 3, 4, 5]]
+
+    def test_batch_error_reaches_every_waiter(self):
+        def write_batch(rows):
+            raise OSError("disk full")
+
+        writer = IngestWriter(write_batch)
+
+        async def run():
+            return await asyncio.gather(writer.submit({}), writer.submit({}), return_exceptions=True)
+
+        results = asyncio.run(run())
+        writer.stop()
+
+        assert all(isinstance(r, OSError) for r in results)
+
+
+class TestIdempotentCollect:
+    """Duplicate deliveries of the same event_id must be stored once"""
+
+    def setup_method(self):
+        self.client = TestClient(main.app)
+
+    def test_retry_with_same_event_id_is_ignored(self, ingest_paths):
+        # Arrange
+        ev = {"event_type": "stage_start", "username": "alice", "event_id": "ev-123", "stage_number": 1}
+
+        # Act
+        first = self.client.post("/api/collect", json=ev)
+        second = self.client.post("/api/collect", json=ev)
+
+        # Assert
+        assert first.status_code == 200 and second.status_code == 200
+        assert first.json()["duplicate"] is False
+        assert second.json()["duplicate"] is True
+        assert _count_rows(ingest_paths) == 1
+
+    def test_unique_index_catches_ids_evicted_from_cache(self, ingest_paths):
+        # Arrange
+        ev = {"event_type": "death", "username": "bob", "event_id": "ev-456",
+              "stage_number": 1, "x_position": 10.0, "y_position": 20.0}
+        self.client.post("/api/collect", json=ev)
+        main._recent_event_ids.clear()  # simulate the id ageing out of memory
+
+        # Act
+        resp = self.client.post("/api/collect", json=ev)
+
+        # Assert
+        assert resp.json()["duplicate"] is True
+        assert _count_rows(ingest_paths) == 1
+        conn = sqlite3.connect(ingest_paths)
+        assert conn.execute("SELECT COUNT(*) FROM death_heatmap").fetchone()[0] == 1
+        conn.close()
+        assert len(_csv_rows()) == 1
+
+    def test_csv_failure_rolls_the_batch_back(self, ingest_paths, monkeypatch):
+        # Arrange
+        real_append = main.append_csv_rows
+        failures = [OSError("disk full")]
+
+        def full_disk_once(rows):
+            if failures:
+                raise failures.pop()
+            real_append(rows)
+
+        monkeypatch.setattr(main, "append_csv_rows", full_disk_once)
+        ev = {"event_type": "stage_start", "username": "carol", "event_id": "ev-789", "stage_number": 1}
+
+        # Act
+        with pytest.raises(OSError):
+            self.client.post("/api/collect", json=ev)
+        retried = self.client.post("/api/collect", json=ev)
+
+        # Assert: nothing was stored by the failed write, so the retry is not a duplicate
+        assert retried.status_code == 200 and retried.json()["duplicate"] is False
+        assert _count_rows(ingest_paths) == 1
+        assert [r["event_type"] for r in _csv_rows()] == ["stage_start"]
+
+    @pytest.mark.parametrize("first_result,stored_by_retry", [(True, False), (None, True), (RuntimeError, True)])
+    def test_retry_during_the_first_write_waits_for_it(self, monkeypatch, first_result, stored_by_retry):
+        # Arrange: the first write is held open until the retry has arrived
+        class SlowWriter:
+            def __init__(self):
+                self.calls = 0
+                self.release = asyncio.Event()
+
+            async def submit(self, row):
+                self.calls += 1
+                if self.calls > 1:
+                    return True
+                await self.release.wait()
+                if first_result is RuntimeError:
+                    raise RuntimeError("csv write failed")
+                return first_result
+
+        writer = SlowWriter()
+        monkeypatch.setattr(main, "ingest_writer", writer)
+        main._recent_event_ids.clear()
+        ev = main.UserEvent(event_type="player_hit", username="dave", event_id="ev-789", stage_number=1)
+
+        async def deliver_twice():
+            first = asyncio.ensure_future(main.collect_event(ev))
+            await asyncio.sleep(0.01)
+            retry = asyncio.ensure_future(main.collect_event(ev))
+            await asyncio.sleep(0.01)
+            assert not retry.done()                      # not acknowledged before the first write ends
+            writer.release.set()
+            return await asyncio.gather(first, retry, return_exceptions=True)
+
+        # Act
+        first, retry = asyncio.run(deliver_twice())
+
+        # Assert
+        assert retry["duplicate"] is (not stored_by_retry)
+        assert writer.calls == (2 if stored_by_retry else 1)
+        assert "ev-789" in main._recent_event_ids and not main._inflight_event_ids
+        if first_result is RuntimeError:
+            assert isinstance(first, RuntimeError)
+        main._recent_event_ids.clear()
+
+    def test_events_without_id_are_always_stored(self, ingest_paths):
+        ev = {"event_type": "heartbeat", "username": "carol"}
+
+        self.client.post("/api/collect", json=ev)
+        self.client.post("/api/collect", json=ev)
+
+        assert _count_rows(ingest_paths, "heartbeat") == 2
+
+    def test_legacy_table_is_migrated(self, tmp_path, monkeypatch):
+        # Arrange: pre-event_id schema with an existing row
+        db_path = str(tmp_path / "legacy.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE telemetry_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER, session_id TEXT, event_type TEXT,
+                event_data TEXT, stage_number INTEGER, timestamp TEXT
+            )
+        """)
+        conn.execute("INSERT INTO telemetry_events(event_type) VALUES ('stage_start')")
+        conn.commit()
+        conn.close()
+        monkeypatch.setattr(main, "DASHBOARD_DB_PATH", db_path)
+
+        # Act
+        main.ensure_dashboard_tables()
+
+        # Assert
+        conn = sqlite3.connect(db_path)
+        cols = {r[1] for r in conn.execute("PRAGMA table_info(telemetry_events)")}
+        conn.close()
+        assert "event_id" in cols
+        assert _count_rows(db_path) == 1
+
+
+class TestAnonymizedUserIds:
+    """username -> user_id is cached and stays stable"""
+
+    def setup_method(self):
+        main._user_id_cache.clear()
+
+    def test_default_space_keeps_legacy_format(self):
+        h = main.sha256_hex(f"{main.ANON_SALT}::alice")
+        expected = f"user_{int(h[:8], 16) % 1000:03d}"
+
+        assert main.user_id_from_username("alice") == expected
+        assert main.user_ids_from_username("alice") == (expected, int(expected.split("_")[1]))
+
+    def test_repeat_lookups_skip_hashing(self, monkeypatch):
+        # Arrange
+        calls = []
+        real = main.sha256_hex
+        monkeypatch.setattr(main, "sha256_hex", lambda s: calls.append(s) or real(s))
+
+        # Act
+        ids = {main.user_id_from_username("dave") for _ in range(5)}
+
+        # Assert
+        assert len(ids) == 1
+        assert len(calls) == 1
+
+    def test_wider_space_pads_ids(self, monkeypatch):
+        monkeypatch.setattr(main, "ANON_ID_SPACE", 1_000_000)
+        monkeypatch.setattr(main, "_ANON_ID_WIDTH", 6)
+
+        user_id, num = main.user_ids_from_username("erin")
+
+        assert user_id == f"user_{num:06d}"
+        assert 0 <= num < 1_000_000
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,60 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from benchmarks.ingest_fleet import compare, growth, session_script
+
+
+class TestSessionScript:
+    """Simulated sessions follow the scenes' event order"""
+
+    def test_attempts_are_coherent(self):
+        # Arrange
+        rng = np.random.default_rng(3)
+
+        # Act
+        events = [ev for _ in range(50) for _, ev in session_script(rng, "fleet_1")]
+
+        # Assert
+        types = [ev["event_type"] for ev in events]
+        assert types.count("login") == types.count("logout") == 50
+        assert types.count("death") == types.count("fail")
+        assert types.count("stage_start") == types.count("stage_complete") + types.count("fail")
+        assert len({ev["event_id"] for ev in events}) == len(events)
+        for ev in events:
+            if ev["event_type"] in ("player_hit", "stage_complete", "fail"):
+                assert ev["extra"]["attempt_id"] >= 1
+                assert ev["stage_number"] in (1, 2)
+
+    def test_deterministic_per_seed(self):
+        strip = lambda evs: [(d, {k: v for k, v in ev.items() if k != "event_id"}) for d, ev in evs]
+        a = strip(session_script(np.random.default_rng(5), "u"))
+        b = strip(session_script(np.random.default_rng(5), "u"))
+        assert a == b
+
+
+class TestRegressionCheck:
+    """--compare flags throughput drops and latency rises beyond the tolerance"""
+
+    def test_compare(self):
+        baseline = {"events_per_s": 200.0, "rps": 200.0, "p95_ms": 40.0, "p99_ms": 70.0, "error_rate": 0.0}
+
+        assert compare(dict(baseline, events_per_s=185.0), baseline, tolerance_pct=10) == []
+        problems = compare(dict(baseline, events_per_s=150.0, p95_ms=60.0), baseline, tolerance_pct=10)
+        assert [p.split()[0] for p in problems] == ["events_per_s", "p95_ms"]
+
+    def test_growth_per_row(self):
+        before = {"db_bytes": 1000, "csv_bytes": 100, "telemetry_rows": 10}
+        after = {"db_bytes": 3000, "csv_bytes": 1100, "telemetry_rows": 20}
+
+        assert growth(before, after)["db_bytes_per_row"] == 200.0
+        assert growth(before, after)["csv_bytes_per_row"] == 100.0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,153 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app import main
+from app.request_metrics import RequestMetrics
+from dashboard.instrumentation import COMPUTE_SECONDS, Registry, timed
+from dashboard.metrics import normalize_events
+
+RAW_EVENTS = pd.DataFrame({"id": [1], "event_type": ["stage_start"], "event_data": ['{"difficulty": "easy"}'],
+                           "timestamp": ["2026-01-01T00:00:00Z"]})
+
+
+def _sample(text: str, line_prefix: str) -> float:
+    """Value of the first exposition line starting with line_prefix."""
+    for line in text.splitlines():
+        if line.startswith(line_prefix):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"no sample {line_prefix!r} in:\n{text}")
+
+
+class TestRegistry:
+    """Preallocated buckets rendered in the Prometheus text format"""
+
+    def test_histogram_exposition(self):
+        # Arrange
+        reg = Registry()
+        h = reg.histogram("op_seconds", "Op time", ("op",), buckets=(0.1, 1.0))
+        child = h.labels("read")
+
+        # Act
+        for v in (0.05, 0.1, 0.5, 3.0):
+            child.observe(v)
+        text = reg.render()
+
+        # Assert
+        assert "# TYPE op_seconds histogram" in text
+        assert 'op_seconds_bucket{op="read",le="0.1"} 2' in text      # le is inclusive
+        assert 'op_seconds_bucket{op="read",le="1"} 3' in text
+        assert 'op_seconds_bucket{op="read",le="+Inf"} 4' in text
+        assert _sample(text, 'op_seconds_sum{op="read"}') == pytest.approx(3.65)
+        assert 'op_seconds_count{op="read"} 4' in text
+
+    def test_counter_and_name_reuse(self):
+        # Arrange
+        reg = Registry()
+        c = reg.counter("events_total", "Events", ("result",))
+
+        # Act
+        c.labels("stored").inc()
+        reg.counter("events_total", "Events", ("result",)).labels("stored").inc(2)
+
+        # Assert
+        assert 'events_total{result="stored"} 3' in reg.render()
+        with pytest.raises(ValueError):
+            reg.histogram("events_total", "clash")
+        with pytest.raises(ValueError):
+            c.labels("a", "b")
+        with pytest.raises(ValueError):
+            c.inc()                      # labelled metric, no child given
+
+    def test_label_values_are_escaped(self):
+        reg = Registry()
+        reg.counter("x_total", "X", ("v",)).labels('a"b\\c').inc()
+
+        assert 'x_total{v="a\\"b\\\\c"} 1' in reg.render()
+
+    def test_timed_records_failures_too(self):
+        # Arrange
+        reg = Registry()
+        h = reg.histogram("fn_seconds", "Fn", ("fn",))
+
+        @timed(h)
+        def boom():
+            raise RuntimeError
+
+        # Act
+        with pytest.raises(RuntimeError):
+            boom()
+
+        # Assert
+        assert boom.__name__ == "boom"
+        assert h.labels("boom").count == 1
+
+
+class TestRequestMetrics:
+    """Request latency by route prefix and status class"""
+
+    def test_routes_and_status_classes(self):
+        # Arrange
+        async def ok(request):
+            return PlainTextResponse("ok")
+
+        async def fail(request):
+            raise RuntimeError("boom")
+
+        reg = Registry()
+        h = reg.histogram("req_seconds", "Requests", ("route", "status"))
+        inner = Starlette(routes=[Route("/api/collect", ok, methods=["POST"]), Route("/api/fail", fail)])
+        client = TestClient(RequestMetrics(inner, h), raise_server_exceptions=False)
+
+        # Act
+        client.post("/api/collect")
+        client.post("/api/collect")
+        client.get("/api/fail")
+        client.get("/nowhere")
+
+        # Assert
+        assert h.labels("collect", "2xx").count == 2
+        assert h.labels("api", "5xx").count == 1
+        assert h.labels("page", "4xx").count == 1
+        assert h.labels("static", "2xx").count == 0
+
+
+class TestMetricsEndpoint:
+    """/metrics exposes request, ingest and compute timings"""
+
+    def test_scrape_after_collect(self, tmp_path, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(main, "CSV_PATH", str(tmp_path / "user_events.csv"))
+        monkeypatch.setattr(main, "DASHBOARD_DB_PATH", str(tmp_path / "game.db"))
+        main.ensure_dashboard_tables()
+        client = TestClient(main.app)
+        fsyncs = main.INGEST_STEP_SECONDS.labels("csv_fsync").count
+        normalizes = COMPUTE_SECONDS.labels("normalize_events").count
+
+        # Act
+        client.post("/api/collect", json={"event_type": "stage_start", "username": "m", "stage_number": 1})
+        normalize_events(RAW_EVENTS)
+        resp = client.get("/metrics")
+
+        # Assert
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+        text = resp.text
+        assert _sample(text, 'ingest_step_seconds_count{step="csv_fsync"}') == fsyncs + 1
+        assert _sample(text, 'ingest_step_seconds_count{step="sqlite_commit"}') >= 1
+        assert _sample(text, 'http_request_duration_seconds_count{route="collect",status="2xx"}') >= 1
+        assert _sample(text, 'dashboard_compute_seconds_count{fn="normalize_events"}') == normalizes + 1
+        assert _sample(text, 'ingest_events_total{result="stored"}') >= 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
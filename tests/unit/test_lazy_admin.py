@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.lazy_mount import LazyMount
+
+PROJECT_ROOT = os.path.join(os.path.dirname(__file__), '..', '..')
+
+
+class TestLazyMount:
+    """The /admin mount is only built when first used"""
+
+    def test_loader_runs_once_on_first_request(self):
+        # Arrange
+        calls = []
+
+        def loader():
+            calls.append(threading.current_thread().name)
+            return PlainTextResponse("admin")
+
+        lazy = LazyMount(loader)
+        client = TestClient(Starlette(routes=[Mount("/admin", lazy)]))
+        assert not lazy.loaded
+
+        # Act
+        first = client.get("/admin/")
+        second = client.get("/admin/")
+
+        # Assert
+        assert first.text == second.text == "admin"
+        assert len(calls) == 1
+        assert lazy.loaded and lazy.load_seconds is not None
+
+    def test_failed_load_returns_503_and_retries(self):
+        attempts = []
+
+        def loader():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ImportError("no plotly")
+            return PlainTextResponse("ok")
+
+        client = TestClient(Starlette(routes=[Mount("/admin", LazyMount(loader))]))
+
+        assert client.get("/admin/").status_code == 503
+        assert client.get("/admin/").text == "ok"
+
+    def test_background_preload(self):
+        lazy = LazyMount(lambda: PlainTextResponse("ok"))
+
+        lazy.preload_in_background().join(5)
+
+        assert lazy.loaded
+
+    def test_importing_main_does_not_import_dash(self, tmp_path):
+        # fresh interpreter: other tests in this process import the dashboard
+        code = "import sys, app.main; print(','.join(m for m in ('dash', 'plotly') if m in sys.modules))"
+        proc = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True,
+                              env=dict(os.environ, DATA_DIR=str(tmp_path)))
+
+        assert proc.returncode == 0, proc.stderr
+        assert proc.stdout.strip() == ""
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app import main
+from app.live import RollupBroker, format_sse
+
+
+def _sse_data(chunk):
+    return json.loads("".join(line[len("data: "):] for line in chunk.splitlines() if line.startswith("data: ")))
+
+
+class TestRollupBroker:
+    """Committed events -> one coalesced delta message per interval"""
+
+    def test_flush_coalesces_per_stage_and_difficulty(self):
+        async def run():
+            broker = RollupBroker()
+            stream = broker.stream()
+            hello = await stream.__anext__()
+
+            broker.record([(1, "easy", "stage_start"), (1, "easy", "stage_start"),
+                           (1, "easy", "death"), (2, "hard", "stage_complete"), (2, "hard", "login")])
+            message = broker.flush()
+            chunk = await stream.__anext__()
+            await stream.aclose()
+            return hello, message, chunk, broker
+
+        # Act
+        hello, message, chunk, broker = asyncio.run(run())
+
+        # Assert
+        assert hello.startswith("event: hello")
+        assert chunk.startswith("event: rollup")
+        assert _sse_data(chunk) == message
+        assert message["seq"] == 1
+        assert message["rows"] == [
+            {"stage": 1, "difficulty": "easy", "starts": 2, "completes": 0, "fails": 0, "quits": 0, "deaths": 1},
+            {"stage": 2, "difficulty": "hard", "starts": 0, "completes": 1, "fails": 0, "quits": 0, "deaths": 0},
+        ]
+        assert broker.subscribers == 0
+
+    def test_nothing_sent_without_new_events(self):
+        async def run():
+            broker = RollupBroker()
+            stream = broker.stream()
+            await stream.__anext__()
+            result = broker.flush()
+            await stream.aclose()
+            return result
+
+        assert asyncio.run(run()) is None
+
+    def test_slow_subscriber_is_dropped(self):
+        async def run():
+            broker = RollupBroker(max_queue=2)
+            stream = broker.stream()
+            await stream.__anext__()
+            for _ in range(3):
+                broker.record([(1, "easy", "fail")])
+                broker.flush()
+            return broker, [chunk async for chunk in stream]
+
+        # Act
+        broker, chunks = asyncio.run(run())
+
+        # Assert: the backlog is discarded and the stream ends
+        assert chunks == []
+        assert broker.dropped == 1
+        assert broker.subscribers == 0
+
+    def test_keepalive_when_idle(self):
+        async def run():
+            broker = RollupBroker(heartbeat=0.01)
+            stream = broker.stream()
+            await stream.__anext__()
+            chunk = await stream.__anext__()
+            await stream.aclose()
+            return chunk
+
+        assert asyncio.run(run()) == ": keepalive\n\n"
+
+    def test_streams_past_the_cap_are_turned_away(self):
+        async def run():
+            broker = RollupBroker(max_subscribers=1)
+            first = broker.stream()
+            await first.__anext__()
+            late = [chunk async for chunk in broker.stream()]
+            full = broker.full
+            await first.aclose()
+            return broker, late, full
+
+        # Act
+        broker, late, full = asyncio.run(run())
+
+        # Assert
+        assert full and len(late) == 1
+        assert late[0].startswith("retry: ") and "event: busy" in late[0]
+        assert broker.subscribers == 0 and not broker.full
+
+    def test_format_sse_multiline(self):
+        assert format_sse("a\nb", event="x") == "event: x\ndata: a\ndata: b\n\n"
+
+
+class TestLiveEndpoint:
+    """/admin/_live/rollups is served by the API, capped"""
+
+    def test_full_broker_answers_503(self, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(main, "live_rollups", RollupBroker(max_subscribers=1))
+        main.live_rollups._subscribers.add(asyncio.Queue())
+        client = TestClient(main.app)
+
+        # Act
+        resp = client.get("/admin/_live/rollups")
+
+        # Assert
+        assert resp.status_code == 503
+        assert resp.headers["retry-after"] == "30"
+        assert client.get("/api/live/rollups").status_code == 404
+
+
+class TestIngestPublishesRollups:
+    """The ingest writer reports what it committed"""
+
+    @pytest.fixture
+    def ingest_paths(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(main, "CSV_PATH", str(tmp_path / "user_events.csv"))
+        monkeypatch.setattr(main, "DASHBOARD_DB_PATH", str(tmp_path / "game.db"))
+        main._recent_event_ids.clear()
+        main.ensure_dashboard_tables()
+        yield
+        main._recent_event_ids.clear()
+
+    def test_stored_events_are_recorded_once(self, ingest_paths, monkeypatch):
+        # Arrange
+        recorded = []
+        monkeypatch.setattr(main.live_rollups, "record", lambda events: recorded.extend(events))
+        client = TestClient(main.app)
+        body = {"event_id": "ev-live-1", "username": "live", "event_type": "death",
+                "mode_level_choice": "Hard", "stage_number": 3, "x_position": 1, "y_position": 2}
+
+        # Act
+        client.post("/api/collect", json=body)
+        main._recent_event_ids.clear()      # force the duplicate through to the DB
+        client.post("/api/collect", json=body)
+
+        # Assert
+        assert recorded == [(3, "hard", "death")]
+
+    def test_logout_counts_its_derived_completion(self):
+        rows = [{"event_type": "logout", "mode_level_choice": "easy", "stage_number": None, "duration_seconds": 30}]
+
+        events = list(main.rollup_events(rows, [True]))
+
+        assert events == [(2, "easy", "logout"), (2, "easy", "stage_complete")]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
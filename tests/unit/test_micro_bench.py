@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from benchmarks.micro import build_cases, check, synthetic_events
+from dashboard.metrics import funnel_by_stage, normalize_events
+
+
+class TestSyntheticEvents:
+    """Benchmark input looks like telemetry_events rows"""
+
+    def test_rows_normalize(self):
+        # Arrange
+        raw = synthetic_events(2_000, seed=1)
+
+        # Act
+        df = normalize_events(raw)
+
+        # Assert
+        assert len(raw) == 2_000
+        json.loads(raw["event_data"].iloc[0])
+        assert set(df["difficulty"].dropna()) <= {"easy", "medium", "hard"}
+        assert not funnel_by_stage(df).empty
+
+    def test_only_filters_cases(self):
+        cases = build_cases(("1k",), ("200",), only={"fail_reasons", "run_simulation"})
+
+        assert [c.key for c in cases] == ["fail_reasons@1k", "run_simulation@200"]
+
+
+class TestRegressionCheck:
+    """--check flags time (in reference units) and memory beyond the threshold"""
+
+    def test_check(self):
+        # Arrange
+        baseline = {"results": {
+            "a@1k": {"ref_units": 1.0, "peak_mb": 10.0},
+            "b@1k": {"ref_units": 1.0, "peak_mb": 0.1},
+        }}
+        current = {"results": {
+            "a@1k": {"ref_units": 1.2, "peak_mb": 14.0},
+            "b@1k": {"ref_units": 1.6, "peak_mb": 0.5},   # tiny peaks are noise
+            "c@1k": {"ref_units": 9.0, "peak_mb": 90.0},  # not in the baseline
+        }}
+
+        # Act
+        problems = check(current, baseline, threshold_pct=25)
+
+        # Assert
+        assert [p.split(":")[0] for p in problems] == ["a@1k", "b@1k"]
+        assert "peak" in problems[0] and "time" in problems[1]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,121 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app import main
+from dashboard import profiler
+from dashboard.admin_auth import is_admin
+
+TOKEN = {"Authorization": "Bearer s3cret"}
+
+
+def _spin(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(500))
+
+
+class TestSampler:
+    """All-thread sampling into collapsed stacks"""
+
+    def test_busy_thread_shows_up_and_parked_one_does_not(self):
+        # Arrange
+        stop = threading.Event()
+        busy = threading.Thread(target=_spin, args=(stop,), name="spinner-3")
+        parked = threading.Thread(target=stop.wait, name="parked")
+        busy.start()
+        parked.start()
+
+        # Act
+        try:
+            result = profiler.sample(0.3, interval=0.005)
+        finally:
+            stop.set()
+            busy.join()
+            parked.join()
+        lines = result.collapsed().splitlines()
+
+        # Assert
+        assert result.samples > 10
+        spinner = [line for line in lines if line.startswith("spinner;")]   # thread number dropped
+        assert spinner and any("_spin (test_profiler.py:" in line for line in spinner)
+        assert not any(line.startswith("parked;") for line in lines)
+        assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    def test_one_run_at_a_time(self):
+        # Arrange
+        started = threading.Event()
+
+        def long_run():
+            started.set()
+            profiler.sample(0.3)
+
+        runner = threading.Thread(target=long_run)
+        runner.start()
+        started.wait()
+        time.sleep(0.05)
+
+        # Act / Assert
+        with pytest.raises(profiler.ProfilerBusy):
+            profiler.sample(0.01)
+        runner.join()
+
+    def test_args_are_bounded(self):
+        assert profiler.sample_args({"seconds": "2", "idle": "1"}) == (2.0, profiler.DEFAULT_INTERVAL, True)
+        with pytest.raises(ValueError):
+            profiler.sample_args({"seconds": "600"})
+        with pytest.raises(ValueError):
+            profiler.sample_args({"interval": "0"})
+
+
+class TestAdminEndpoints:
+    """ADMIN_TOKEN gates /api/debug/profile and per-request profiles"""
+
+    def setup_method(self):
+        self.client = TestClient(main.app)
+
+    def test_token_required(self, monkeypatch):
+        monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+        assert not is_admin(TOKEN)                       # unset token: nobody is admin
+        assert self.client.get("/api/debug/profile?seconds=0.01", headers=TOKEN).status_code == 403
+
+        monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+        assert self.client.get("/api/debug/profile?seconds=0.01").status_code == 403
+        assert self.client.get("/api/debug/profile?seconds=0.01", headers={"X-Admin-Token": "nope"}).status_code == 403
+        resp = self.client.get("/api/debug/profile?seconds=0.05", headers=TOKEN)
+        assert resp.status_code == 200
+        assert int(resp.headers["x-profile-samples"]) >= 1
+        assert self.client.get("/api/debug/profile?seconds=999", headers=TOKEN).status_code == 400
+
+    def test_x_profile_on_collect(self, tmp_path, monkeypatch):
+        # Arrange
+        monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+        monkeypatch.setattr(main, "CSV_PATH", str(tmp_path / "user_events.csv"))
+        monkeypatch.setattr(main, "DASHBOARD_DB_PATH", str(tmp_path / "game.db"))
+        main.ensure_dashboard_tables()
+        ev = {"event_type": "stage_start", "username": "p", "stage_number": 1}
+
+        # Act
+        plain = self.client.post("/api/collect", json=ev, headers={"X-Profile": "1"})    # no token
+        profiled = self.client.post("/api/collect", json=ev, headers={**TOKEN, "X-Profile": "1"})
+        profile_id = profiled.headers.get("x-profile-id")
+        report = self.client.get(f"/api/debug/profiles/{profile_id}", headers=TOKEN)
+        raw = self.client.get(f"/api/debug/profiles/{profile_id}?format=pstats", headers=TOKEN)
+
+        # Assert
+        assert plain.status_code == 200 and "x-profile-id" not in plain.headers
+        assert profiled.status_code == 200 and profile_id
+        assert report.status_code == 200
+        assert report.text.startswith("POST /api/collect") and "function calls" in report.text
+        assert raw.status_code == 200 and raw.content
+        assert self.client.get("/api/debug/profiles/missing", headers=TOKEN).status_code == 404
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
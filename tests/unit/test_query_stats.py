@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import sys
+
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import query_stats
+from dashboard.db import execute, executemany, query_df
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A small events table, fresh statement stats."""
+    path = str(tmp_path / "q.db")
+    monkeypatch.setenv("DB_PATH", path)
+    monkeypatch.setattr(query_stats, "SLOW_QUERY_MS", 10_000.0)
+    query_stats.reset()
+    execute("CREATE TABLE ev (id INTEGER PRIMARY KEY, kind TEXT, stage INTEGER)")
+    execute("CREATE INDEX idx_ev_stage ON ev(stage)")
+    executemany("INSERT INTO ev (kind, stage) VALUES (?, ?)", [("start", i % 5) for i in range(200)])
+    yield path
+    query_stats.reset()
+
+
+def _stat(fp):
+    return next(s for s in query_stats.top(100) if s["fingerprint"] == fp)
+
+
+class TestFingerprint:
+    """Statements differing only in literals share a fingerprint"""
+
+    def test_literals_and_in_lists(self):
+        a = query_stats.fingerprint("SELECT * FROM ev WHERE id > 10 AND kind = 'start'")
+        b = query_stats.fingerprint("SELECT *  FROM ev\n WHERE id > 99 AND kind = 'it''s'")
+        c = query_stats.fingerprint("SELECT * FROM ev WHERE stage IN (?, ?, ?)")
+
+        assert a == b == "SELECT * FROM ev WHERE id > ? AND kind = ?"
+        assert c == "SELECT * FROM ev WHERE stage IN (?...)"
+        assert query_stats.fingerprint("SELECT * FROM t1") == "SELECT * FROM t1"
+
+
+class TestRecord:
+    """Every db.py statement is timed, planned once and ranked"""
+
+    def test_calls_rows_and_plans(self, db):
+        # Act
+        for stage in (1, 2, 3):
+            query_df("SELECT id FROM ev WHERE stage = ?", (stage,))
+        query_df("SELECT * FROM ev WHERE kind = 'start'")
+
+        # Assert
+        indexed = _stat("SELECT id FROM ev WHERE stage = ?")
+        assert indexed["calls"] == 3 and indexed["rows"] == 120
+        assert indexed["scans"] == [] and "USING" in indexed["plan"][0]
+        scan = _stat("SELECT * FROM ev WHERE kind = ?")
+        assert scan["scans"] == ["ev"] and scan["rows"] == 200
+        inserts = _stat("INSERT INTO ev (kind, stage) VALUES (?...)")
+        assert inserts["kind"] == "write" and inserts["rows"] == 200 and inserts["plan"] is None
+        assert query_stats.slow_log() == []
+        totals = [s["total_ms"] for s in query_stats.top(100)]
+        assert totals == sorted(totals, reverse=True)
+
+    def test_slow_statement_is_logged_with_plan(self, db, monkeypatch, caplog):
+        # Arrange
+        monkeypatch.setattr(query_stats, "SLOW_QUERY_MS", 0.0)
+
+        # Act
+        with caplog.at_level(logging.WARNING, logger="dashboard.slow_query"):
+            query_df("SELECT COUNT(*) AS n FROM ev WHERE kind = ?", ("start",))
+
+        # Assert
+        entry = json.loads(caplog.records[-1].getMessage())
+        assert entry["event"] == "slow_query" and entry["params"] == "('start',)"
+        assert entry["scans"] == ["ev"] and entry["db"] == "q.db"
+        assert query_stats.slow_log(1)[0]["sql"] == "SELECT COUNT(*) AS n FROM ev WHERE kind = ?"
+
+    def test_least_costly_fingerprint_is_evicted(self, db, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(query_stats, "MAX_FINGERPRINTS", 2)
+        query_stats.reset()
+
+        # Act
+        query_stats.record(None, "SELECT a FROM t", (), 0.5, 1, explainable=False)
+        query_stats.record(None, "SELECT b FROM t", (), 0.1, 1, explainable=False)
+        query_stats.record(None, "SELECT c FROM t", (), 0.3, 1, explainable=False)
+
+        # Assert
+        assert [s["fingerprint"] for s in query_stats.top()] == ["SELECT a FROM t", "SELECT c FROM t"]
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
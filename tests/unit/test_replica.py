@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import replica
+from dashboard.db import query_df
+from dashboard.synthetic import generate, write_sqlite
+
+
+@pytest.fixture
+def primary(tmp_path, monkeypatch):
+    """A small ingest-schema DB in WAL mode, as the API keeps it."""
+    path = str(tmp_path / "game.db")
+    write_sqlite(path, generate(40, seed=2))
+    monkeypatch.setenv("DB_PATH", path)
+    monkeypatch.delenv("DB_REPLICA_PATH", raising=False)
+    replica._replicas.clear()
+    yield path
+    for r in replica._replicas.values():
+        r.wait()
+    replica._replicas.clear()
+
+
+def _count(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM telemetry_events").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _add_event(path: str) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO telemetry_events (event_type, stage_number, event_data) VALUES ('stage_start', 1, '{}')")
+    conn.commit()
+    conn.close()
+
+
+def _counts(conn):
+    return conn.execute("SELECT * FROM stage_event_counts ORDER BY 1, 2, 3").fetchall()
+
+
+def _recounted(conn):
+    return conn.execute("""SELECT stage_number, NULLIF(json_extract(event_data, '$.difficulty'), ''), event_type,
+                                  COUNT(*), COUNT(DISTINCT session_id)
+                           FROM telemetry_events GROUP BY 1, 2, 3 ORDER BY 1, 2, 3""").fetchall()
+
+
+class TestRefresh:
+    """Build once, then apply only what is new"""
+
+    def test_snapshot_is_read_optimized(self, primary):
+        # Arrange
+        r = replica.Replica(primary)
+        before = time.time()
+
+        # Act
+        assert r.refresh()
+
+        # Assert
+        assert r.path.endswith("game.replica.db")
+        assert not os.path.exists(r.path + "-wal")
+        conn = sqlite3.connect(r.path)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        assert {"idx_replica_events_type_stage", "stage_event_counts", "events_flat", "sqlite_stat1"} <= names
+        assert _counts(conn) == _recounted(conn)
+        plan = conn.execute("EXPLAIN QUERY PLAN SELECT COUNT(*) FROM telemetry_events "
+                            "WHERE event_type = 'death' AND stage_number = 1").fetchall()
+        assert "idx_replica_events_type_stage" in plan[0][3]
+        conn.close()
+        assert before - 1 <= os.path.getmtime(r.stamp) <= time.time()     # mtime = refresh start
+        assert not [f for f in os.listdir(os.path.dirname(primary)) if ".tmp-" in f]
+
+    def test_later_refreshes_apply_only_new_rows(self, primary, monkeypatch):
+        # Arrange
+        r = replica.Replica(primary)
+        r.refresh()
+        conn = sqlite3.connect(primary)
+        session = conn.execute("SELECT session_id FROM telemetry_events WHERE event_type = 'stage_start' "
+                               "AND stage_number = 1 LIMIT 1").fetchone()[0]
+        conn.executemany("INSERT INTO telemetry_events (session_id, event_type, stage_number, event_data) "
+                         "VALUES (?, ?, 1, ?)", [
+                             (session, "stage_start", '{"difficulty": "easy"}'),      # a session already counted
+                             ("s-new", "stage_start", '{"difficulty": "easy"}'),
+                             ("s-new", "stage_start", '{"difficulty": "easy"}'),
+                             (None, "death", "{}"),
+                             ("s-new", "quit", '{"difficulty": ""}'),
+                         ])
+        conn.execute("INSERT INTO death_heatmap (stage_number, x_position, y_position) VALUES (1, 5, 6)")
+        conn.commit()
+        conn.close()
+        copies = []
+        monkeypatch.setattr(r, "_copy", lambda tmp: copies.append(tmp))
+        monkeypatch.setattr(replica, "prepare", lambda path: copies.append(path))
+
+        # Act
+        assert r.refresh()
+
+        # Assert
+        assert copies == []
+        conn = sqlite3.connect(r.path)
+        assert conn.execute("SELECT COUNT(*) FROM telemetry_events").fetchone()[0] == _count(primary)
+        assert conn.execute("SELECT COUNT(*) FROM death_heatmap WHERE x_position = 5").fetchone()[0] == 1
+        assert _counts(conn) == _recounted(conn)
+        names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+        assert "idx_replica_events_type_stage" in names
+        conn.close()
+
+    def test_changed_schema_or_recreated_primary_is_copied_again(self, primary):
+        # Arrange
+        r = replica.Replica(primary)
+        r.refresh()
+        conn = sqlite3.connect(primary)
+        conn.execute("ALTER TABLE death_heatmap ADD COLUMN cause TEXT")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'telemetry_events'")
+        conn.execute("DELETE FROM telemetry_events WHERE id > 5")          # a recreated DB: ids start over
+        conn.execute("INSERT INTO telemetry_events (session_id, event_type, stage_number, event_data) "
+                     "VALUES ('s-1', 'stage_start', 2, '{}')")
+        conn.commit()
+        conn.close()
+
+        # Act
+        r.refresh()
+
+        # Assert
+        conn = sqlite3.connect(r.path)
+        assert "cause" in {row[1] for row in conn.execute("PRAGMA table_info(death_heatmap)")}
+        assert conn.execute("SELECT COUNT(*) FROM telemetry_events").fetchone()[0] == 6
+        assert _counts(conn) == _recounted(conn)
+        conn.close()
+
+
+class TestQueryDf:
+    """query_df reads the replica under DB_REPLICA=1; primary=True stays fresh"""
+
+    def test_staleness_and_primary_reads(self, primary, monkeypatch):
+        # Arrange
+        monkeypatch.setenv("DB_REPLICA", "1")
+        monkeypatch.setenv("DB_REPLICA_MAX_STALENESS", "3600")
+        n = _count(primary)
+        sql = "SELECT COUNT(*) AS n FROM telemetry_events"
+
+        # Act / Assert: no snapshot yet, the first read goes to the primary and starts one
+        assert query_df(sql)["n"].iloc[0] == n
+        r = replica.for_primary(primary)
+        r.wait()
+        assert r.age() is not None
+
+        _add_event(primary)
+        assert query_df(sql)["n"].iloc[0] == n                      # within staleness: the snapshot
+        assert query_df(sql, primary=True)["n"].iloc[0] == n + 1
+        assert query_df(sql, db_path=primary)["n"].iloc[0] == n + 1
+
+        monkeypatch.setenv("DB_REPLICA_MAX_STALENESS", "0")
+        query_df(sql)                                               # stale: refreshed in the background
+        r.wait()
+        monkeypatch.setenv("DB_REPLICA_MAX_STALENESS", "3600")
+        assert query_df(sql)["n"].iloc[0] == n + 1
+
+    def test_disabled_by_default(self, primary, monkeypatch):
+        monkeypatch.delenv("DB_REPLICA", raising=False)
+
+        assert replica.read_path(primary) == primary
+        assert replica._replicas == {}
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,230 @@
+import json
+import os
+import sqlite3
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import data, metrics, query_stats
+from dashboard.db import query_chunks
+from dashboard.synthetic import generate, write_sqlite
+
+
+@pytest.fixture(scope="module")
+def events_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("rollup") / "game.db")
+    write_sqlite(path, generate(40, seed=6))
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO telemetry_events (event_type, stage_number, event_data) VALUES (?, ?, ?)", [
+        ("death", 1, "bad {"),
+        ("death", None, json.dumps({"difficulty": "easy", "extra": json.dumps({"cause": "boss"})})),
+        ("player_hit", 2, json.dumps({"difficulty": 3, "extra": {"enemyType": "bat"}})),
+    ])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _raw(path):
+    conn = sqlite3.connect(path)
+    try:
+        return pd.read_sql_query("SELECT * FROM telemetry_events", conn)
+    finally:
+        conn.close()
+
+
+class TestEventRollup:
+    """Chunked rollups give the whole-frame tables"""
+
+    @pytest.mark.parametrize("chunk", [100_000, 777, 200])
+    def test_same_tables_for_any_chunk_size(self, events_db, chunk):
+        # Arrange
+        raw = _raw(events_db)
+        events = metrics.normalize_events(raw)
+        chunks = (raw.iloc[i:i + chunk] for i in range(0, len(raw), chunk))
+
+        # Act
+        rollup = metrics.rollup_events(chunks)
+
+        # Assert
+        assert rollup.rows == len(raw)
+        assert sorted(rollup.difficulties) == ["easy", "hard", "medium"]
+        for difficulty in (None, "easy", "hard"):
+            pd.testing.assert_frame_equal(rollup.funnel(difficulty), metrics.funnel_by_stage(events, difficulty))
+            pd.testing.assert_frame_equal(rollup.combat(difficulty), metrics.combat_by_stage(events, difficulty))
+            pd.testing.assert_frame_equal(rollup.times(difficulty), metrics.time_by_stage(events, difficulty))
+            for stage in (None, 1, 2):
+                pd.testing.assert_frame_equal(rollup.fail_reasons(difficulty, stage),
+                                              metrics.fail_reasons(events, difficulty, stage))
+                pd.testing.assert_frame_equal(rollup.hits_by_enemy(difficulty, stage),
+                                              metrics.hits_by_enemy(events, difficulty, stage))
+
+    def test_merge_leaves_inputs_alone(self, events_db):
+        # Arrange
+        events = metrics.normalize_events(_raw(events_db))
+        first = metrics.EventRollup.of(events.iloc[:500])
+        before = first.funnel()
+
+        # Act
+        merged = first.merge(metrics.EventRollup.of(events.iloc[500:]))
+
+        # Assert
+        pd.testing.assert_frame_equal(first.funnel(), before)
+        pd.testing.assert_frame_equal(merged.fail_reasons(), metrics.fail_reasons(events))
+
+    def test_durations_are_coarsened_past_the_cap(self, events_db, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(metrics, "MAX_DURATION_VALUES", 40)
+        events = metrics.normalize_events(_raw(events_db))
+
+        # Act
+        rollup = metrics.EventRollup.of(events)
+
+        # Assert
+        assert len(rollup.durations) <= 40 and rollup.duration_step >= 10
+        exact = metrics.time_by_stage(events, None)
+        approx = rollup.times()
+        assert approx["stage_id"].tolist() == exact["stage_id"].tolist()
+        assert (approx["median_duration_ms"] - exact["median_duration_ms"]).abs().max() <= rollup.duration_step
+
+
+class TestBoundedMemory:
+    """Peak memory follows the chunk size, not the number of events"""
+
+    def test_peak_does_not_grow_with_events(self, tmp_path):
+        # Arrange
+        small, large = str(tmp_path / "small.db"), str(tmp_path / "large.db")
+        write_sqlite(small, generate(10, seed=1))
+        write_sqlite(large, generate(40, seed=1))
+
+        def peak(path):
+            tracemalloc.start()
+            rollup = metrics.rollup_events(query_chunks("SELECT * FROM telemetry_events", chunksize=500, db_path=path))
+            _, top = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            return rollup.rows, top
+
+        # Act
+        small_rows, small_peak = peak(small)
+        large_rows, large_peak = peak(large)
+
+        # Assert
+        assert large_rows > 3 * small_rows
+        assert large_peak < 1.5 * small_peak
+
+
+class TestDashboardData:
+    """data.py reads new events only and bins deaths while reading"""
+
+    def test_new_events_are_merged_into_the_last_rollup(self, events_db, tmp_path, monkeypatch):
+        # Arrange
+        path = str(tmp_path / "game.db")
+        with open(events_db, "rb") as src, open(path, "wb") as dst:
+            dst.write(src.read())
+        monkeypatch.setenv("DB_PATH", path)
+        monkeypatch.delenv("DB_REPLICA", raising=False)
+        monkeypatch.delenv("ANALYTICS_SOURCE", raising=False)
+        monkeypatch.setattr(data, "VERSION_TTL_SECONDS", 0.0)
+        monkeypatch.setattr(data, "chunk_rows", lambda: 500)
+        data.clear_caches()
+        query_stats.reset()
+        first = data.rollup()
+        conn = sqlite3.connect(path)
+        conn.execute("INSERT INTO telemetry_events (event_type, stage_number, event_data) "
+                     "VALUES ('stage_start', 9, '{\"difficulty\": \"easy\"}')")
+        conn.commit()
+        conn.close()
+
+        # Act
+        second = data.rollup()
+
+        # Assert
+        assert second is not first and second.rows == first.rows + 1
+        reads = [q for q in query_stats.top(100) if "FROM telemetry_events WHERE id > ?" in q["fingerprint"]]
+        assert reads[0]["calls"] == 2 and reads[0]["rows"] == second.rows      # the second read got one row
+        pd.testing.assert_frame_equal(data.funnel("easy"),
+                                      metrics.funnel_by_stage(metrics.normalize_events(_raw(path)), "easy"))
+        data.clear_caches()
+
+    def test_death_bins_match_one_histogram(self, events_db, monkeypatch):
+        # Arrange
+        monkeypatch.setenv("DB_PATH", events_db)
+        monkeypatch.delenv("DB_REPLICA", raising=False)
+        monkeypatch.setattr(data, "chunk_rows", lambda: 7)
+        data.clear_caches()
+        conn = sqlite3.connect(events_db)
+        deaths = pd.read_sql_query("SELECT x_position, y_position FROM death_heatmap WHERE stage_number = 1", conn)
+        conn.close()
+
+        # Act
+        counts, xedges, yedges = data.death_bins(1, 40, 25)
+
+        # Assert
+        expected = np.histogram2d(deaths["x_position"], deaths["y_position"], bins=[40, 25])
+        np.testing.assert_array_equal(counts, expected[0])
+        np.testing.assert_allclose(xedges, expected[1])
+        assert data.death_bins(99) is None
+        data.clear_caches()
+
+    def test_parquet_source(self, tmp_path, monkeypatch):
+        # Arrange
+        pytest.importorskip("pyarrow")
+        blocks = list(generate(20, seed=2))
+        for i, (events, _) in enumerate(blocks):
+            events.to_parquet(tmp_path / f"events-{i:05d}.parquet", index=False)
+        monkeypatch.setenv("ANALYTICS_SOURCE", str(tmp_path))
+        monkeypatch.setattr(data, "chunk_rows", lambda: 300)
+        data.clear_caches()
+
+        # Act
+        funnel = data.funnel(None)
+
+        # Assert
+        everything = metrics.normalize_events(pd.concat([events for events, _ in blocks], ignore_index=True))
+        pd.testing.assert_frame_equal(funnel, metrics.funnel_by_stage(everything))
+        data.clear_caches()
+
+    def test_parquet_files_are_the_version_and_only_new_ones_are_read(self, events_db, tmp_path, monkeypatch):
+        # Arrange
+        pytest.importorskip("pyarrow")
+        blocks = [events for events, _ in generate(20, seed=5)]
+        archive = tmp_path / "archive"
+        archive.mkdir()
+        for i, events in enumerate(blocks[:-1]):
+            events.to_parquet(archive / f"events-{i:05d}.parquet", index=False)
+        monkeypatch.setenv("ANALYTICS_SOURCE", str(archive))
+        monkeypatch.setenv("DB_PATH", events_db)
+        monkeypatch.delenv("DB_REPLICA", raising=False)
+        monkeypatch.setattr(data, "VERSION_TTL_SECONDS", 0.0)
+        read = []
+        real_chunks = data.parquet_chunks
+        monkeypatch.setattr(data, "parquet_chunks", lambda files, *args: read.extend(files) or real_chunks(files, *args))
+        data.clear_caches()
+        first = data.rollup()
+        version = data.data_version()
+
+        # Act
+        data.rollup.cache_clear()                   # e.g. a new SQLite event: same files, a new memo key
+        again = data.rollup()
+        blocks[-1].to_parquet(archive / f"events-{len(blocks) - 1:05d}.parquet", index=False)
+        grown = data.rollup()
+
+        # Assert
+        assert again is first
+        assert data.data_version() != version
+        assert len(read) == len(blocks)             # every file read once
+        assert read[-1].endswith(f"events-{len(blocks) - 1:05d}.parquet")
+        everything = metrics.normalize_events(pd.concat(blocks, ignore_index=True))
+        pd.testing.assert_frame_equal(grown.funnel(), metrics.funnel_by_stage(everything))
+        pd.testing.assert_frame_equal(data.funnel(None), metrics.funnel_by_stage(everything))
+        data.clear_caches()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.sessions import InProcessSessionRegistry, SessionRegistry, SqliteSessionRegistry, make_session_registry
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def registry_factory(request, tmp_path):
+    """Builds registries of either backend; sqlite ones share one DB file."""
+    db_path = str(tmp_path / "sessions.db")
+
+    def build(clock, idle_ttl=60.0):
+        if request.param == "sqlite":
+            return SqliteSessionRegistry(db_path, idle_ttl=idle_ttl, touch_interval=0, clock=clock)
+        return InProcessSessionRegistry(idle_ttl=idle_ttl, clock=clock)
+
+    return build
+
+
+class TestSessionRegistry:
+    """Behaviour shared by both session backends"""
+
+    def test_reuses_active_session(self, registry_factory):
+        reg = registry_factory(FakeClock())
+
+        first = reg.get_or_create("user_001")
+        second = reg.get_or_create("user_001")
+
+        assert first == second
+        assert first.startswith("session_user_001_")
+
+    def test_client_session_id_wins(self, registry_factory):
+        reg = registry_factory(FakeClock())
+        reg.get_or_create("user_001")
+
+        sid = reg.get_or_create("user_001", "client-sid")
+
+        assert sid == "client-sid"
+        assert reg.get_or_create("user_001") == "client-sid"
+
+    def test_idle_session_expires(self, registry_factory):
+        # Arrange
+        clock = FakeClock()
+        reg = registry_factory(clock, idle_ttl=60.0)
+        first = reg.get_or_create("user_001")
+
+        # Act: player closed the tab, comes back much later
+        clock.now += 61
+        second = reg.get_or_create("user_001")
+
+        # Assert
+        assert second != first
+
+    def test_sweep_evicts_idle_sessions(self, registry_factory):
+        clock = FakeClock()
+        reg = registry_factory(clock, idle_ttl=60.0)
+        reg.get_or_create("user_001")
+        clock.now += 30
+        reg.get_or_create("user_002")
+
+        clock.now += 45
+        evicted = reg.sweep()
+
+        assert evicted == 1
+        assert [s["user_id"] for s in reg.page()] == ["user_002"]
+
+    def test_clear_on_logout(self, registry_factory):
+        reg = registry_factory(FakeClock())
+        first = reg.get_or_create("user_001")
+
+        reg.clear("user_001")
+
+        assert reg.get_or_create("user_001") != first
+
+
+    def test_max_size_evicts_least_recently_seen(self, registry_factory):
+        # Arrange
+        clock = FakeClock()
+        reg = registry_factory(clock)
+        reg.max_size = 2
+        for user in ("user_001", "user_002", "user_003"):
+            clock.now += 1
+            reg.get_or_create(user)
+
+        # Act
+        reg.sweep()
+
+        # Assert
+        assert reg.summary()["count"] == 2
+        assert [s["user_id"] for s in reg.page()] == ["user_003", "user_002"]
+
+    def test_page_and_summary(self, registry_factory):
+        clock = FakeClock()
+        reg = registry_factory(clock)
+        for i in range(5):
+            clock.now += 10
+            reg.get_or_create(f"user_{i:03d}")
+
+        page = reg.page(offset=1, limit=2)
+        summary = reg.summary()
+
+        assert [s["user_id"] for s in page] == ["user_003", "user_002"]
+        assert page[0]["idle_s"] == 10.0
+        assert summary["count"] == 5
+        assert summary["oldest_idle_s"] == 40.0
+
+
+class TestSqliteSharedAcrossWorkers:
+    """Two registry instances on one file behave like two uvicorn workers"""
+
+    def test_workers_agree_on_session(self, tmp_path):
+        db_path = str(tmp_path / "sessions.db")
+        worker_a = SqliteSessionRegistry(db_path)
+        worker_b = SqliteSessionRegistry(db_path)
+
+        sid_a = worker_a.get_or_create("user_042")
+        sid_b = worker_b.get_or_create("user_042")
+
+        assert sid_a == sid_b
+
+    def test_close_reaches_every_thread_connection(self, tmp_path):
+        # Arrange: one connection opened here, one from a threadpool-like worker
+        registry = SqliteSessionRegistry(str(tmp_path / "sessions.db"))
+        sid = registry.get_or_create("user_042")
+        worker = threading.Thread(target=registry.get_or_create, args=("user_043",))
+        worker.start()
+        worker.join()
+        conns = list(registry._conns)
+
+        # Act
+        registry.close()
+
+        # Assert: all closed, and a later call reopens instead of failing
+        assert len(conns) == 2
+        for conn in conns:
+            with pytest.raises(sqlite3.ProgrammingError):
+                conn.execute("SELECT 1")
+        assert registry.get_or_create("user_042") == sid
+        registry.close()
+
+
+def test_registry_interface_is_abstract():
+    with pytest.raises(TypeError):
+        SessionRegistry()
+    InProcessSessionRegistry().close()
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        make_session_registry("redis")
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+import sys
+
+import pandas as pd
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+duckdb = pytest.importorskip("duckdb")
+
+from dashboard import data, metrics, sql_metrics
+from dashboard.synthetic import generate, write_sqlite
+
+# payload shapes normalize_events copes with: bad JSON, extra saved as a
+# string, null fields falling through, numbers as strings, no stage
+ODD_ROWS = [
+    ("death", 1, "bad {"),
+    ("death", 1, json.dumps({"difficulty": "easy", "extra": json.dumps({"cause": "boss"})})),
+    ("death", 2, json.dumps({"difficulty": "easy", "fail_reason": "fall", "extra": {"cause": None}})),
+    ("player_hit", 1, json.dumps({"difficulty": "easy", "extra": {"enemyType": "bat"}})),
+    ("player_hit", 1, None),
+    ("heal_pickup", 1, json.dumps({"difficulty": "easy", "extra": {"amount": "5"}})),
+    ("stage_complete", 1, json.dumps({"difficulty": "easy", "duration_ms": "1500"})),
+    ("stage_start", None, "{}"),
+    ("quit", 2, "[1]"),
+]
+
+
+@pytest.fixture(scope="module")
+def events_db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("sql") / "game.db")
+    write_sqlite(path, generate(60, seed=4))
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO telemetry_events (event_type, stage_number, event_data) VALUES (?, ?, ?)", ODD_ROWS)
+    conn.commit()
+    conn.close()
+    return path
+
+
+def _normalized(path):
+    conn = sqlite3.connect(path)
+    try:
+        return metrics.normalize_events(pd.read_sql_query("SELECT * FROM telemetry_events", conn))
+    finally:
+        conn.close()
+
+
+def _assert_same_tables(events, source, difficulty, stage_id):
+    for name in ("funnel_by_stage", "combat_by_stage", "time_by_stage"):
+        pd.testing.assert_frame_equal(getattr(metrics, name)(events, difficulty),
+                                      getattr(sql_metrics, name)(source, difficulty))
+    for name in ("fail_reasons", "hits_by_enemy"):
+        pd.testing.assert_frame_equal(getattr(metrics, name)(events, difficulty, stage_id),
+                                      getattr(sql_metrics, name)(source, difficulty, stage_id))
+
+
+class TestSameAsPandas:
+    """Every DuckDB table equals its pandas counterpart"""
+
+    @pytest.mark.parametrize("difficulty,stage_id", [(None, None), ("easy", None), ("hard", 2), (None, 7)])
+    def test_sqlite_source(self, events_db, difficulty, stage_id):
+        _assert_same_tables(_normalized(events_db), events_db, difficulty, stage_id)
+
+    def test_parquet_directory(self, events_db, tmp_path):
+        # Arrange: the layout `python -m dashboard.synthetic --parquet` writes, no id column
+        con = duckdb.connect()
+        for i, (events, _) in enumerate(generate(30, seed=9)):
+            con.register("block", events)
+            con.execute(f"COPY block TO '{tmp_path / f'events-{i:05d}.parquet'}' (FORMAT parquet)")
+        raw = con.execute(f"SELECT * FROM read_parquet('{tmp_path}/events-*.parquet', filename = true, "
+                          "file_row_number = true) ORDER BY filename, file_row_number").df()
+        con.close()
+
+        # Act / Assert
+        _assert_same_tables(metrics.normalize_events(raw), str(tmp_path), None, 3)
+
+    def test_sqlite_copied_in_chunks_without_the_extension(self, events_db, monkeypatch):
+        # Arrange
+        monkeypatch.setattr(sql_metrics, "_sqlite_extension", False)
+        monkeypatch.setattr(sql_metrics, "chunk_rows", lambda: 50)
+        reads = []
+        real_chunks = sql_metrics.query_chunks
+        monkeypatch.setattr(sql_metrics, "query_chunks",
+                            lambda *args, **kwargs: (reads.append(len(c)) or c for c in real_chunks(*args, **kwargs)))
+
+        # Act / Assert
+        _assert_same_tables(_normalized(events_db), events_db, "easy", 1)
+        assert reads and max(reads) <= 50
+        assert sql_metrics.funnel_by_stage(str(events_db) + ".missing").empty
+
+
+class TestDataBackend:
+    """dashboard/data.py picks the backend per call"""
+
+    def test_per_call_backend(self, events_db, monkeypatch):
+        # Arrange
+        monkeypatch.setenv("DB_PATH", events_db)
+        monkeypatch.delenv("DB_REPLICA", raising=False)
+        monkeypatch.delenv("ANALYTICS_BACKEND", raising=False)
+        data.clear_caches()
+
+        # Act
+        pandas_funnel = data.funnel("easy")
+        duckdb_funnel = data.funnel("easy", "duckdb")
+
+        # Assert
+        assert pandas_funnel is not duckdb_funnel
+        pd.testing.assert_frame_equal(pandas_funnel, duckdb_funnel)
+        pd.testing.assert_frame_equal(data.spikes(None, "pandas"), data.spikes(None, "duckdb"))
+        with pytest.raises(ValueError):
+            data.backend("polars")
+        monkeypatch.setenv("ANALYTICS_BACKEND", "duckdb")
+        assert data.difficulties() == sorted(_normalized(events_db)["difficulty"].dropna().unique())
+        data.clear_caches()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,203 @@
+import asyncio
+import os
+import sys
+
+import pytest
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from app.hot_files import HotFileCache, RangeNotSatisfiable, parse_range
+from app.static_files import IMMUTABLE, REVALIDATE, AssetStaticFiles, accepted_encodings
+from tools.build_assets import build
+
+
+@pytest.fixture
+def built(tmp_path):
+    """A tiny static/ tree, built into static/dist and served like app.main does."""
+    src = tmp_path / "static"
+    (src / "assets").mkdir(parents=True)
+    (src / "src").mkdir()
+    (src / "assets" / "hero.png").write_bytes(b"\x89PNG fake image bytes")
+    (src / "assets" / "sketch.aseprite").write_bytes(b"editor file")
+    (src / "src" / "main.js").write_text(
+        "// loader\n" * 50 + "this.load.image('hero', '/static/assets/hero.png');\n", encoding="utf-8"
+    )
+    (src / "game.html").write_text('<script type="module" src="/static/src/main.js"></script>', encoding="utf-8")
+
+    manifest = build(src)
+    app = Starlette(routes=[Mount("/static/dist", AssetStaticFiles(directory=str(src / "dist")))])
+    return src / "dist", manifest, TestClient(app)
+
+
+class TestBuildAssets:
+    """Unit tests for tools/build_assets.py"""
+
+    def test_assets_are_fingerprinted_and_modules_keep_their_name(self, built):
+        dist, manifest, _ = built
+
+        hero = manifest["assets"]["assets/hero.png"]
+        assert hero.startswith("assets/hero.") and hero != "assets/hero.png"
+        assert manifest["assets"]["src/main.js"] == "src/main.js"
+        assert "assets/sketch.aseprite" not in manifest["assets"]
+
+    def test_references_are_rewritten_to_dist_urls(self, built):
+        dist, manifest, _ = built
+
+        js = (dist / "src" / "main.js").read_text(encoding="utf-8")
+        html = (dist / "game.html").read_text(encoding="utf-8")
+
+        assert f"'/static/dist/{manifest['assets']['assets/hero.png']}'" in js
+        assert 'src="/static/dist/src/main.js"' in html
+
+    def test_text_files_get_gzip_variant(self, built):
+        dist, manifest, _ = built
+
+        assert "gzip" in manifest["files"]["src/main.js"]["encodings"]
+        assert (dist / "src" / "main.js.gz").is_file()
+        assert manifest["files"][manifest["assets"]["assets/hero.png"]]["encodings"] == []
+
+
+class TestAssetStaticFiles:
+    """Serving headers for built assets"""
+
+    def test_hashed_asset_is_immutable(self, built):
+        _, manifest, client = built
+
+        resp = client.get("/static/dist/" + manifest["assets"]["assets/hero.png"])
+
+        assert resp.status_code == 200
+        assert resp.headers["cache-control"] == IMMUTABLE
+        assert resp.headers["content-type"] == "image/png"
+
+    def test_precompressed_variant_is_negotiated(self, built):
+        # Arrange
+        _, _, client = built
+
+        # Act
+        gz = client.get("/static/dist/src/main.js", headers={"accept-encoding": "gzip"})
+        plain = client.get("/static/dist/src/main.js", headers={"accept-encoding": "identity"})
+
+        # Assert
+        assert gz.headers["content-encoding"] == "gzip"
+        assert gz.headers["cache-control"] == REVALIDATE
+        assert "Accept-Encoding" in gz.headers["vary"]
+        assert "content-encoding" not in plain.headers
+        assert gz.text == plain.text          # client decodes to the same module
+        assert gz.headers["etag"] != plain.headers["etag"]
+
+    def test_variant_is_found_off_the_event_loop(self, built, monkeypatch):
+        # Arrange
+        dist, _, client = built
+        on_loop = []
+        find = AssetStaticFiles._find_variant
+
+        def recording_find(self, *args):
+            try:
+                asyncio.get_running_loop()
+                on_loop.append(True)
+            except RuntimeError:            # a worker thread: no loop running here
+                on_loop.append(False)
+            return find(self, *args)
+
+        monkeypatch.setattr(AssetStaticFiles, "_find_variant", recording_find)
+
+        # Act
+        gz = client.get("/static/dist/src/main.js", headers={"accept-encoding": "gzip"})
+        (dist / "src" / "main.js.gz").unlink()           # manifest is now ahead of the files
+        fallback = client.get("/static/dist/src/main.js", headers={"accept-encoding": "gzip"})
+
+        # Assert
+        assert gz.headers["content-encoding"] == "gzip"
+        assert "content-encoding" not in fallback.headers and fallback.text == gz.text
+        assert on_loop == [False, False]
+
+    def test_revalidation_returns_304(self, built):
+        _, _, client = built
+        first = client.get("/static/dist/src/main.js", headers={"accept-encoding": "gzip"})
+
+        again = client.get("/static/dist/src/main.js",
+                           headers={"accept-encoding": "gzip", "if-none-match": first.headers["etag"]})
+
+        assert again.status_code == 304
+        assert again.headers["etag"] == first.headers["etag"]
+
+    def test_accept_encoding_respects_q_zero(self):
+        assert accepted_encodings("gzip;q=0, br") == {"br"}
+        assert accepted_encodings("*") >= {"br", "gzip"}
+
+
+class TestHotFileCache:
+    """In-memory cache of small static files"""
+
+    def test_second_request_is_served_from_memory(self, tmp_path):
+        # Arrange
+        (tmp_path / "page.html").write_text("<h1>hi</h1>", encoding="utf-8")
+        cache = HotFileCache(max_bytes=1024)
+        app = Starlette(routes=[Mount("/s", AssetStaticFiles(directory=str(tmp_path), hot_cache=cache))])
+        client = TestClient(app)
+
+        # Act
+        first = client.get("/s/page.html")
+        second = client.get("/s/page.html")
+
+        # Assert
+        assert first.text == second.text == "<h1>hi</h1>"
+        assert first.headers["etag"] == second.headers["etag"]
+        assert (cache.misses, cache.hits) == (1, 1)
+
+    def test_changed_file_is_reloaded(self, tmp_path):
+        path = tmp_path / "a.js"
+        path.write_bytes(b"one")
+        cache = HotFileCache()
+        cache.load(str(path), os.stat(path))
+
+        path.write_bytes(b"three")
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+
+        assert cache.get(str(path), os.stat(path)) is None
+
+    def test_bounded_by_bytes(self, tmp_path):
+        cache = HotFileCache(max_bytes=10, max_file_bytes=10)
+        for name in ("a", "b", "c"):
+            (tmp_path / name).write_bytes(b"x" * 4)
+            cache.load(str(tmp_path / name), os.stat(tmp_path / name))
+
+        stats = cache.stats()
+        assert stats["entries"] == 2 and stats["bytes"] == 8
+        assert stats["evictions"] == 1
+        assert cache.get(str(tmp_path / "a"), os.stat(tmp_path / "a")) is None
+
+    def test_range_and_conditional_requests_on_cached_file(self, tmp_path):
+        # Arrange: warm the cache
+        (tmp_path / "map.tmj").write_bytes(b"0123456789")
+        app = Starlette(routes=[Mount("/s", AssetStaticFiles(directory=str(tmp_path), hot_cache=HotFileCache()))])
+        client = TestClient(app)
+        etag = client.get("/s/map.tmj").headers["etag"]
+
+        # Act
+        part = client.get("/s/map.tmj", headers={"range": "bytes=2-5"})
+        stale_if_range = client.get("/s/map.tmj", headers={"range": "bytes=2-5", "if-range": '"other"'})
+        cached = client.get("/s/map.tmj", headers={"if-none-match": etag})
+
+        # Assert
+        assert part.status_code == 206
+        assert part.content == b"2345"
+        assert part.headers["content-range"] == "bytes 2-5/10"
+        assert stale_if_range.status_code == 200 and stale_if_range.content == b"0123456789"
+        assert cached.status_code == 304
+
+    def test_parse_range(self):
+        assert parse_range("bytes=0-", 10) == (0, 9)
+        assert parse_range("bytes=-3", 10) == (7, 9)
+        assert parse_range("bytes=5-100", 10) == (5, 9)
+        assert parse_range("bytes=0-1,4-5", 10) is None
+        with pytest.raises(RangeNotSatisfiable):
+            parse_range("bytes=10-", 10)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
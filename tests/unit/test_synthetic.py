@@ -0,0 +1,115 @@
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the project directory to the path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from dashboard import synthetic
+from dashboard.synthetic import events_frame, generate, load_map, write_sqlite
+
+
+def _unpack(events: pd.DataFrame) -> pd.DataFrame:
+    data = pd.json_normalize(events["event_data"].map(json.loads).tolist())
+    data["event_type"] = events["event_type"].to_numpy()
+    data["session_id"] = events["session_id"].to_numpy()
+    data["stage_number"] = events["stage_number"].to_numpy()
+    return data
+
+
+class TestGenerate:
+    """Vectorized sessions are deterministic and coherent"""
+
+    def test_deterministic_per_seed(self):
+        # Act
+        a = events_frame(300, seed=4)
+        b = events_frame(300, seed=4)
+        c = events_frame(300, seed=5)
+
+        # Assert
+        pd.testing.assert_frame_equal(a, b)
+        assert not a["event_data"].equals(c["event_data"])
+
+    def test_blocks_do_not_depend_on_each_other(self, monkeypatch):
+        monkeypatch.setattr(synthetic, "BLOCK_SESSIONS", 100)
+        blocks = list(generate(250, seed=2))
+
+        assert len(blocks) == 3
+        assert blocks[0][0]["session_id"].nunique() == 100
+        assert blocks[2][0]["session_id"].nunique() == 50
+        pd.testing.assert_frame_equal(blocks[1][0], list(generate(250, seed=2))[1][0])
+
+    def test_attempts_and_hp_are_coherent(self):
+        # Arrange
+        events = events_frame(400, seed=1)
+
+        # Act
+        data = _unpack(events)
+
+        # Assert
+        assert events["timestamp"].is_monotonic_increasing
+        assert set(data["difficulty"]) <= set(synthetic.DIFFICULTIES)
+        types = data["event_type"].value_counts()
+        assert types["death"] == types["fail"]
+        assert types["complete_flow"] == 400
+        closed_tabs = 400 - types["logout"]                       # leave their last attempt open
+        assert types["stage_start"] == types["stage_complete"] + types["fail"] + types.get("quit", 0) + closed_tabs
+
+        hits = data[data["event_type"] == "player_hit"]
+        assert (hits["hp_before"] - hits["damage"]).clip(lower=0).equals(hits["hp_after"])
+        # a death that isn't a fall comes with the hit that emptied the bar
+        key = ["session_id", "stage_number", "attempt_id"]
+        fails = data[data["event_type"] == "fail"].set_index(key)
+        zero = hits[hits["hp_after"] == 0].set_index(key)
+        assert set(zero.index) == set(fails[fails["cause"] != "fell"].index)
+        wins = data[data["event_type"] == "stage_complete"].set_index(key)
+        assert not set(zero.index) & set(wins.index)
+        assert (fails.loc[zero.index, "cause"].to_numpy()
+                == zero["enemy"].map(synthetic.DEATH_CAUSE).to_numpy()).all()
+
+    def test_deaths_follow_map_geometry(self):
+        # Arrange
+        _, deaths = next(generate(800, seed=3))
+        desert = load_map("desertMap")
+
+        # Act
+        stage1 = deaths[deaths["stage_number"] == 1]
+
+        # Assert
+        assert stage1["x_position"].between(0, desert.width_px).all()
+        fell = stage1["y_position"] == desert.height_px
+        assert fell.any()
+        pits = np.abs(stage1.loc[fell, "x_position"].to_numpy()[:, None] - desert.pits[None, :]).min(axis=1)
+        assert (pits <= 12).all()
+
+
+class TestWriteSqlite:
+    """Bulk load into the ingest schema"""
+
+    def test_load_and_refuse_to_mix(self, tmp_path):
+        # Arrange
+        db = str(tmp_path / "game.db")
+
+        # Act
+        n_events, n_deaths = write_sqlite(db, generate(50, seed=0))
+
+        # Assert
+        conn = sqlite3.connect(db)
+        assert conn.execute("SELECT COUNT(*) FROM telemetry_events").fetchone()[0] == n_events
+        assert conn.execute("SELECT COUNT(*) FROM death_heatmap").fetchone()[0] == n_deaths
+        assert conn.execute("SELECT COUNT(*) FROM telemetry_events WHERE event_type = 'death'").fetchone()[0] == n_deaths
+        indexes = {row[1] for row in conn.execute("PRAGMA index_list(telemetry_events)")}
+        assert "idx_telemetry_events_event_id" in indexes
+        conn.close()
+        with pytest.raises(SystemExit):
+            write_sqlite(db, generate(5, seed=1))
+        assert write_sqlite(db, generate(5, seed=1), append=True)[0] > 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -0,0 +1,194 @@
+"""
+Build the production copy of static/ into static/dist/.
+
+    python -m tools.build_assets            # static/ -> static/dist/
+
+- Game assets (images, maps, css, ...) are copied under a content-hashed
+  name (`knight.png` -> `knight.3f9c0a1b2d.png`) so they can be cached
+  forever (`Cache-Control: immutable`). A new build changes the name.
+- JS modules and HTML pages keep their names (ES module imports are
+  relative and the pages are routed by name); they are served with
+  `no-cache` + a strong content ETag, so revalidation is a 304.
+- `/static/...` references in JS, HTML, CSS and JSON (atlas index/pages)
+  are rewritten to the hashed `/static/dist/...` URLs via the manifest;
+  files are built after the files they reference.
+- Text files get precompressed `.gz` siblings (and `.br` when the optional
+  `brotli` package is installed), which app/static_files.py serves.
+
+dist/manifest.json records source -> dist names plus per-file hash and
+available encodings; the server reads it instead of stat-ing variants.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+
+ROOT = Path(__file__).resolve().parent.parent
+STATIC_DIR = ROOT / "static"
+DIST_NAME = "dist"
+MANIFEST_NAME = "manifest.json"
+
+HASH_LEN = 10
+# kept under their own name, revalidated instead of fingerprinted
+KEEP_NAME_EXTS = {".html", ".js"}
+# references inside these are rewritten to the dist URLs
+REWRITE_EXTS = {".html", ".js", ".css", ".json"}
+COMPRESS_EXTS = {".js", ".json", ".tmj", ".html", ".css", ".txt", ".svg", ".map"}
+# editor/source art that the game never requests
+SKIP_EXTS = {".ase", ".aseprite", ".psd"}
+SKIP_NAMES = {".DS_Store", "Thumbs.db"}
+
+# "/static/x/y.png", 'static/x/y.png', url(/static/x/y.png)
+_REF_RE = re.compile(r"""(?P<q>["'`(])(?P<slash>/?)static/(?P<path>[^"'`()\s?#]+)""")
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hashed_name(rel: str, digest: str) -> str:
+    """assets/ui/hp.png -> assets/ui/hp.<hash>.png"""
+    base, ext = os.path.splitext(rel)
+    return f"{base}.{digest[:HASH_LEN]}{ext}"
+
+
+def rewrite_refs(text: str, assets: Dict[str, str], prefix: str = "/static/dist/") -> str:
+    """Point every `/static/<src>` reference that was built at its dist URL."""
+    def sub(m):
+        target = assets.get(m.group("path"))
+        if target is None:
+            return m.group(0)
+        return m.group("q") + prefix + target
+    return _REF_RE.sub(sub, text)
+
+
+def compress_variants(data: bytes) -> Dict[str, bytes]:
+    """Precompressed bodies keyed by Content-Encoding; only kept if smaller."""
+    out = {}
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    if len(gz) < len(data):
+        out["gzip"] = gz
+    if brotli is not None:
+        br = brotli.compress(data, quality=11)
+        if len(br) < len(data):
+            out["br"] = br
+    return out
+
+
+ENCODING_SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+
+def _source_files(src: Path, dist: Path) -> List[str]:
+    files = []
+    for dirpath, dirnames, filenames in os.walk(src):
+        if Path(dirpath) == src and DIST_NAME in dirnames:
+            dirnames.remove(DIST_NAME)
+        if Path(dirpath).resolve() == dist.resolve():
+            dirnames[:] = []
+            continue
+        for name in filenames:
+            if name in SKIP_NAMES or os.path.splitext(name)[1].lower() in SKIP_EXTS:
+                continue
+            files.append(os.path.relpath(os.path.join(dirpath, name), src).replace(os.sep, "/"))
+    return sorted(files)
+
+
+def _build_order(src: Path, files: List[str]) -> List[str]:
+    """Referenced files before the files referencing them (so their dist names are known)."""
+    known = set(files)
+    deps: Dict[str, List[str]] = {}
+    for rel in files:
+        if os.path.splitext(rel)[1].lower() in REWRITE_EXTS:
+            text = (src / rel).read_text(encoding="utf-8", errors="replace")
+            deps[rel] = sorted({m.group("path") for m in _REF_RE.finditer(text)} & known - {rel})
+
+    order, seen = [], set()
+
+    def visit(rel):
+        if rel in seen:  # also breaks reference cycles
+            return
+        seen.add(rel)
+        for dep in deps.get(rel, ()):
+            visit(dep)
+        order.append(rel)
+
+    for rel in files:
+        visit(rel)
+    return order
+
+
+def build(src: Path = STATIC_DIR, dist: Optional[Path] = None, clean: bool = True) -> dict:
+    """Build dist/ from src/ and return the manifest."""
+    src = Path(src)
+    dist = Path(dist) if dist is not None else src / DIST_NAME
+    if clean and dist.exists():
+        shutil.rmtree(dist)
+    dist.mkdir(parents=True, exist_ok=True)
+
+    assets: Dict[str, str] = {}
+    files: Dict[str, dict] = {}
+
+    for rel in _build_order(src, _source_files(src, dist)):
+        ext = os.path.splitext(rel)[1].lower()
+        data = (src / rel).read_bytes()
+
+        if ext in REWRITE_EXTS:
+            try:
+                data = rewrite_refs(data.decode("utf-8"), assets).encode("utf-8")
+            except UnicodeDecodeError:
+                pass
+
+        digest = content_hash(data)
+        immutable = ext not in KEEP_NAME_EXTS
+        out_rel = hashed_name(rel, digest) if immutable else rel
+
+        out_path = dist / out_rel
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_bytes(data)
+
+        encodings = []
+        if ext in COMPRESS_EXTS:
+            for enc, body in compress_variants(data).items():
+                Path(str(out_path) + ENCODING_SUFFIX[enc]).write_bytes(body)
+                encodings.append(enc)
+
+        assets[rel] = out_rel
+        files[out_rel] = {
+            "hash": digest[:2 * HASH_LEN],
+            "size": len(data),
+            "immutable": immutable,
+            "encodings": sorted(encodings),
+        }
+
+    manifest = {"version": 1, "assets": assets, "files": files}
+    (dist / MANIFEST_NAME).write_text(json.dumps(manifest, indent=1, sort_keys=True), encoding="utf-8")
+    return manifest
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Fingerprint + precompress static assets into static/dist")
+    ap.add_argument("--src", default=str(STATIC_DIR))
+    ap.add_argument("--out", default=None, help="output dir (default: <src>/dist)")
+    args = ap.parse_args()
+
+    manifest = build(Path(args.src), Path(args.out) if args.out else None)
+    files = manifest["files"]
+    raw = sum(f["size"] for f in files.values())
+    print(f"built {len(files)} files ({raw / 1e6:.1f} MB), "
+          f"{sum(1 for f in files.values() if f['encodings'])} precompressed, "
+          f"brotli={'yes' if brotli is not None else 'no'}")
+
+
+if __name__ == "__main__":
+    main()
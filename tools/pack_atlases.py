@@ -0,0 +1,375 @@
+"""
+Pack the images each Phaser scene preloads into texture atlases.
+
+    pip install -r tools/requirements.txt
+    python -m tools.pack_atlases            # -> static/atlases/
+
+Scenes are found in static/src/scenes/*.js. For every scene the tool reads
+the `load.image(key, url)` / `load.spritesheet(key, url, {frameWidth, ...})`
+calls in its file and in the `X.preload(this)` helpers it calls (players,
+enemies, NPCs), so the atlases follow the code instead of a hand-kept list.
+
+- Spritesheets are sliced into frames; every image/frame is trimmed to its
+  non-transparent bounds and identical frames are stored once.
+- Frames are shelf-packed into the smallest power-of-two page that fits
+  (up to --max-size, spilling onto more pages).
+- Keys used by several scenes go into a `shared` atlas, the rest into one
+  atlas per scene.
+
+Output (all under static/atlases/):
+  <atlas>-<n>.png        atlas pages
+  <atlas>.json           Phaser multiatlas JSON (TexturePacker hash format)
+  index.json             per-scene atlas list + what each packed key was
+
+static/src/utils/atlases.js reads index.json, loads a scene's atlases
+instead of the individual files and recreates every packed key as a
+texture of its original size, so game code keeps using the same keys.
+"""
+import argparse
+import hashlib
+import json
+import math
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional build dependency
+    Image = None
+
+
+ROOT = Path(__file__).resolve().parent.parent
+STATIC_DIR = ROOT / "static"
+SCENES_DIR = STATIC_DIR / "src" / "scenes"
+OUT_DIR = STATIC_DIR / "atlases"
+URL_PREFIX = "/static/"
+SHARED = "shared"
+
+
+# ---------- scene parsing ----------
+_STR = r"""(?:"([^"]*)"|'([^']*)')"""
+_LOAD_RE = re.compile(
+    r"""\.load\.(image|spritesheet)\(\s*(?P<key>[\w.]+|"[^"]*"|'[^']*')\s*,\s*(?P<url>"[^"]*"|'[^']*')\s*(?:,\s*\{(?P<cfg>[^}]*)\})?""",
+    re.S,
+)
+_PRELOAD_CALL_RE = re.compile(r"\b([A-Z]\w*)\.preload\(\s*this\s*\)")
+_IMPORT_RE = re.compile(r"""import\s+(?:\{([^}]*)\}|(\w+))\s+from\s+["']([^"']+)["']""")
+_CONST_OBJ_RE = re.compile(r"const\s+(\w+)\s*=\s*\{([^}]*)\}", re.S)
+_PAIR_RE = re.compile(r"""(\w+)\s*:\s*""" + _STR)
+_NUM_PAIR_RE = re.compile(r"(\w+)\s*:\s*(\d+)")
+_SCENE_KEY_RE = re.compile(r"super\(\s*" + _STR)
+
+
+@dataclass
+class LoadCall:
+    key: str
+    url: str
+    kind: str                                   # "image" | "spritesheet"
+    config: Dict[str, int] = field(default_factory=dict)
+
+
+def _unquote(token: str) -> Optional[str]:
+    if len(token) >= 2 and token[0] == token[-1] and token[0] in "\"'":
+        return token[1:-1]
+    return None
+
+
+def _constants(src: str) -> Dict[str, str]:
+    """`const AssetKeys = { HP: "hpFill" }` -> {"AssetKeys.HP": "hpFill"}"""
+    out = {}
+    for name, body in _CONST_OBJ_RE.findall(src):
+        for prop, dq, sq in _PAIR_RE.findall(body):
+            out[f"{name}.{prop}"] = dq or sq
+    return out
+
+
+def _imports(src: str, path: Path) -> Dict[str, Path]:
+    out = {}
+    for named, default, spec in _IMPORT_RE.findall(src):
+        target = (path.parent / spec).resolve()
+        names = [default] if default else [n.split(" as ")[-1].strip() for n in named.split(",")]
+        for n in names:
+            if n:
+                out[n] = target
+    return out
+
+
+def parse_loads(path: Path, _seen=None) -> List[LoadCall]:
+    """load.image/spritesheet calls in a file plus in the X.preload(this) helpers it calls."""
+    seen = _seen if _seen is not None else set()
+    path = Path(path).resolve()
+    if path in seen or not path.is_file():
+        return []
+    seen.add(path)
+
+    src = path.read_text(encoding="utf-8")
+    consts = _constants(src)
+    calls = []
+    for m in _LOAD_RE.finditer(src):
+        key_tok, url = m.group("key"), _unquote(m.group("url"))
+        key = _unquote(key_tok)
+        if key is None:
+            key = consts.get(key_tok)
+        if key is None or url is None:
+            continue
+        cfg = {k: int(v) for k, v in _NUM_PAIR_RE.findall(m.group("cfg") or "")}
+        calls.append(LoadCall(key, url, m.group(1), cfg))
+
+    imports = _imports(src, path)
+    for name in _PRELOAD_CALL_RE.findall(src):
+        if name in imports:
+            calls.extend(parse_loads(imports[name], seen))
+    return calls
+
+
+def discover_scenes(scenes_dir: Path = SCENES_DIR) -> Dict[str, List[LoadCall]]:
+    """scene key (the super("...") argument) -> its load calls."""
+    scenes = {}
+    for path in sorted(Path(scenes_dir).glob("*.js")):
+        src = path.read_text(encoding="utf-8")
+        m = _SCENE_KEY_RE.search(src)
+        if not m or "preload" not in src:
+            continue
+        calls = parse_loads(path)
+        if calls:
+            scenes[m.group(1) or m.group(2)] = calls
+    return scenes
+
+
+def source_path(url: str, static_dir: Path = STATIC_DIR) -> Optional[Path]:
+    """'/static/assets/x.png' or 'static/assets/x.png' -> static/assets/x.png"""
+    rel = url.lstrip("/")
+    if not rel.startswith(URL_PREFIX.strip("/") + "/"):
+        return None
+    return Path(static_dir) / rel[len(URL_PREFIX.strip("/")) + 1:]
+
+
+# ---------- slicing + trimming ----------
+@dataclass
+class Sprite:
+    name: str                 # atlas frame name: "<key>" or "<key>/<n>"
+    image: "Image.Image"      # trimmed pixels
+    source_w: int
+    source_h: int
+    offset: Tuple[int, int]   # trim offset inside the source frame
+    digest: str = ""
+
+
+def sheet_grid(width: int, height: int, cfg: Dict[str, int]) -> List[Tuple[int, int]]:
+    """Top-left corners of spritesheet cells, in Phaser's frame order."""
+    fw, fh = cfg["frameWidth"], cfg.get("frameHeight", cfg["frameWidth"])
+    margin, spacing = cfg.get("margin", 0), cfg.get("spacing", 0)
+    cols = (width - margin + spacing) // (fw + spacing)
+    rows = (height - margin + spacing) // (fh + spacing)
+    cells = [(margin + c * (fw + spacing), margin + r * (fh + spacing)) for r in range(rows) for c in range(cols)]
+    start = cfg.get("startFrame", 0)
+    end = cfg.get("endFrame", -1)
+    return cells[start:] if end < 0 else cells[start:end + 1]
+
+
+def trim(img: "Image.Image") -> Tuple["Image.Image", Tuple[int, int]]:
+    bbox = img.getchannel("A").getbbox()
+    if bbox is None:  # fully transparent frame; keep one pixel so Phaser has a frame
+        bbox = (0, 0, 1, 1)
+    return img.crop(bbox), (bbox[0], bbox[1])
+
+
+def sprites_for(call: LoadCall, path: Path) -> Tuple[List[Sprite], dict]:
+    """Trimmed sprites for one load call plus its index.json entry."""
+    img = Image.open(path).convert("RGBA")
+    entry = {"type": call.kind, "url": call.url, "width": img.width, "height": img.height}
+
+    if call.kind == "spritesheet":
+        fw = call.config["frameWidth"]
+        fh = call.config.get("frameHeight", fw)
+        cells = sheet_grid(img.width, img.height, call.config)
+        entry["config"] = call.config
+        entry["frames"] = len(cells)
+        pieces = [(f"{call.key}/{i}", img.crop((x, y, x + fw, y + fh)), fw, fh) for i, (x, y) in enumerate(cells)]
+    else:
+        pieces = [(call.key, img, img.width, img.height)]
+
+    sprites = []
+    for name, piece, w, h in pieces:
+        trimmed, offset = trim(piece)
+        digest = hashlib.sha1(trimmed.tobytes() + repr(trimmed.size).encode()).hexdigest()
+        sprites.append(Sprite(name, trimmed, w, h, offset, digest))
+    return sprites, entry
+
+
+# ---------- packing ----------
+def _shelf_pack(rects: List[Tuple[str, int, int]], width: int, height: int,
+                padding: int) -> Tuple[Dict[str, Tuple[int, int]], List[Tuple[str, int, int]]]:
+    """Place rects (sorted tallest first) on shelves; returns (placed, left over)."""
+    placed, left = {}, []
+    x = y = shelf_h = 0
+    for rid, w, h in rects:
+        if w > width or h > height:
+            left.append((rid, w, h))
+            continue
+        if x + w > width:  # padding only goes between sprites, not at the page edge
+            x, y, shelf_h = 0, y + shelf_h + padding, 0
+        if y + h > height:
+            left.append((rid, w, h))
+            continue
+        placed[rid] = (x, y)
+        x += w + padding
+        shelf_h = max(shelf_h, h)
+    return placed, left
+
+
+def _page_sizes(max_size: int) -> List[Tuple[int, int]]:
+    sides = [2 ** k for k in range(4, int(math.log2(max_size)) + 1)]
+    return sorted(((w, h) for w in sides for h in sides), key=lambda s: (s[0] * s[1], max(s)))
+
+
+def pack(rects: List[Tuple[str, int, int]], max_size: int = 2048,
+         padding: int = 0) -> List[Tuple[Tuple[int, int], Dict[str, Tuple[int, int]]]]:
+    """
+    Pack (id, w, h) rects into power-of-two pages.
+    Returns [((page_w, page_h), {id: (x, y)}), ...]; raises if a rect can never fit.
+    """
+    todo = sorted(rects, key=lambda r: (-r[2], -r[1], r[0]))
+    for rid, w, h in todo:
+        if w > max_size or h > max_size:
+            raise ValueError(f"{rid} ({w}x{h}) does not fit a {max_size}px page")
+
+    pages = []
+    while todo:
+        area = sum((w + padding) * (h + padding) for _, w, h in todo)
+        for size in _page_sizes(max_size):
+            if size[0] * size[1] < area:
+                continue
+            placed, left = _shelf_pack(todo, size[0], size[1], padding)
+            if not left:
+                pages.append((size, placed))
+                todo = []
+                break
+        else:
+            placed, todo = _shelf_pack(todo, max_size, max_size, padding)
+            pages.append(((max_size, max_size), placed))
+    return pages
+
+
+# ---------- output ----------
+def build_atlas(name: str, sprites: List[Sprite], out_dir: Path, url_base: str,
+                max_size: int, padding: int) -> dict:
+    """Write <name>-<n>.png pages + <name>.json; returns the multiatlas dict."""
+    unique: Dict[str, Sprite] = {}
+    for s in sprites:
+        unique.setdefault(s.digest, s)
+
+    pages = pack([(d, s.image.width, s.image.height) for d, s in unique.items()], max_size, padding)
+    textures = []
+    for n, ((pw, ph), placed) in enumerate(pages):
+        page = Image.new("RGBA", (pw, ph), (0, 0, 0, 0))
+        for digest, (x, y) in placed.items():
+            page.paste(unique[digest].image, (x, y))
+        filename = f"{name}-{n}.png"
+        page.save(out_dir / filename, optimize=True)
+
+        frames = []
+        for s in sprites:
+            if s.digest not in placed:
+                continue
+            x, y = placed[s.digest]
+            w, h = s.image.size
+            frames.append({
+                "filename": s.name,
+                "rotated": False,
+                "trimmed": True,
+                "frame": {"x": x, "y": y, "w": w, "h": h},
+                "spriteSourceSize": {"x": s.offset[0], "y": s.offset[1], "w": w, "h": h},
+                "sourceSize": {"w": s.source_w, "h": s.source_h},
+            })
+        textures.append({
+            "image": url_base + filename,
+            "format": "RGBA8888",
+            "size": {"w": pw, "h": ph},
+            "scale": 1,
+            "frames": frames,
+        })
+
+    atlas = {"textures": textures, "meta": {"app": "tools/pack_atlases.py", "version": "1"}}
+    (out_dir / f"{name}.json").write_text(json.dumps(atlas, separators=(",", ":")), encoding="utf-8")
+    return atlas
+
+
+def _inside(path: Path, directory: Path) -> bool:
+    return Path(directory).resolve() in (Path(path).resolve(), *Path(path).resolve().parents)
+
+
+def pack_scenes(scenes: Dict[str, List[LoadCall]], static_dir: Path = STATIC_DIR, out_dir: Path = OUT_DIR,
+                max_size: int = 2048, padding: int = 0) -> dict:
+    """Build every atlas and write index.json; returns the index."""
+    if Image is None:
+        raise RuntimeError("Pillow is required: pip install -r tools/requirements.txt")
+    out_dir = Path(out_dir)
+    if not _inside(out_dir, static_dir):
+        raise ValueError(f"atlas output {out_dir} must be inside {static_dir} to be served under {URL_PREFIX}")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    url_base = URL_PREFIX + out_dir.resolve().relative_to(Path(static_dir).resolve()).as_posix() + "/"
+
+    # which scenes use each key (first definition of a key wins, like Phaser's loader)
+    calls: Dict[str, LoadCall] = {}
+    users: Dict[str, List[str]] = {}
+    for scene, scene_calls in scenes.items():
+        for call in scene_calls:
+            path = source_path(call.url, static_dir)
+            if path is None or path.suffix.lower() != ".png" or not path.is_file():
+                continue
+            if call.kind == "spritesheet" and "frameWidth" not in call.config:
+                continue
+            calls.setdefault(call.key, call)
+            if scene not in users.setdefault(call.key, []):
+                users[call.key].append(scene)
+
+    groups: Dict[str, List[str]] = {}
+    for key, scene_list in users.items():
+        groups.setdefault(SHARED if len(scene_list) > 1 else scene_list[0], []).append(key)
+
+    index = {"version": 1, "atlases": {}, "scenes": {s: [] for s in scenes}, "keys": {}}
+    for atlas_name, keys in sorted(groups.items()):
+        sprites = []
+        for key in keys:
+            key_sprites, entry = sprites_for(calls[key], source_path(calls[key].url, static_dir))
+            entry["atlas"] = atlas_name
+            index["keys"][key] = entry
+            sprites.extend(key_sprites)
+        build_atlas(atlas_name, sprites, out_dir, url_base, max_size, padding)
+        index["atlases"][atlas_name] = url_base + f"{atlas_name}.json"
+        for scene in scenes:
+            if atlas_name == SHARED and any(scene in users[k] for k in keys) or atlas_name == scene:
+                index["scenes"][scene].append(atlas_name)
+
+    (out_dir / "index.json").write_text(json.dumps(index, indent=1, sort_keys=True), encoding="utf-8")
+    return index
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pack per-scene Phaser texture atlases into static/atlases")
+    ap.add_argument("--scenes", default=str(SCENES_DIR))
+    ap.add_argument("--out", default=str(OUT_DIR))
+    ap.add_argument("--max-size", type=int, default=2048, help="largest atlas page side (power of two)")
+    # frames are copied out of the pages onto their own canvases (no filtering
+    # across neighbours), so no gutter is needed unless the atlas is drawn from directly
+    ap.add_argument("--padding", type=int, default=0)
+    args = ap.parse_args()
+    if not _inside(Path(args.out), STATIC_DIR):
+        ap.error(f"--out must be a directory inside {STATIC_DIR} (atlases are served under {URL_PREFIX})")
+
+    scenes = discover_scenes(Path(args.scenes))
+    index = pack_scenes(scenes, STATIC_DIR, Path(args.out), args.max_size, args.padding)
+
+    before = sum(1 for calls in scenes.values() for _ in calls)
+    pages = sum(len(json.loads((Path(args.out) / f"{a}.json").read_text())["textures"]) for a in index["atlases"])
+    print(f"{len(index['keys'])} keys from {len(scenes)} scenes ({before} load calls) "
+          f"-> {len(index['atlases'])} atlases, {pages} pages")
+    for scene, atlases in index["scenes"].items():
+        print(f"  {scene}: {', '.join(atlases) or '-'}")
+
+
+if __name__ == "__main__":
+    main()